@@ -1,8 +1,15 @@
-from pylater.dist import LATER
-from pylater.plot import ReciprobitPlot
-from pylater.model import build_default_model
-from pylater.compare import combine_multiple_likelihoods
-from pylater.data import Dataset
+from __future__ import annotations
+
+import importlib
+import typing
+
+if typing.TYPE_CHECKING:
+    from pylater.dist import LATER
+    from pylater.plot import ReciprobitPlot
+    from pylater.model import build_default_model
+    from pylater.compare import combine_multiple_likelihoods
+    from pylater.data import Dataset, BinnedDataset
+    from pylater.compilation import warmup
 
 __version__ = "0.1"
 
@@ -12,4 +19,43 @@ __all__ = (
     "build_default_model",
     "combine_multiple_likelihoods",
     "Dataset",
+    "BinnedDataset",
+    "warmup",
 )
+
+# the submodule that provides each top-level name; these are only imported when
+# the name is first accessed, so that (for example) loading data does not import
+# PyMC or matplotlib
+_LAZY_ATTRS = {
+    "LATER": "pylater.dist",
+    "ReciprobitPlot": "pylater.plot",
+    "build_default_model": "pylater.model",
+    "combine_multiple_likelihoods": "pylater.compare",
+    "Dataset": "pylater.data",
+    "BinnedDataset": "pylater.data",
+    "warmup": "pylater.compilation",
+}
+
+
+def __getattr__(name: str) -> typing.Any:  # noqa: ANN401
+    if name in _LAZY_ATTRS:
+        value = getattr(importlib.import_module(_LAZY_ATTRS[name]), name)
+        # cache, so that subsequent access does not go through here
+        globals()[name] = value
+        return value
+
+    # allow submodules to be accessed as attributes (e.g., `pylater.data`)
+    # without an explicit import
+    try:
+        return importlib.import_module(f"{__name__}.{name}")
+    except ModuleNotFoundError as err:
+        if err.name != f"{__name__}.{name}":
+            raise
+
+    error_info = f"No known attribute named {name}"
+
+    raise AttributeError(error_info)
+
+
+def __dir__() -> list[str]:
+    return sorted({*globals(), *__all__})
@@ -0,0 +1,392 @@
+from __future__ import annotations
+
+import enum
+import hashlib
+import json
+import typing
+import warnings
+
+import numpy as np
+import numpy.typing as npt
+
+import xarray as xr
+
+import arviz as az
+
+import pylater.dist
+import pylater.gof
+import pylater.instrument
+import pylater.store
+
+# the inference data group in which bands are cached
+BANDS_GROUP = "credible_bands"
+
+# the statistics of each band, along its `statistic` dimension
+BAND_STATS = ("median", "lower", "upper")
+
+
+class BandType(enum.Enum):
+    MODEL = "model"
+    PRIOR_PREDICTIVE = "prior_predictive"
+    POSTERIOR_PREDICTIVE = "posterior_predictive"
+
+
+@pylater.instrument.instrumented("model_band")
+def model_band(
+    idata: az.data.inference_data.InferenceData,
+    min_rt_s: float,
+    max_rt_s: float,
+    n_points: int = 1000,
+    ci_range: float = 0.95,
+    dataset_name: str | None = None,
+    chunk_size: int = pylater.store.DEFAULT_CHUNK_SIZE,
+    use_cache: bool = True,
+) -> xr.DataArray:
+    """
+    Calculate the credible band of the model distribution function, from
+    parameters in a posterior distribution.
+
+    Parameters
+    ----------
+    idata
+        Inference data object containing posterior samples.
+    min_rt_s, max_rt_s
+        Range of reaction times, in seconds, over which to evaluate the model.
+    n_points
+        How many points to use when evaluating the model; these are evenly spaced
+        in the logarithm of the reaction time.
+    ci_range
+        Width of the credible interval.
+    dataset_name
+        Name of the dataset. This is used to select a coordinate within a
+        `dataset` dimension in the posterior samples. If `None`, assumes that
+        there is only a single coordinate in the `dataset` dimension.
+    chunk_size
+        Number of draws (of each chain) to read and evaluate at a time.
+    use_cache
+        Whether to reuse a band that has been calculated with the same settings
+        and stored in `idata` (see Notes), and to store the band if not.
+
+    Returns
+    -------
+    xr.DataArray
+        The median and the lower and upper bounds of the credible interval of the
+        distribution function, over `statistic` and `rt`.
+
+    Notes
+    -----
+    * Bands are stored in the `credible_bands` group of `idata`, and so are saved
+      with it (e.g., by `idata.to_netcdf`). A stored band is only reused if a
+      hash of the posterior samples from which it was calculated matches that of
+      the current samples. The hash is of all of the draws, so checking it reads
+      them all (a chunk at a time); with `use_cache=False`, they are only read
+      to calculate the band.
+    """
+
+    # only the parameters that are needed are read, which matters if the
+    # posterior is in a store (see `pylater.store`)
+    assert hasattr(idata, "posterior")
+
+    posterior: xr.Dataset = idata.posterior[["mu", "sigma", "sigma_e"]]
+
+    subset = (
+        posterior.sel(dataset=dataset_name) if dataset_name is not None else posterior
+    )
+
+    # assumes a single dataset, if not selected
+    if "dataset" in subset.dims:
+        subset = subset.squeeze(dim="dataset")
+
+    # parameters that are shared in a 'shift' or 'swivel' arrangement
+    if "shared" in subset.dims:
+        subset = subset.squeeze(dim="shared")
+
+    x_rt_s = rt_grid(min_rt_s=min_rt_s, max_rt_s=max_rt_s, n_points=n_points)
+
+    def compute() -> npt.NDArray[np.float64]:
+
+        p = np.concatenate(
+            [
+                -np.expm1(
+                    pylater.dist.numpy_logcdf(
+                        value=1 / x_rt_s[:, np.newaxis],
+                        mu=chunk.mu.values,
+                        sigma=chunk.sigma.values,
+                        sigma_e=chunk.sigma_e.values,
+                    )
+                )
+                for chunk in pylater.store.iter_draw_chunks(
+                    data=subset,
+                    chunk_size=chunk_size,
+                )
+            ],
+            axis=1,
+        )
+
+        pylater.instrument.annotate(n_points=n_points, n_cdf_values=int(p.size))
+
+        quantiles: npt.NDArray[np.float64] = np.quantile(
+            p,
+            q=[0.5, *q_from_ci_range(ci_range=ci_range)],
+            axis=1,
+        )
+
+        return quantiles
+
+    return get_band(
+        idata=idata,
+        settings={
+            "band_type": BandType.MODEL.value,
+            "min_rt_s": min_rt_s,
+            "max_rt_s": max_rt_s,
+            "n_points": n_points,
+            "ci_range": ci_range,
+            "dataset_name": dataset_name,
+        },
+        source=subset,
+        x_rt_s=x_rt_s,
+        compute=compute,
+        chunk_size=chunk_size,
+        use_cache=use_cache,
+    )
+
+
+@pylater.instrument.instrumented("predictive_band")
+def predictive_band(
+    idata: az.data.inference_data.InferenceData,
+    predictive_type: str,
+    min_rt_s: float,
+    max_rt_s: float,
+    observed_var_name: str | None = None,
+    n_points: int = 1000,
+    ci_range: float = 0.95,
+    chunk_size: int = pylater.store.DEFAULT_CHUNK_SIZE,
+    use_cache: bool = True,
+) -> xr.DataArray:
+    """
+    Calculate the credible band of the ECDF of draws from a prior or posterior
+    predictive distribution.
+
+    Parameters
+    ----------
+    idata
+        Inference data object containing predictive samples.
+    predictive_type
+        Either `prior` or `posterior`.
+    min_rt_s, max_rt_s
+        Range of reaction times, in seconds, over which to evaluate the ECDFs.
+    observed_var_name
+        Name of the observed variable in the predictive samples. If `None`,
+        assumes that there is only a single variable with observations.
+    n_points
+        How many points to use when evaluating the ECDFs; these are evenly spaced
+        in the logarithm of the reaction time.
+    ci_range
+        Width of the credible interval.
+    chunk_size
+        Number of draws (of each chain) to read and evaluate at a time.
+    use_cache
+        Whether to reuse a band that has been calculated with the same settings
+        and stored in `idata` (as for `model_band`), and to store the band if
+        not.
+
+    Returns
+    -------
+    xr.DataArray
+        The median and the lower and upper bounds of the credible interval of the
+        ECDF, over `statistic` and `rt`.
+    """
+
+    band_type = BandType(f"{predictive_type}_predictive")
+
+    dataset: xr.Dataset = getattr(idata, band_type.value)
+
+    data = (
+        dataset.to_dataarray()
+        if observed_var_name is None
+        else dataset[observed_var_name]
+    )
+
+    x_rt_s = rt_grid(min_rt_s=min_rt_s, max_rt_s=max_rt_s, n_points=n_points)
+
+    def gen_ecdfs(chunk: xr.DataArray) -> npt.NDArray[np.float64]:
+        samples = chunk.transpose("sample", ...).values
+
+        # the ECDF of each draw, evaluated in a single vectorised operation
+        return pylater.gof.evaluate_ecdfs(
+            samples=samples.reshape(len(samples), -1),
+            x=x_rt_s[np.newaxis, :],
+        )
+
+    def compute() -> npt.NDArray[np.float64]:
+
+        # only a chunk of the draws is read at a time, which matters if they are
+        # in a store (see `pylater.store`)
+        ecdfs = np.concatenate(
+            [
+                gen_ecdfs(chunk=chunk)
+                for chunk in pylater.store.iter_draw_chunks(
+                    data=data,
+                    chunk_size=chunk_size,
+                )
+            ],
+            axis=0,
+        )
+
+        pylater.instrument.annotate(
+            n_points=n_points,
+            n_predictive=int(data.size),
+            n_ecdf_values=int(ecdfs.size),
+        )
+
+        quantiles: npt.NDArray[np.float64] = np.quantile(
+            ecdfs,
+            q=[0.5, *q_from_ci_range(ci_range=ci_range)],
+            axis=0,
+        )
+
+        return quantiles
+
+    return get_band(
+        idata=idata,
+        settings={
+            "band_type": band_type.value,
+            "min_rt_s": min_rt_s,
+            "max_rt_s": max_rt_s,
+            "n_points": n_points,
+            "ci_range": ci_range,
+            "observed_var_name": observed_var_name,
+        },
+        source=data,
+        x_rt_s=x_rt_s,
+        compute=compute,
+        chunk_size=chunk_size,
+        use_cache=use_cache,
+    )
+
+
+def get_band(
+    idata: az.data.inference_data.InferenceData,
+    settings: dict[str, typing.Any],
+    source: xr.Dataset | xr.DataArray,
+    x_rt_s: npt.NDArray[np.float64],
+    compute: typing.Callable[[], npt.NDArray[np.float64]],
+    chunk_size: int = pylater.store.DEFAULT_CHUNK_SIZE,
+    use_cache: bool = True,
+) -> xr.DataArray:
+    """
+    Get a band from the cache in an inference data object, or compute it (with
+    shape (statistic, rt)) and add it to the cache.
+    """
+
+    # netCDF attributes cannot be `None`
+    attrs = {
+        name: value if value is not None else "" for (name, value) in settings.items()
+    }
+
+    if not use_cache:
+        return band_array(values=compute(), x_rt_s=x_rt_s, attrs=attrs)
+
+    var_name = band_var_name(settings=settings)
+    digest = source_digest(source=source, chunk_size=chunk_size)
+
+    bands: xr.Dataset | None = getattr(idata, BANDS_GROUP, None)
+
+    if (
+        bands is not None
+        and var_name in bands
+        and bands[var_name].attrs.get("source_digest") == digest
+    ):
+        pylater.instrument.annotate(cache_hit=True)
+        return bands[var_name].rename({f"{var_name}_rt": "rt"})
+
+    pylater.instrument.annotate(cache_hit=False)
+
+    band = band_array(
+        values=compute(),
+        x_rt_s=x_rt_s,
+        attrs={**attrs, "source_digest": digest},
+    )
+
+    stored_band = band.rename({"rt": f"{var_name}_rt"})
+
+    if bands is None:
+        with warnings.catch_warnings():
+            # the group is not one of the groups of the InferenceData schema
+            warnings.filterwarnings(
+                action="ignore",
+                message=f"The group {BANDS_GROUP} is not defined",
+                category=UserWarning,
+            )
+            idata.add_groups({BANDS_GROUP: xr.Dataset({var_name: stored_band})})
+    else:
+        # replaces any band with the same settings but different samples
+        bands[var_name] = stored_band
+
+    return band
+
+
+def band_array(
+    values: npt.NDArray[np.float64],
+    x_rt_s: npt.NDArray[np.float64],
+    attrs: dict[str, typing.Any],
+) -> xr.DataArray:
+    return xr.DataArray(
+        data=values,
+        dims=("statistic", "rt"),
+        coords={"statistic": list(BAND_STATS), "rt": x_rt_s},
+        attrs=attrs,
+    )
+
+
+def band_var_name(settings: dict[str, typing.Any]) -> str:
+    """
+    The name of the variable in which a band with the given settings is stored.
+    """
+
+    digest = hashlib.sha256(json.dumps(settings, sort_keys=True).encode())
+
+    return f"band_{digest.hexdigest()[:16]}"
+
+
+def source_digest(
+    source: xr.Dataset | xr.DataArray,
+    chunk_size: int = pylater.store.DEFAULT_CHUNK_SIZE,
+) -> str:
+    """
+    A hash of all of the draws from which a band is calculated, read a chunk of
+    draws at a time. The draws are hashed in order of draw and then chain, so
+    that the hash does not depend on the chunk size.
+    """
+
+    digest = hashlib.sha256()
+
+    data = source.to_dataarray() if isinstance(source, xr.Dataset) else source
+
+    data = data.transpose("draw", "chain", ...)
+
+    digest.update(f"{data.dtype.str}{data.dims}{data.shape}".encode())
+
+    for draw_start in range(0, data.sizes["draw"], chunk_size):
+        chunk = data.isel(draw=slice(draw_start, draw_start + chunk_size))
+        digest.update(np.ascontiguousarray(chunk.values).tobytes())
+
+    return digest.hexdigest()
+
+
+def rt_grid(min_rt_s: float, max_rt_s: float, n_points: int) -> npt.NDArray[np.float64]:
+    """
+    Reaction times, in seconds, that are evenly spaced in their logarithm.
+    """
+
+    x_rt_s: npt.NDArray[np.float64] = np.logspace(
+        np.log10(min_rt_s),
+        np.log10(max_rt_s),
+        n_points,
+    )
+
+    return x_rt_s
+
+
+def q_from_ci_range(ci_range: float) -> tuple[float, float]:
+    return ((1 - ci_range) / 2, 1 - (1 - ci_range) / 2)
@@ -0,0 +1,641 @@
+from __future__ import annotations
+
+import collections
+import concurrent.futures
+import contextlib
+import csv
+import enum
+import json
+import os
+import pathlib
+import typing
+import warnings
+
+import numpy as np
+
+import xarray as xr
+
+import arviz as az
+
+import pylater.cache
+import pylater.data
+import pylater.files
+import pylater.fit
+import pylater.instrument
+import pylater.model
+import pylater.posterior
+
+
+class Executor(enum.Enum):
+    LOCAL = "local"
+    DASK = "dask"
+    RAY = "ray"
+
+
+SETTINGS_FILENAME = "batch.json"
+FITS_DIRNAME = "fits"
+MERGED_FILENAME = "merged.nc"
+
+# settings that can differ between shards, or when resuming a run
+RESUMABLE_SETTINGS = ("n_workers",)
+
+# arguments to `pm.sample` that are used unless overridden; the fits are run in
+# parallel with each other rather than their chains being run in parallel
+DEFAULT_SAMPLE_KWARGS: dict[str, typing.Any] = {"cores": 1, "progressbar": False}
+
+P = typing.ParamSpec("P")
+R = typing.TypeVar("R")
+
+
+class BatchFit:
+    __slots__ = ("path", "settings")
+
+    def __init__(self, path: str | os.PathLike[str]) -> None:
+        """
+        Results of a batch of fits, as produced by `fit_batch`.
+
+        Parameters
+        ----------
+        path
+            Directory containing the batch.
+
+        Notes
+        -----
+        * The inference data of each fit is stored in `fits/<fit name>.nc`, and
+          that of all of the fits (once complete) in `merged.nc`.
+        """
+
+        self.path = pathlib.Path(path)
+
+        settings = read_settings(path=self.path)
+
+        if settings is None:
+            msg = f"No batch of fits found in {self.path}"
+            raise ValueError(msg)
+
+        self.settings = settings
+
+    def __repr__(self) -> str:
+        return (
+            f"Batch of {len(self.fit_names)} fit(s), {len(self.completed)} "
+            + f"complete, in {self.path}"
+        )
+
+    @property
+    def fit_names(self) -> list[str]:
+        return sorted(self.settings["fits"])
+
+    @property
+    def completed(self) -> list[str]:
+        """Names of the fits whose results have been written."""
+        return [
+            fit_name
+            for fit_name in self.fit_names
+            if fit_path(path=self.path, fit_name=fit_name).exists()
+        ]
+
+    @property
+    def is_complete(self) -> bool:
+        """Whether all of the fits have been written."""
+        return len(self.completed) == len(self.fit_names)
+
+    def load(self, fit_name: str) -> az.data.inference_data.InferenceData:
+        """
+        Load the inference data of a completed fit.
+
+        Parameters
+        ----------
+        fit_name
+            Name of the fit.
+
+        Returns
+        -------
+        az.data.inference_data.InferenceData
+            The inference data.
+        """
+
+        if fit_name not in self.completed:
+            msg = f"Fit {fit_name} has not been completed"
+            raise ValueError(msg)
+
+        return load_netcdf(path=fit_path(path=self.path, fit_name=fit_name))
+
+    def merge(self, overwrite: bool = False) -> az.data.inference_data.InferenceData:
+        """
+        Merge the inference data of all of the fits, and write it to the batch
+        directory.
+
+        Parameters
+        ----------
+        overwrite
+            Whether to merge the fits again if they have already been merged.
+
+        Returns
+        -------
+        az.data.inference_data.InferenceData
+            Inference data object in which the posterior is over all of the
+            datasets, with parameters that are shared within a fit repeated for
+            each of its datasets and a `fit` coordinate identifying the fit of
+            each dataset. The sampler statistics are over a `fit` dimension, and
+            the log-likelihood and observed data contain the variables of all of
+            the fits.
+        """
+
+        merged_path = self.path / MERGED_FILENAME
+
+        if merged_path.exists() and not overwrite:
+            return load_netcdf(path=merged_path)
+
+        if not self.is_complete:
+            n_remaining = len(self.fit_names) - len(self.completed)
+            msg = f"Cannot merge the fits, since {n_remaining} are not complete"
+            raise ValueError(msg)
+
+        with pylater.instrument.phase("merge_fits", n_fits=len(self.fit_names)):
+            merged = merge_fits(
+                idatas={fit_name: self.load(fit_name) for fit_name in self.fit_names}
+            )
+
+        write_netcdf(path=merged_path, idata=merged)
+
+        return merged
+
+
+@pylater.instrument.instrumented("fit_batch")
+def fit_batch(
+    fits: typing.Mapping[str, typing.Sequence[pylater.data.Dataset]],
+    path: str | os.PathLike[str],
+    share_type: str | None = None,
+    sample_kwargs: typing.Mapping[str, typing.Any] | None = None,
+    log_likelihood: bool = True,
+    random_seed: int | None = None,
+    shard: tuple[int, int] = (0, 1),
+    executor: str = "local",
+    n_workers: int = 1,
+) -> BatchFit:
+    """
+    Fit models from `build_default_model` to many sets of datasets, writing the
+    result of each fit to disk so that an interrupted batch can be resumed.
+
+    Parameters
+    ----------
+    fits
+        The datasets of each fit, keyed by the name of the fit. Each fit is of a
+        single model, and so fits with multiple datasets need a `share_type`.
+    path
+        Directory in which to write the results; if it contains results from a
+        previous run with the same settings, only the incomplete fits are run.
+    share_type
+        Parameter sharing arrangement for fits with multiple datasets, as for
+        `build_default_model`.
+    sample_kwargs
+        Arguments passed to `pm.sample`; these need to be representable in JSON.
+        By default, each fit has `cores=1` and `progressbar=False`.
+    log_likelihood
+        Whether to compute the pointwise log-likelihood of each fit.
+    random_seed
+        Seed for the random number generator; if `None`, a previous run is
+        continued with its seed or a new run has a random seed. The seed of each
+        fit does not depend on the sharding or on the number of workers.
+    shard
+        The index (from zero) of the shard to run and the total number of
+        shards; the fits, ordered by name, are divided among the shards in turn.
+        Each shard can be run by a separate process (e.g., on separate nodes of a
+        cluster sharing a filesystem).
+    executor
+        How to run the fits in parallel, when `n_workers` is more than one:
+        `local` (a pool of processes), `dask` (a local Dask cluster; needs
+        `dask.distributed`), or `ray` (a local Ray cluster; needs `ray`).
+    n_workers
+        Number of fits to run in parallel.
+
+    Returns
+    -------
+    BatchFit
+        The results of the batch, including those from other shards. Once all
+        of the fits are complete, the merged inference data is also written.
+
+    Notes
+    -----
+    * Each shard should be given the same `random_seed`, so that they agree on
+      the settings of the batch.
+    * The name of each fit is used as the name of its file, and so cannot be
+      empty, start with `.`, or contain a path separator.
+    """
+
+    path = pathlib.Path(path)
+
+    i_shard, n_shards = shard
+
+    if not 0 <= i_shard < n_shards:
+        msg = f"Invalid shard {i_shard} of {n_shards}"
+        raise ValueError(msg)
+
+    fit_executor = Executor(executor)
+
+    for fit_name in fits:
+        check_fit_name(fit_name=fit_name)
+
+    existing = read_settings(path=path)
+
+    if random_seed is None and existing is not None:
+        # continue an existing run
+        entropy = existing["entropy"]
+    else:
+        entropy = np.random.SeedSequence(random_seed).entropy
+
+    settings = {
+        "fits": {
+            fit_name: [
+                pylater.cache.dataset_settings(dataset=dataset) for dataset in datasets
+            ]
+            for (fit_name, datasets) in fits.items()
+        },
+        "share_type": (
+            pylater.model.ShareType(share_type).value
+            if share_type is not None
+            else None
+        ),
+        "sample_kwargs": {**DEFAULT_SAMPLE_KWARGS, **(sample_kwargs or {})},
+        "log_likelihood": log_likelihood,
+        "n_workers": n_workers,
+        "entropy": entropy,
+    }
+
+    # as read back from the settings file, in which (for example) tuples become
+    # lists, so that they can be compared with those of a previous run
+    settings = json.loads(json.dumps(settings))
+
+    if existing is not None and any(
+        existing[setting_name] != setting_value
+        for (setting_name, setting_value) in settings.items()
+        if setting_name not in RESUMABLE_SETTINGS
+    ):
+        msg = f"A batch of fits with different settings already exists in {path}"
+        raise ValueError(msg)
+
+    (path / FITS_DIRNAME).mkdir(parents=True, exist_ok=True)
+
+    pylater.files.write_atomic(
+        path=path / SETTINGS_FILENAME,
+        write=lambda file: file.write(json.dumps(settings).encode()),
+    )
+
+    fit_names = sorted(fits)
+
+    tasks: list[dict[str, typing.Any]] = [
+        {
+            "fit_name": fit_name,
+            "datasets": {
+                dataset.name: {
+                    "rt_s": dataset.rt_s,
+                    "censor_lower_s": dataset.censor_lower_s,
+                    "censor_upper_s": dataset.censor_upper_s,
+                    "n_censored_lower": dataset.n_censored_lower,
+                    "n_censored_upper": dataset.n_censored_upper,
+                }
+                for dataset in fits[fit_name]
+            },
+            "seed": np.random.SeedSequence(entropy, spawn_key=(i_fit,)),
+            "settings": settings,
+            "path": path,
+        }
+        for (i_fit, fit_name) in enumerate(fit_names)
+        if i_fit % n_shards == i_shard
+        and not fit_path(path=path, fit_name=fit_name).exists()
+    ]
+
+    pylater.instrument.annotate(n_fits=len(tasks))
+
+    if n_workers == 1 and fit_executor is Executor.LOCAL:
+        for task in tasks:
+            run_fit(**task)
+    else:
+        with open_executor(executor=fit_executor, n_workers=n_workers) as pool:
+            futures = [pool.submit(run_fit, **task) for task in tasks]
+            for future in concurrent.futures.as_completed(futures):
+                future.result()
+
+    batch = BatchFit(path=path)
+
+    # whichever shard finishes last writes the merged results
+    if batch.is_complete:
+        batch.merge()
+
+    return batch
+
+
+def run_fit(
+    fit_name: str,
+    datasets: dict[str, dict[str, typing.Any]],
+    seed: np.random.SeedSequence,
+    settings: dict[str, typing.Any],
+    path: pathlib.Path,
+) -> str:
+    """
+    Build and sample the model of a single fit, and write its inference data.
+    The datasets are given by their reaction times and censoring, keyed by name.
+    """
+
+    rng = np.random.default_rng(seed)
+
+    fit_datasets = [
+        pylater.data.Dataset(
+            name=dataset_name,
+            dtype=dataset_args["rt_s"].dtype,
+            **dataset_args,
+        )
+        for (dataset_name, dataset_args) in datasets.items()
+    ]
+
+    with warnings.catch_warnings():
+        warnings.filterwarnings(action="ignore", message="Note that this uses priors")
+        model = pylater.model.build_default_model(
+            datasets=fit_datasets,
+            share_type=settings["share_type"],
+        )
+
+    idata = pylater.fit.sample(
+        model=model,
+        random_seed=int(rng.integers(2**31)),
+        idata_kwargs={"log_likelihood": settings["log_likelihood"]},
+        **settings["sample_kwargs"],
+    )
+
+    write_netcdf(path=fit_path(path=path, fit_name=fit_name), idata=idata)
+
+    return fit_name
+
+
+def merge_fits(
+    idatas: typing.Mapping[str, az.data.inference_data.InferenceData],
+) -> az.data.inference_data.InferenceData:
+    """
+    Merge the inference data of separate fits; see `BatchFit.merge`.
+    """
+
+    groups = set.intersection(*(set(idata.groups()) for idata in idatas.values()))
+
+    merged: dict[str, xr.Dataset] = {}
+
+    for group in sorted(groups):
+
+        datasets = {
+            fit_name: getattr(idata, group) for (fit_name, idata) in idatas.items()
+        }
+
+        if group == "posterior":
+            merged[group] = xr.concat(
+                [
+                    pylater.posterior.dataset_posterior(
+                        posterior=posterior
+                    ).assign_coords(
+                        fit=("dataset", [fit_name] * posterior.sizes["dataset"])
+                    )
+                    for (fit_name, posterior) in datasets.items()
+                ],
+                dim="dataset",
+                combine_attrs="drop_conflicts",
+            )
+        elif group in ("log_likelihood", "observed_data"):
+            # the variables are named after their datasets
+            merged[group] = xr.merge(
+                list(datasets.values()),
+                combine_attrs="drop_conflicts",
+            )
+        else:
+            merged[group] = xr.concat(
+                list(datasets.values()),
+                dim=xr.Variable(dims="fit", data=list(datasets)),
+                combine_attrs="drop_conflicts",
+            )
+
+    return az.InferenceData(**typing.cast(dict[str, typing.Any], merged))
+
+
+@contextlib.contextmanager
+def open_executor(
+    executor: Executor,
+    n_workers: int,
+) -> typing.Iterator[concurrent.futures.Executor]:
+    """
+    Start a pool of workers to which fits can be submitted.
+    """
+
+    if executor is Executor.LOCAL:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=n_workers) as pool:
+            yield pool
+
+    elif executor is Executor.DASK:
+
+        try:
+            import dask.distributed
+        except ImportError as err:
+            msg = "The `dask` executor needs `dask.distributed` to be installed"
+            raise ImportError(msg) from err
+
+        with (
+            dask.distributed.LocalCluster(
+                n_workers=n_workers,
+                threads_per_worker=1,
+                processes=True,
+            ) as cluster,
+            dask.distributed.Client(cluster) as client,
+        ):
+            yield client.get_executor()
+
+    elif executor is Executor.RAY:
+
+        try:
+            import ray
+        except ImportError as err:
+            msg = "The `ray` executor needs `ray` to be installed"
+            raise ImportError(msg) from err
+
+        ray.init(num_cpus=n_workers)
+
+        try:
+            yield RayExecutor()
+        finally:
+            ray.shutdown()
+
+
+class RayExecutor(concurrent.futures.Executor):
+    """
+    Runs functions as Ray tasks, via the `concurrent.futures` interface.
+    """
+
+    def submit(
+        self,
+        fn: typing.Callable[P, R],
+        /,
+        *args: P.args,
+        **kwargs: P.kwargs,
+    ) -> concurrent.futures.Future[R]:
+
+        import ray
+
+        future: concurrent.futures.Future[R] = (
+            ray.remote(num_cpus=1)(fn).remote(*args, **kwargs).future()
+        )
+
+        return future
+
+
+def read_fits_csv(
+    path: str | os.PathLike[str],
+) -> dict[str, list[pylater.data.Dataset]]:
+    """
+    Read the datasets of a batch of fits from a CSV file.
+
+    Parameters
+    ----------
+    path
+        Path to the CSV file, which has a row per trial with columns `dataset`
+        (the name of the dataset) and `rt_s` (the reaction time, in seconds). An
+        optional `fit` column groups datasets into fits; without it, each dataset
+        is fit separately.
+
+    Returns
+    -------
+    dict[str, list[pylater.data.Dataset]]
+        The datasets of each fit, keyed by the name of the fit.
+    """
+
+    rt_s: dict[str, list[float]] = collections.defaultdict(list)
+    dataset_fits: dict[str, str] = {}
+
+    with pathlib.Path(path).open(newline="", encoding="utf-8-sig") as handle:
+        reader = csv.DictReader(handle)
+
+        for row in reader:
+
+            dataset_name = row["dataset"]
+            fit_name = row.get("fit", dataset_name)
+
+            if dataset_fits.setdefault(dataset_name, fit_name) != fit_name:
+                msg = f"Dataset {dataset_name} is in more than one fit"
+                raise ValueError(msg)
+
+            rt_s[dataset_name].append(float(row["rt_s"]))
+
+    fits: dict[str, list[pylater.data.Dataset]] = collections.defaultdict(list)
+
+    for dataset_name, dataset_rt_s in rt_s.items():
+        fits[dataset_fits[dataset_name]].append(
+            pylater.data.Dataset(name=dataset_name, rt_s=dataset_rt_s)
+        )
+
+    return dict(fits)
+
+
+def read_manifest(path: str | os.PathLike[str]) -> dict[str, typing.Any]:
+    """
+    Read a batch manifest: either a CSV file of datasets (see `read_fits_csv`),
+    or a JSON file with the path to such a CSV file (`data`, relative to the
+    manifest) and optionally `share_type`, `sample` (arguments to `pm.sample`),
+    `log_likelihood`, and `random_seed`.
+
+    Returns
+    -------
+    dict[str, typing.Any]
+        The arguments to `fit_batch` given by the manifest.
+    """
+
+    path = pathlib.Path(path)
+
+    if path.suffix.lower() != ".json":
+        return {"fits": read_fits_csv(path=path)}
+
+    manifest: dict[str, typing.Any] = json.loads(path.read_text())
+
+    unknown = set(manifest) - {
+        "data",
+        "share_type",
+        "sample",
+        "log_likelihood",
+        "random_seed",
+    }
+
+    if unknown:
+        msg = f"Unknown manifest entries: {sorted(unknown)}"
+        raise ValueError(msg)
+
+    batch_kwargs = {
+        "fits": read_fits_csv(path=path.parent / manifest.pop("data")),
+        **manifest,
+    }
+
+    if "sample" in batch_kwargs:
+        batch_kwargs["sample_kwargs"] = batch_kwargs.pop("sample")
+
+    return batch_kwargs
+
+
+def parse_shard(shard: str) -> tuple[int, int]:
+    """
+    Parse a shard specification of the form `i/n`.
+    """
+
+    try:
+        i_shard, n_shards = (int(value) for value in shard.split("/"))
+    except ValueError as err:
+        msg = f"Invalid shard {shard}; expected the form `i/n`"
+        raise ValueError(msg) from err
+
+    return (i_shard, n_shards)
+
+
+def fit_path(path: pathlib.Path, fit_name: str) -> pathlib.Path:
+    return path / FITS_DIRNAME / f"{fit_name}.nc"
+
+
+def check_fit_name(fit_name: str) -> None:
+    """
+    Check that the name of a fit can be used as the name of its file, without
+    referring to another directory or being hidden (like a temporary file).
+    """
+
+    if (
+        fit_name == ""
+        or fit_name.startswith(".")
+        or any(character in fit_name for character in ("/", "\\", "\0"))
+    ):
+        msg = f"Invalid fit name {fit_name!r}; it is used as the name of a file"
+        raise ValueError(msg)
+
+
+def read_settings(path: pathlib.Path) -> dict[str, typing.Any] | None:
+    settings_path = path / SETTINGS_FILENAME
+
+    if not settings_path.exists():
+        return None
+
+    settings: dict[str, typing.Any] = json.loads(settings_path.read_text())
+
+    return settings
+
+
+def load_netcdf(path: pathlib.Path) -> az.data.inference_data.InferenceData:
+    # loaded into memory, so that the file is not held open
+    with az.rcparams.rc_context(rc={"data.load": "eager"}):
+        idata: az.data.inference_data.InferenceData = az.from_netcdf(
+            filename=os.fspath(path)
+        )
+    return idata
+
+
+def write_netcdf(
+    path: pathlib.Path,
+    idata: az.data.inference_data.InferenceData,
+) -> None:
+    """
+    Write inference data such that the file is either complete or absent, even if
+    interrupted.
+    """
+
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+
+    idata.to_netcdf(filename=os.fspath(tmp_path))
+
+    tmp_path.replace(path)
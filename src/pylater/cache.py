@@ -0,0 +1,515 @@
+from __future__ import annotations
+
+import datetime
+import hashlib
+import importlib.metadata
+import json
+import os
+import pathlib
+import typing
+
+import numpy as np
+
+import arviz as az
+
+import pylater
+import pylater.config
+import pylater.data
+import pylater.files
+import pylater.fit
+import pylater.instrument
+import pylater.model
+
+# default limit on the total size of the cached fits, in bytes
+DEFAULT_MAX_BYTES = 2**30
+
+# arguments to `pm.sample` that do not affect the draws, and so are not part of
+# the key
+IGNORED_SAMPLE_KWARGS = frozenset(
+    ("progressbar", "cores", "compute_convergence_checks")
+)
+
+
+class CacheEntry:
+    __slots__ = ("key", "last_used", "n_bytes", "path", "settings")
+
+    def __init__(
+        self,
+        key: str,
+        path: pathlib.Path,
+        n_bytes: int,
+        last_used: datetime.datetime,
+        settings: dict[str, typing.Any],
+    ) -> None:
+        """
+        A fit that is stored in a `FitCache`.
+
+        Parameters
+        ----------
+        key
+            The content hash that identifies the fit.
+        path
+            Path to the file containing the inference data.
+        n_bytes
+            Size of the file, in bytes.
+        last_used
+            When the fit was last stored or loaded.
+        settings
+            The description of the fit from which the key was computed.
+        """
+
+        self.key = key
+        self.path = path
+        self.n_bytes = n_bytes
+        self.last_used = last_used
+        self.settings = settings
+
+    def __repr__(self) -> str:
+        return (
+            f"Cached fit {self.key[:12]} ({self.n_bytes / 2**20:.3g} MiB, "
+            + f"last used {self.last_used:%Y-%m-%d %H:%M:%S})"
+        )
+
+
+class FitCache:
+    __slots__ = ("max_bytes", "path")
+
+    def __init__(
+        self,
+        path: str | os.PathLike[str] | None = None,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+    ) -> None:
+        """
+        A cache of fitted models on local disk, keyed by a hash of the observed
+        data and of the model and sampler settings.
+
+        Parameters
+        ----------
+        path
+            Directory in which to store the fits; created if it does not exist.
+            Defaults to `pylater/fits` within the user cache directory
+            (`$XDG_CACHE_HOME`, or `~/.cache`).
+        max_bytes
+            Limit on the total size of the stored fits; the least recently used
+            fits are removed when a new fit takes the total over this limit.
+
+        Notes
+        -----
+        * The key covers the reaction times (or bin counts) and name of each
+          dataset, the share type and priors given to `build_default_model`, the
+          arguments given to `pm.sample` (other than `progressbar`, `cores`, and
+          `compute_convergence_checks`, which do not affect the draws), the
+          floating-point precision, and the versions of `pylater` and PyMC.
+        * The sampler arguments are identified by their values, so a fit is only
+          reused if `random_seed` is given as an integer; a fit with a random
+          number generator (or without a seed) is stored, but is not found again.
+        """
+
+        if path is None:
+            path = (
+                pathlib.Path(os.environ.get("XDG_CACHE_HOME", "~/.cache"))
+                / "pylater"
+                / "fits"
+            )
+
+        self.path = pathlib.Path(path).expanduser()
+        self.max_bytes = max_bytes
+
+        self.path.mkdir(parents=True, exist_ok=True)
+
+    def __repr__(self) -> str:
+        return f"Fit cache in {self.path} with {len(self.entries())} fit(s)"
+
+    @property
+    def n_bytes(self) -> int:
+        """Total size of the stored fits, in bytes."""
+        return sum(entry.n_bytes for entry in self.entries())
+
+    def fit(
+        self,
+        datasets: typing.Sequence[pylater.data.Dataset | pylater.data.BinnedDataset],
+        share_type: str | None = None,
+        priors: typing.Mapping[str, pylater.model.LogNormalPrior] | None = None,
+        **kwargs: object,
+    ) -> az.data.inference_data.InferenceData:
+        """
+        Fit a model from `build_default_model`, or load the fit from the cache if
+        it has been done before.
+
+        Parameters
+        ----------
+        datasets, share_type, priors
+            As for `build_default_model`.
+        **kwargs
+            Additional arguments are passed directly to `pm.sample`.
+
+        Returns
+        -------
+        az.data.inference_data.InferenceData
+            Inference data object containing the posterior samples.
+        """
+
+        settings = fit_settings(
+            datasets=datasets,
+            share_type=share_type,
+            priors=priors,
+            sample_kwargs=kwargs,
+        )
+
+        key = settings_key(settings=settings)
+
+        idata = self.load(key=key)
+
+        if idata is not None:
+            return idata
+
+        model = pylater.model.build_default_model(
+            datasets=datasets,
+            share_type=share_type,
+            priors=priors,
+        )
+
+        idata = pylater.fit.sample(model=model, **kwargs)
+
+        self.save(key=key, idata=idata, settings=settings)
+
+        return idata
+
+    def key(
+        self,
+        datasets: typing.Sequence[pylater.data.Dataset | pylater.data.BinnedDataset],
+        share_type: str | None = None,
+        priors: typing.Mapping[str, pylater.model.LogNormalPrior] | None = None,
+        **kwargs: object,
+    ) -> str:
+        """
+        The key under which a fit is stored; the arguments are as for `fit`.
+        """
+        return settings_key(
+            settings=fit_settings(
+                datasets=datasets,
+                share_type=share_type,
+                priors=priors,
+                sample_kwargs=kwargs,
+            )
+        )
+
+    def load(self, key: str) -> az.data.inference_data.InferenceData | None:
+        """
+        Load a fit from the cache.
+
+        Parameters
+        ----------
+        key
+            The key of the fit.
+
+        Returns
+        -------
+        az.data.inference_data.InferenceData | None
+            The inference data, or `None` if the fit is not in the cache.
+        """
+
+        data_path = self.entry_path(key=key)
+
+        if not data_path.exists():
+            return None
+
+        with pylater.instrument.phase("load_cached_fit"):
+            # loaded into memory, so that the file can be removed
+            with az.rcparams.rc_context(rc={"data.load": "eager"}):
+                idata: az.data.inference_data.InferenceData = az.from_netcdf(
+                    filename=os.fspath(data_path)
+                )
+
+        # marks the fit as recently used
+        data_path.touch()
+
+        return idata
+
+    def save(
+        self,
+        key: str,
+        idata: az.data.inference_data.InferenceData,
+        settings: dict[str, typing.Any],
+    ) -> None:
+        """
+        Store a fit in the cache, removing the least recently used fits if the
+        cache is then over its size limit.
+
+        Parameters
+        ----------
+        key
+            The key of the fit.
+        idata
+            The inference data.
+        settings
+            The description of the fit from which the key was computed.
+        """
+
+        data_path = self.entry_path(key=key)
+
+        # written to temporary files first, so that a fit is either complete or
+        # absent, even if interrupted; the settings are written first, since a
+        # fit is only considered to be present once its data file exists
+        pylater.files.write_atomic(
+            path=data_path.with_suffix(".json"),
+            write=lambda file: file.write(json.dumps(settings).encode()),
+        )
+
+        tmp_path = data_path.with_name(f".{data_path.name}.{os.getpid()}.tmp")
+        idata.to_netcdf(filename=os.fspath(tmp_path))
+        tmp_path.replace(data_path)
+
+        self.evict(keep=(key,))
+
+    def entries(self) -> list[CacheEntry]:
+        """
+        The fits in the cache, from the least to the most recently used.
+        """
+
+        entries = []
+
+        for data_path in self.path.glob("*.nc"):
+
+            try:
+                stat = data_path.stat()
+                settings = json.loads(data_path.with_suffix(".json").read_text())
+            except FileNotFoundError:
+                # removed by another process
+                continue
+
+            entries.append(
+                CacheEntry(
+                    key=data_path.stem,
+                    path=data_path,
+                    n_bytes=stat.st_size,
+                    last_used=datetime.datetime.fromtimestamp(stat.st_mtime),
+                    settings=settings,
+                )
+            )
+
+        return sorted(entries, key=lambda entry: entry.last_used)
+
+    def invalidate(
+        self,
+        keys: typing.Iterable[str] | None = None,
+        dry_run: bool = False,
+    ) -> list[CacheEntry]:
+        """
+        Remove fits from the cache.
+
+        Parameters
+        ----------
+        keys
+            Keys (or unambiguous prefixes of keys) of the fits to remove; if
+            `None`, all fits are removed.
+        dry_run
+            If `True`, only list the fits that would be removed.
+
+        Returns
+        -------
+        list[CacheEntry]
+            The fits that were (or would be) removed.
+        """
+
+        entries = self.entries()
+
+        if keys is not None:
+
+            selected = []
+
+            for key in keys:
+
+                matches = [entry for entry in entries if entry.key.startswith(key)]
+
+                if len(matches) != 1:
+                    msg = f"Key {key} matches {len(matches)} cached fits"
+                    raise ValueError(msg)
+
+                selected.extend(matches)
+
+            entries = selected
+
+        if not dry_run:
+            for entry in entries:
+                self.remove(entry=entry)
+
+        return entries
+
+    def evict(
+        self,
+        max_bytes: int | None = None,
+        keep: typing.Container[str] = (),
+        dry_run: bool = False,
+    ) -> list[CacheEntry]:
+        """
+        Remove the least recently used fits until the cache is within a size
+        limit.
+
+        Parameters
+        ----------
+        max_bytes
+            The size limit, in bytes; defaults to that of the cache.
+        keep
+            Keys of fits that are not to be removed.
+        dry_run
+            If `True`, only list the fits that would be removed.
+
+        Returns
+        -------
+        list[CacheEntry]
+            The fits that were (or would be) removed.
+        """
+
+        if max_bytes is None:
+            max_bytes = self.max_bytes
+
+        entries = self.entries()
+
+        n_bytes = sum(entry.n_bytes for entry in entries)
+
+        evicted = []
+
+        for entry in entries:
+
+            if n_bytes <= max_bytes:
+                break
+
+            if entry.key in keep:
+                continue
+
+            evicted.append(entry)
+            n_bytes -= entry.n_bytes
+
+        if not dry_run:
+            for entry in evicted:
+                self.remove(entry=entry)
+
+        return evicted
+
+    def remove(self, entry: CacheEntry) -> None:
+        # the data file is removed first, so that the fit is no longer present
+        entry.path.unlink(missing_ok=True)
+        entry.path.with_suffix(".json").unlink(missing_ok=True)
+
+    def entry_path(self, key: str) -> pathlib.Path:
+        return self.path / f"{key}.nc"
+
+
+def fit_settings(
+    datasets: typing.Sequence[pylater.data.Dataset | pylater.data.BinnedDataset],
+    share_type: str | None,
+    priors: typing.Mapping[str, pylater.model.LogNormalPrior] | None,
+    sample_kwargs: typing.Mapping[str, object],
+) -> dict[str, typing.Any]:
+    """
+    A description of everything that determines the result of a fit, from which
+    its cache key is computed.
+    """
+
+    return {
+        "datasets": [dataset_settings(dataset=dataset) for dataset in datasets],
+        "share_type": (
+            pylater.model.ShareType(share_type).value
+            if share_type is not None
+            else None
+        ),
+        # the complete set, so that giving the default priors explicitly does not
+        # change the key
+        "priors": {
+            param_name: [prior.mu, prior.sigma]
+            for (param_name, prior) in pylater.model.get_priors(priors=priors).items()
+        },
+        "sample_kwargs": {
+            name: canonical_value(value=value)
+            for (name, value) in sorted(sample_kwargs.items())
+            if name not in IGNORED_SAMPLE_KWARGS
+        },
+        "precision": pylater.config.get_precision().value,
+        "versions": {
+            "pylater": pylater.__version__,
+            "pymc": importlib.metadata.version("pymc"),
+        },
+    }
+
+
+def dataset_settings(
+    dataset: pylater.data.Dataset | pylater.data.BinnedDataset,
+) -> dict[str, typing.Any]:
+
+    arrays = (
+        {"edges_s": dataset.edges_s, "counts": dataset.counts}
+        if isinstance(dataset, pylater.data.BinnedDataset)
+        else {"rt_s": dataset.rt_s}
+    )
+
+    # only for censored datasets, so that the keys of other fits are unchanged
+    censoring = (
+        {
+            "censor_lower_s": dataset.censor_lower_s,
+            "censor_upper_s": dataset.censor_upper_s,
+            "n_censored_lower": dataset.n_censored_lower,
+            "n_censored_upper": dataset.n_censored_upper,
+        }
+        if isinstance(dataset, pylater.data.Dataset) and dataset.is_censored
+        else {}
+    )
+
+    return {
+        "name": dataset.name,
+        "n_trials": dataset.n_trials,
+        **{
+            array_name: array_digest(array=array)
+            for (array_name, array) in arrays.items()
+        },
+        **censoring,
+    }
+
+
+def array_digest(array: np.ndarray[typing.Any, typing.Any]) -> str:
+    """
+    A hash of the values, data type, and shape of an array.
+    """
+
+    array = np.ascontiguousarray(array)
+
+    digest = hashlib.sha256()
+    digest.update(f"{array.dtype.str}{array.shape}".encode())
+    digest.update(array.tobytes())
+
+    return digest.hexdigest()
+
+
+def canonical_value(value: object) -> typing.Any:  # noqa: ANN401
+    """
+    A JSON-compatible representation of a sampler argument.
+    """
+
+    if isinstance(value, np.ndarray):
+        return array_digest(array=value)
+
+    if isinstance(value, np.generic):
+        return value.item()
+
+    if isinstance(value, dict):
+        return {
+            str(name): canonical_value(value=item)
+            for (name, item) in sorted(value.items())
+        }
+
+    if isinstance(value, list | tuple):
+        return [canonical_value(value=item) for item in value]
+
+    if value is None or isinstance(value, bool | int | float | str):
+        return value
+
+    # includes the object identity for most types (e.g., random number
+    # generators), so that such arguments do not match previous fits
+    return repr(value)
+
+
+def settings_key(settings: dict[str, typing.Any]) -> str:
+    """
+    The cache key corresponding to a description of a fit.
+    """
+    return hashlib.sha256(json.dumps(settings, sort_keys=True).encode()).hexdigest()
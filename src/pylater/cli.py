@@ -0,0 +1,361 @@
+from __future__ import annotations
+
+import argparse
+import sys
+import typing
+
+import pylater.compilation
+import pylater.config
+
+
+def main(argv: typing.Sequence[str] | None = None) -> int:
+    """
+    Run the `pylater` command-line interface.
+
+    Parameters
+    ----------
+    argv
+        Command-line arguments; defaults to those of the current process.
+
+    Returns
+    -------
+    int
+        The exit status.
+    """
+
+    parser = build_parser()
+
+    args = parser.parse_args(argv)
+
+    return int(args.func(args))
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """
+    Create the parser for the command-line arguments.
+    """
+
+    parser = argparse.ArgumentParser(
+        prog="pylater",
+        description="Tools for working with LATER models.",
+    )
+
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    warmup_parser = subparsers.add_parser(
+        "warmup",
+        help="Compile the standard LATER model graphs into the compile cache.",
+    )
+    add_compile_arguments(parser=warmup_parser)
+    warmup_parser.set_defaults(func=run_warmup)
+
+    check_parser = subparsers.add_parser(
+        "check-cache",
+        help=(
+            "Report whether the standard LATER model graphs are in the compile "
+            + "cache; exits with a non-zero status if any are missing."
+        ),
+    )
+    add_compile_arguments(parser=check_parser)
+    check_parser.set_defaults(func=run_warmup)
+
+    fit_parser = subparsers.add_parser(
+        "fit",
+        help=(
+            "Fit the default model to a batch of datasets, resuming any previous "
+            + "run in the output directory."
+        ),
+    )
+    add_fit_arguments(parser=fit_parser)
+    fit_parser.set_defaults(func=run_fit)
+
+    cache_parser = subparsers.add_parser(
+        "fit-cache",
+        help=(
+            "List the fits in a fit cache, or remove them; with `--dry-run`, only "
+            + "list the fits that would be removed."
+        ),
+    )
+    cache_parser.add_argument(
+        "--path",
+        help="Directory containing the fit cache; defaults to the user cache.",
+    )
+    cache_action = cache_parser.add_mutually_exclusive_group()
+    cache_action.add_argument(
+        "--invalidate",
+        nargs="*",
+        metavar="KEY",
+        help="Remove the fits with the given keys (or key prefixes), or all fits.",
+    )
+    cache_action.add_argument(
+        "--evict",
+        type=int,
+        metavar="MAX_BYTES",
+        help="Remove the least recently used fits until within a size limit.",
+    )
+    cache_parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Only list the fits that would be removed.",
+    )
+    cache_parser.set_defaults(func=run_fit_cache)
+
+    summarise_parser = subparsers.add_parser(
+        "summarise",
+        help=(
+            "Summarise the posterior of each dataset, with convergence "
+            + "diagnostics, and write the summary to a Parquet or CSV file."
+        ),
+    )
+    add_summarise_arguments(parser=summarise_parser)
+    summarise_parser.set_defaults(func=run_summarise)
+
+    return parser
+
+
+def add_compile_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--compiledir",
+        help="Directory in which to store the compiled modules.",
+    )
+    parser.add_argument(
+        "--n-datasets",
+        nargs="+",
+        type=int,
+        default=pylater.compilation.DEFAULT_N_DATASETS,
+        help="Numbers of datasets for which to compile the models.",
+    )
+    parser.add_argument(
+        "--share-types",
+        nargs="+",
+        default=("shift", "swivel"),
+        choices=("shift", "swivel"),
+        help="Parameter sharing arrangements for models with multiple datasets.",
+    )
+    parser.add_argument(
+        "--precisions",
+        nargs="+",
+        default=("float64",),
+        choices=[precision.value for precision in pylater.config.Precision],
+        help="Floating-point precisions to compile for.",
+    )
+    parser.add_argument(
+        "--no-log-likelihood",
+        action="store_false",
+        dest="log_likelihood",
+        help="Do not compile the pointwise log-likelihood.",
+    )
+
+
+def add_fit_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "manifest",
+        help=(
+            "CSV file of reaction times (with `dataset`, `rt_s`, and optionally "
+            + "`fit` columns), or a JSON file giving such a CSV file (`data`) and "
+            + "the fit settings (`share_type`, `sample`, `log_likelihood`, and "
+            + "`random_seed`)."
+        ),
+    )
+    parser.add_argument(
+        "--output",
+        required=True,
+        help="Directory in which to write the results.",
+    )
+    parser.add_argument(
+        "--share-type",
+        choices=("shift", "swivel", "independent"),
+        help="Parameter sharing arrangement for fits with multiple datasets.",
+    )
+    for sample_arg in ("draws", "tune", "chains"):
+        parser.add_argument(
+            f"--{sample_arg}",
+            type=int,
+            help=f"Number of {sample_arg} of each fit, as for `pm.sample`.",
+        )
+    parser.add_argument(
+        "--random-seed",
+        type=int,
+        help="Seed for the random number generator; each shard needs the same seed.",
+    )
+    parser.add_argument(
+        "--no-log-likelihood",
+        action="store_false",
+        dest="log_likelihood",
+        default=None,
+        help="Do not compute the pointwise log-likelihood.",
+    )
+    parser.add_argument(
+        "--shard",
+        default="0/1",
+        help="Run only shard `i` (from zero) of `n`, given as `i/n`.",
+    )
+    parser.add_argument(
+        "--executor",
+        default="local",
+        choices=("local", "dask", "ray"),
+        help="How to run fits in parallel.",
+    )
+    parser.add_argument(
+        "--n-workers",
+        type=int,
+        default=1,
+        help="Number of fits to run in parallel.",
+    )
+
+
+def add_summarise_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "idata",
+        help=(
+            "netCDF file of inference data (such as a merged batch of fits or a "
+            + "store), which is read a chunk of datasets at a time."
+        ),
+    )
+    parser.add_argument(
+        "--output",
+        required=True,
+        help=(
+            "File in which to write the summary; as CSV if it has a `.csv` "
+            + "suffix, and otherwise as Parquet."
+        ),
+    )
+    parser.add_argument(
+        "--var-names",
+        nargs="+",
+        default=("mu", "sigma", "sigma_e", "k"),
+        help="Variables to summarise.",
+    )
+    parser.add_argument(
+        "--quantiles",
+        nargs="+",
+        type=float,
+        default=(0.025, 0.5, 0.975),
+        help="Quantiles of each variable to calculate.",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=500,
+        help="Number of datasets to read and summarise at a time.",
+    )
+
+
+def run_fit(args: argparse.Namespace) -> int:
+
+    # imported here, since it imports PyMC
+    import pylater.batch
+
+    batch_kwargs = pylater.batch.read_manifest(path=args.manifest)
+
+    # options that are given override those of the manifest
+    sample_kwargs = {
+        **batch_kwargs.pop("sample_kwargs", {}),
+        **{
+            sample_arg: getattr(args, sample_arg)
+            for sample_arg in ("draws", "tune", "chains")
+            if getattr(args, sample_arg) is not None
+        },
+    }
+
+    for arg in ("share_type", "random_seed", "log_likelihood"):
+        if getattr(args, arg) is not None:
+            batch_kwargs[arg] = getattr(args, arg)
+
+    batch = pylater.batch.fit_batch(
+        path=args.output,
+        sample_kwargs=sample_kwargs,
+        shard=pylater.batch.parse_shard(shard=args.shard),
+        executor=args.executor,
+        n_workers=args.n_workers,
+        **batch_kwargs,
+    )
+
+    print(batch)
+
+    return 0
+
+
+def run_warmup(args: argparse.Namespace) -> int:
+
+    # needs to happen before PyTensor is imported
+    if args.compiledir is not None:
+        pylater.config.set_compiledir(compiledir=args.compiledir)
+
+    reports = pylater.compilation.warmup(
+        n_datasets=args.n_datasets,
+        share_types=args.share_types,
+        precisions=args.precisions,
+        log_likelihood=args.log_likelihood,
+    )
+
+    for (n_datasets, share_type, precision), report in reports.items():
+        print(
+            f"{n_datasets} dataset(s), share type {share_type}, {precision}: "
+            + f"{report}"
+        )
+
+    if args.command == "check-cache":
+        return int(not all(report.hit for report in reports.values()))
+
+    return 0
+
+
+def run_fit_cache(args: argparse.Namespace) -> int:
+
+    # imported here, since it imports PyMC
+    import pylater.cache
+
+    cache = pylater.cache.FitCache(path=args.path)
+
+    if args.invalidate is not None:
+        entries = cache.invalidate(
+            keys=args.invalidate if args.invalidate else None,
+            dry_run=args.dry_run,
+        )
+    elif args.evict is not None:
+        entries = cache.evict(max_bytes=args.evict, dry_run=args.dry_run)
+    else:
+        entries = cache.entries()
+
+    for entry in entries:
+        print(f"{entry.key}  {entry.n_bytes:>12d}  {entry.last_used:%Y-%m-%d %H:%M:%S}")
+
+    return 0
+
+
+def run_summarise(args: argparse.Namespace) -> int:
+
+    # imported here, since they import PyMC
+    import pylater.store
+    import pylater.summary
+
+    idata = pylater.store.open_store(path=args.idata)
+
+    try:
+        summary = pylater.summary.summarise(
+            idata=idata,
+            var_names=args.var_names,
+            quantiles=args.quantiles,
+            chunk_size=args.chunk_size,
+        )
+    finally:
+        pylater.store.close_store(idata=idata, path=args.idata)
+
+    if args.output.endswith(".csv"):
+        pylater.summary.write_csv(summary=summary, path=args.output)
+    else:
+        pylater.summary.write_parquet(summary=summary, path=args.output)
+
+    n_flagged = int((summary.r_hat > pylater.summary.R_HAT_THRESHOLD).sum())
+
+    print(
+        f"Summarised {summary.sizes['dataset']} dataset(s); {n_flagged} value(s) "
+        + f"with R-hat above {pylater.summary.R_HAT_THRESHOLD}"
+    )
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
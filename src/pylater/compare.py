@@ -1,12 +1,66 @@
 from __future__ import annotations
 
+import concurrent.futures
+import os
 import typing
+import warnings
+
+import numpy as np
+import numpy.typing as npt
 
 import xarray as xr
 
 import arviz as az
 
+import pylater.data
+import pylater.dist
+import pylater.fit
+import pylater.instrument
+import pylater.model
+import pylater.store
+
+if typing.TYPE_CHECKING:
+    import pandas as pd
+
+
+ARRANGEMENTS = tuple(share_type.value for share_type in pylater.model.ShareType)
+
+
+class ArrangementComparison:
+    __slots__ = ("comparison", "dataset_elpd", "idatas")
+
+    def __init__(
+        self,
+        comparison: pd.DataFrame,
+        dataset_elpd: xr.Dataset,
+        idatas: dict[str, az.data.inference_data.InferenceData],
+    ) -> None:
+        """
+        The comparison of parameter sharing arrangements.
+
+        Parameters
+        ----------
+        comparison
+            The output of `az.compare` across the arrangements.
+        dataset_elpd
+            The contribution of each dataset to the expected log pointwise
+            predictive density (`elpd_loo`), with its standard error (`se`) and
+            the largest Pareto shape estimate of its observations
+            (`max_pareto_k`), for each arrangement.
+        idatas
+            The inference data of each arrangement, including the pointwise
+            log-likelihood.
+        """
+
+        self.comparison = comparison
+        self.dataset_elpd = dataset_elpd
+        self.idatas = idatas
 
+    def __repr__(self) -> str:
+        return f"Comparison of {len(self.idatas)} parameter sharing arrangements"
+
+
+@pylater.instrument.instrumented("combine_multiple_likelihoods")
 def combine_multiple_likelihoods(
     idata: az.data.inference_data.InferenceData,
     combined_var_name: str = "obs",
@@ -14,6 +68,7 @@ def combine_multiple_likelihoods(
     overwrite: bool = False,
     combined_dim_name: str = "trial",
     copy_idata: bool = False,
+    chunk_size: int = pylater.store.DEFAULT_CHUNK_SIZE,
 ) -> az.data.inference_data.InferenceData:
     """
     Combine likelihoods from multiple observations into a single variable.
@@ -33,6 +88,11 @@ def combine_multiple_likelihoods(
         Name of the combined dimension.
     copy_idata
         Whether to add the new variable to the provided `idata` or to a copy.
+    chunk_size
+        If the log-likelihood is read from a store opened by
+        `pylater.store.open_store` and `copy_idata` is `False`, the combined
+        variable is written to the store this number of draws (per chain) at a
+        time. Otherwise, it is only added in memory.
 
     Returns
     -------
@@ -69,14 +129,404 @@ def combine_multiple_likelihoods(
 
     assert hasattr(modified_idata, "log_likelihood")
 
-    modified_idata.log_likelihood[combined_var_name] = xr.concat(
-        objs=[
-            modified_idata.log_likelihood[ll_var_name].rename(
-                {f"{ll_var_name}_dim_0": combined_dim_name}
+    def combine(log_likelihood: xr.Dataset) -> xr.Dataset:
+        return xr.concat(
+            objs=[
+                log_likelihood[ll_var_name].rename(
+                    {f"{ll_var_name}_dim_0": combined_dim_name}
+                )
+                for ll_var_name in ll_var_names
+            ],
+            dim=combined_dim_name,
+        ).to_dataset(name=combined_var_name)
+
+    path = (
+        None
+        if copy_idata
+        else pylater.store.store_path(idata=modified_idata, group="log_likelihood")
+    )
+
+    if path is None:
+        modified_idata.log_likelihood[combined_var_name] = combine(
+            modified_idata.log_likelihood
+        )[combined_var_name]
+
+    else:
+        # the combined variable is written to the store, a chunk at a time,
+        # rather than being held in memory
+        closed_groups = pylater.store.close_store(idata=modified_idata, path=path)
+        try:
+            pylater.store.add_group(
+                path=path,
+                group="log_likelihood",
+                compute=combine,
+                chunk_size=chunk_size,
+                source_group="log_likelihood",
             )
-            for ll_var_name in ll_var_names
-        ],
-        dim=combined_dim_name,
+        finally:
+            pylater.store.reopen_store(
+                idata=modified_idata,
+                path=path,
+                groups=closed_groups,
+            )
+
+    pylater.instrument.annotate(
+        n_vars=len(ll_var_names),
+        n_values=int(modified_idata.log_likelihood[combined_var_name].size),
     )
 
     return modified_idata
+
+
+@pylater.instrument.instrumented("compare_arrangements")
+def compare_arrangements(
+    datasets: typing.Sequence[pylater.data.Dataset | pylater.data.BinnedDataset],
+    arrangements: typing.Sequence[str] = ARRANGEMENTS,
+    priors: typing.Mapping[str, pylater.model.LogNormalPrior] | None = None,
+    sample_kwargs: typing.Mapping[str, typing.Any] | None = None,
+    n_cores: int | None = None,
+    random_seed: int | None = None,
+) -> ArrangementComparison:
+    """
+    Fit the default model to a set of datasets with each parameter sharing
+    arrangement, and compare the arrangements by their approximate leave-one-out
+    cross-validation performance.
+
+    Parameters
+    ----------
+    datasets
+        Observed data to model.
+    arrangements
+        The arrangements to compare (see `pylater.model.ShareType`).
+    priors
+        Priors to use in place of the defaults, as in `build_default_model`.
+    sample_kwargs
+        Arguments passed to `pm.sample`, other than `cores` and `random_seed`.
+    n_cores
+        Number of processor cores to use across all of the fits; defaults to the
+        number of cores on the system.
+    random_seed
+        Seed for the random state of the fits.
+
+    Returns
+    -------
+    ArrangementComparison
+        The comparison of the arrangements.
+
+    Notes
+    -----
+    * The arrangements are fit concurrently, each in its own process, with the
+      cores divided among them (and used to sample chains in parallel). With
+      fewer cores than arrangements, the fits are queued.
+    * The likelihood of each dataset is the same function of its `mu`, `sigma`,
+      and `sigma_e` in every arrangement, so the pointwise log-likelihood is
+      evaluated from these posterior samples (see `pointwise_log_likelihood`)
+      rather than by compiling the likelihood graph of each model. The
+      likelihood is evaluated once per unique reaction time.
+    * The pointwise log-likelihood of the datasets is combined into a single
+      variable (`obs`, over `trial`) for the comparison.
+    """
+
+    share_types = [
+        pylater.model.ShareType(arrangement).value for arrangement in arrangements
+    ]
+
+    if len(set(share_types)) != len(share_types):
+        msg = f"The arrangements are not distinct: {list(arrangements)}"
+        raise ValueError(msg)
+
+    if n_cores is None:
+        n_cores = os.cpu_count() or 1
+
+    n_workers = min(len(share_types), n_cores)
+    cores_per_fit = max(1, n_cores // n_workers)
+
+    entropy = np.random.SeedSequence(random_seed).entropy
+
+    pylater.instrument.annotate(
+        n_arrangements=len(share_types),
+        n_workers=n_workers,
+        cores_per_fit=cores_per_fit,
+    )
+
+    tasks: list[dict[str, typing.Any]] = [
+        {
+            "datasets": datasets,
+            "share_type": share_type,
+            "priors": priors,
+            "sample_kwargs": {
+                "progressbar": False,
+                **(sample_kwargs or {}),
+                "cores": cores_per_fit,
+            },
+            "seed": np.random.SeedSequence(entropy, spawn_key=(i_arrangement,)),
+        }
+        for (i_arrangement, share_type) in enumerate(share_types)
+    ]
+
+    if n_workers == 1:
+        idatas = [fit_arrangement(**task) for task in tasks]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=n_workers) as pool:
+            idatas = list(pool.map(fit_arrangement_task, tasks))
+
+    loos = {}
+
+    for (share_type, idata) in zip(share_types, idatas, strict=True):
+
+        assert hasattr(idata, "posterior")
+
+        idata.add_groups(
+            log_likelihood=pointwise_log_likelihood(
+                posterior=idata.posterior,
+                datasets=datasets,
+            )
+        )
+
+        combine_multiple_likelihoods(idata=idata)
+
+        loos[share_type] = az.loo(data=idata, pointwise=True, var_name="obs")
+
+    comparison = az.compare(compare_dict=loos)
+
+    # the dataset of each trial in the combined variable
+    trial_datasets = np.repeat(
+        [dataset.name for dataset in datasets],
+        [
+            (
+                len(dataset.counts)
+                if isinstance(dataset, pylater.data.BinnedDataset)
+                else dataset.n_trials + 2 * has_censor_bounds(dataset=dataset)
+            )
+            for dataset in datasets
+        ],
+    )
+
+    dataset_elpd = xr.concat(
+        [
+            xr.Dataset(
+                data_vars={
+                    "loo_i": ("trial", loo.loo_i.values),
+                    "pareto_k": ("trial", loo.pareto_k.values),
+                },
+                coords={"dataset": ("trial", trial_datasets)},
+            )
+            .groupby("dataset")
+            .map(summarise_elpd)
+            .sel(dataset=[dataset.name for dataset in datasets])
+            for loo in loos.values()
+        ],
+        dim="arrangement",
+    ).assign_coords(arrangement=share_types)
+
+    return ArrangementComparison(
+        comparison=comparison,
+        dataset_elpd=dataset_elpd,
+        idatas=dict(zip(share_types, idatas, strict=True)),
+    )
+
+
+def fit_arrangement(
+    datasets: typing.Sequence[pylater.data.Dataset | pylater.data.BinnedDataset],
+    share_type: str,
+    priors: typing.Mapping[str, pylater.model.LogNormalPrior] | None,
+    sample_kwargs: typing.Mapping[str, typing.Any],
+    seed: np.random.SeedSequence,
+) -> az.data.inference_data.InferenceData:
+    """
+    Build and sample the default model with a parameter sharing arrangement.
+    """
+
+    with warnings.catch_warnings():
+        warnings.filterwarnings(action="ignore", message="Note that this uses priors")
+        model = pylater.model.build_default_model(
+            datasets=datasets,
+            share_type=share_type,
+            priors=priors,
+        )
+
+    return pylater.fit.sample(
+        model=model,
+        random_seed=int(np.random.default_rng(seed).integers(2**31)),
+        **sample_kwargs,
+    )
+
+
+def fit_arrangement_task(
+    task: dict[str, typing.Any],
+) -> az.data.inference_data.InferenceData:
+    return fit_arrangement(**task)
+
+
+def summarise_elpd(elpd: xr.Dataset) -> xr.Dataset:
+    """
+    Summarise the pointwise elpd of a group of observations.
+    """
+
+    n_obs = elpd.sizes["trial"]
+
+    return xr.Dataset(
+        data_vars={
+            "elpd_loo": elpd.loo_i.sum(),
+            "se": np.sqrt(n_obs * elpd.loo_i.var()),
+            "max_pareto_k": elpd.pareto_k.max(),
+        }
+    )
+
+
+def pointwise_log_likelihood(
+    posterior: xr.Dataset,
+    datasets: typing.Sequence[pylater.data.Dataset | pylater.data.BinnedDataset],
+) -> xr.Dataset:
+    """
+    Evaluate the log-likelihood of each observation for each posterior sample of
+    a model from `build_default_model`, without compiling the model.
+
+    Parameters
+    ----------
+    posterior
+        Posterior samples, with `mu`, `sigma`, and `sigma_e` over `dataset` (or,
+        for a shared `sigma`, over `shared`).
+    datasets
+        The observed data.
+
+    Returns
+    -------
+    xr.Dataset
+        The log-likelihood, with the variables and dimensions of
+        `pm.compute_log_likelihood`: `obs_<name>` over `obs_<name>_dim_0`. For a
+        binned dataset, each bin is an observation. A dataset with censoring
+        bounds also has `obs_<name>_censored`, with the censored trials below and
+        above the bounds as two observations.
+    """
+
+    sigma = posterior.sigma
+
+    if "shared" in sigma.dims:
+        sigma = sigma.squeeze(dim="shared", drop=True)
+
+    (mu, sigma, sigma_e) = xr.broadcast(posterior.mu, sigma, posterior.sigma_e)
+
+    log_likelihood = {}
+
+    for dataset in datasets:
+
+        (dataset_mu, dataset_sigma, dataset_sigma_e) = (
+            param.sel(dataset=dataset.name).values[..., np.newaxis]
+            for param in (mu, sigma, sigma_e)
+        )
+
+        var_name = f"obs_{dataset.name}"
+
+        if isinstance(dataset, pylater.data.BinnedDataset):
+            values = binned_log_likelihood(
+                dataset=dataset,
+                mu=dataset_mu,
+                sigma=dataset_sigma,
+                sigma_e=dataset_sigma_e,
+            )
+        else:
+            (promptness, i_trials) = np.unique(dataset.promptness, return_inverse=True)
+            values = pylater.dist.numpy_logp(
+                value=promptness,
+                mu=dataset_mu,
+                sigma=dataset_sigma,
+                sigma_e=dataset_sigma_e,
+            )[..., i_trials]
+
+        log_likelihood[var_name] = (("chain", "draw", f"{var_name}_dim_0"), values)
+
+        if isinstance(dataset, pylater.data.Dataset) and has_censor_bounds(
+            dataset=dataset
+        ):
+            log_likelihood[f"{var_name}_censored"] = (
+                ("chain", "draw", f"{var_name}_censored_dim_0"),
+                censored_log_likelihood(
+                    dataset=dataset,
+                    mu=dataset_mu,
+                    sigma=dataset_sigma,
+                    sigma_e=dataset_sigma_e,
+                ),
+            )
+
+    return xr.Dataset(
+        data_vars=log_likelihood,
+        coords={"chain": posterior.chain, "draw": posterior.draw},
+    )
+
+
+def has_censor_bounds(dataset: pylater.data.Dataset) -> bool:
+    """
+    Whether the model of a dataset has a variable for its censored trials, as in
+    `pylater.dist.LATER`.
+    """
+    return dataset.censor_lower_s is not None or dataset.censor_upper_s is not None
+
+
+def censored_log_likelihood(
+    dataset: pylater.data.Dataset,
+    mu: npt.NDArray[np.float64],
+    sigma: npt.NDArray[np.float64],
+    sigma_e: npt.NDArray[np.float64],
+) -> npt.NDArray[np.float64]:
+    """
+    NumPy equivalent of the log-likelihood of the censored trials below and above
+    the censoring bounds of a dataset, as evaluated by
+    `pylater.dist.LATERCensored`.
+    """
+
+    bound_promptness = pylater.dist.censor_bounds_to_promptness(
+        censor_lower_s=dataset.censor_lower_s,
+        censor_upper_s=dataset.censor_upper_s,
+    )
+
+    bound_logcdf = pylater.dist.numpy_logcdf(
+        value=bound_promptness, mu=mu, sigma=sigma, sigma_e=sigma_e
+    )
+
+    counts = np.array([dataset.n_censored_lower, dataset.n_censored_upper])
+
+    # a missing bound has no probability beyond it, and no censored trials
+    with np.errstate(divide="ignore", invalid="ignore"):
+        bound_logp = np.where(
+            pylater.dist.IS_ABOVE_BOUND,
+            pylater.dist.numpy_logdiffexp(a=0.0, b=bound_logcdf),
+            bound_logcdf,
+        )
+        log_likelihood: npt.NDArray[np.float64] = np.where(
+            counts > 0, counts * bound_logp, 0.0
+        )
+
+    return log_likelihood
+
+
+def binned_log_likelihood(
+    dataset: pylater.data.BinnedDataset,
+    mu: npt.NDArray[np.float64],
+    sigma: npt.NDArray[np.float64],
+    sigma_e: npt.NDArray[np.float64],
+) -> npt.NDArray[np.float64]:
+    """
+    NumPy equivalent of the log-likelihood of each bin of a binned dataset, as
+    evaluated by `pylater.dist.LATERBinned`.
+    """
+
+    (lower_promptness, upper_promptness) = pylater.dist.edges_to_promptness(
+        edges_s=dataset.edges_s
+    )
+
+    (lower_logcdf, upper_logcdf) = (
+        pylater.dist.numpy_logcdf(value=promptness, mu=mu, sigma=sigma, sigma_e=sigma_e)
+        for promptness in (lower_promptness, upper_promptness)
+    )
+
+    # in log space, as in `pylater.dist.binned_logp`, so that a bin far in a tail
+    # does not have its probability lost to cancellation
+    with np.errstate(divide="ignore", invalid="ignore"):
+        bin_logp = pylater.dist.numpy_logdiffexp(a=upper_logcdf, b=lower_logcdf)
+
+    log_likelihood: npt.NDArray[np.float64] = np.where(
+        dataset.counts > 0, dataset.counts * bin_logp, 0.0
+    )
+
+    return log_likelihood
@@ -0,0 +1,255 @@
+from __future__ import annotations
+
+import logging
+import os
+import typing
+import warnings
+
+import numpy as np
+
+import pylater.config
+import pylater.data
+
+if typing.TYPE_CHECKING:
+    import pymc as pm
+
+
+# the dataset counts whose model graphs are compiled by default; the number of
+# trials in each dataset does not affect the compiled code
+DEFAULT_N_DATASETS = (1, 2, 3, 4)
+
+
+class CacheReport:
+    __slots__ = ("n_compiled", "n_disk_hits", "n_memory_hits")
+
+    def __init__(self, n_memory_hits: int, n_disk_hits: int, n_compiled: int) -> None:
+        """
+        Usage of the PyTensor compile cache while compiling a model.
+
+        Parameters
+        ----------
+        n_memory_hits
+            Number of compiled modules that were already loaded in this process.
+        n_disk_hits
+            Number of compiled modules that were loaded from the compile directory.
+        n_compiled
+            Number of modules that were not in the cache and had to be compiled.
+        """
+
+        self.n_memory_hits = n_memory_hits
+        self.n_disk_hits = n_disk_hits
+        self.n_compiled = n_compiled
+
+    def __repr__(self) -> str:
+        return (
+            f"Compile cache {'hit' if self.hit else 'miss'} ("
+            + f"{self.n_memory_hits} in memory, {self.n_disk_hits} loaded, "
+            + f"{self.n_compiled} compiled)"
+        )
+
+    @property
+    def hit(self) -> bool:
+        """Whether all of the required modules were already in the cache."""
+        return self.n_compiled == 0
+
+
+def warmup(
+    n_datasets: typing.Sequence[int] = DEFAULT_N_DATASETS,
+    share_types: typing.Sequence[str] = ("shift", "swivel"),
+    precisions: typing.Sequence[str] = ("float64",),
+    log_likelihood: bool = True,
+    compiledir: str | os.PathLike[str] | None = None,
+) -> dict[tuple[int, str | None, str], CacheReport]:
+    """
+    Compile the graphs of the standard LATER models ahead of time, so that they
+    are available from the PyTensor compile cache.
+
+    Parameters
+    ----------
+    n_datasets
+        Numbers of datasets for which to compile the models from
+        `build_default_model`.
+    share_types
+        Parameter sharing arrangements to compile for models with more than one
+        dataset.
+    precisions
+        Floating-point precisions to compile for (see `pylater.config`).
+    log_likelihood
+        Whether to also compile the pointwise log-likelihood, as used by
+        `compute_log_likelihood`.
+    compiledir
+        Directory in which to store the compiled modules (see
+        `pylater.config.set_compiledir`); if `None`, the PyTensor default (or
+        that already configured) is used.
+
+    Returns
+    -------
+    dict[tuple[int, str | None, str], CacheReport]
+        Usage of the compile cache for each compiled model, keyed by the number
+        of datasets, the share type, and the precision.
+
+    Notes
+    -----
+    * The models are compiled by drawing a single sample with the default PyMC
+      sampler, which compiles the same functions as a full run of `sample`.
+    * Only the PyTensor C backend uses the compile directory; other backends
+      (e.g., Numba or JAX) maintain their own caches.
+    * If `compiledir` is provided, this needs to be called before PyTensor is
+      imported; the `pylater warmup` command can be used instead.
+    """
+
+    if compiledir is not None:
+        pylater.config.set_compiledir(compiledir=compiledir)
+
+    reports = {}
+
+    for precision in precisions:
+        for n_model_datasets in n_datasets:
+
+            model_share_types = share_types if n_model_datasets > 1 else (None,)
+
+            for share_type in model_share_types:
+                with pylater.config.precision(precision=precision):
+                    model = build_standard_model(
+                        n_datasets=n_model_datasets,
+                        share_type=share_type,
+                    )
+                    reports[(n_model_datasets, share_type, precision)] = check_cache(
+                        model=model,
+                        log_likelihood=log_likelihood,
+                    )
+
+    return reports
+
+
+def check_cache(model: pm.Model, log_likelihood: bool = False) -> CacheReport:
+    """
+    Report whether compiling a model's sampling functions hits the PyTensor
+    compile cache.
+
+    Parameters
+    ----------
+    model
+        The PyMC model.
+    log_likelihood
+        Whether to also compile the pointwise log-likelihood.
+
+    Returns
+    -------
+    CacheReport
+        Usage of the compile cache.
+
+    Notes
+    -----
+    * The check compiles the functions, so any modules that were missing from the
+      cache are added to it; subsequent compilations of the model will hit the
+      cache.
+    """
+
+    # imported here so that the compile directory can be set before PyTensor is
+    # imported
+    import pytensor.link.c.basic
+
+    module_cache = pytensor.link.c.basic.get_module_cache()
+
+    stats_before = list(module_cache.stats)
+
+    compile_model(model=model, log_likelihood=log_likelihood)
+
+    n_memory_hits, n_disk_hits, n_compiled = (
+        stat_after - stat_before
+        for (stat_before, stat_after) in zip(
+            stats_before, module_cache.stats, strict=True
+        )
+    )
+
+    return CacheReport(
+        n_memory_hits=n_memory_hits,
+        n_disk_hits=n_disk_hits,
+        n_compiled=n_compiled,
+    )
+
+
+def compile_model(model: pm.Model, log_likelihood: bool = False) -> None:
+    """
+    Compile the functions used to sample from a model, by drawing a single sample.
+    """
+
+    import pymc as pm
+
+    logger = logging.getLogger("pymc")
+    log_level = logger.level
+
+    # the run is too short for the sampler diagnostics to be meaningful
+    logger.setLevel(logging.ERROR)
+
+    try:
+        with warnings.catch_warnings():
+
+            warnings.simplefilter("ignore")
+
+            idata = pm.sample(
+                model=model,
+                draws=1,
+                tune=1,
+                chains=1,
+                cores=1,
+                progressbar=False,
+                compute_convergence_checks=False,
+                random_seed=0,
+            )
+
+            if log_likelihood:
+                pm.compute_log_likelihood(
+                    idata=idata,
+                    model=model,
+                    progressbar=False,
+                )
+
+    finally:
+        logger.setLevel(log_level)
+
+
+def build_standard_model(
+    n_datasets: int,
+    share_type: str | None = None,
+    n_trials: int = 100,
+) -> pm.Model:
+    """
+    Build a model from `build_default_model` for synthetic datasets.
+
+    Parameters
+    ----------
+    n_datasets
+        Number of datasets.
+    share_type
+        Parameter sharing arrangement, for multiple datasets.
+    n_trials
+        Number of trials in each dataset.
+
+    Returns
+    -------
+    pm.Model
+        The PyMC model.
+    """
+
+    import pylater.model
+
+    rng = np.random.default_rng(seed=0)
+
+    # the values do not affect the compiled graphs
+    datasets = [
+        pylater.data.Dataset(
+            name=f"dataset_{i_dataset}",
+            rt_s=1 / rng.uniform(low=2, high=6, size=n_trials),
+        )
+        for i_dataset in range(n_datasets)
+    ]
+
+    with warnings.catch_warnings():
+        # the default priors are fine for compilation
+        warnings.simplefilter("ignore")
+        return pylater.model.build_default_model(
+            datasets=datasets,
+            share_type=share_type,
+        )
@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+import contextlib
+import contextvars
+import enum
+import os
+import pathlib
+import sys
+import typing
+
+import numpy as np
+
+
+class Precision(enum.Enum):
+    FLOAT64 = "float64"
+    FLOAT32 = "float32"
+
+
+_precision: contextvars.ContextVar[Precision] = contextvars.ContextVar(
+    "pylater_precision",
+    default=Precision.FLOAT64,
+)
+
+
+def get_precision() -> Precision:
+    """
+    Get the current floating-point precision.
+
+    Returns
+    -------
+    Precision
+        The current precision.
+    """
+    return _precision.get()
+
+
+def float_dtype() -> type[np.floating[typing.Any]]:
+    """
+    Get the NumPy floating-point type for the current precision.
+
+    Returns
+    -------
+    type[np.floating]
+        Either `np.float64` or `np.float32`.
+    """
+    return np.float32 if get_precision() is Precision.FLOAT32 else np.float64
+
+
+def set_precision(precision: str) -> None:
+    """
+    Set the floating-point precision used for data, models, and random samples.
+
+    Parameters
+    ----------
+    precision
+        Either `float64` (the default) or `float32`.
+
+    Notes
+    -----
+    * This also sets the PyTensor `floatX` configuration, which determines the
+      precision of the model variables and of the posterior samples.
+    * Models should be built and sampled using the same precision.
+    """
+
+    # imported here so that data can be loaded without importing PyTensor
+    import pytensor.configdefaults
+
+    new_precision = Precision(precision)
+
+    _precision.set(new_precision)
+
+    pytensor.configdefaults.config.floatX = new_precision.value
+
+
+@contextlib.contextmanager
+def precision(precision: str) -> typing.Iterator[Precision]:
+    """
+    Temporarily set the floating-point precision used for data, models, and random
+    samples.
+
+    Parameters
+    ----------
+    precision
+        Either `float64` or `float32`.
+
+    Notes
+    -----
+    * This also sets the PyTensor `floatX` configuration, which determines the
+      precision of the model variables and of the posterior samples.
+    * Models should be built and sampled within the same context.
+    """
+
+    # imported here so that data can be loaded without importing PyTensor
+    import pytensor.configdefaults
+
+    new_precision = Precision(precision)
+
+    token = _precision.set(new_precision)
+
+    try:
+        with pytensor.configdefaults.config.change_flags(floatX=new_precision.value):
+            yield new_precision
+    finally:
+        _precision.reset(token)
+
+
+def set_compiledir(compiledir: str | os.PathLike[str]) -> None:
+    """
+    Set the directory in which PyTensor stores its compiled C modules.
+
+    Parameters
+    ----------
+    compiledir
+        Path to the directory; it is created if it does not exist. This is used
+        as the PyTensor `base_compiledir`, within which a subdirectory specific
+        to the platform and Python version holds the compiled modules.
+
+    Notes
+    -----
+    * PyTensor reads its configuration when it is first imported, so this needs
+      to be called before PyTensor (or PyMC, or any `pylater` module that uses
+      them) is imported. It can alternatively be set using the `PYTENSOR_FLAGS`
+      environment variable (e.g., `PYTENSOR_FLAGS=base_compiledir=/opt/cache`).
+    * A directory that has been populated using `pylater.warmup` can be copied
+      into a container image, so that processes started from the image do not
+      need to compile the LATER model graphs.
+    """
+
+    compiledir = pathlib.Path(compiledir).expanduser().absolute()
+
+    if "pytensor" in sys.modules:
+
+        import pytensor.configdefaults
+
+        current = pathlib.Path(pytensor.configdefaults.config.base_compiledir)
+
+        if current.absolute() == compiledir:
+            return
+
+        msg = (
+            "Cannot set the compile directory after PyTensor has been imported; "
+            + "call `set_compiledir` before importing PyMC or set "
+            + f"`PYTENSOR_FLAGS=base_compiledir={compiledir}`"
+        )
+        raise ValueError(msg)
+
+    compiledir.mkdir(parents=True, exist_ok=True)
+
+    flags = os.environ.get("PYTENSOR_FLAGS")
+
+    # later flags take precedence over earlier ones
+    os.environ["PYTENSOR_FLAGS"] = ",".join(
+        flag for flag in (flags, f"base_compiledir={compiledir}") if flag
+    )
@@ -1,22 +1,43 @@
+from __future__ import annotations
+
 import collections
 import csv
 import functools
 import importlib.resources
 import pathlib
+import typing
 
 import numpy as np
 import numpy.typing as npt
 
 import scipy.stats
 
+import pylater.config
+
 
 class Dataset:
-    __slots__ = ("name", "rt_s", "promptness", "ecdf", "ecdf_p", "ecdf_x")
+    __slots__ = (
+        "name",
+        "rt_s",
+        "promptness",
+        "ecdf",
+        "ecdf_p",
+        "ecdf_x",
+        "censor_lower_s",
+        "censor_upper_s",
+        "n_censored_lower",
+        "n_censored_upper",
+    )
 
     def __init__(
         self,
         name: str,
         rt_s: npt.ArrayLike,
+        dtype: npt.DTypeLike | None = None,
+        censor_lower_s: float | None = None,
+        censor_upper_s: float | None = None,
+        n_censored_lower: int = 0,
+        n_censored_upper: int = 0,
     ) -> None:
         """
         Create a dataset from observed reaction times.
@@ -27,25 +48,320 @@ class Dataset:
             Name of the dataset.
         rt_s
             Reaction times, in seconds.
+        dtype
+            Floating-point type in which to store the reaction times; defaults to
+            that of the current precision (see `pylater.config`).
+        censor_lower_s
+            Reaction time below which trials were censored (e.g., an
+            anticipation cut-off), in seconds.
+        censor_upper_s
+            Reaction time above which trials were censored (e.g., a timeout), in
+            seconds.
+        n_censored_lower
+            Number of trials that were censored for being faster than
+            `censor_lower_s`; these are not included in `rt_s`.
+        n_censored_upper
+            Number of trials that were censored for being slower than
+            `censor_upper_s` (including those without a response); these are not
+            included in `rt_s`.
 
         Returns
         -------
         Dataset
             The dataset.
+
+        Notes
+        -----
+        * See `from_censored_rt_s` to count the censored trials from a set of
+          reaction times.
         """
 
         self.name = name
-        self.rt_s: npt.NDArray[np.float64] = np.array(rt_s, dtype=np.float64)
+        self.rt_s: npt.NDArray[np.floating[typing.Any]] = np.array(
+            rt_s,
+            dtype=dtype if dtype is not None else pylater.config.float_dtype(),
+        )
+
+        self.censor_lower_s = censor_lower_s
+        self.censor_upper_s = censor_upper_s
+        self.n_censored_lower = int(n_censored_lower)
+        self.n_censored_upper = int(n_censored_upper)
+
+        if self.n_censored_lower < 0 or self.n_censored_upper < 0:
+            raise ValueError("Censored counts must be non-negative")
+
+        for bound_s, n_censored in (
+            (censor_lower_s, self.n_censored_lower),
+            (censor_upper_s, self.n_censored_upper),
+        ):
+            if bound_s is None and n_censored > 0:
+                raise ValueError("Censored trials need a censoring bound")
+
+        if (
+            censor_lower_s is not None
+            and censor_upper_s is not None
+            and censor_lower_s >= censor_upper_s
+        ):
+            raise ValueError("The lower censoring bound must be below the upper")
+
+        if np.any(self.rt_s < (censor_lower_s or 0.0)) or np.any(
+            self.rt_s > (censor_upper_s or np.inf)
+        ):
+            msg = (
+                f"Dataset {name} has reaction times beyond its censoring bounds; "
+                + "see `Dataset.from_censored_rt_s`"
+            )
+            raise ValueError(msg)
 
         self.promptness = 1.0 / self.rt_s
 
         self.ecdf = scipy.stats.ecdf(sample=self.rt_s)
 
-        self.ecdf_p = self.ecdf.cdf.probabilities
+        # the ECDF is over all of the trials, including those that were censored
+        self.ecdf_p = (
+            self.n_censored_lower + self.n_trials * self.ecdf.cdf.probabilities
+        ) / self.n_total
         self.ecdf_x = self.ecdf.cdf.quantiles
 
     def __repr__(self) -> str:
-        return f"Dataset named '{self.name}' with {len(self.rt_s)} data points"
+        censored = f" and {self.n_censored} censored" if self.is_censored else ""
+        return (
+            f"Dataset named '{self.name}' with {len(self.rt_s)} data points" + censored
+        )
+
+    @classmethod
+    def from_censored_rt_s(
+        cls,
+        name: str,
+        rt_s: npt.ArrayLike,
+        censor_lower_s: float | None = None,
+        censor_upper_s: float | None = None,
+        dtype: npt.DTypeLike | None = None,
+    ) -> Dataset:
+        """
+        Create a dataset by censoring reaction times beyond bounds.
+
+        Parameters
+        ----------
+        name
+            Name of the dataset.
+        rt_s
+            Reaction times, in seconds; trials without a response can be given
+            as NaN or infinity, and are censored above `censor_upper_s`.
+        censor_lower_s
+            Reaction time below which trials are censored, in seconds.
+        censor_upper_s
+            Reaction time above which trials are censored, in seconds.
+        dtype
+            Floating-point type in which to store the reaction times.
+
+        Returns
+        -------
+        Dataset
+            The dataset, with the reaction times within the bounds and the number
+            of trials beyond each bound.
+        """
+
+        rt_s = np.asarray(rt_s, dtype=np.float64)
+
+        is_below = rt_s < (censor_lower_s if censor_lower_s is not None else 0.0)
+        # written so that trials without a response (NaN) are above
+        is_above = ~(rt_s <= (censor_upper_s if censor_upper_s is not None else np.inf))
+
+        return cls(
+            name=name,
+            rt_s=rt_s[~(is_below | is_above)],
+            dtype=dtype,
+            censor_lower_s=censor_lower_s,
+            censor_upper_s=censor_upper_s,
+            n_censored_lower=int(np.sum(is_below)),
+            n_censored_upper=int(np.sum(is_above)),
+        )
+
+    @property
+    def n_trials(self) -> int:
+        return len(self.rt_s)
+
+    @property
+    def n_censored(self) -> int:
+        return self.n_censored_lower + self.n_censored_upper
+
+    @property
+    def n_total(self) -> int:
+        return self.n_trials + self.n_censored
+
+    @property
+    def is_censored(self) -> bool:
+        return self.censor_lower_s is not None or self.censor_upper_s is not None
+
+    def evaluate_ecdf(self, rt_s: npt.ArrayLike) -> npt.NDArray[np.float64]:
+        """
+        Evaluate the empirical cumulative distribution function.
+
+        Parameters
+        ----------
+        rt_s
+            Reaction times at which to evaluate the function, in seconds.
+
+        Returns
+        -------
+        npt.NDArray[np.float64]
+            The cumulative probabilities, over all of the trials. Where trials
+            were censored, the function is unknown beyond the censoring bound and
+            is NaN.
+        """
+
+        rt_s = np.asarray(rt_s)
+
+        ecdf_p: npt.NDArray[np.float64] = (
+            self.n_censored_lower + self.n_trials * self.ecdf.cdf.evaluate(rt_s)
+        ) / self.n_total
+
+        if self.censor_lower_s is not None and self.n_censored_lower > 0:
+            ecdf_p = np.where(rt_s < self.censor_lower_s, np.nan, ecdf_p)
+
+        if self.censor_upper_s is not None and self.n_censored_upper > 0:
+            ecdf_p = np.where(rt_s > self.censor_upper_s, np.nan, ecdf_p)
+
+        return ecdf_p
+
+
+class BinnedDataset:
+    __slots__ = ("counts", "ecdf_p", "ecdf_x", "edges_s", "name")
+
+    def __init__(
+        self,
+        name: str,
+        edges_s: npt.ArrayLike,
+        counts: npt.ArrayLike,
+    ) -> None:
+        """
+        Create a dataset from counts of reaction times within bins.
+
+        Parameters
+        ----------
+        name
+            Name of the dataset.
+        edges_s
+            Edges of the reaction time bins, in seconds. This is one element
+            longer than `counts`, and can begin at zero and end at infinity.
+        counts
+            Number of reaction times in each bin.
+
+        Returns
+        -------
+        BinnedDataset
+            The dataset.
+        """
+
+        self.name = name
+        self.edges_s: npt.NDArray[np.float64] = np.array(edges_s, dtype=np.float64)
+        self.counts: npt.NDArray[np.int64] = np.array(counts, dtype=np.int64)
+
+        if self.edges_s.shape != (len(self.counts) + 1,):
+            raise ValueError("Need one more bin edge than the number of bins")
+
+        if np.any(self.edges_s < 0) or np.any(np.diff(self.edges_s) <= 0):
+            raise ValueError("Bin edges must be non-negative and increasing")
+
+        if np.any(self.counts < 0):
+            raise ValueError("Bin counts must be non-negative")
+
+        if self.n_trials == 0:
+            raise ValueError("Need at least one reaction time within the bins")
+
+        # the ECDF is known at the upper edge of each bin
+        self.ecdf_x = self.edges_s[1:]
+        self.ecdf_p = np.cumsum(self.counts) / self.n_trials
+
+    def __repr__(self) -> str:
+        return (
+            f"Binned dataset named '{self.name}' with {self.n_trials} data points "
+            + f"in {len(self.counts)} bins"
+        )
+
+    @classmethod
+    def from_rt_s(
+        cls,
+        name: str,
+        rt_s: npt.ArrayLike,
+        edges_s: npt.ArrayLike,
+    ) -> BinnedDataset:
+        """
+        Create a binned dataset by counting reaction times within bins.
+
+        Parameters
+        ----------
+        name
+            Name of the dataset.
+        rt_s
+            Reaction times, in seconds.
+        edges_s
+            Edges of the reaction time bins, in seconds.
+
+        Returns
+        -------
+        BinnedDataset
+            The dataset.
+        """
+
+        counts, _ = np.histogram(np.asarray(rt_s), bins=np.asarray(edges_s))
+
+        return cls(name=name, edges_s=edges_s, counts=counts)
+
+    @property
+    def n_trials(self) -> int:
+        return int(np.sum(self.counts))
+
+    def evaluate_ecdf(self, rt_s: npt.ArrayLike) -> npt.NDArray[np.float64]:
+        """
+        Evaluate the empirical cumulative distribution function.
+
+        Parameters
+        ----------
+        rt_s
+            Reaction times at which to evaluate the function, in seconds.
+
+        Returns
+        -------
+        npt.NDArray[np.float64]
+            The cumulative probabilities; the function steps up at the upper edge
+            of each bin.
+        """
+
+        i_bins = np.searchsorted(self.ecdf_x, np.asarray(rt_s), side="right")
+
+        ecdf_p: npt.NDArray[np.float64] = np.concatenate(([0.0], self.ecdf_p))[i_bins]
+
+        return ecdf_p
+
+
+def compress_ties(
+    values: npt.ArrayLike,
+) -> tuple[npt.NDArray[np.float64], npt.NDArray[np.int64]]:
+    """
+    Represent a set of values by its unique values and their counts.
+
+    Parameters
+    ----------
+    values
+        Values to compress.
+
+    Returns
+    -------
+    unique_values, counts
+        The sorted unique values and the number of times each occurs.
+
+    Notes
+    -----
+    * Reaction times are typically recorded at a resolution of milliseconds, and
+      so likelihoods can be evaluated over the unique values and weighted by
+      their counts rather than being evaluated for each trial.
+    """
+
+    unique_values, counts = np.unique(np.asarray(values), return_counts=True)
+
+    return (unique_values, counts)
 
 
 @functools.lru_cache
@@ -0,0 +1,552 @@
+from __future__ import annotations
+
+import typing
+
+import numpy as np
+import numpy.typing as npt
+
+import scipy.special
+
+import arviz as az
+
+import pylater.data
+import pylater.dist
+import pylater.instrument
+import pylater.model
+import pylater.online
+import pylater.regression
+
+# order of the parameters in the last axis of the condition parameters
+PARAM_NAMES = pylater.regression.PARAM_NAMES
+
+
+class AdaptiveDesign:
+    def __init__(
+        self,
+        conditions: typing.Mapping[str, npt.ArrayLike],
+        formulas: typing.Mapping[str, str] | None = None,
+        priors: typing.Mapping[str, pylater.model.LogNormalPrior] | None = None,
+        effect_sigma: float = pylater.regression.DEFAULT_EFFECT_SIGMA,
+        n_trials: int = 20,
+        n_particles: int = 2000,
+        n_simulations: int = 200,
+        n_bins: int = 16,
+        ess_threshold: float = 0.5,
+        n_rejuvenation_steps: int = 5,
+        rng: np.random.Generator | int | None = None,
+    ) -> None:
+        """
+        Choose the condition of each block of trials to maximise the expected
+        information gain about the parameters of a LATER model.
+
+        Parameters
+        ----------
+        conditions
+            Values of each covariate for each candidate condition; for example,
+            `{"log_prior": np.log([0.1, 0.25, 0.5, 0.75, 0.9])}` for the prior
+            probability of the target (as in Carpenter & Williams, 1995).
+        formulas
+            Formula (see `pylater.regression.design_matrix`) relating each of the
+            parameters `sigma`, `k`, and `sigma_e_mod` to the covariates, as in
+            `pylater.regression.build_regression_model`. Parameters without a
+            formula are constant over conditions (`1`).
+        priors
+            Priors to use in place of the defaults for the baseline coefficients,
+            as in `pylater.regression.build_regression_model`.
+        effect_sigma
+            Prior standard deviation of the other coefficients, on the logarithmic
+            scale.
+        n_trials
+            Number of trials in each block.
+        n_particles
+            Number of particles used to represent the posterior.
+        n_simulations
+            Number of simulated blocks used to estimate the expected information
+            gain of each condition.
+        n_bins
+            Number of promptness bins used to evaluate the likelihood of the
+            simulated blocks.
+        ess_threshold
+            The particles are resampled and rejuvenated when the effective sample
+            size falls below this proportion of `n_particles`.
+        n_rejuvenation_steps
+            Number of Metropolis-Hastings steps applied to each particle after
+            resampling.
+        rng
+            Random number generator, or a seed for one.
+
+        Notes
+        -----
+        * The posterior of the coefficients is represented by weighted particles
+          that are updated after each block, as in `pylater.online.OnlineLATER`
+          (without tempering, as blocks are expected to be small).
+        * See `expected_information_gain` for how each condition is evaluated.
+        """
+
+        if not 0 < ess_threshold <= 1:
+            raise ValueError("`ess_threshold` must be in (0, 1]")
+
+        formulas = {param_name: "1" for param_name in PARAM_NAMES} | dict(
+            formulas or {}
+        )
+
+        unknown = set(formulas) - set(PARAM_NAMES)
+
+        if unknown:
+            msg = f"Unknown parameter names: {sorted(unknown)}"
+            raise ValueError(msg)
+
+        self.designs = {
+            param_name: pylater.regression.design_matrix(
+                formula=formulas[param_name],
+                covariates=conditions,
+            )
+            for param_name in PARAM_NAMES
+        }
+
+        self.n_conditions = self.designs[PARAM_NAMES[0]].matrix.shape[0]
+
+        self.n_trials = n_trials
+        self.n_particles = n_particles
+        self.n_simulations = n_simulations
+        self.n_bins = n_bins
+        self.ess_threshold = ess_threshold
+        self.n_rejuvenation_steps = n_rejuvenation_steps
+
+        self.rng = np.random.default_rng(rng)
+
+        model_priors = pylater.model.get_priors(priors=priors)
+
+        # prior mean and standard deviation of each coefficient
+        self.coef_mu, self.coef_sigma = (
+            np.concatenate(
+                [
+                    np.where(
+                        design.is_baseline,
+                        getattr(model_priors[param_name], attr_name),
+                        default,
+                    )
+                    for (param_name, design) in self.designs.items()
+                ]
+            )
+            for (attr_name, default) in (("mu", 0.0), ("sigma", effect_sigma))
+        )
+
+        # the coefficients of each parameter, as a slice of the particle columns
+        i_ends = np.cumsum([design.matrix.shape[1] for design in self.designs.values()])
+        self.coef_slices = {
+            param_name: slice(i_end - design.matrix.shape[1], i_end)
+            for ((param_name, design), i_end) in zip(
+                self.designs.items(), i_ends, strict=True
+            )
+        }
+
+        self.coefs = self.rng.normal(
+            loc=self.coef_mu,
+            scale=self.coef_sigma,
+            size=(n_particles, len(self.coef_mu)),
+        )
+
+        self.log_weights = np.zeros(n_particles)
+        self.log_likelihood = np.zeros(n_particles)
+
+        # tie-compressed observations in each condition
+        self.promptness = [np.array([], dtype=np.float64)] * self.n_conditions
+        self.counts = [np.array([], dtype=np.int64)] * self.n_conditions
+
+        self.n_acceptances = 0
+        self.n_proposals = 0
+
+    def __repr__(self) -> str:
+        return (
+            f"AdaptiveDesign over {self.n_conditions} conditions with "
+            + f"{self.n_trials_observed} trials observed"
+        )
+
+    @property
+    def n_trials_observed(self) -> int:
+        return int(sum(np.sum(counts) for counts in self.counts))
+
+    @property
+    def ess(self) -> float:
+        """Effective sample size of the weighted particles."""
+        weights = pylater.online.normalise_log_weights(log_weights=self.log_weights)
+        return float(1 / np.sum(weights**2))
+
+    def condition_log_params(
+        self,
+        coefs: npt.NDArray[np.float64] | None = None,
+    ) -> npt.NDArray[np.float64]:
+        """
+        Evaluate the logarithm of the `sigma`, `k`, and `sigma_e_mod` parameters
+        in each condition.
+
+        Parameters
+        ----------
+        coefs
+            Coefficients, with shape (particles, coefficients); defaults to the
+            current particles.
+
+        Returns
+        -------
+        npt.NDArray[np.float64]
+            The parameters, with shape (conditions, particles, parameters).
+        """
+
+        if coefs is None:
+            coefs = self.coefs
+
+        return np.stack(
+            [
+                design.matrix @ coefs[:, self.coef_slices[param_name]].T
+                for (param_name, design) in self.designs.items()
+            ],
+            axis=-1,
+        )
+
+    @pylater.instrument.instrumented("AdaptiveDesign.next_condition")
+    def next_condition(self) -> tuple[int, npt.NDArray[np.float64]]:
+        """
+        Choose the condition of the next block of trials.
+
+        Returns
+        -------
+        i_condition, eig
+            The index of the condition with the largest expected information gain,
+            and the expected information gain (in nats) of each condition.
+        """
+
+        eig = expected_information_gain(
+            log_params=self.condition_log_params(),
+            weights=pylater.online.normalise_log_weights(log_weights=self.log_weights),
+            n_trials=self.n_trials,
+            n_simulations=self.n_simulations,
+            n_bins=self.n_bins,
+            rng=self.rng,
+        )
+
+        return (int(np.argmax(eig)), eig)
+
+    @pylater.instrument.instrumented("AdaptiveDesign.update")
+    def update(self, condition: int, new_rt_s: npt.ArrayLike) -> None:
+        """
+        Update the posterior with a new block of observations.
+
+        Parameters
+        ----------
+        condition
+            Index of the condition of the block.
+        new_rt_s
+            Reaction times in the block, in seconds.
+        """
+
+        new_promptness, new_counts = pylater.data.compress_ties(
+            values=1.0 / np.asarray(new_rt_s, dtype=np.float64)
+        )
+
+        pylater.instrument.annotate(
+            n_new_trials=int(np.sum(new_counts)),
+            n_particles=self.n_particles,
+        )
+
+        self.promptness[condition], self.counts[condition] = (
+            pylater.online.merge_compressed(
+                values_a=self.promptness[condition],
+                counts_a=self.counts[condition],
+                values_b=new_promptness,
+                counts_b=new_counts,
+            )
+        )
+
+        block_log_likelihood = pylater.online.compressed_log_likelihood(
+            log_params=self.condition_log_params()[condition],
+            promptness=new_promptness,
+            counts=new_counts,
+        )
+
+        self.log_weights += block_log_likelihood
+        self.log_likelihood += block_log_likelihood
+
+        if self.ess < self.ess_threshold * self.n_particles:
+            self.resample()
+            self.rejuvenate()
+
+    def posterior(
+        self,
+        n_draws: int | None = None,
+    ) -> az.data.inference_data.InferenceData:
+        """
+        Draw equally-weighted samples of the coefficients from the current
+        posterior.
+
+        Parameters
+        ----------
+        n_draws
+            Number of samples to draw; defaults to the number of particles.
+
+        Returns
+        -------
+        az.data.inference_data.InferenceData
+            Inference data object containing the posterior samples, with a single
+            chain and the coefficient variables and coordinates of
+            `pylater.regression.build_regression_model`.
+        """
+
+        if n_draws is None:
+            n_draws = self.n_particles
+
+        i_particles = pylater.online.systematic_resample(
+            weights=pylater.online.normalise_log_weights(log_weights=self.log_weights),
+            n_draws=n_draws,
+            rng=self.rng,
+        )
+
+        idata: az.data.inference_data.InferenceData = az.from_dict(
+            posterior={
+                f"{param_name}_coef": self.coefs[
+                    np.newaxis, i_particles, self.coef_slices[param_name]
+                ]
+                for param_name in PARAM_NAMES
+            },
+            coords={
+                f"{param_name}_column": design.column_names
+                for (param_name, design) in self.designs.items()
+            },
+            dims={
+                f"{param_name}_coef": [f"{param_name}_column"]
+                for param_name in PARAM_NAMES
+            },
+        )
+
+        return idata
+
+    def resample(self) -> None:
+        """
+        Resample the particles in proportion to their weights.
+        """
+
+        i_particles = pylater.online.systematic_resample(
+            weights=pylater.online.normalise_log_weights(log_weights=self.log_weights),
+            n_draws=self.n_particles,
+            rng=self.rng,
+        )
+
+        self.coefs = self.coefs[i_particles]
+        self.log_likelihood = self.log_likelihood[i_particles]
+        self.log_weights = np.zeros(self.n_particles)
+
+    def rejuvenate(self) -> None:
+        """
+        Move the (equally-weighted) particles using random-walk Metropolis-Hastings
+        steps that target the posterior given all of the observations.
+        """
+
+        n_coefs = self.coefs.shape[1]
+
+        # standard scaling for random-walk proposals
+        proposal_cov = (2.38**2 / n_coefs) * np.atleast_2d(
+            np.cov(self.coefs, rowvar=False)
+        )
+        proposal_chol = np.linalg.cholesky(proposal_cov + np.eye(n_coefs) * 1e-10)
+
+        log_prior = self.log_prior(coefs=self.coefs)
+
+        for _ in range(self.n_rejuvenation_steps):
+
+            proposal = self.coefs + (
+                self.rng.standard_normal(size=self.coefs.shape) @ proposal_chol.T
+            )
+
+            proposal_log_prior = self.log_prior(coefs=proposal)
+            proposal_log_likelihood = self.evaluate_log_likelihood(coefs=proposal)
+
+            log_ratio = (proposal_log_prior + proposal_log_likelihood) - (
+                log_prior + self.log_likelihood
+            )
+
+            accept = np.log(self.rng.uniform(size=self.n_particles)) < log_ratio
+
+            self.coefs[accept] = proposal[accept]
+            self.log_likelihood[accept] = proposal_log_likelihood[accept]
+            log_prior[accept] = proposal_log_prior[accept]
+
+            self.n_acceptances += int(np.sum(accept))
+            self.n_proposals += self.n_particles
+
+    def log_prior(self, coefs: npt.NDArray[np.float64]) -> npt.NDArray[np.float64]:
+        """
+        Evaluate the log prior density of the coefficients of each particle.
+        """
+        log_prior: npt.NDArray[np.float64] = np.sum(
+            pylater.dist.normal_logpdf(
+                value=coefs, mu=self.coef_mu, sigma=self.coef_sigma
+            ),
+            axis=-1,
+        )
+        return log_prior
+
+    def evaluate_log_likelihood(
+        self,
+        coefs: npt.NDArray[np.float64],
+    ) -> npt.NDArray[np.float64]:
+        """
+        Evaluate the log-likelihood of all of the observations for each particle.
+        """
+
+        log_params = self.condition_log_params(coefs=coefs)
+
+        log_likelihood: npt.NDArray[np.float64] = np.sum(
+            [
+                pylater.online.compressed_log_likelihood(
+                    log_params=log_params[i_condition],
+                    promptness=self.promptness[i_condition],
+                    counts=self.counts[i_condition],
+                )
+                for i_condition in range(self.n_conditions)
+            ],
+            axis=0,
+        )
+
+        return log_likelihood
+
+
+def expected_information_gain(
+    log_params: npt.NDArray[np.float64],
+    weights: npt.NDArray[np.float64],
+    n_trials: int,
+    n_simulations: int = 200,
+    n_bins: int = 16,
+    rng: np.random.Generator | int | None = None,
+) -> npt.NDArray[np.float64]:
+    """
+    Estimate the expected information gain from a block of trials in each of a
+    set of conditions, given a weighted particle (or grid) posterior.
+
+    Parameters
+    ----------
+    log_params
+        Logarithm of the `sigma`, `k`, and `sigma_e_mod` parameters of each
+        particle in each condition, with shape (conditions, particles, parameters).
+    weights
+        Normalised weight of each particle (such as the probability of each grid
+        cell).
+    n_trials
+        Number of trials in the block.
+    n_simulations
+        Number of blocks to simulate.
+    n_bins
+        Number of promptness bins used to evaluate the likelihood of the
+        simulated blocks.
+    rng
+        Random number generator, or a seed for one.
+
+    Returns
+    -------
+    npt.NDArray[np.float64]
+        The expected information gain (in nats) about the particles from a block
+        in each condition.
+
+    Notes
+    -----
+    * The information gain is the mutual information between the particle and
+      the block's data. It is estimated by simulating blocks (with
+      `pylater.dist.random`) from particles drawn from the posterior, and
+      averaging the log ratio of each block's likelihood under its particle to its
+      marginal likelihood over all of the particles.
+    * The same particles are used for the simulations in each condition, so that
+      the differences between conditions are estimated with less noise.
+    * The likelihood of each simulated block is evaluated from its counts in
+      promptness bins, whose edges are quantiles of the simulated promptness.
+      The probability of each bin is evaluated once for each particle, so that
+      the likelihood of all of the blocks under all of the particles is a single
+      matrix product. Binning can only lose information, so this underestimates
+      the gain from the unbinned data, but equally for each condition.
+    """
+
+    rng = np.random.default_rng(rng)
+
+    n_conditions, n_particles, _ = log_params.shape
+
+    pylater.instrument.annotate(
+        n_conditions=n_conditions,
+        n_particles=n_particles,
+    )
+
+    with np.errstate(divide="ignore"):
+        log_weights = np.log(weights)
+
+    # the particle that generates each simulated block
+    i_true = rng.choice(n_particles, size=n_simulations, p=weights / np.sum(weights))
+
+    eig = np.empty(n_conditions)
+
+    for i_condition in range(n_conditions):
+
+        sigma, k, sigma_e_mod = np.moveaxis(np.exp(log_params[i_condition]), -1, 0)
+
+        mu, sigma_e = (sigma * k, sigma * sigma_e_mod)
+
+        promptness = 1 / pylater.dist.random(
+            mu=mu[i_true, np.newaxis],
+            sigma=sigma[i_true, np.newaxis],
+            sigma_e=sigma_e[i_true, np.newaxis],
+            rng=rng,
+            size=(n_simulations, n_trials),
+        )
+
+        inner_edges = np.unique(
+            np.quantile(promptness, np.linspace(0, 1, n_bins + 1)[1:-1])
+        )
+
+        i_bins = np.searchsorted(inner_edges, promptness)
+
+        n_block_bins = len(inner_edges) + 1
+
+        counts = np.bincount(
+            (i_bins + n_block_bins * np.arange(n_simulations)[:, np.newaxis]).ravel(),
+            minlength=n_simulations * n_block_bins,
+        ).reshape(n_simulations, n_block_bins)
+
+        unit_mu, unit_sigma = pylater.dist.numpy_later_units(
+            mu=mu[:, np.newaxis],
+            sigma=sigma[:, np.newaxis],
+            sigma_e=sigma_e[:, np.newaxis],
+        )
+
+        # (particles, bin edges), with the outermost bins extending to infinity;
+        # the race distribution function is the product of those of its units,
+        # which is evaluated directly as its logarithm is not needed here
+        edges_cdf = np.prod(
+            scipy.special.ndtr(
+                (
+                    np.concatenate(([-np.inf], inner_edges, [np.inf]))[
+                        np.newaxis, :, np.newaxis
+                    ]
+                    - unit_mu
+                )
+                / unit_sigma
+            ),
+            axis=-1,
+        )
+
+        # the floor avoids zero counts multiplying infinite values
+        bin_log_p = np.log(
+            np.maximum(np.diff(edges_cdf, axis=-1), np.finfo(np.float64).tiny)
+        )
+
+        # (simulations, particles)
+        block_log_likelihood = counts.astype(np.float64) @ bin_log_p.T
+
+        # the marginal likelihood of each block; this is the bulk of the work, and
+        # is faster than `scipy.special.logsumexp` for a single axis
+        log_joint = block_log_likelihood + log_weights
+        max_log_joint = np.max(log_joint, axis=1)
+        log_marginal = max_log_joint + np.log(
+            np.sum(np.exp(log_joint - max_log_joint[:, np.newaxis]), axis=1)
+        )
+
+        eig[i_condition] = np.mean(
+            block_log_likelihood[np.arange(n_simulations), i_true] - log_marginal
+        )
+
+    return eig
@@ -1,12 +1,22 @@
 from __future__ import annotations
 
+import math
+
 import numpy as np
 import numpy.typing as npt
 
+import scipy.special
+
 import pymc as pm
 
 import pytensor.tensor as pt
 
+import pylater.config
+
+# whether the censored trials of each bound (lower and upper, in reaction time) are
+# above the bound in promptness
+IS_ABOVE_BOUND = np.array([True, False])
+
 
 class LATER:
 
@@ -24,6 +34,18 @@ class LATER:
         Standard deviation of the early component.
     observed_rt_s
         Observed reaction times, in units of seconds.
+    censor_lower_s
+        Reaction time below which trials were censored (e.g., an anticipation
+        cut-off), in units of seconds.
+    censor_upper_s
+        Reaction time above which trials were censored (e.g., a timeout), in
+        units of seconds.
+    n_censored_lower
+        Number of trials that were censored for being faster than
+        `censor_lower_s`.
+    n_censored_upper
+        Number of trials that were censored for being slower than
+        `censor_upper_s` (including those without a response).
     **kwargs
         Additional arguments are passed directly to `pm.CustomDist`.
 
@@ -36,6 +58,9 @@ class LATER:
     -----
     * The model parameters are in units of promptness (reciprocal of time).
     * Random samples from the model are in units of time.
+    * If either censoring bound is given, the censored trials are modelled by an
+      additional `LATERCensored` variable named `<name>_censored`, whose
+      log-likelihood has one term per bound rather than one per trial.
 
     """
 
@@ -46,11 +71,30 @@ class LATER:
         sigma: float | pm.Distribution,
         sigma_e: float | pm.Distribution,
         observed_rt_s: npt.NDArray[np.float64] | None = None,
+        censor_lower_s: float | None = None,
+        censor_upper_s: float | None = None,
+        n_censored_lower: int = 0,
+        n_censored_upper: int = 0,
         **kwargs: str | float | npt.NDArray[np.float64],
     ) -> pm.CustomDist:
 
         observed_promptness = 1 / observed_rt_s if observed_rt_s is not None else None
 
+        if censor_lower_s is not None or censor_upper_s is not None:
+            n_observed = len(observed_rt_s) if observed_rt_s is not None else 0
+            LATERCensored(
+                name=f"{name}_censored",
+                mu=mu,
+                sigma=sigma,
+                sigma_e=sigma_e,
+                censor_lower_s=censor_lower_s,
+                censor_upper_s=censor_upper_s,
+                observed_counts=[n_censored_lower, n_censored_upper],
+                n_trials=n_observed + n_censored_lower + n_censored_upper,
+            )
+        elif n_censored_lower > 0 or n_censored_upper > 0:
+            raise ValueError("Censored trials need a censoring bound")
+
         return pm.CustomDist(
             name,
             mu,
@@ -64,36 +108,375 @@ class LATER:
         )
 
 
+class LATERBinned:
+
+    __doc__ = """A custom PyMC distribution for a LATER model of binned observations.
+
+    Parameters
+    ----------
+    name
+        Identifier for the distribution.
+    mu
+        Mean of the primary component.
+    sigma
+        Standard deviation of the primary component.
+    sigma_e
+        Standard deviation of the early component.
+    edges_s
+        Edges of the reaction time bins, in units of seconds. This is one
+        element longer than the number of bins, and can begin at zero and end at
+        infinity.
+    observed_counts
+        Observed number of reaction times in each bin.
+    n_trials
+        Total number of trials, used when drawing random samples. If `None`, the
+        total of `observed_counts` is used.
+    **kwargs
+        Additional arguments are passed directly to `pm.CustomDist`.
+
+    Returns
+    -------
+    pm.CustomDist
+        Distribution for use with a PyMC model.
+
+    Notes
+    -----
+    * The probability of each bin is the difference in the LATER distribution
+      function evaluated (in units of promptness) at the bin edges, and the
+      log-likelihood of each bin is its count multiplied by the log of its
+      probability (i.e., the multinomial log-likelihood, up to a constant). The
+      cost is hence proportional to the number of bins rather than the number
+      of trials.
+    * Random samples from the model are counts in each bin.
+
+    """
+
+    def __new__(
+        cls,
+        name: str,
+        mu: float | pm.Distribution,
+        sigma: float | pm.Distribution,
+        sigma_e: float | pm.Distribution,
+        edges_s: npt.ArrayLike,
+        observed_counts: npt.ArrayLike | None = None,
+        n_trials: int | None = None,
+        **kwargs: str | float | npt.NDArray[np.float64],
+    ) -> pm.CustomDist:
+
+        lower_promptness, upper_promptness = edges_to_promptness(edges_s=edges_s)
+
+        if n_trials is None:
+            if observed_counts is None:
+                raise ValueError("Need one of `observed_counts` or `n_trials`")
+            n_trials = int(np.sum(observed_counts))
+
+        return pm.CustomDist(
+            name,
+            mu,
+            sigma,
+            sigma_e,
+            lower_promptness,
+            upper_promptness,
+            n_trials,
+            logp=binned_logp,
+            random=binned_random,
+            observed=observed_counts,
+            **kwargs,
+        )
+
+
+class LATERCensored:
+
+    __doc__ = """A custom PyMC distribution for the number of censored trials of a LATER
+    model.
+
+    Parameters
+    ----------
+    name
+        Identifier for the distribution.
+    mu
+        Mean of the primary component.
+    sigma
+        Standard deviation of the primary component.
+    sigma_e
+        Standard deviation of the early component.
+    censor_lower_s
+        Reaction time below which trials were censored, in units of seconds, or
+        `None` if there was no lower bound.
+    censor_upper_s
+        Reaction time above which trials were censored, in units of seconds, or
+        `None` if there was no upper bound (in which case only trials without a
+        response are censored).
+    observed_counts
+        Observed number of trials censored below the lower bound and above the
+        upper bound.
+    n_trials
+        Total number of trials (observed and censored), used when drawing random
+        samples. If `None`, the total of `observed_counts` is used.
+    **kwargs
+        Additional arguments are passed directly to `pm.CustomDist`.
+
+    Returns
+    -------
+    pm.CustomDist
+        Distribution for use with a PyMC model.
+
+    Notes
+    -----
+    * A reaction time below the lower bound is a promptness above its
+      reciprocal, and a reaction time above the upper bound (or no response) is
+      a promptness below its reciprocal. The log-likelihood of each bound is
+      its count multiplied by the log of the probability beyond the bound,
+      from the LATER distribution function, so the cost does not depend on the
+      number of censored trials.
+    * Random samples from the model are the counts beyond each bound.
+
+    """
+
+    def __new__(
+        cls,
+        name: str,
+        mu: float | pm.Distribution,
+        sigma: float | pm.Distribution,
+        sigma_e: float | pm.Distribution,
+        censor_lower_s: float | None = None,
+        censor_upper_s: float | None = None,
+        observed_counts: npt.ArrayLike | None = None,
+        n_trials: int | None = None,
+        **kwargs: str | float | npt.NDArray[np.float64],
+    ) -> pm.CustomDist:
+
+        bound_promptness = censor_bounds_to_promptness(
+            censor_lower_s=censor_lower_s,
+            censor_upper_s=censor_upper_s,
+        )
+
+        if n_trials is None:
+            if observed_counts is None:
+                raise ValueError("Need one of `observed_counts` or `n_trials`")
+            n_trials = int(np.sum(observed_counts))
+
+        return pm.CustomDist(
+            name,
+            mu,
+            sigma,
+            sigma_e,
+            bound_promptness,
+            IS_ABOVE_BOUND,
+            n_trials,
+            logp=censored_logp,
+            random=censored_random,
+            observed=observed_counts,
+            **kwargs,
+        )
+
+
+class LATERRace:
+
+    __doc__ = """A custom PyMC distribution for a race between LATER units.
+
+    Parameters
+    ----------
+    name
+        Identifier for the distribution.
+    mu
+        Mean of each unit, along the last axis.
+    sigma
+        Standard deviation of each unit, along the last axis.
+    observed_rt_s
+        Observed reaction times, in units of seconds.
+    **kwargs
+        Additional arguments are passed directly to `pm.CustomDist`.
+
+    Returns
+    -------
+    pm.CustomDist
+        Distribution for use with a PyMC model.
+
+    Notes
+    -----
+    * Each response is made by whichever unit reaches threshold first (i.e., has
+      the greatest promptness); which unit that was is not observed.
+    * An early unit is a unit with a mean of zero, so `LATER` is the race
+      between a main unit and an early unit.
+    * The model parameters are in units of promptness (reciprocal of time).
+    * Random samples from the model are in units of time.
+
+    """
+
+    def __new__(
+        cls,
+        name: str,
+        mu: npt.ArrayLike | pm.Distribution,
+        sigma: npt.ArrayLike | pm.Distribution,
+        observed_rt_s: npt.NDArray[np.float64] | None = None,
+        **kwargs: str | float | npt.NDArray[np.float64],
+    ) -> pm.CustomDist:
+
+        observed_promptness = 1 / observed_rt_s if observed_rt_s is not None else None
+
+        return pm.CustomDist(
+            name,
+            mu,
+            sigma,
+            logp=race_logp,
+            logcdf=race_logcdf,
+            random=race_random,
+            signature="(unit),(unit)->()",
+            observed=observed_promptness,
+            **kwargs,
+        )
+
+
 def logp(
     value: pt.TensorVariable,  # type: ignore
     mu: pt.TensorVariable,  # type: ignore
     sigma: pt.TensorVariable,  # type: ignore
     sigma_e: pt.TensorVariable,  # type: ignore
 ) -> pt.TensorVariable:  # type: ignore
-    early_mu = 0
+    return race_logp(value, *tensor_later_units(mu=mu, sigma=sigma, sigma_e=sigma_e))
+
+
+def logcdf(
+    value: pt.TensorVariable,  # type: ignore[name-defined]
+    mu: pt.TensorVariable,  # type: ignore[name-defined]
+    sigma: pt.TensorVariable,  # type: ignore[name-defined]
+    sigma_e: pt.TensorVariable,  # type: ignore[name-defined]
+) -> pt.TensorVariable:  # type: ignore[name-defined]
+    return race_logcdf(value, *tensor_later_units(mu=mu, sigma=sigma, sigma_e=sigma_e))
+
+
+def race_logp(
+    value: pt.TensorVariable,  # type: ignore[name-defined]
+    mu: pt.TensorVariable,  # type: ignore[name-defined]
+    sigma: pt.TensorVariable,  # type: ignore[name-defined]
+) -> pt.TensorVariable:  # type: ignore[name-defined]
+    """
+    Log-density of the greatest promptness among racing units, whose parameters
+    are along the last axis.
 
-    a = pm.Normal.logp(value=value, mu=mu, sigma=sigma) + pm.Normal.logcdf(
-        value=value, mu=early_mu, sigma=sigma_e
+    Notes
+    -----
+    * The density is the sum, over units, of the density of that unit multiplied
+      by the distribution functions of all of the other units. The products over
+      the other units are formed from cumulative sums from each end of the unit
+      axis, so the cost is linear in the number of units.
+    """
+
+    unit_value = pt.as_tensor_variable(value)[..., np.newaxis]
+
+    log_pdfs = tensor_normal_logpdf(value=unit_value, mu=mu, sigma=sigma)
+    log_cdfs = tensor_normal_logcdf(value=unit_value, mu=mu, sigma=sigma)
+
+    return pt.logsumexp(  # type: ignore[no-untyped-call]
+        x=log_pdfs + tensor_exclusive_sum(x=log_cdfs),
+        axis=-1,
     )
-    b = pm.Normal.logp(value=value, mu=early_mu, sigma=sigma_e) + pm.Normal.logcdf(
-        value=value, mu=mu, sigma=sigma
+
+
+def race_logcdf(
+    value: pt.TensorVariable,  # type: ignore[name-defined]
+    mu: pt.TensorVariable,  # type: ignore[name-defined]
+    sigma: pt.TensorVariable,  # type: ignore[name-defined]
+) -> pt.TensorVariable:  # type: ignore[name-defined]
+    """
+    Log of the distribution function of the greatest promptness among racing
+    units, whose parameters are along the last axis.
+    """
+
+    unit_value = pt.as_tensor_variable(value)[..., np.newaxis]
+
+    return pt.sum(  # type: ignore[no-untyped-call]
+        tensor_normal_logcdf(value=unit_value, mu=mu, sigma=sigma),
+        axis=-1,
     )
 
-    return pt.logsumexp(x=pt.stack(tensors=(a, b), axis=0), axis=0)  # type: ignore
 
+def tensor_later_units(
+    mu: pt.TensorVariable,  # type: ignore[name-defined]
+    sigma: pt.TensorVariable,  # type: ignore[name-defined]
+    sigma_e: pt.TensorVariable,  # type: ignore[name-defined]
+) -> tuple[pt.TensorVariable, pt.TensorVariable]:  # type: ignore[name-defined]
+    """
+    Arrange the LATER parameters as a race between the main and early units.
+    """
 
-def logcdf(
-    value: pt.TensorVariable,  # type: ignore
-    mu: pt.TensorVariable,  # type: ignore
-    sigma: pt.TensorVariable,  # type: ignore
-    sigma_e: pt.TensorVariable,  # type: ignore
-) -> pt.TensorVariable:  # type: ignore
-    early_mu = 0
+    mu, sigma, sigma_e = pt.broadcast_arrays(
+        *(pt.as_tensor_variable(param) for param in (mu, sigma, sigma_e))
+    )
+
+    return (
+        pt.stack(tensors=(mu, pt.zeros_like(mu)), axis=-1),  # type: ignore[no-untyped-call]
+        pt.stack(tensors=(sigma, sigma_e), axis=-1),
+    )
 
-    a = pm.Normal.logcdf(value=value, mu=early_mu, sigma=sigma_e)
-    b = pm.Normal.logcdf(value=value, mu=mu, sigma=sigma)
 
-    return a + b
+def tensor_exclusive_sum(
+    x: pt.TensorVariable,  # type: ignore[name-defined]
+) -> pt.TensorVariable:  # type: ignore[name-defined]
+    """
+    Sum of all of the other elements along the last axis, for each element.
+
+    Notes
+    -----
+    * The sum is formed from cumulative sums from each end, rather than by
+      subtracting each element from the total, so that there is no cancellation
+      when an element is large in magnitude.
+    """
+
+    zeros = pt.zeros_like(x[..., :1])  # type: ignore[no-untyped-call]
+
+    before = pt.concatenate(  # type: ignore[no-untyped-call]
+        (zeros, pt.cumsum(x, axis=-1)[..., :-1]),  # type: ignore[no-untyped-call]
+        axis=-1,
+    )
+    after = pt.concatenate(  # type: ignore[no-untyped-call]
+        (pt.cumsum(x[..., ::-1], axis=-1)[..., -2::-1], zeros),  # type: ignore[no-untyped-call]
+        axis=-1,
+    )
+
+    return before + after
+
+
+def tensor_normal_logpdf(
+    value: pt.TensorVariable,  # type: ignore[name-defined]
+    mu: pt.TensorVariable,  # type: ignore[name-defined]
+    sigma: pt.TensorVariable,  # type: ignore[name-defined]
+) -> pt.TensorVariable:  # type: ignore[name-defined]
+    z = (value - mu) / sigma
+    # Python (rather than NumPy) scalars, so as not to upcast reduced precision
+    return -0.5 * z**2 - pt.log(sigma) - 0.5 * math.log(2 * math.pi)
+
+
+def tensor_normal_logcdf(
+    value: pt.TensorVariable,  # type: ignore[name-defined]
+    mu: pt.TensorVariable,  # type: ignore[name-defined]
+    sigma: pt.TensorVariable,  # type: ignore[name-defined]
+) -> pt.TensorVariable:  # type: ignore[name-defined]
+    """
+    Log of the normal distribution function, hardened for reduced precision.
+
+    Notes
+    -----
+    * The lower tail uses the scaled complementary error function and the upper
+      tail uses the complementary error function. Each branch is evaluated on a
+      value clamped to its own side of the switch, so that the unused branch
+      cannot overflow and contaminate the gradient; in float32, `erfcx`
+      overflows at modest values.
+    """
+
+    z = (value - mu) / sigma
+
+    is_lower_tail = pt.lt(z, -1.0)
+
+    lower_z = pt.minimum(z, -1.0)
+    upper_z = pt.maximum(z, -1.0)
+
+    return pt.switch(
+        is_lower_tail,
+        pt.log(pt.erfcx(-lower_z / math.sqrt(2.0)) / 2.0) - lower_z**2 / 2.0,
+        pt.log1p(-pt.erfc(upper_z / math.sqrt(2.0)) / 2.0),
+    )
 
 
 def random(
@@ -101,8 +484,10 @@ def random(
     sigma: npt.NDArray[np.float64] | float,
     sigma_e: npt.NDArray[np.float64] | float,
     rng: np.random.Generator | None = None,
-    size: tuple[int, ...] | None = None,
+    size: int | tuple[int, ...] | None = None,
 ) -> npt.NDArray[np.float64] | float:
+    # the main and early units are drawn separately, rather than through
+    # `race_random`, so that seeded draws are the same as in earlier versions
     if rng is None:
         rng = np.random.default_rng()
 
@@ -111,4 +496,373 @@ def random(
 
     promptness = np.where(later > early, later, early)
 
-    return 1 / promptness
+    return (1 / promptness).astype(pylater.config.float_dtype(), copy=False)
+
+
+def race_random(
+    mu: npt.ArrayLike,
+    sigma: npt.ArrayLike,
+    rng: np.random.Generator | None = None,
+    size: int | tuple[int, ...] | None = None,
+) -> npt.NDArray[np.float64] | float:
+    """
+    Draw reaction times from a race between units, whose parameters are along
+    the last axis.
+    """
+
+    if rng is None:
+        rng = np.random.default_rng()
+
+    mu = np.asarray(mu)
+    sigma = np.asarray(sigma)
+
+    n_units = np.broadcast_shapes(mu.shape, sigma.shape)[-1]
+
+    unit_promptness = rng.normal(
+        loc=mu,
+        scale=sigma,
+        size=(*np.atleast_1d(size), n_units) if size is not None else None,
+    )
+
+    promptness: npt.NDArray[np.float64] = np.max(unit_promptness, axis=-1)
+
+    return (1 / promptness).astype(pylater.config.float_dtype(), copy=False)
+
+
+def numpy_logp(
+    value: npt.ArrayLike,
+    mu: npt.ArrayLike,
+    sigma: npt.ArrayLike,
+    sigma_e: npt.ArrayLike,
+) -> npt.NDArray[np.float64]:
+    """NumPy equivalent of `logp`, for use outside of a PyTensor graph."""
+    return numpy_race_logp(
+        value, *numpy_later_units(mu=mu, sigma=sigma, sigma_e=sigma_e)
+    )
+
+
+def numpy_logcdf(
+    value: npt.ArrayLike,
+    mu: npt.ArrayLike,
+    sigma: npt.ArrayLike,
+    sigma_e: npt.ArrayLike,
+) -> npt.NDArray[np.float64]:
+    """NumPy equivalent of `logcdf`, for use outside of a PyTensor graph."""
+    return numpy_race_logcdf(
+        value, *numpy_later_units(mu=mu, sigma=sigma, sigma_e=sigma_e)
+    )
+
+
+def numpy_race_logp(
+    value: npt.ArrayLike,
+    mu: npt.ArrayLike,
+    sigma: npt.ArrayLike,
+) -> npt.NDArray[np.float64]:
+    """NumPy equivalent of `race_logp`, for use outside of a PyTensor graph."""
+
+    unit_value = np.asarray(value)[..., np.newaxis]
+
+    log_pdfs = normal_logpdf(value=unit_value, mu=mu, sigma=sigma)
+    log_cdfs = normal_logcdf(value=unit_value, mu=mu, sigma=sigma)
+
+    logp: npt.NDArray[np.float64] = scipy.special.logsumexp(
+        log_pdfs + numpy_exclusive_sum(x=log_cdfs),
+        axis=-1,
+    )
+
+    return logp
+
+
+def numpy_race_logcdf(
+    value: npt.ArrayLike,
+    mu: npt.ArrayLike,
+    sigma: npt.ArrayLike,
+) -> npt.NDArray[np.float64]:
+    """NumPy equivalent of `race_logcdf`, for use outside of a PyTensor graph."""
+
+    logcdf: npt.NDArray[np.float64] = np.sum(
+        normal_logcdf(value=np.asarray(value)[..., np.newaxis], mu=mu, sigma=sigma),
+        axis=-1,
+    )
+
+    return logcdf
+
+
+def numpy_logdiffexp(
+    a: npt.ArrayLike,
+    b: npt.ArrayLike,
+) -> npt.NDArray[np.float64]:
+    """NumPy equivalent of `pm.math.logdiffexp`; the log of `exp(a) - exp(b)`."""
+
+    a, b = (np.asarray(a), np.asarray(b))
+
+    # as `log1mexp`, with the form chosen for accuracy on either side of -log(2)
+    x = b - a
+    log1mexp = np.where(
+        x < -math.log(2),
+        np.log1p(-np.exp(np.minimum(x, -math.log(2)))),
+        np.log(-np.expm1(np.maximum(x, -math.log(2)))),
+    )
+
+    logdiffexp: npt.NDArray[np.float64] = a + log1mexp
+
+    return logdiffexp
+
+
+def numpy_later_units(
+    mu: npt.ArrayLike,
+    sigma: npt.ArrayLike,
+    sigma_e: npt.ArrayLike,
+) -> tuple[npt.NDArray[np.float64], npt.NDArray[np.float64]]:
+    """NumPy equivalent of `tensor_later_units`."""
+
+    mu, sigma, sigma_e = np.broadcast_arrays(mu, sigma, sigma_e)
+
+    return (
+        np.stack((mu, np.zeros_like(mu)), axis=-1),
+        np.stack((sigma, sigma_e), axis=-1),
+    )
+
+
+def numpy_exclusive_sum(x: npt.NDArray[np.float64]) -> npt.NDArray[np.float64]:
+    """NumPy equivalent of `tensor_exclusive_sum`."""
+
+    zeros = np.zeros_like(x[..., :1])
+
+    before = np.concatenate((zeros, np.cumsum(x, axis=-1)[..., :-1]), axis=-1)
+    after = np.concatenate(
+        (np.cumsum(x[..., ::-1], axis=-1)[..., -2::-1], zeros),
+        axis=-1,
+    )
+
+    exclusive_sum: npt.NDArray[np.float64] = before + after
+
+    return exclusive_sum
+
+
+def normal_logpdf(
+    value: npt.ArrayLike,
+    mu: npt.ArrayLike,
+    sigma: npt.ArrayLike,
+) -> npt.NDArray[np.float64]:
+    value, mu, sigma = (np.asarray(value), np.asarray(mu), np.asarray(sigma))
+    z = (value - mu) / sigma
+    logpdf: npt.NDArray[np.float64] = (
+        -0.5 * z**2 - np.log(sigma) - 0.5 * np.log(2 * np.pi)
+    )
+    return logpdf
+
+
+def normal_logcdf(
+    value: npt.ArrayLike,
+    mu: npt.ArrayLike,
+    sigma: npt.ArrayLike,
+) -> npt.NDArray[np.float64]:
+    logcdf: npt.NDArray[np.float64] = scipy.special.log_ndtr(
+        (np.asarray(value) - np.asarray(mu)) / np.asarray(sigma)
+    )
+    return logcdf
+
+
+def edges_to_promptness(
+    edges_s: npt.ArrayLike,
+) -> tuple[npt.NDArray[np.float64], npt.NDArray[np.float64]]:
+    """
+    Convert reaction time bin edges into the lower and upper promptness bounds of
+    each bin.
+    """
+
+    edges_s = np.asarray(edges_s, dtype=np.float64)
+
+    if edges_s.ndim != 1 or len(edges_s) < 2:
+        raise ValueError("Bin edges must be a vector with at least two elements")
+
+    if np.any(edges_s < 0) or np.any(np.diff(edges_s) <= 0):
+        raise ValueError("Bin edges must be non-negative and increasing")
+
+    with np.errstate(divide="ignore"):
+        edges_promptness = (1 / edges_s).astype(pylater.config.float_dtype())
+
+    return (edges_promptness[1:], edges_promptness[:-1])
+
+
+def binned_logp(
+    value: pt.TensorVariable,  # type: ignore[name-defined]
+    mu: pt.TensorVariable,  # type: ignore[name-defined]
+    sigma: pt.TensorVariable,  # type: ignore[name-defined]
+    sigma_e: pt.TensorVariable,  # type: ignore[name-defined]
+    lower_promptness: pt.TensorVariable,  # type: ignore[name-defined]
+    upper_promptness: pt.TensorVariable,  # type: ignore[name-defined]
+    n_trials: pt.TensorVariable,  # type: ignore[name-defined]  # noqa: ARG001
+) -> pt.TensorVariable:  # type: ignore[name-defined]
+
+    # an empty bin does not contribute, but its log probability can still be -inf
+    # (e.g. a narrow bin far in a tail), which gives a NaN gradient even though
+    # its branch of the switch below is not taken; evaluate empty bins over a
+    # range that always has some probability instead
+    is_empty = pt.le(value, 0)
+    lower_promptness = pt.switch(is_empty, mu - sigma, lower_promptness)
+    upper_promptness = pt.switch(is_empty, mu + sigma, upper_promptness)
+
+    # a bin that starts at a reaction time of zero has an infinite upper bound in
+    # promptness; substitute a finite value so that the gradient is well-defined
+    is_unbounded = pt.isinf(upper_promptness)
+    finite_upper_promptness = pt.switch(
+        is_unbounded, lower_promptness + 1, upper_promptness
+    )
+
+    upper_logcdf = pt.switch(
+        is_unbounded,
+        0.0,
+        logcdf(value=finite_upper_promptness, mu=mu, sigma=sigma, sigma_e=sigma_e),
+    )
+    lower_logcdf = logcdf(value=lower_promptness, mu=mu, sigma=sigma, sigma_e=sigma_e)
+
+    bin_logp = pm.math.logdiffexp(upper_logcdf, lower_logcdf)
+
+    return pt.switch(pt.gt(value, 0), value * bin_logp, 0.0)
+
+
+def binned_random(
+    mu: npt.NDArray[np.float64] | float,
+    sigma: npt.NDArray[np.float64] | float,
+    sigma_e: npt.NDArray[np.float64] | float,
+    lower_promptness: npt.NDArray[np.float64],
+    upper_promptness: npt.NDArray[np.float64],
+    n_trials: npt.NDArray[np.int64] | int,
+    rng: np.random.Generator | None = None,
+    size: tuple[int, ...] | None = None,
+) -> npt.NDArray[np.int64]:
+    if rng is None:
+        rng = np.random.default_rng()
+
+    mu, sigma, sigma_e, lower_promptness, upper_promptness = np.broadcast_arrays(
+        mu, sigma, sigma_e, lower_promptness, upper_promptness
+    )
+
+    if size is not None:
+        mu, sigma, sigma_e, lower_promptness, upper_promptness = (
+            np.broadcast_to(param, size)
+            for param in (mu, sigma, sigma_e, lower_promptness, upper_promptness)
+        )
+
+    bin_p = np.exp(
+        numpy_logcdf(value=upper_promptness, mu=mu, sigma=sigma, sigma_e=sigma_e)
+    ) - np.exp(
+        numpy_logcdf(value=lower_promptness, mu=mu, sigma=sigma, sigma_e=sigma_e)
+    )
+
+    # the probability mass outside of the bins
+    outside_p = np.clip(1 - np.sum(bin_p, axis=-1, keepdims=True), 0, 1)
+
+    # each element of a batch has its own number of trials
+    counts: npt.NDArray[np.int64] = rng.multinomial(
+        n=np.broadcast_to(n_trials, bin_p.shape[:-1]),
+        pvals=np.concatenate((bin_p, outside_p), axis=-1),
+    )[..., :-1]
+
+    return counts
+
+
+def censor_bounds_to_promptness(
+    censor_lower_s: float | None,
+    censor_upper_s: float | None,
+) -> npt.NDArray[np.float64]:
+    """
+    Convert reaction time censoring bounds into promptness bounds.
+
+    Notes
+    -----
+    * A missing lower bound is an infinite promptness, beyond which there is no
+      probability. A missing upper bound is an infinite reaction time (a
+      promptness of zero), beyond which are the trials without a response.
+    """
+
+    lower_s, upper_s = (
+        np.float64(bound_s) if bound_s is not None else default_s
+        for (bound_s, default_s) in ((censor_lower_s, 0.0), (censor_upper_s, np.inf))
+    )
+
+    if lower_s < 0 or lower_s >= upper_s:
+        raise ValueError("Censoring bounds must be non-negative and increasing")
+
+    with np.errstate(divide="ignore"):
+        bound_promptness = (1 / np.array([lower_s, upper_s])).astype(
+            pylater.config.float_dtype()
+        )
+
+    return bound_promptness
+
+
+def censored_logp(
+    value: pt.TensorVariable,  # type: ignore[name-defined]
+    mu: pt.TensorVariable,  # type: ignore[name-defined]
+    sigma: pt.TensorVariable,  # type: ignore[name-defined]
+    sigma_e: pt.TensorVariable,  # type: ignore[name-defined]
+    bound_promptness: pt.TensorVariable,  # type: ignore[name-defined]
+    is_above: pt.TensorVariable,  # type: ignore[name-defined]
+    n_trials: pt.TensorVariable,  # type: ignore[name-defined]  # noqa: ARG001
+) -> pt.TensorVariable:  # type: ignore[name-defined]
+
+    # a missing lower bound has an infinite promptness; substitute a finite value
+    # so that the gradient is well-defined
+    is_unbounded = pt.isinf(bound_promptness)
+    finite_bound_promptness = pt.switch(is_unbounded, 1.0, bound_promptness)
+
+    bound_logcdf = logcdf(
+        value=finite_bound_promptness, mu=mu, sigma=sigma, sigma_e=sigma_e
+    )
+
+    bound_logp = pt.switch(
+        is_unbounded,
+        -np.inf,
+        pt.switch(is_above, pt.log1mexp(bound_logcdf), bound_logcdf),
+    )
+
+    return pt.switch(pt.gt(value, 0), value * bound_logp, 0.0)
+
+
+def censored_random(
+    mu: npt.NDArray[np.float64] | float,
+    sigma: npt.NDArray[np.float64] | float,
+    sigma_e: npt.NDArray[np.float64] | float,
+    bound_promptness: npt.NDArray[np.float64],
+    is_above: npt.NDArray[np.bool_],
+    n_trials: npt.NDArray[np.int64] | int,
+    rng: np.random.Generator | None = None,
+    size: tuple[int, ...] | None = None,
+) -> npt.NDArray[np.int64]:
+    if rng is None:
+        rng = np.random.default_rng()
+
+    shape = (
+        size
+        if size is not None
+        else np.broadcast_shapes(
+            *(np.shape(param) for param in (mu, sigma, sigma_e, bound_promptness))
+        )
+    )
+
+    mu_b, sigma_b, sigma_e_b, bound_promptness_b = (
+        np.broadcast_to(np.asarray(param), shape)
+        for param in (mu, sigma, sigma_e, bound_promptness)
+    )
+
+    bound_cdf = np.exp(
+        numpy_logcdf(
+            value=bound_promptness_b, mu=mu_b, sigma=sigma_b, sigma_e=sigma_e_b
+        )
+    )
+
+    bound_p = np.where(np.broadcast_to(is_above, shape), 1 - bound_cdf, bound_cdf)
+
+    # the probability mass within the bounds
+    within_p = np.clip(1 - np.sum(bound_p, axis=-1, keepdims=True), 0, 1)
+
+    # each element of a batch has its own number of trials
+    counts: npt.NDArray[np.int64] = rng.multinomial(
+        n=np.broadcast_to(n_trials, bound_p.shape[:-1]),
+        pvals=np.concatenate((bound_p, within_p), axis=-1),
+    )[..., :-1]
+
+    return counts
@@ -0,0 +1,29 @@
+from __future__ import annotations
+
+import os
+import pathlib
+import typing
+
+
+def write_atomic(
+    path: pathlib.Path,
+    write: typing.Callable[[typing.BinaryIO], object],
+) -> None:
+    """
+    Write a file such that it is either complete or absent, even if interrupted.
+
+    Parameters
+    ----------
+    path
+        Path to the file.
+    write
+        Function that writes the contents to an open (binary) file; it is given
+        a temporary file, which replaces `path` once it has been written.
+    """
+
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+
+    with tmp_path.open("wb") as file:
+        write(file)
+
+    tmp_path.replace(path)
@@ -0,0 +1,520 @@
+from __future__ import annotations
+
+import enum
+import typing
+
+import numpy as np
+import numpy.typing as npt
+
+import scipy.optimize
+import scipy.special
+import scipy.stats
+
+import arviz as az
+
+import pymc as pm
+
+import pylater.instrument
+
+
+def sample(
+    model: pm.Model,
+    **kwargs: object,
+) -> az.data.inference_data.InferenceData:
+    """
+    Draw samples from the posterior distribution of a model.
+
+    Parameters
+    ----------
+    model
+        The PyMC model.
+    **kwargs
+        Additional arguments are passed directly to `pm.sample`.
+
+    Returns
+    -------
+    az.data.inference_data.InferenceData
+        Inference data object containing the posterior samples.
+    """
+
+    with pylater.instrument.phase("sample", n_free=len(model.free_RVs)):
+        idata: az.data.inference_data.InferenceData = pm.sample(model=model, **kwargs)
+        pylater.instrument.annotate(n_posterior=group_size(idata, "posterior"))
+
+    return idata
+
+
+def sample_prior_predictive(
+    model: pm.Model,
+    **kwargs: object,
+) -> az.data.inference_data.InferenceData:
+    """
+    Draw samples from the prior and prior predictive distributions of a model.
+
+    Parameters
+    ----------
+    model
+        The PyMC model.
+    **kwargs
+        Additional arguments are passed directly to `pm.sample_prior_predictive`.
+
+    Returns
+    -------
+    az.data.inference_data.InferenceData
+        Inference data object containing the prior and prior predictive samples.
+    """
+
+    with pylater.instrument.phase("sample_prior_predictive"):
+        idata: az.data.inference_data.InferenceData = pm.sample_prior_predictive(
+            model=model, **kwargs
+        )
+        pylater.instrument.annotate(
+            n_prior_predictive=group_size(idata, "prior_predictive")
+        )
+
+    return idata
+
+
+def sample_posterior_predictive(
+    idata: az.data.inference_data.InferenceData,
+    model: pm.Model,
+    **kwargs: object,
+) -> az.data.inference_data.InferenceData:
+    """
+    Draw samples from the posterior predictive distribution of a model.
+
+    Parameters
+    ----------
+    idata
+        Inference data object containing posterior samples.
+    model
+        The PyMC model.
+    **kwargs
+        Additional arguments are passed directly to `pm.sample_posterior_predictive`.
+
+    Returns
+    -------
+    az.data.inference_data.InferenceData
+        Inference data object containing the posterior predictive samples.
+    """
+
+    with pylater.instrument.phase(
+        "sample_posterior_predictive",
+        n_posterior=group_size(idata, "posterior"),
+    ):
+        pp_idata: az.data.inference_data.InferenceData = pm.sample_posterior_predictive(
+            trace=idata, model=model, **kwargs
+        )
+        pylater.instrument.annotate(
+            n_posterior_predictive=group_size(pp_idata, "posterior_predictive")
+        )
+
+    return pp_idata
+
+
+def compute_log_likelihood(
+    idata: az.data.inference_data.InferenceData,
+    model: pm.Model,
+    **kwargs: object,
+) -> az.data.inference_data.InferenceData:
+    """
+    Compute the pointwise log-likelihood of the observations for each posterior
+    sample.
+
+    Parameters
+    ----------
+    idata
+        Inference data object containing posterior samples.
+    model
+        The PyMC model.
+    **kwargs
+        Additional arguments are passed directly to `pm.compute_log_likelihood`.
+
+    Returns
+    -------
+    az.data.inference_data.InferenceData
+        Inference data object containing the log-likelihood values.
+    """
+
+    with pylater.instrument.phase(
+        "compute_log_likelihood",
+        n_posterior=group_size(idata, "posterior"),
+    ):
+        ll_idata: az.data.inference_data.InferenceData = pm.compute_log_likelihood(
+            idata=idata, model=model, **kwargs
+        )
+        pylater.instrument.annotate(
+            n_log_likelihood=group_size(ll_idata, "log_likelihood")
+        )
+
+    return ll_idata
+
+
+class ApproximationType(enum.Enum):
+    LAPLACE = "laplace"
+    ADVI = "advi"
+    FULLRANK_ADVI = "fullrank_advi"
+
+
+# threshold on the Pareto shape parameter above which importance sampling
+# estimates are unreliable (Vehtari et al., 2024)
+PARETO_K_THRESHOLD = 0.7
+
+
+def approximate(
+    model: pm.Model,
+    method: str = "laplace",
+    n_draws: int = 1000,
+    n_iterations: int = 10_000,
+    importance_resample: bool = True,
+    log_likelihood: bool = True,
+    random_seed: int | None = None,
+    **kwargs: object,
+) -> az.data.inference_data.InferenceData:
+    """
+    Approximate the posterior distribution of a model with a multivariate normal
+    distribution on the unconstrained parameter space.
+
+    Parameters
+    ----------
+    model
+        The PyMC model.
+    method
+        Either `laplace` (a normal approximation centred on the posterior mode,
+        with covariance from the curvature at that point),
+        `advi` (mean-field variational inference), or `fullrank_advi` (full-rank
+        variational inference).
+    n_draws
+        Number of samples to draw from the approximation.
+    n_iterations
+        Maximum number of optimisation iterations for the variational methods.
+    importance_resample
+        Whether to resample the draws according to their Pareto-smoothed
+        importance weights, which corrects for some of the approximation error.
+    log_likelihood
+        Whether to compute the pointwise log-likelihood, as needed by
+        `combine_multiple_likelihoods`.
+    random_seed
+        Seed for the random number generator.
+    **kwargs
+        Additional arguments are passed directly to `pm.fit`, for the variational
+        methods.
+
+    Returns
+    -------
+    az.data.inference_data.InferenceData
+        Inference data object containing the posterior samples (as a single
+        chain) and, optionally, the log-likelihood. The `sample_stats` group
+        contains the (normalised) importance log-weight of each draw, which is
+        the same for all draws if they were resampled, and has attributes
+        `pareto_k` and `needs_full_fit`.
+
+    Notes
+    -----
+    * The draws from the approximation are used as proposals for importance
+      sampling of the posterior, and the shape parameter (`k`) of a Pareto
+      distribution fitted to the tail of the importance weights is a diagnostic of
+      the quality of the approximation. Values above 0.7 (`needs_full_fit`)
+      indicate that the approximation is not reliable and that the posterior
+      should be sampled using `sample`.
+    * The approximations are centred on (`laplace`) or initialised at (the
+      variational methods) the mode of the posterior density on the
+      unconstrained parameter space, which is found by optimisation from the
+      model's initial point (or from `start`, if provided). The variational
+      methods use the Adam optimiser unless `obj_optimizer` is provided.
+    * The curvature for `laplace` is calculated from differences of the
+      gradient of the log density, which is much faster to compile than its
+      symbolic second derivatives.
+    * Pathfinder is not available in the core PyMC package.
+    """
+
+    approx_type = ApproximationType(method)
+
+    rng = np.random.default_rng(random_seed)
+
+    with pylater.instrument.phase("approximate", n_free=len(model.free_RVs)):
+
+        initial_point = pm.initial_point.make_initial_point_fn(
+            model=model,
+            overrides=kwargs.pop("start", None),
+            jitter_rvs=set(),
+            return_transformed=True,
+        )(random_seed)
+
+        ordering = {}
+        i_start = 0
+
+        for value_var in model.value_vars:
+            shape = np.shape(initial_point[value_var.name])
+            var_slice = slice(i_start, i_start + int(np.prod(shape)))
+            ordering[value_var.name] = (var_slice, shape)
+            i_start = var_slice.stop
+
+        def to_point(
+            flat_point: npt.NDArray[np.float64],
+        ) -> dict[str, npt.NDArray[np.float64]]:
+            return {
+                name: flat_point[var_slice].reshape(shape)
+                for (name, (var_slice, shape)) in ordering.items()
+            }
+
+        # a single function provides the log density and its gradient for finding
+        # the mode, for the curvature at the mode, and for the importance weights;
+        # compiling these separately (and the symbolic Hessian, in particular) is
+        # much slower
+        logp_dlogp_func = model.compile_fn(
+            outs=[
+                model.logp(jacobian=True),
+                model.dlogp(vars=model.free_RVs, jacobian=True),
+            ],
+            inputs=model.value_vars,
+            on_unused_input="ignore",
+        )
+
+        def neg_logp_dlogp(
+            flat_point: npt.NDArray[np.float64],
+        ) -> tuple[float, npt.NDArray[np.float64]]:
+            logp, dlogp = logp_dlogp_func(to_point(flat_point=flat_point))
+            return (-float(logp), -np.asarray(dlogp, dtype=np.float64))
+
+        # the mode of the density on the unconstrained space
+        mode = scipy.optimize.minimize(
+            fun=neg_logp_dlogp,
+            x0=np.concatenate(
+                [np.ravel(initial_point[name]) for name in ordering]
+            ).astype(np.float64),
+            jac=True,
+            method="L-BFGS-B",
+        ).x
+
+        if approx_type is ApproximationType.LAPLACE:
+
+            mean = mode
+
+            hessian = finite_difference_hessian(
+                gradient_func=lambda flat_point: -neg_logp_dlogp(flat_point)[1],
+                point=mean,
+            )
+
+            cov = np.linalg.inv(-hessian)
+
+        else:
+
+            kwargs.setdefault("obj_optimizer", pm.adam(learning_rate=0.01))
+
+            approx = pm.fit(
+                n=n_iterations,
+                method=approx_type.value,
+                model=model,
+                random_seed=random_seed,
+                start=to_point(flat_point=mode),
+                progressbar=False,
+                **kwargs,
+            )
+
+            (group,) = approx.groups
+
+            ordering = {
+                name: (var_slice, shape)
+                for (name, var_slice, shape, _) in group.ordering.values()
+            }
+
+            mean = group.mean.eval()
+            cov = np.atleast_2d(group.cov.eval())
+
+        # ensure symmetry in the presence of numerical error
+        cov = (cov + cov.T) / 2
+
+        flat_draws = rng.multivariate_normal(mean=mean, cov=cov, size=n_draws)
+
+        log_q = scipy.stats.multivariate_normal.logpdf(
+            x=flat_draws,
+            mean=mean,
+            cov=cov,
+            allow_singular=True,
+        )
+
+        points = [to_point(flat_point=flat_draw) for flat_draw in flat_draws]
+
+        log_p = np.array([logp_dlogp_func(point)[0] for point in points])
+
+        log_weights, pareto_k = az.psislw(log_p - log_q)
+
+        if importance_resample:
+            i_draws = rng.choice(
+                n_draws,
+                size=n_draws,
+                p=np.exp(log_weights - scipy.special.logsumexp(log_weights)),
+            )
+            points = [points[i_draw] for i_draw in i_draws]
+            # the resampled draws follow the posterior, and so are equally weighted
+            log_weights = np.full(n_draws, -np.log(n_draws))
+
+        idata = points_to_idata(model=model, points=points)
+
+        idata.add_groups(
+            sample_stats={"log_weight": np.asarray(log_weights)[np.newaxis, :]},
+        )
+
+        pareto_k = float(pareto_k)
+
+        assert hasattr(idata, "sample_stats")
+
+        idata.sample_stats.attrs["method"] = approx_type.value
+        idata.sample_stats.attrs["pareto_k"] = pareto_k
+        idata.sample_stats.attrs["needs_full_fit"] = int(pareto_k > PARETO_K_THRESHOLD)
+
+        pylater.instrument.annotate(n_posterior=group_size(idata, "posterior"))
+
+    if log_likelihood:
+        compute_log_likelihood(idata=idata, model=model, progressbar=False)
+
+    return idata
+
+
+def finite_difference_hessian(
+    gradient_func: typing.Callable[[npt.NDArray[np.float64]], npt.NDArray[np.float64]],
+    point: npt.NDArray[np.float64],
+    relative_step: float = 1e-5,
+) -> npt.NDArray[np.float64]:
+    """
+    Calculate the Hessian matrix of a function from central differences of its
+    gradient.
+
+    Parameters
+    ----------
+    gradient_func
+        Function that returns the gradient at a point.
+    point
+        Point at which to calculate the Hessian.
+    relative_step
+        Size of the difference step, relative to the magnitude of each element
+        of `point` (or one, if larger).
+
+    Returns
+    -------
+    npt.NDArray[np.float64]
+        The (symmetric) Hessian matrix.
+    """
+
+    n_dims = len(point)
+
+    steps = relative_step * np.maximum(1.0, np.abs(point))
+
+    hessian = np.empty((n_dims, n_dims))
+
+    for i_dim in range(n_dims):
+        delta = np.zeros(n_dims)
+        delta[i_dim] = steps[i_dim]
+        hessian[:, i_dim] = (
+            gradient_func(point + delta) - gradient_func(point - delta)
+        ) / (2 * steps[i_dim])
+
+    symmetric_hessian: npt.NDArray[np.float64] = (hessian + hessian.T) / 2
+
+    return symmetric_hessian
+
+
+def needs_full_fit(idata: az.data.inference_data.InferenceData) -> bool:
+    """
+    Whether an approximate posterior from `approximate` is unreliable and the
+    posterior should instead be sampled with `sample`.
+
+    Parameters
+    ----------
+    idata
+        Inference data object returned by `approximate`.
+
+    Returns
+    -------
+    bool
+        Whether the Pareto `k` diagnostic exceeds 0.7.
+    """
+    assert hasattr(idata, "sample_stats")
+    return bool(idata.sample_stats.attrs["pareto_k"] > PARETO_K_THRESHOLD)
+
+
+def points_to_idata(
+    model: pm.Model,
+    points: list[dict[str, npt.NDArray[np.float64]]],
+) -> az.data.inference_data.InferenceData:
+    """
+    Convert points on the unconstrained (transformed) space of a model into an
+    inference data object with a single chain, containing the free and
+    deterministic variables on their original scales.
+
+    Parameters
+    ----------
+    model
+        The PyMC model.
+    points
+        Values of the model's value variables, one dictionary per draw.
+
+    Returns
+    -------
+    az.data.inference_data.InferenceData
+        Inference data object containing the posterior samples.
+    """
+
+    output_names = [rv.name for rv in model.unobserved_RVs]
+
+    value_vars = [
+        value_var
+        for value_var in model.unobserved_value_vars
+        if value_var.name in output_names
+    ]
+
+    output_func = model.compile_fn(
+        outs=value_vars,
+        inputs=model.value_vars,
+        on_unused_input="ignore",
+    )
+
+    outputs = [output_func(point) for point in points]
+
+    posterior = {
+        value_var.name: np.stack([output[i_var] for output in outputs])[np.newaxis, ...]
+        for (i_var, value_var) in enumerate(value_vars)
+    }
+
+    idata: az.data.inference_data.InferenceData = az.from_dict(
+        posterior=posterior,
+        coords={
+            coord_name: list(coord_values)
+            for (coord_name, coord_values) in model.coords.items()
+            if coord_values is not None
+        },
+        dims={
+            var_name: list(model.named_vars_to_dims[var_name])
+            for var_name in posterior
+            if var_name in model.named_vars_to_dims
+        },
+    )
+
+    return idata
+
+
+def group_size(
+    idata: az.data.inference_data.InferenceData,
+    group: str,
+) -> int:
+    """
+    Count the number of elements across all variables in a group.
+
+    Parameters
+    ----------
+    idata
+        Inference data object.
+    group
+        Name of the group.
+
+    Returns
+    -------
+    int
+        The total number of elements, or zero if the group is not present.
+    """
+
+    if not hasattr(idata, group):
+        return 0
+
+    return sum(int(data_var.size) for data_var in getattr(idata, group).values())
@@ -0,0 +1,431 @@
+from __future__ import annotations
+
+import enum
+import typing
+
+import numpy as np
+import numpy.typing as npt
+
+import xarray as xr
+
+import arviz as az
+
+import pylater.data
+import pylater.dist
+import pylater.instrument
+
+
+class GOFSource(enum.Enum):
+    LOGCDF = "logcdf"
+    PREDICTIVE = "predictive"
+
+
+# the names of the goodness-of-fit statistics, as variables in the results
+STAT_NAMES = ("ks_statistic", "anderson_darling", "band_coverage")
+
+
+@pylater.instrument.instrumented("goodness_of_fit")
+def goodness_of_fit(
+    idata: az.data.inference_data.InferenceData,
+    datasets: typing.Sequence[pylater.data.Dataset | pylater.data.BinnedDataset],
+    source: str = "logcdf",
+    ci_range: float = 0.95,
+    chunk_size: int = 100,
+) -> xr.Dataset:
+    """
+    Evaluate how well the posterior describes each observed dataset, using
+    statistics that compare each dataset's empirical distribution function with
+    those of the posterior draws.
+
+    Parameters
+    ----------
+    idata
+        Inference data object containing posterior samples (for `logcdf`) or
+        posterior predictive samples (for `predictive`), from a model built with
+        `build_default_model`.
+    datasets
+        The observed datasets; these are matched to the posterior by name.
+    source
+        Compare each dataset with either the distribution function of each
+        posterior draw of the parameters (`logcdf`) or the empirical distribution
+        function of each posterior predictive draw (`predictive`).
+    ci_range
+        Width of the pointwise interval of the posterior distribution functions
+        that is used for the band coverage.
+    chunk_size
+        Number of draws to evaluate at a time; the memory required is proportional
+        to this value multiplied by the total number of trials.
+
+    Returns
+    -------
+    xr.Dataset
+        The statistics for each dataset, over a `dataset` dimension:
+        `ks_statistic`, the Kolmogorov-Smirnov statistic (the maximum absolute
+        difference between the distribution functions), and `anderson_darling`,
+        the Anderson-Darling statistic (which is more sensitive to differences in
+        the tails), each averaged over draws; and `band_coverage`, the proportion
+        of observations at which the empirical distribution function is within
+        the pointwise `ci_range` interval of the draws.
+
+    Notes
+    -----
+    * Only datasets of individual reaction times (`Dataset`) without censoring
+      are supported.
+    * Responses that never occur (a negative reaction time in the predictive
+      draws) count as not having occurred by any time.
+    * The band from `predictive` draws includes sampling variability, so a
+      well-described dataset has a band coverage close to `ci_range`. The band
+      from `logcdf` draws only reflects uncertainty in the parameters, so the
+      coverage is typically lower.
+    """
+
+    gof_source = GOFSource(source)
+
+    if chunk_size < 1:
+        msg = "The chunk size must be at least one"
+        raise ValueError(msg)
+
+    for dataset in datasets:
+        if not isinstance(dataset, pylater.data.Dataset):
+            msg = f"Dataset {dataset.name} does not contain individual reaction times"
+            raise ValueError(msg)
+        if dataset.is_censored:
+            msg = f"Dataset {dataset.name} is censored, which is not supported"
+            raise ValueError(msg)
+
+    observed = stack_observations(
+        datasets=[
+            dataset for dataset in datasets if isinstance(dataset, pylater.data.Dataset)
+        ]
+    )
+
+    dataset_names = [dataset.name for dataset in datasets]
+
+    if gof_source is GOFSource.LOGCDF:
+        draws = posterior_params(idata=idata, dataset_names=dataset_names)
+        n_draws = len(draws["mu"])
+    else:
+        draws = {"rt_s": predictive_rt_s(idata=idata, dataset_names=dataset_names)}
+        n_draws = len(draws["rt_s"])
+
+    pylater.instrument.annotate(
+        n_datasets=len(datasets),
+        n_draws=n_draws,
+        n_trials=int(np.sum(observed["n_trials"])),
+    )
+
+    totals = {stat_name: np.zeros(len(datasets)) for stat_name in STAT_NAMES[:2]}
+
+    # number of draws with a distribution function below, and equal to, the
+    # empirical distribution function, at each observation
+    n_below = np.zeros(observed["rt_s"].shape)
+    n_equal = np.zeros(observed["rt_s"].shape)
+
+    for i_start in range(0, n_draws, chunk_size):
+
+        chunk = {
+            name: values[i_start : i_start + chunk_size]
+            for (name, values) in draws.items()
+        }
+
+        log_cdf, log_sf = (
+            logcdf_chunk(observed=observed, draws=chunk)
+            if gof_source is GOFSource.LOGCDF
+            else predictive_chunk(observed=observed, draws=chunk)
+        )
+
+        cdf = np.exp(log_cdf)
+
+        totals["ks_statistic"] += np.sum(
+            ks_statistic(observed=observed, cdf=cdf), axis=0
+        )
+        totals["anderson_darling"] += np.sum(
+            anderson_darling(observed=observed, log_cdf=log_cdf, log_sf=log_sf),
+            axis=0,
+        )
+
+        n_below += np.sum(cdf < observed["ecdf_p"], axis=0)
+        n_equal += np.sum(cdf == observed["ecdf_p"], axis=0)
+
+    # the proportion of draws below the empirical distribution function, with
+    # ties split evenly
+    rank = (n_below + n_equal / 2) / n_draws
+
+    lower_q = (1 - ci_range) / 2
+    in_band = (rank >= lower_q) & (rank <= 1 - lower_q)
+
+    band_coverage = (
+        np.sum(in_band & observed["is_valid"], axis=-1) / observed["n_trials"]
+    )
+
+    return xr.Dataset(
+        data_vars={
+            "ks_statistic": ("dataset", totals["ks_statistic"] / n_draws),
+            "anderson_darling": ("dataset", totals["anderson_darling"] / n_draws),
+            "band_coverage": ("dataset", band_coverage),
+            "n_trials": ("dataset", observed["n_trials"]),
+        },
+        coords={"dataset": dataset_names},
+        attrs={"source": gof_source.value, "ci_range": ci_range, "n_draws": n_draws},
+    )
+
+
+def evaluate_ecdfs(
+    samples: npt.ArrayLike,
+    x: npt.ArrayLike,
+) -> npt.NDArray[np.float64]:
+    """
+    Evaluate empirical cumulative distribution functions, vectorised across many
+    sets of samples.
+
+    Parameters
+    ----------
+    samples
+        Samples, with the samples of each distribution function along the last
+        axis. Missing (NaN) samples are ignored.
+    x
+        Values at which to evaluate each function, along the last axis; the other
+        axes are broadcast against those of `samples`.
+
+    Returns
+    -------
+    npt.NDArray[np.float64]
+        The cumulative probabilities, with the broadcast shape of the leading axes
+        and the length of the last axis of `x`.
+    """
+
+    samples = np.asarray(samples, dtype=np.float64)
+    x = np.asarray(x, dtype=np.float64)
+
+    shape = np.broadcast_shapes(samples.shape[:-1], x.shape[:-1])
+
+    samples = np.broadcast_to(samples, (*shape, samples.shape[-1]))
+    x = np.broadcast_to(x, (*shape, x.shape[-1]))
+
+    n_samples = samples.shape[-1]
+
+    # merge each set of samples with its evaluation points; the stable sort keeps
+    # samples that are equal to an evaluation point before it, so the running
+    # count of samples at each evaluation point is the number that are less than
+    # or equal to it
+    combined = np.concatenate((samples, x), axis=-1)
+    is_sample = np.arange(combined.shape[-1]) < n_samples
+
+    order = np.argsort(combined, axis=-1, kind="stable")
+
+    n_at_or_below = np.empty(combined.shape)
+    np.put_along_axis(
+        n_at_or_below,
+        order,
+        np.cumsum(is_sample[order], axis=-1),
+        axis=-1,
+    )
+
+    n_valid = np.sum(~np.isnan(samples), axis=-1, keepdims=True)
+
+    ecdf_p: npt.NDArray[np.float64] = n_at_or_below[..., n_samples:] / n_valid
+
+    return ecdf_p
+
+
+def stack_observations(
+    datasets: typing.Sequence[pylater.data.Dataset],
+) -> dict[str, npt.NDArray[typing.Any]]:
+    """
+    Arrange the sorted observations of datasets into padded arrays.
+
+    Returns
+    -------
+    dict[str, npt.NDArray]
+        The sorted reaction times (`rt_s`), the empirical distribution function at
+        each (`ecdf_p`), the rank of each observation, from one (`rank`), and
+        whether each element is an observation rather than padding (`is_valid`),
+        each with shape (datasets, trials); and the number of trials in each
+        dataset (`n_trials`).
+    """
+
+    n_trials = np.array([dataset.n_trials for dataset in datasets])
+
+    shape = (len(datasets), int(np.max(n_trials)))
+
+    rt_s = np.full(shape, np.nan)
+    ecdf_p = np.zeros(shape)
+
+    for i_dataset, dataset in enumerate(datasets):
+        sorted_rt_s = np.sort(dataset.rt_s)
+        rt_s[i_dataset, : dataset.n_trials] = sorted_rt_s
+        ecdf_p[i_dataset, : dataset.n_trials] = dataset.evaluate_ecdf(rt_s=sorted_rt_s)
+
+    rank = np.arange(1, shape[1] + 1)[np.newaxis, :]
+
+    return {
+        "rt_s": rt_s,
+        "ecdf_p": ecdf_p,
+        "rank": rank,
+        "is_valid": rank <= n_trials[:, np.newaxis],
+        "n_trials": n_trials,
+    }
+
+
+def posterior_params(
+    idata: az.data.inference_data.InferenceData,
+    dataset_names: list[str],
+) -> dict[str, npt.NDArray[np.float64]]:
+    """
+    Extract the LATER parameters of each posterior draw, with shape (draws,
+    datasets).
+    """
+
+    posterior: xr.Dataset = az.extract(data=idata, group="posterior", combined=True)
+
+    params = {}
+
+    for param_name in ("mu", "sigma", "sigma_e"):
+
+        values = posterior[param_name]
+
+        # parameters that are shared in a 'shift' or 'swivel' arrangement
+        if "shared" in values.dims:
+            values = values.squeeze(dim="shared", drop=True)
+
+        if "dataset" in values.dims:
+            values = values.sel(dataset=dataset_names)
+        else:
+            values = values.expand_dims(dim={"dataset": len(dataset_names)})
+
+        params[param_name] = values.transpose("sample", "dataset").values
+
+    return params
+
+
+def predictive_rt_s(
+    idata: az.data.inference_data.InferenceData,
+    dataset_names: list[str],
+) -> npt.NDArray[np.float64]:
+    """
+    Extract the reaction times of each posterior predictive draw, with shape
+    (draws, datasets, trials) and padded with NaN.
+    """
+
+    predictive: xr.Dataset = az.extract(
+        data=idata,
+        group="posterior_predictive",
+        combined=True,
+        keep_dataset=True,
+    )
+
+    draws = [
+        predictive[f"obs_{dataset_name}"].transpose("sample", ...).values
+        for dataset_name in dataset_names
+    ]
+
+    rt_s = np.full(
+        (len(draws[0]), len(draws), max(draw.shape[-1] for draw in draws)),
+        np.nan,
+    )
+
+    for i_dataset, draw in enumerate(draws):
+        rt_s[:, i_dataset, : draw.shape[-1]] = draw
+
+    # a negative promptness is a response that never occurs
+    return np.where(rt_s < 0, np.inf, rt_s)
+
+
+def logcdf_chunk(
+    observed: dict[str, npt.NDArray[typing.Any]],
+    draws: dict[str, npt.NDArray[np.float64]],
+) -> tuple[npt.NDArray[np.float64], npt.NDArray[np.float64]]:
+    """
+    Evaluate the logarithm of the distribution and survival functions of each
+    posterior draw at the observations, with shape (draws, datasets, trials).
+    """
+
+    mu, sigma, sigma_e = (
+        draws[param_name][..., np.newaxis] for param_name in ("mu", "sigma", "sigma_e")
+    )
+
+    # a reaction time has not occurred if the promptness is below its inverse
+    log_sf = pylater.dist.numpy_logcdf(
+        value=1 / observed["rt_s"][np.newaxis, ...],
+        mu=mu,
+        sigma=sigma,
+        sigma_e=sigma_e,
+    )
+
+    with np.errstate(divide="ignore"):
+        log_cdf = np.log(-np.expm1(log_sf))
+
+    return (log_cdf, log_sf)
+
+
+def predictive_chunk(
+    observed: dict[str, npt.NDArray[typing.Any]],
+    draws: dict[str, npt.NDArray[np.float64]],
+) -> tuple[npt.NDArray[np.float64], npt.NDArray[np.float64]]:
+    """
+    Evaluate the logarithm of the empirical distribution and survival functions
+    of each posterior predictive draw at the observations, with shape (draws,
+    datasets, trials).
+    """
+
+    rt_s = draws["rt_s"]
+
+    cdf = evaluate_ecdfs(samples=rt_s, x=observed["rt_s"][np.newaxis, ...])
+
+    # keep away from zero and one, as for a continuous distribution function
+    # estimated from the draws
+    n_samples = np.sum(~np.isnan(rt_s), axis=-1, keepdims=True)
+    cdf = np.clip(cdf, 0.5 / n_samples, 1 - 0.5 / n_samples)
+
+    return (np.log(cdf), np.log1p(-cdf))
+
+
+def ks_statistic(
+    observed: dict[str, npt.NDArray[typing.Any]],
+    cdf: npt.NDArray[np.float64],
+) -> npt.NDArray[np.float64]:
+    """
+    Evaluate the Kolmogorov-Smirnov statistic of each draw and dataset.
+    """
+
+    n_trials = observed["n_trials"][:, np.newaxis]
+
+    difference = np.maximum(
+        observed["rank"] / n_trials - cdf,
+        cdf - (observed["rank"] - 1) / n_trials,
+    )
+
+    statistic: npt.NDArray[np.float64] = np.max(
+        np.where(observed["is_valid"], difference, -np.inf),
+        axis=-1,
+    )
+
+    return statistic
+
+
+def anderson_darling(
+    observed: dict[str, npt.NDArray[typing.Any]],
+    log_cdf: npt.NDArray[np.float64],
+    log_sf: npt.NDArray[np.float64],
+) -> npt.NDArray[np.float64]:
+    """
+    Evaluate the Anderson-Darling statistic of each draw and dataset.
+    """
+
+    n_trials = observed["n_trials"][:, np.newaxis]
+    rank = observed["rank"]
+
+    # the usual form, with the second sum re-indexed so that both terms are
+    # evaluated at the same (sorted) observation
+    terms = (2 * rank - 1) * log_cdf + (2 * (n_trials - rank) + 1) * log_sf
+
+    statistic: npt.NDArray[np.float64] = (
+        -observed["n_trials"]
+        - np.sum(
+            np.where(observed["is_valid"], terms, 0.0),
+            axis=-1,
+        )
+        / observed["n_trials"]
+    )
+
+    return statistic
@@ -0,0 +1,431 @@
+from __future__ import annotations
+
+import typing
+
+import numpy as np
+import numpy.typing as npt
+
+import scipy.special
+
+import xarray as xr
+
+import arviz as az
+
+import pylater.data
+import pylater.dist
+import pylater.instrument
+import pylater.model
+import pylater.online
+
+# order of the grid axes
+PARAM_NAMES = pylater.online.PARAM_NAMES
+
+
+class GridPosterior:
+    __slots__ = ("dataset_names", "log_axes", "log_evidence", "log_probability")
+
+    def __init__(
+        self,
+        dataset_names: list[str],
+        log_axes: npt.NDArray[np.float64],
+        log_probability: npt.NDArray[np.float64],
+        log_evidence: npt.NDArray[np.float64],
+    ) -> None:
+        """
+        A posterior distribution evaluated on a grid of parameter values.
+
+        Parameters
+        ----------
+        dataset_names
+            Names of the datasets.
+        log_axes
+            Logarithm of the grid values for each dataset and parameter, with
+            shape (datasets, parameters, points). The parameters are `sigma`, `k`,
+            and `sigma_e_mod`.
+        log_probability
+            Logarithm of the normalised posterior probability of each grid cell,
+            with shape (datasets, points, points, points).
+        log_evidence
+            Estimate of the log marginal likelihood of each dataset.
+        """
+
+        self.dataset_names = dataset_names
+        self.log_axes = log_axes
+        self.log_probability = log_probability
+        self.log_evidence = log_evidence
+
+    def __repr__(self) -> str:
+        return (
+            f"Grid posterior for {len(self.dataset_names)} dataset(s) with "
+            + f"{self.log_axes.shape[-1]} points per parameter"
+        )
+
+    @property
+    def joint(self) -> xr.DataArray:
+        """The posterior probability of each grid cell."""
+        return xr.DataArray(
+            data=np.exp(self.log_probability),
+            dims=("dataset", *(f"{name}_point" for name in PARAM_NAMES)),
+            coords={"dataset": self.dataset_names},
+        )
+
+    def marginal(self, param_name: str) -> xr.Dataset:
+        """
+        Calculate the marginal posterior distribution of a parameter.
+
+        Parameters
+        ----------
+        param_name
+            One of `sigma`, `k`, or `sigma_e_mod`.
+
+        Returns
+        -------
+        xr.Dataset
+            Contains the parameter `value` and its posterior `probability` at each
+            grid point, for each dataset.
+        """
+
+        i_param = PARAM_NAMES.index(param_name)
+
+        other_axes = tuple(
+            i_axis + 1 for i_axis in range(len(PARAM_NAMES)) if i_axis != i_param
+        )
+
+        probability = np.exp(
+            scipy.special.logsumexp(self.log_probability, axis=other_axes)
+        )
+
+        dims = ("dataset", "point")
+
+        return xr.Dataset(
+            data_vars={
+                "value": (dims, np.exp(self.log_axes[:, i_param, :])),
+                "probability": (dims, probability),
+            },
+            coords={"dataset": self.dataset_names},
+        )
+
+    def to_inference_data(
+        self,
+        n_draws: int = 4000,
+        rng: np.random.Generator | int | None = None,
+    ) -> az.data.inference_data.InferenceData:
+        """
+        Draw samples from the grid posterior.
+
+        Parameters
+        ----------
+        n_draws
+            Number of samples to draw for each dataset.
+        rng
+            Random number generator, or a seed for one.
+
+        Returns
+        -------
+        az.data.inference_data.InferenceData
+            Inference data object containing the posterior samples (as a single
+            chain), with the same variables and coordinates as an unshared model
+            from `build_default_model`.
+
+        Notes
+        -----
+        * Samples are drawn from the grid cells in proportion to their
+          probability, and are then jittered uniformly within each cell.
+        """
+
+        rng = np.random.default_rng(rng)
+
+        n_datasets, n_params, n_points = self.log_axes.shape
+
+        log_params = np.empty((n_draws, n_datasets, n_params))
+
+        for i_dataset in range(n_datasets):
+
+            probability = np.exp(self.log_probability[i_dataset].ravel())
+
+            i_cells = rng.choice(
+                probability.size,
+                size=n_draws,
+                p=probability / np.sum(probability),
+            )
+
+            i_points = np.unravel_index(i_cells, shape=(n_points,) * n_params)
+
+            for i_param, i_param_points in enumerate(i_points):
+                param_axis = self.log_axes[i_dataset, i_param]
+                width = param_axis[1] - param_axis[0]
+                log_params[:, i_dataset, i_param] = param_axis[
+                    i_param_points
+                ] + rng.uniform(low=-width / 2, high=width / 2, size=n_draws)
+
+        return pylater.online.params_to_idata(
+            log_params=log_params,
+            dataset_names=self.dataset_names,
+        )
+
+
+@pylater.instrument.instrumented("grid_posterior")
+def grid_posterior(
+    datasets: typing.Sequence[pylater.data.Dataset],
+    n_points: int = 24,
+    n_refinements: int = 3,
+    tail_mass: float = 1e-4,
+    priors: typing.Mapping[str, pylater.model.LogNormalPrior] | None = None,
+    max_chunk_size: int = 2**18,
+) -> GridPosterior:
+    """
+    Evaluate the posterior distribution of independent LATER models for each
+    dataset on an adaptive grid.
+
+    Parameters
+    ----------
+    datasets
+        Observed data to model; each dataset has its own parameters.
+    n_points
+        Number of grid points for each parameter.
+    n_refinements
+        Number of times that the grid is narrowed to the region containing the
+        posterior mass.
+    tail_mass
+        When refining the grid, each parameter's range is narrowed to exclude
+        marginal posterior tails containing less than this probability.
+    priors
+        Priors to use in place of the defaults, as in `build_default_model`.
+    max_chunk_size
+        Maximum number of grid-by-observation evaluations that are held in memory
+        at once.
+
+    Returns
+    -------
+    GridPosterior
+        The posterior distribution evaluated on the grid.
+
+    Notes
+    -----
+    * The grid is over the logarithm of the `sigma`, `k`, and `sigma_e_mod`
+      parameters, matching the parameterisation and priors of
+      `build_default_model`, and initially spans four prior standard deviations
+      either side of the prior mean.
+    * The likelihood is evaluated over the unique reaction times, weighted by
+      their counts. The normal density and distribution function terms are each
+      evaluated on two-dimensional sub-grids, with only their combination
+      evaluated over the full three-dimensional grid.
+    * The grids of all the datasets are evaluated and refined together.
+    """
+
+    model_priors = pylater.model.get_priors(priors=priors)
+
+    param_priors = [model_priors[param_name] for param_name in PARAM_NAMES]
+
+    n_datasets = len(datasets)
+    n_params = len(PARAM_NAMES)
+
+    pylater.instrument.annotate(
+        n_datasets=n_datasets,
+        n_grid=n_datasets * n_points**n_params,
+    )
+
+    # the unique reaction times of all the datasets, in dataset order
+    compressed = [
+        pylater.data.compress_ties(values=dataset.promptness) for dataset in datasets
+    ]
+
+    promptness = np.concatenate(
+        [dataset_promptness for (dataset_promptness, _) in compressed]
+    )
+    counts = np.concatenate([dataset_counts for (_, dataset_counts) in compressed])
+    dataset_indices = np.repeat(
+        np.arange(n_datasets),
+        [len(dataset_promptness) for (dataset_promptness, _) in compressed],
+    )
+
+    # (datasets, parameters, lower and upper)
+    bounds = np.broadcast_to(
+        np.array(
+            [
+                (prior.mu - 4 * prior.sigma, prior.mu + 4 * prior.sigma)
+                for prior in param_priors
+            ]
+        ),
+        (n_datasets, n_params, 2),
+    )
+
+    for i_refinement in range(n_refinements + 1):
+
+        # (datasets, parameters, points)
+        log_axes = np.linspace(bounds[..., 0], bounds[..., 1], n_points, axis=-1)
+
+        sigma_log_prior, k_log_prior, sigma_e_mod_log_prior = (
+            prior.log_density(log_value=log_axes[:, i_param])
+            for (i_param, prior) in enumerate(param_priors)
+        )
+
+        log_posterior = (
+            evaluate_grid_log_likelihood(
+                log_axes=log_axes,
+                promptness=promptness,
+                counts=counts,
+                dataset_indices=dataset_indices,
+                max_chunk_size=max_chunk_size,
+            )
+            + sigma_log_prior[:, :, np.newaxis, np.newaxis]
+            + k_log_prior[:, np.newaxis, :, np.newaxis]
+            + sigma_e_mod_log_prior[:, np.newaxis, np.newaxis, :]
+        )
+
+        log_norm = scipy.special.logsumexp(log_posterior, axis=(1, 2, 3))
+
+        log_probability = (
+            log_posterior - log_norm[:, np.newaxis, np.newaxis, np.newaxis]
+        )
+
+        if i_refinement == n_refinements:
+            break
+
+        bounds = refine_bounds(
+            log_axes=log_axes,
+            log_probability=log_probability,
+            tail_mass=tail_mass,
+        )
+
+    log_evidence = log_norm + np.sum(
+        np.log(log_axes[..., 1] - log_axes[..., 0]), axis=-1
+    )
+
+    return GridPosterior(
+        dataset_names=[dataset.name for dataset in datasets],
+        log_axes=log_axes,
+        log_probability=log_probability,
+        log_evidence=log_evidence,
+    )
+
+
+def evaluate_grid_log_likelihood(
+    log_axes: npt.NDArray[np.float64],
+    promptness: npt.NDArray[np.float64],
+    counts: npt.NDArray[np.int64],
+    dataset_indices: npt.NDArray[np.int64],
+    max_chunk_size: int = 2**18,
+) -> npt.NDArray[np.float64]:
+    """
+    Evaluate the LATER log-likelihood of tie-compressed observations over a
+    three-dimensional grid of the logarithm of `sigma`, `k`, and `sigma_e_mod`,
+    for each of a set of datasets.
+
+    Parameters
+    ----------
+    log_axes
+        Grid values, with shape (datasets, parameters, points).
+    promptness
+        Unique observed promptness values of each dataset, concatenated.
+    counts
+        Number of observations of each unique promptness value.
+    dataset_indices
+        Index of the dataset of each promptness value, in increasing order. Each
+        dataset needs at least one value.
+    max_chunk_size
+        Maximum number of grid-by-observation evaluations that are held in memory
+        at once.
+
+    Returns
+    -------
+    npt.NDArray[np.float64]
+        The log-likelihood at each grid point, with shape
+        (datasets, points, points, points).
+    """
+
+    n_datasets, _, n_points = log_axes.shape
+
+    # the grid values for each observation; each with shape (points, observations)
+    sigma, k, sigma_e_mod = np.exp(log_axes).transpose(1, 2, 0)[..., dataset_indices]
+
+    log_likelihood = np.zeros((n_datasets, n_points**3))
+
+    chunk_size = max(1, max_chunk_size // n_points**3)
+
+    for i_start in range(0, len(promptness), chunk_size):
+
+        chunk = slice(i_start, i_start + chunk_size)
+
+        value = promptness[chunk]
+
+        # (sigma, k or sigma_e_mod, observation)
+        chunk_sigma = sigma[:, np.newaxis, chunk]
+        chunk_mu = chunk_sigma * k[np.newaxis, :, chunk]
+        chunk_sigma_e = chunk_sigma * sigma_e_mod[np.newaxis, :, chunk]
+
+        main_logpdf = pylater.dist.normal_logpdf(
+            value=value, mu=chunk_mu, sigma=chunk_sigma
+        )
+        main_logcdf = pylater.dist.normal_logcdf(
+            value=value, mu=chunk_mu, sigma=chunk_sigma
+        )
+        early_logpdf = pylater.dist.normal_logpdf(
+            value=value, mu=0, sigma=chunk_sigma_e
+        )
+        early_logcdf = pylater.dist.normal_logcdf(
+            value=value, mu=0, sigma=chunk_sigma_e
+        )
+
+        # (sigma, k, sigma_e_mod, observation)
+        logp = np.logaddexp(
+            main_logpdf[:, :, np.newaxis, :] + early_logcdf[:, np.newaxis, :, :],
+            early_logpdf[:, np.newaxis, :, :] + main_logcdf[:, :, np.newaxis, :],
+        )
+
+        # sum the count-weighted values over the observations of each of the
+        # datasets in the chunk
+        chunk_datasets = dataset_indices[chunk]
+        first, last = chunk_datasets[0], chunk_datasets[-1]
+
+        weights = np.zeros((len(value), last - first + 1))
+        weights[np.arange(len(value)), chunk_datasets - first] = counts[chunk]
+
+        log_likelihood[first : last + 1] += (logp.reshape(-1, len(value)) @ weights).T
+
+    return log_likelihood.reshape((n_datasets, *(n_points,) * 3))
+
+
+def refine_bounds(
+    log_axes: npt.NDArray[np.float64],
+    log_probability: npt.NDArray[np.float64],
+    tail_mass: float,
+) -> npt.NDArray[np.float64]:
+    """
+    Narrow the range of each grid axis to the region containing the posterior
+    mass, for each dataset.
+    """
+
+    n_datasets, n_params, n_points = log_axes.shape
+
+    i_datasets = np.arange(n_datasets)
+
+    bounds = np.empty((n_datasets, n_params, 2))
+
+    for i_param in range(n_params):
+
+        other_axes = tuple(
+            i_axis + 1 for i_axis in range(n_params) if i_axis != i_param
+        )
+
+        marginal = np.exp(scipy.special.logsumexp(log_probability, axis=other_axes))
+
+        cumulative = np.cumsum(marginal, axis=-1)
+
+        axis = log_axes[:, i_param]
+        width = axis[:, 1] - axis[:, 0]
+
+        # equivalent to `np.searchsorted` for each dataset
+        i_lower = np.sum(cumulative < tail_mass, axis=-1)
+        i_upper = np.sum(cumulative < 1 - tail_mass, axis=-1)
+
+        # include a cell either side, so that mass at the edges is not lost, and
+        # expand outwards if the mass is at the edge of the grid
+        lower = axis[i_datasets, i_lower] - np.where(i_lower > 0, width, 4 * width)
+        upper = axis[i_datasets, np.minimum(i_upper, n_points - 1)] + np.where(
+            i_upper < n_points - 1, width, 4 * width
+        )
+
+        bounds[:, i_param] = np.stack((lower, upper), axis=-1)
+
+    return bounds
@@ -0,0 +1,343 @@
+from __future__ import annotations
+
+import collections
+import contextlib
+import contextvars
+import functools
+import time
+import tracemalloc
+import types
+import typing
+
+P = typing.ParamSpec("P")
+R = typing.TypeVar("R")
+
+
+class PhaseRecord:
+    __slots__ = ("name", "peak_bytes", "sizes", "wall_s")
+
+    def __init__(
+        self,
+        name: str,
+        wall_s: float,
+        peak_bytes: int | None,
+        sizes: dict[str, int],
+    ) -> None:
+        """
+        Measurements from a single execution of an instrumented phase.
+
+        Parameters
+        ----------
+        name
+            Name of the phase.
+        wall_s
+            Elapsed wall time, in seconds.
+        peak_bytes
+            Peak memory allocated during the phase, over and above that allocated
+            at its start, in bytes. This is `None` if memory was not tracked.
+        sizes
+            Array sizes (number of elements) reported by the phase.
+        """
+
+        self.name = name
+        self.wall_s = wall_s
+        self.peak_bytes = peak_bytes
+        self.sizes = sizes
+
+    def __repr__(self) -> str:
+        return f"Phase '{self.name}' taking {self.wall_s:.3g} s"
+
+
+PhaseCallback = typing.Callable[[PhaseRecord], None]
+
+
+_active_profiler: contextvars.ContextVar[Profiler | None] = contextvars.ContextVar(
+    "pylater_active_profiler",
+    default=None,
+)
+
+_current_sizes: contextvars.ContextVar[dict[str, int] | None] = contextvars.ContextVar(
+    "pylater_current_sizes", default=None
+)
+
+
+class Profiler:
+    def __init__(
+        self,
+        callback: PhaseCallback | None = None,
+        track_memory: bool = False,
+        keep_records: bool = True,
+    ) -> None:
+        """
+        Record the wall time, peak memory, and array sizes of instrumented phases.
+
+        Parameters
+        ----------
+        callback
+            Function that is called with each `PhaseRecord` as its phase completes.
+        track_memory
+            Whether to measure peak memory via `tracemalloc`. This has a
+            non-negligible overhead and is off by default.
+        keep_records
+            Whether to store each `PhaseRecord` on the profiler; if `False`, only
+            the running per-phase totals are kept.
+
+        Notes
+        -----
+        * The profiler is activated by using it as a context manager; phases that
+          are executed within the context are recorded.
+        * When no profiler is active, the instrumentation reduces to a context
+          variable lookup and so can be left in place in production code.
+        * Memory is only tracked in the current process; sampling that is
+          distributed over multiple processes (e.g., `cores > 1` in `pm.sample`)
+          is timed but its memory is not captured.
+        """
+
+        self.callback = callback
+        self.track_memory = track_memory
+        self.keep_records = keep_records
+
+        self.records: list[PhaseRecord] = []
+
+        self._totals: dict[str, list[float]] = collections.defaultdict(
+            lambda: [0, 0.0, 0]
+        )
+        self._peak_stack: list[int] = []
+        self._started_tracing = False
+        self._tokens: list[contextvars.Token[Profiler | None]] = []
+
+    def __enter__(self) -> Profiler:
+        if self.track_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+
+        self._tokens.append(_active_profiler.set(self))
+
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: types.TracebackType | None,
+    ) -> None:
+        _active_profiler.reset(self._tokens.pop())
+
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    @contextlib.contextmanager
+    def phase(self, name: str, **sizes: int) -> typing.Iterator[dict[str, int]]:
+        """
+        Measure a phase of execution.
+
+        Parameters
+        ----------
+        name
+            Name of the phase.
+        **sizes
+            Array sizes to associate with the phase; further sizes can be added
+            to the yielded dictionary or via `annotate`.
+        """
+
+        track_memory = self.track_memory and tracemalloc.is_tracing()
+
+        start_bytes = 0
+
+        if track_memory:
+            start_bytes, peak = tracemalloc.get_traced_memory()
+            if self._peak_stack:
+                self._peak_stack[-1] = max(self._peak_stack[-1], peak)
+            tracemalloc.reset_peak()
+            self._peak_stack.append(start_bytes)
+
+        sizes_token = _current_sizes.set(sizes)
+
+        start = time.perf_counter()
+
+        try:
+            yield sizes
+        finally:
+            wall_s = time.perf_counter() - start
+
+            _current_sizes.reset(sizes_token)
+
+            peak_bytes = None
+
+            if track_memory:
+                _, peak = tracemalloc.get_traced_memory()
+                phase_peak = max(self._peak_stack.pop(), peak)
+                peak_bytes = phase_peak - start_bytes
+                if self._peak_stack:
+                    self._peak_stack[-1] = max(self._peak_stack[-1], phase_peak)
+                tracemalloc.reset_peak()
+
+            self.record(
+                record=PhaseRecord(
+                    name=name,
+                    wall_s=wall_s,
+                    peak_bytes=peak_bytes,
+                    sizes=sizes,
+                )
+            )
+
+    def record(self, record: PhaseRecord) -> None:
+        """
+        Add a completed phase to the profiler.
+
+        Parameters
+        ----------
+        record
+            Measurements from the phase.
+        """
+
+        totals = self._totals[record.name]
+        totals[0] += 1
+        totals[1] += record.wall_s
+        if record.peak_bytes is not None:
+            totals[2] = max(totals[2], record.peak_bytes)
+
+        if self.keep_records:
+            self.records.append(record)
+
+        if self.callback is not None:
+            self.callback(record)
+
+    def summary(self) -> dict[str, dict[str, float]]:
+        """
+        Summarise the recorded phases.
+
+        Returns
+        -------
+        dict[str, dict[str, float]]
+            For each phase name, the number of calls (`n_calls`), the total and
+            mean wall time (`total_s`, `mean_s`), and the maximum peak memory
+            (`peak_bytes`).
+        """
+
+        return {
+            name: {
+                "n_calls": n_calls,
+                "total_s": total_s,
+                "mean_s": total_s / n_calls,
+                "peak_bytes": peak_bytes,
+            }
+            for (name, (n_calls, total_s, peak_bytes)) in self._totals.items()
+        }
+
+    def summary_table(self) -> str:
+        """
+        Format the summary of the recorded phases as a text table, ordered by
+        decreasing total wall time.
+
+        Returns
+        -------
+        str
+            The summary table.
+        """
+
+        header = ("Phase", "Calls", "Total (s)", "Mean (s)", "Peak (MB)")
+
+        rows = [
+            (
+                name,
+                f"{info['n_calls']:.0f}",
+                f"{info['total_s']:.4f}",
+                f"{info['mean_s']:.4f}",
+                f"{info['peak_bytes'] / 1e6:.2f}" if self.track_memory else "-",
+            )
+            for (name, info) in sorted(
+                self.summary().items(),
+                key=lambda item: item[1]["total_s"],
+                reverse=True,
+            )
+        ]
+
+        widths = [
+            max(len(row[i_col]) for row in (header, *rows))
+            for i_col in range(len(header))
+        ]
+
+        lines = [
+            "  ".join(
+                cell.ljust(width) if i_col == 0 else cell.rjust(width)
+                for (i_col, (cell, width)) in enumerate(zip(row, widths, strict=True))
+            )
+            for row in (header, *rows)
+        ]
+
+        lines.insert(1, "  ".join("-" * width for width in widths))
+
+        return "\n".join(lines)
+
+    def reset(self) -> None:
+        """
+        Remove all recorded phases.
+        """
+        self.records.clear()
+        self._totals.clear()
+
+
+@contextlib.contextmanager
+def phase(name: str, **sizes: int) -> typing.Iterator[dict[str, int]]:
+    """
+    Measure a phase of execution using the active profiler, if there is one.
+
+    Parameters
+    ----------
+    name
+        Name of the phase.
+    **sizes
+        Array sizes to associate with the phase.
+    """
+
+    profiler = _active_profiler.get()
+
+    if profiler is None:
+        yield sizes
+        return
+
+    with profiler.phase(name, **sizes) as phase_sizes:
+        yield phase_sizes
+
+
+def annotate(**sizes: int) -> None:
+    """
+    Associate array sizes with the innermost phase that is currently executing.
+
+    Parameters
+    ----------
+    **sizes
+        Array sizes to associate with the phase.
+    """
+
+    current_sizes = _current_sizes.get()
+
+    if current_sizes is not None:
+        current_sizes.update(sizes)
+
+
+def instrumented(
+    name: str,
+) -> typing.Callable[[typing.Callable[P, R]], typing.Callable[P, R]]:
+    """
+    Decorate a function so that each call is measured as a phase.
+
+    Parameters
+    ----------
+    name
+        Name of the phase.
+    """
+
+    def decorator(func: typing.Callable[P, R]) -> typing.Callable[P, R]:
+        @functools.wraps(func)
+        def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+            if _active_profiler.get() is None:
+                return func(*args, **kwargs)
+            with phase(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
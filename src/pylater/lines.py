@@ -0,0 +1,576 @@
+from __future__ import annotations
+
+import enum
+import typing
+
+import numpy as np
+import numpy.typing as npt
+
+import scipy.special
+
+import xarray as xr
+
+import pylater.data
+import pylater.instrument
+
+
+class LineFitMethod(enum.Enum):
+    WLS = "wls"
+    KS = "ks"
+
+
+# the fitted parameters, in the order of the (logarithmic) parameter vector
+PARAM_NAMES = ("mu", "sigma", "sigma_e")
+
+# bounds on the logarithm of each parameter during fitting
+LOG_PARAM_BOUNDS = (-7.0, 7.0)
+
+
+class LineFit:
+    __slots__ = ("dataset_names", "ks_statistic", "method", "mu", "sigma", "sigma_e")
+
+    def __init__(
+        self,
+        dataset_names: list[str],
+        mu: npt.NDArray[np.float64],
+        sigma: npt.NDArray[np.float64],
+        sigma_e: npt.NDArray[np.float64],
+        ks_statistic: npt.NDArray[np.float64],
+        method: str,
+    ) -> None:
+        """
+        LATER parameters estimated by fitting lines in reciprobit space.
+
+        Parameters
+        ----------
+        dataset_names
+            Names of the datasets.
+        mu, sigma, sigma_e
+            Estimated parameters for each dataset.
+        ks_statistic
+            The Kolmogorov-Smirnov statistic (the maximum absolute difference
+            between the fitted and empirical distribution functions) for each
+            dataset.
+        method
+            The fitting method.
+        """
+
+        self.dataset_names = dataset_names
+        self.mu = mu
+        self.sigma = sigma
+        self.sigma_e = sigma_e
+        self.ks_statistic = ks_statistic
+        self.method = LineFitMethod(method)
+
+    def __repr__(self) -> str:
+        return (
+            f"Reciprobit line fits ({self.method.value}) for "
+            + f"{len(self.dataset_names)} dataset(s)"
+        )
+
+    def to_dataset(self) -> xr.Dataset:
+        """
+        Convert the estimates to a dataset.
+
+        Returns
+        -------
+        xr.Dataset
+            The estimated `mu`, `sigma`, and `sigma_e`, and the `ks_statistic`,
+            over a `dataset` dimension.
+        """
+        return xr.Dataset(
+            data_vars={
+                var_name: ("dataset", getattr(self, var_name))
+                for var_name in (*PARAM_NAMES, "ks_statistic")
+            },
+            coords={"dataset": self.dataset_names},
+            attrs={"method": self.method.value},
+        )
+
+    def cdf(
+        self,
+        rt_s: npt.ArrayLike,
+        component: str = "combined",
+    ) -> npt.NDArray[np.float64]:
+        """
+        Evaluate the fitted cumulative distribution function of reaction times.
+
+        Parameters
+        ----------
+        rt_s
+            Reaction times at which to evaluate the function, in seconds.
+        component
+            The `combined` (LATER) distribution, or that of the `main` or `early`
+            unit alone. The distributions of the individual units are straight
+            lines in reciprobit space.
+
+        Returns
+        -------
+        npt.NDArray[np.float64]
+            The cumulative probabilities, with shape (datasets, reaction times).
+        """
+
+        promptness = 1 / np.asarray(rt_s, dtype=np.float64)[np.newaxis, :]
+
+        mu, sigma, sigma_e = (
+            value[:, np.newaxis] for value in (self.mu, self.sigma, self.sigma_e)
+        )
+
+        if component == "main":
+            p: npt.NDArray[np.float64] = scipy.special.ndtr((mu - promptness) / sigma)
+            return p
+
+        if component == "early":
+            p = scipy.special.ndtr(-promptness / sigma_e)
+            return p
+
+        if component != "combined":
+            msg = f"Unknown component: {component}"
+            raise ValueError(msg)
+
+        return -np.expm1(
+            log_survival(promptness=promptness, mu=mu, sigma=sigma, sigma_e=sigma_e)
+        )
+
+
+@pylater.instrument.instrumented("fit_lines")
+def fit_lines(
+    datasets: typing.Sequence[pylater.data.Dataset | pylater.data.BinnedDataset],
+    method: str = "wls",
+    n_iterations: int = 100,
+    tolerance: float = 1e-6,
+) -> LineFit:
+    """
+    Estimate LATER parameters for many datasets by fitting lines in reciprobit
+    space, without Bayesian inference.
+
+    Parameters
+    ----------
+    datasets
+        Observed data; each dataset is fitted independently.
+    method
+        Either `wls`, which minimises the weighted squared difference between the
+        fitted and empirical distribution functions in probit space, or `ks`,
+        which minimises the maximum absolute difference between them (the
+        Kolmogorov-Smirnov statistic), starting from the `wls` fit.
+    n_iterations
+        Maximum number of optimisation iterations.
+    tolerance
+        Convergence tolerance on the (logarithmic) parameter values.
+
+    Returns
+    -------
+    LineFit
+        The estimated parameters.
+
+    Notes
+    -----
+    * The main and early units are straight lines in reciprobit space; the
+      fitted distribution function is that of their race (as in
+      `pylater.dist.LATER`), so both lines are fitted jointly.
+    * For `wls`, each point of the empirical distribution function (at the
+      midpoint of its step) is weighted by the inverse of its approximate
+      binomial variance in probit space. The initial main line is from a
+      weighted linear fit and the parameters are refined with the
+      Levenberg-Marquardt algorithm.
+    * For `ks`, the parameters are refined using a compass (pattern) search.
+    * The datasets are padded to a common length and all of the calculations
+      are vectorised across datasets. Parameters are fitted on a logarithmic
+      scale, so `mu` is constrained to be positive.
+    """
+
+    fit_method = LineFitMethod(method)
+
+    ecdf = stack_ecdfs(datasets=datasets)
+
+    pylater.instrument.annotate(
+        n_datasets=len(datasets),
+        n_points=int(ecdf["is_valid"].sum()),
+    )
+
+    # poor trial steps can under- or overflow; these are rejected by the
+    # optimisers rather than needing to be reported
+    with np.errstate(all="ignore"):
+
+        log_params = fit_wls(
+            ecdf=ecdf,
+            n_iterations=n_iterations,
+            tolerance=tolerance,
+        )
+
+        if fit_method is LineFitMethod.KS:
+            log_params = fit_ks(
+                ecdf=ecdf,
+                log_params=log_params,
+                n_iterations=n_iterations,
+                tolerance=tolerance,
+            )
+
+        statistic = ks_statistic(ecdf=ecdf, log_params=log_params)
+
+    mu, sigma, sigma_e = np.exp(log_params).T
+
+    return LineFit(
+        dataset_names=[dataset.name for dataset in datasets],
+        mu=mu,
+        sigma=sigma,
+        sigma_e=sigma_e,
+        ks_statistic=statistic,
+        method=fit_method.value,
+    )
+
+
+def stack_ecdfs(
+    datasets: typing.Sequence[pylater.data.Dataset | pylater.data.BinnedDataset],
+) -> dict[str, npt.NDArray[typing.Any]]:
+    """
+    Arrange the empirical distribution functions of datasets into padded arrays.
+
+    Returns
+    -------
+    dict[str, npt.NDArray]
+        The promptness (`promptness`), the cumulative probability after
+        (`p_upper`) and before (`p_lower`) each step, the probit of the midpoint
+        of each step (`z`) and its weight (`weight`), and whether each element is
+        an observation rather than padding (`is_valid`), each with shape
+        (datasets, points).
+    """
+
+    n_dataset_points = np.array([len(dataset.ecdf_x) for dataset in datasets])
+
+    n_points = int(np.max(n_dataset_points))
+    shape = (len(datasets), n_points)
+
+    promptness = np.ones(shape)
+    p_upper = np.zeros(shape)
+    p_lower = np.zeros(shape)
+    n_trials = np.zeros((len(datasets), 1))
+
+    for i_dataset, dataset in enumerate(datasets):
+        n_valid = n_dataset_points[i_dataset]
+        with np.errstate(divide="ignore"):
+            promptness[i_dataset, :n_valid] = 1 / dataset.ecdf_x
+        p_upper[i_dataset, :n_valid] = dataset.ecdf_p
+        p_lower[i_dataset, 1:n_valid] = dataset.ecdf_p[:-1]
+        n_trials[i_dataset] = dataset.n_trials
+
+    # excludes padding, negative reaction times, and infinite bin edges
+    is_valid = (
+        (np.arange(n_points)[np.newaxis, :] < n_dataset_points[:, np.newaxis])
+        & (promptness > 0)
+        & np.isfinite(promptness)
+    )
+
+    p_mid = np.clip((p_upper + p_lower) / 2, 0.5 / n_trials, 1 - 0.5 / n_trials)
+
+    z = scipy.special.ndtri(p_mid)
+
+    # inverse of the (delta-method) binomial variance of the probit, using the
+    # squared normal density at `z`
+    weight = np.where(
+        is_valid,
+        n_trials * np.exp(-(z**2)) / (2 * np.pi) / (p_mid * (1 - p_mid)),
+        0.0,
+    )
+
+    return {
+        "promptness": np.where(is_valid, promptness, 1.0),
+        "p_upper": p_upper,
+        "p_lower": p_lower,
+        "z": np.where(is_valid, z, 0.0),
+        "weight": weight,
+        "is_valid": is_valid,
+    }
+
+
+def fit_wls(
+    ecdf: dict[str, npt.NDArray[typing.Any]],
+    n_iterations: int,
+    tolerance: float,
+) -> npt.NDArray[np.float64]:
+    """
+    Fit by weighted least squares in probit space, using the Levenberg-Marquardt
+    algorithm.
+
+    Returns
+    -------
+    npt.NDArray[np.float64]
+        The logarithm of `mu`, `sigma`, and `sigma_e`, with shape (datasets, 3).
+    """
+
+    log_params = initial_log_params(ecdf=ecdf)
+
+    n_params = len(PARAM_NAMES)
+
+    def residuals(
+        ecdf: dict[str, npt.NDArray[typing.Any]],
+        log_params: npt.NDArray[np.float64],
+    ) -> npt.NDArray[np.float64]:
+        weighted: npt.NDArray[np.float64] = np.sqrt(ecdf["weight"]) * (
+            probit_cdf(ecdf=ecdf, log_params=log_params) - ecdf["z"]
+        )
+        return weighted
+
+    damping = np.full(len(log_params), 1e-3)
+
+    current_residuals = residuals(ecdf=ecdf, log_params=log_params)
+    current_loss = np.sum(current_residuals**2, axis=-1)
+
+    step_size = 1e-6
+
+    # datasets that have not yet converged; the calculations are restricted to
+    # these, so that a few slow datasets do not hold up the others
+    active = np.arange(len(log_params))
+
+    for _ in range(n_iterations):
+
+        if len(active) == 0:
+            break
+
+        active_ecdf = select_datasets(ecdf=ecdf, indices=active)
+        active_params = log_params[active]
+        active_residuals = current_residuals[active]
+
+        # (datasets, points, params), by forward differences
+        jacobian = np.stack(
+            [
+                (
+                    residuals(
+                        ecdf=active_ecdf,
+                        log_params=active_params + step_size * unit,
+                    )
+                    - active_residuals
+                )
+                / step_size
+                for unit in np.eye(n_params)
+            ],
+            axis=-1,
+        )
+
+        jtj = np.einsum("dpi,dpj->dij", jacobian, jacobian)
+        jtr = np.einsum("dpi,dp->di", jacobian, active_residuals)
+
+        diagonal = np.einsum("dii->di", jtj)
+
+        damped = (
+            jtj
+            + np.eye(n_params)
+            * (damping[active, np.newaxis] * np.maximum(diagonal, 1e-12))[
+                :, np.newaxis, :
+            ]
+        )
+
+        delta = -np.linalg.solve(damped, jtr[..., np.newaxis])[..., 0]
+
+        proposed = clip_log_params(log_params=active_params + delta)
+
+        proposed_residuals = residuals(ecdf=active_ecdf, log_params=proposed)
+        proposed_loss = np.sum(proposed_residuals**2, axis=-1)
+
+        is_better = np.isfinite(proposed_loss) & (proposed_loss < current_loss[active])
+
+        improved = active[is_better]
+
+        log_params[improved] = proposed[is_better]
+        current_residuals[improved] = proposed_residuals[is_better]
+        current_loss[improved] = proposed_loss[is_better]
+
+        damping[active] = np.where(
+            is_better,
+            damping[active] / 10,
+            damping[active] * 10,
+        )
+
+        # converged if the accepted step was small, or if no step is accepted
+        # even with very strong damping
+        has_converged = (is_better & (np.max(np.abs(delta), axis=-1) < tolerance)) | (
+            damping[active] > 1e10
+        )
+
+        active = active[~has_converged]
+
+    return log_params
+
+
+def fit_ks(
+    ecdf: dict[str, npt.NDArray[typing.Any]],
+    log_params: npt.NDArray[np.float64],
+    n_iterations: int,
+    tolerance: float,
+) -> npt.NDArray[np.float64]:
+    """
+    Minimise the Kolmogorov-Smirnov statistic using a compass search.
+
+    Returns
+    -------
+    npt.NDArray[np.float64]
+        The logarithm of `mu`, `sigma`, and `sigma_e`, with shape (datasets, 3).
+    """
+
+    log_params = log_params.copy()
+
+    n_params = len(PARAM_NAMES)
+
+    directions = np.concatenate((np.eye(n_params), -np.eye(n_params)))
+
+    step = np.full(len(log_params), 0.1)
+
+    current = ks_statistic(ecdf=ecdf, log_params=log_params)
+
+    active = np.arange(len(log_params))
+
+    for _ in range(n_iterations):
+
+        if len(active) == 0:
+            break
+
+        active_ecdf = select_datasets(ecdf=ecdf, indices=active)
+
+        # (directions, datasets, params)
+        candidates = clip_log_params(
+            log_params=(
+                log_params[np.newaxis, active, :]
+                + step[np.newaxis, active, np.newaxis] * directions[:, np.newaxis, :]
+            )
+        )
+
+        candidate_stats = np.stack(
+            [
+                ks_statistic(ecdf=active_ecdf, log_params=candidate)
+                for candidate in candidates
+            ]
+        )
+
+        i_best = np.argmin(candidate_stats, axis=0)
+        best = np.take_along_axis(candidate_stats, i_best[np.newaxis, :], axis=0)[0]
+
+        is_better = best < current[active]
+
+        improved = active[is_better]
+
+        log_params[improved] = candidates[i_best, np.arange(len(active))][is_better]
+        current[improved] = best[is_better]
+
+        step[active] = np.where(is_better, step[active], step[active] / 2)
+
+        active = active[step[active] >= tolerance]
+
+    return log_params
+
+
+def select_datasets(
+    ecdf: dict[str, npt.NDArray[typing.Any]],
+    indices: npt.NDArray[np.intp],
+) -> dict[str, npt.NDArray[typing.Any]]:
+    """
+    Restrict stacked empirical distribution functions to a subset of datasets.
+    """
+    return {key: value[indices] for (key, value) in ecdf.items()}
+
+
+def clip_log_params(log_params: npt.NDArray[np.float64]) -> npt.NDArray[np.float64]:
+    """
+    Keep the logarithmic parameters within a range that avoids numerical overflow
+    and the collapse of a unit's variability to zero.
+    """
+    clipped: npt.NDArray[np.float64] = np.clip(log_params, *LOG_PARAM_BOUNDS)
+    return clipped
+
+
+def initial_log_params(
+    ecdf: dict[str, npt.NDArray[typing.Any]],
+) -> npt.NDArray[np.float64]:
+    """
+    Estimate the main line from a weighted linear fit in probit space, with the
+    early unit initially four times more variable than the main unit.
+    """
+
+    # the main line is `z = (mu - promptness) / sigma`
+    weight = ecdf["weight"]
+    x = ecdf["promptness"]
+    y = ecdf["z"]
+
+    sum_w = np.sum(weight, axis=-1)
+    mean_x = np.sum(weight * x, axis=-1) / sum_w
+    mean_y = np.sum(weight * y, axis=-1) / sum_w
+
+    dx = x - mean_x[:, np.newaxis]
+    dy = y - mean_y[:, np.newaxis]
+
+    slope = np.sum(weight * dx * dy, axis=-1) / np.sum(weight * dx**2, axis=-1)
+
+    sigma = -1 / np.minimum(slope, -1e-3)
+    mu = np.maximum(mean_x + mean_y * sigma, 1e-3)
+
+    log_params = np.log(np.column_stack((mu, sigma, 4 * sigma)))
+
+    return clip_log_params(log_params=log_params)
+
+
+def probit_cdf(
+    ecdf: dict[str, npt.NDArray[typing.Any]],
+    log_params: npt.NDArray[np.float64],
+) -> npt.NDArray[np.float64]:
+    """
+    Evaluate the probit of the LATER distribution function at the observations.
+    """
+
+    mu, sigma, sigma_e = np.exp(log_params).T[..., np.newaxis]
+
+    # the probit of `1 - S` is the negative of the probit of `S`
+    z: npt.NDArray[np.float64] = -scipy.special.ndtri_exp(
+        log_survival(
+            promptness=ecdf["promptness"],
+            mu=mu,
+            sigma=sigma,
+            sigma_e=sigma_e,
+        )
+    )
+
+    return z
+
+
+def ks_statistic(
+    ecdf: dict[str, npt.NDArray[typing.Any]],
+    log_params: npt.NDArray[np.float64],
+) -> npt.NDArray[np.float64]:
+    """
+    Evaluate the Kolmogorov-Smirnov statistic of each dataset.
+    """
+
+    mu, sigma, sigma_e = np.exp(log_params).T[..., np.newaxis]
+
+    cdf = -np.expm1(
+        log_survival(
+            promptness=ecdf["promptness"],
+            mu=mu,
+            sigma=sigma,
+            sigma_e=sigma_e,
+        )
+    )
+
+    difference = np.maximum(ecdf["p_upper"] - cdf, cdf - ecdf["p_lower"])
+
+    statistic: npt.NDArray[np.float64] = np.max(
+        np.where(ecdf["is_valid"], difference, -np.inf),
+        axis=-1,
+    )
+
+    return statistic
+
+
+def log_survival(
+    promptness: npt.NDArray[np.float64],
+    mu: npt.NDArray[np.float64],
+    sigma: npt.NDArray[np.float64],
+    sigma_e: npt.NDArray[np.float64],
+) -> npt.NDArray[np.float64]:
+    """
+    Logarithm of the probability that a response has not occurred by the time
+    corresponding to a (positive) promptness; that is, that both units have
+    a promptness below it.
+    """
+    log_s: npt.NDArray[np.float64] = scipy.special.log_ndtr(
+        (promptness - mu) / sigma
+    ) + scipy.special.log_ndtr(promptness / sigma_e)
+    return log_s
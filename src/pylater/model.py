@@ -6,21 +6,106 @@ import typing
 import warnings
 
 import numpy as np
+import numpy.typing as npt
 
 import pymc as pm
 
+import pytensor.tensor as pt
+
 import pylater.data
 import pylater.dist
+import pylater.instrument
 
 
 class ShareType(enum.Enum):
     SHIFT = "shift"
     SWIVEL = "swivel"
+    INDEPENDENT = "independent"
+
+
+class LogNormalPrior:
+    __slots__ = ("mu", "sigma")
+
+    def __init__(self, mu: float, sigma: float) -> None:
+        """
+        A log-normal prior distribution.
+
+        Parameters
+        ----------
+        mu
+            Mean of the logarithm of the variable.
+        sigma
+            Standard deviation of the logarithm of the variable.
+        """
+
+        self.mu = float(mu)
+        self.sigma = float(sigma)
+
+    def __repr__(self) -> str:
+        return f"LogNormalPrior(mu={self.mu!r}, sigma={self.sigma!r})"
+
+    def log_density(self, log_value: npt.ArrayLike) -> npt.NDArray[np.float64]:
+        """
+        Evaluate the log density of the logarithm of the variable.
+
+        Parameters
+        ----------
+        log_value
+            Logarithm of the variable.
+
+        Returns
+        -------
+        npt.NDArray[np.float64]
+            Log density of `log_value`.
+        """
+        return pylater.dist.normal_logpdf(value=log_value, mu=self.mu, sigma=self.sigma)
+
+    def random(
+        self,
+        rng: np.random.Generator | None = None,
+        size: int | tuple[int, ...] | None = None,
+    ) -> npt.NDArray[np.float64]:
+        """
+        Draw random samples from the distribution.
+
+        Parameters
+        ----------
+        rng
+            Random number generator.
+        size
+            Shape of the samples.
 
+        Returns
+        -------
+        npt.NDArray[np.float64]
+            The samples.
+        """
 
+        if rng is None:
+            rng = np.random.default_rng()
+
+        samples: npt.NDArray[np.float64] = np.exp(
+            rng.normal(loc=self.mu, scale=self.sigma, size=size)
+        )
+
+        return samples
+
+
+DEFAULT_PRIORS: dict[str, LogNormalPrior] = {
+    # 95% CI of [0.375, 1.5]
+    "sigma": LogNormalPrior(mu=np.log(0.75), sigma=np.log(2) / 2),
+    # 95% CI of [2.5, 10]
+    "k": LogNormalPrior(mu=np.log(5), sigma=np.log(2) / 2),
+    # 95% CI of [2, 8]
+    "sigma_e_mod": LogNormalPrior(mu=np.log(4), sigma=np.log(2) / 2),
+}
+
+
+@pylater.instrument.instrumented("build_default_model")
 def build_default_model(
-    datasets: typing.Sequence[pylater.data.Dataset],
+    datasets: typing.Sequence[pylater.data.Dataset | pylater.data.BinnedDataset],
     share_type: str | None = None,
+    priors: typing.Mapping[str, LogNormalPrior] | None = None,
 ) -> pm.Model:
     """
     Assemble a LATER model using a default set of priors.
@@ -28,10 +113,17 @@ def build_default_model(
     Parameters
     ----------
     datasets
-        Observed data to model.
+        Observed data to model. Binned datasets use a binned likelihood
+        (`pylater.dist.LATERBinned`), and the censored trials of a dataset are
+        modelled by an `obs_<name>_censored` variable
+        (`pylater.dist.LATERCensored`).
     share_type
         With multiple datasets, parameters can be shared according to a 'shift'
-        or a 'swivel' arrangement.
+        or a 'swivel' arrangement, or each dataset can have its own parameters
+        ('independent').
+    priors
+        Priors to use in place of the defaults (`DEFAULT_PRIORS`), keyed by the
+        parameter name (`sigma`, `k`, or `sigma_e_mod`).
 
     Returns
     -------
@@ -48,7 +140,8 @@ def build_default_model(
 
     warnings.warn(
         message="Note that this uses priors that may not be appropriate for your use case",
-        stacklevel=2,
+        # the instrumentation wrapper adds a frame between this and the caller
+        stacklevel=3,
     )
 
     sharing = (
@@ -57,8 +150,15 @@ def build_default_model(
         else None
     )
 
+    model_priors = get_priors(priors=priors)
+
     n_datasets = len(datasets)
 
+    pylater.instrument.annotate(
+        n_datasets=n_datasets,
+        n_trials=sum(dataset.n_trials for dataset in datasets),
+    )
+
     if n_datasets > 1 and sharing is None:
         raise ValueError(
             "With multiple datasets, must provide a `share_type` argument"
@@ -66,7 +166,76 @@ def build_default_model(
 
     dataset_names = [dataset.name for dataset in datasets]
 
-    if sharing is None:
+    with pm.Model(
+        coords={
+            "dataset": dataset_names,
+            "shared": ("shared",),
+        },
+    ) as model:
+
+        params = add_default_parameters(
+            n_datasets=n_datasets,
+            sharing=sharing,
+            model_priors=model_priors,
+        )
+
+        (mu, sigma_all, sigma_e) = (
+            params[param_name] for param_name in ("mu", "sigma", "sigma_e")
+        )
+
+        for (i_dataset, dataset) in enumerate(datasets):
+
+            if isinstance(dataset, pylater.data.BinnedDataset):
+                pylater.dist.LATERBinned(
+                    name=f"obs_{dataset.name}",
+                    mu=mu[i_dataset],
+                    sigma=sigma_all[i_dataset],
+                    sigma_e=sigma_e[i_dataset],
+                    edges_s=dataset.edges_s,
+                    observed_counts=dataset.counts,
+                )
+                continue
+
+            pylater.LATER(
+                name=f"obs_{dataset.name}",
+                mu=mu[i_dataset],
+                sigma=sigma_all[i_dataset],
+                sigma_e=sigma_e[i_dataset],
+                observed_rt_s=dataset.rt_s,
+                censor_lower_s=dataset.censor_lower_s,
+                censor_upper_s=dataset.censor_upper_s,
+                n_censored_lower=dataset.n_censored_lower,
+                n_censored_upper=dataset.n_censored_upper,
+            )
+
+    return model
+
+
+def add_default_parameters(
+    n_datasets: int,
+    sharing: ShareType | None,
+    model_priors: typing.Mapping[str, LogNormalPrior],
+) -> dict[str, pt.TensorVariable]:  # type: ignore[name-defined]
+    """
+    Add the parameters of the default model to the current model context.
+
+    Parameters
+    ----------
+    n_datasets
+        Number of datasets; the model needs `dataset` and `shared` coordinates.
+    sharing
+        Arrangement by which parameters are shared among datasets.
+    model_priors
+        Prior of each parameter (see `get_priors`).
+
+    Returns
+    -------
+    dict[str, pt.TensorVariable]
+        The `sigma`, `k`, `sigma_e_mod`, `mu`, and `sigma_e` parameters, with
+        shared parameters repeated so that each has one value per dataset.
+    """
+
+    if sharing is None or sharing is ShareType.INDEPENDENT:
         n_sigma = n_k = n_datasets
         sigma_dims = k_dims = "dataset"
     elif sharing is ShareType.SHIFT:
@@ -80,67 +249,82 @@ def build_default_model(
         sigma_dims = "dataset"
         k_dims = "shared"
 
-    with pm.Model(
-        coords={
-            "dataset": dataset_names,
-            "shared": ("shared",),
-        },
-    ) as model:
+    sigma = pm.LogNormal(
+        "sigma",
+        mu=model_priors["sigma"].mu,
+        sigma=model_priors["sigma"].sigma,
+        dims=sigma_dims,
+    )
 
-        # 95% CI of [0.375, 1.5]
-        sigma = pm.LogNormal(
-            "sigma",
-            mu=np.log(0.75),
-            sigma=np.log(2) / 2,
-            dims=sigma_dims,
-        )
+    sigma_all = pm.math.pt.repeat(
+        x=sigma,
+        repeats=n_datasets - n_sigma + 1,
+    )
 
-        sigma_all = pm.math.pt.repeat(
-            x=sigma,
-            repeats=n_datasets - n_sigma + 1,
-        )
+    k = pm.LogNormal(
+        "k",
+        mu=model_priors["k"].mu,
+        sigma=model_priors["k"].sigma,
+        dims=k_dims,
+    )
 
-        # 95% CI of [2.5, 10]
-        k = pm.LogNormal(
-            "k",
-            mu=np.log(5),
-            sigma=np.log(2) / 2,
-            dims=k_dims,
-        )
+    k_all = pm.math.pt.repeat(
+        x=k,
+        repeats=n_datasets - n_k + 1,
+    )
 
-        k_all = pm.math.pt.repeat(
-            x=k,
-            repeats=n_datasets - n_k + 1,
-        )
+    sigma_e_mod = pm.LogNormal(
+        "sigma_e_mod",
+        mu=model_priors["sigma_e_mod"].mu,
+        sigma=model_priors["sigma_e_mod"].sigma,
+        dims="dataset",
+    )
 
-        # 95% CI of [2, 8]
-        sigma_e_mod = pm.LogNormal(
-            "sigma_e_mod",
-            mu=np.log(4),
-            sigma=np.log(2) / 2,
-            dims="dataset",
-        )
+    mu = pm.Deterministic(
+        "mu",
+        sigma_all * k_all,
+        dims="dataset",
+    )
 
-        mu = pm.Deterministic(
-            "mu",
-            sigma_all * k_all,
-            dims="dataset",
-        )
+    sigma_e = pm.Deterministic(
+        "sigma_e",
+        sigma_all * sigma_e_mod,
+        dims="dataset",
+    )
 
-        sigma_e = pm.Deterministic(
-            "sigma_e",
-            sigma_all * sigma_e_mod,
-            dims="dataset",
-        )
+    return {
+        "sigma": sigma_all,
+        "k": k_all,
+        "sigma_e_mod": sigma_e_mod,
+        "mu": mu,
+        "sigma_e": sigma_e,
+    }
 
-        for (i_dataset, dataset) in enumerate(datasets):
 
-            pylater.LATER(
-                name=f"obs_{dataset.name}",
-                mu=mu[i_dataset],
-                sigma=sigma_all[i_dataset],
-                sigma_e=sigma_e[i_dataset],
-                observed_rt_s=dataset.rt_s,
-            )
+def get_priors(
+    priors: typing.Mapping[str, LogNormalPrior] | None = None,
+) -> dict[str, LogNormalPrior]:
+    """
+    Combine any custom priors with the defaults.
 
-    return model
+    Parameters
+    ----------
+    priors
+        Priors to use in place of the defaults, keyed by the parameter name.
+
+    Returns
+    -------
+    dict[str, LogNormalPrior]
+        The complete set of priors.
+    """
+
+    if priors is None:
+        return dict(DEFAULT_PRIORS)
+
+    unknown = set(priors) - set(DEFAULT_PRIORS)
+
+    if unknown:
+        msg = f"Unknown prior names: {sorted(unknown)}"
+        raise ValueError(msg)
+
+    return {**DEFAULT_PRIORS, **priors}
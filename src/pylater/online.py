@@ -0,0 +1,518 @@
+from __future__ import annotations
+
+import typing
+
+import numpy as np
+import numpy.typing as npt
+
+import arviz as az
+
+import pylater.data
+import pylater.dist
+import pylater.instrument
+import pylater.model
+
+# order of the columns in the particle array
+PARAM_NAMES = ("sigma", "k", "sigma_e_mod")
+
+
+class OnlineLATER:
+    def __init__(
+        self,
+        name: str = "online",
+        n_particles: int = 2000,
+        priors: typing.Mapping[str, pylater.model.LogNormalPrior] | None = None,
+        ess_threshold: float = 0.5,
+        n_rejuvenation_steps: int = 5,
+        max_chunk_size: int = 2**22,
+        rng: np.random.Generator | int | None = None,
+    ) -> None:
+        """
+        Sequentially update the posterior of a single-dataset LATER model as
+        blocks of trials are observed.
+
+        Parameters
+        ----------
+        name
+            Name of the dataset, used as the `dataset` coordinate in the posterior.
+        n_particles
+            Number of particles used to represent the posterior.
+        priors
+            Priors to use in place of the defaults, as in `build_default_model`.
+        ess_threshold
+            The particles are resampled and rejuvenated when the effective sample
+            size falls below this proportion of `n_particles`.
+        n_rejuvenation_steps
+            Number of Metropolis-Hastings steps applied to each particle after
+            resampling.
+        max_chunk_size
+            Maximum number of particle-by-observation likelihood evaluations that
+            are held in memory at once.
+        rng
+            Random number generator, or a seed for one.
+
+        Notes
+        -----
+        * This uses a sequential Monte Carlo (particle filter) approach: the
+          particles are drawn from the default priors and each new block of trials
+          reweights them by its likelihood. When the weights degenerate, the
+          particles are resampled and moved with random-walk Metropolis-Hastings
+          steps that target the posterior given all of the trials so far. A block
+          that is very informative relative to the current posterior is
+          introduced over several tempering steps.
+        * The observations are stored with ties compressed, so the cost of a
+          rejuvenation step scales with the number of unique reaction times rather
+          than the number of trials.
+        * The posterior has the same variables and coordinates as a single-dataset
+          model from `build_default_model`.
+        """
+
+        if not 0 < ess_threshold <= 1:
+            raise ValueError("`ess_threshold` must be in (0, 1]")
+
+        self.name = name
+        self.n_particles = n_particles
+        self.ess_threshold = ess_threshold
+        self.n_rejuvenation_steps = n_rejuvenation_steps
+        self.max_chunk_size = max_chunk_size
+
+        self.rng = np.random.default_rng(rng)
+
+        self.priors = [
+            pylater.model.get_priors(priors=priors)[param_name]
+            for param_name in PARAM_NAMES
+        ]
+
+        # particles are stored as the logarithm of the parameters
+        self.log_params = np.column_stack(
+            [
+                self.rng.normal(loc=prior.mu, scale=prior.sigma, size=n_particles)
+                for prior in self.priors
+            ]
+        )
+
+        self.log_weights = np.zeros(n_particles)
+        self.log_likelihood = np.zeros(n_particles)
+
+        self.promptness = np.array([], dtype=np.float64)
+        self.counts = np.array([], dtype=np.int64)
+
+        self.n_acceptances = 0
+        self.n_proposals = 0
+
+    def __repr__(self) -> str:
+        return (
+            f"OnlineLATER posterior for '{self.name}' with {self.n_trials} trials "
+            + f"and {self.n_particles} particles"
+        )
+
+    @property
+    def n_trials(self) -> int:
+        return int(np.sum(self.counts))
+
+    @property
+    def ess(self) -> float:
+        """Effective sample size of the weighted particles."""
+        weights = normalise_log_weights(log_weights=self.log_weights)
+        return float(1 / np.sum(weights**2))
+
+    @property
+    def acceptance_rate(self) -> float:
+        """Proportion of accepted rejuvenation proposals."""
+        return self.n_acceptances / max(self.n_proposals, 1)
+
+    @pylater.instrument.instrumented("OnlineLATER.update")
+    def update(self, new_rt_s: npt.ArrayLike) -> az.data.inference_data.InferenceData:
+        """
+        Update the posterior with a new block of observations.
+
+        Parameters
+        ----------
+        new_rt_s
+            Reaction times in the new block, in seconds.
+
+        Returns
+        -------
+        az.data.inference_data.InferenceData
+            Inference data object containing samples from the updated posterior.
+        """
+
+        new_promptness, new_counts = pylater.data.compress_ties(
+            values=1.0 / np.asarray(new_rt_s, dtype=np.float64)
+        )
+
+        pylater.instrument.annotate(
+            n_new_trials=int(np.sum(new_counts)),
+            n_particles=self.n_particles,
+        )
+
+        block_log_likelihood = self.evaluate_log_likelihood(
+            log_params=self.log_params,
+            promptness=new_promptness,
+            counts=new_counts,
+        )
+
+        # the new block is introduced gradually (tempered) if its likelihood
+        # would otherwise collapse the particle weights
+        temperature = 0.0
+
+        while temperature < 1:
+
+            next_temperature = self.next_temperature(
+                temperature=temperature,
+                block_log_likelihood=block_log_likelihood,
+            )
+
+            self.log_weights += (next_temperature - temperature) * block_log_likelihood
+
+            temperature = next_temperature
+
+            if self.ess < self.ess_threshold * self.n_particles:
+                i_particles = self.resample()
+                block_log_likelihood = block_log_likelihood[i_particles]
+                block_log_likelihood = self.rejuvenate(
+                    block_promptness=new_promptness,
+                    block_counts=new_counts,
+                    block_log_likelihood=block_log_likelihood,
+                    temperature=temperature,
+                )
+
+        self.log_likelihood += block_log_likelihood
+
+        self.promptness, self.counts = merge_compressed(
+            values_a=self.promptness,
+            counts_a=self.counts,
+            values_b=new_promptness,
+            counts_b=new_counts,
+        )
+
+        return self.posterior()
+
+    def posterior(
+        self,
+        n_draws: int | None = None,
+    ) -> az.data.inference_data.InferenceData:
+        """
+        Draw equally-weighted samples from the current posterior.
+
+        Parameters
+        ----------
+        n_draws
+            Number of samples to draw; defaults to the number of particles.
+
+        Returns
+        -------
+        az.data.inference_data.InferenceData
+            Inference data object containing the posterior samples, with a single
+            chain.
+        """
+
+        if n_draws is None:
+            n_draws = self.n_particles
+
+        i_particles = systematic_resample(
+            weights=normalise_log_weights(log_weights=self.log_weights),
+            n_draws=n_draws,
+            rng=self.rng,
+        )
+
+        return params_to_idata(
+            log_params=self.log_params[i_particles, np.newaxis, :],
+            dataset_names=[self.name],
+        )
+
+    def resample(self) -> npt.NDArray[np.intp]:
+        """
+        Resample the particles in proportion to their weights.
+
+        Returns
+        -------
+        npt.NDArray[np.intp]
+            Indices of the resampled particles.
+        """
+
+        i_particles = systematic_resample(
+            weights=normalise_log_weights(log_weights=self.log_weights),
+            n_draws=self.n_particles,
+            rng=self.rng,
+        )
+
+        self.log_params = self.log_params[i_particles]
+        self.log_likelihood = self.log_likelihood[i_particles]
+        self.log_weights = np.zeros(self.n_particles)
+
+        return i_particles
+
+    def next_temperature(
+        self,
+        temperature: float,
+        block_log_likelihood: npt.NDArray[np.float64],
+        tolerance: float = 1e-3,
+    ) -> float:
+        """
+        Find the largest increase in the temperature of the new block that keeps
+        the effective sample size above the resampling threshold.
+        """
+
+        target_ess = self.ess_threshold * self.n_particles
+
+        def ess_at(next_temperature: float) -> float:
+            weights = normalise_log_weights(
+                log_weights=self.log_weights
+                + (next_temperature - temperature) * block_log_likelihood
+            )
+            return float(1 / np.sum(weights**2))
+
+        if ess_at(next_temperature=1.0) >= target_ess:
+            return 1.0
+
+        lower, upper = (temperature, 1.0)
+
+        while upper - lower > tolerance:
+            middle = (lower + upper) / 2
+            if ess_at(next_temperature=middle) >= target_ess:
+                lower = middle
+            else:
+                upper = middle
+
+        # always make some progress, without going beyond the full block
+        return min(max(lower, temperature + tolerance), 1.0)
+
+    def rejuvenate(
+        self,
+        block_promptness: npt.NDArray[np.float64],
+        block_counts: npt.NDArray[np.int64],
+        block_log_likelihood: npt.NDArray[np.float64],
+        temperature: float,
+    ) -> npt.NDArray[np.float64]:
+        """
+        Move the (equally-weighted) particles using random-walk Metropolis-Hastings
+        steps that target the posterior given the previous observations and the
+        tempered likelihood of the new block.
+
+        Returns
+        -------
+        npt.NDArray[np.float64]
+            The log-likelihood of the new block for the moved particles.
+        """
+
+        n_params = len(PARAM_NAMES)
+
+        # standard scaling for random-walk proposals
+        proposal_cov = (2.38**2 / n_params) * np.atleast_2d(
+            np.cov(self.log_params, rowvar=False)
+        )
+        proposal_chol = np.linalg.cholesky(proposal_cov + np.eye(n_params) * 1e-10)
+
+        log_prior = self.log_prior(log_params=self.log_params)
+
+        for _ in range(self.n_rejuvenation_steps):
+
+            proposal = self.log_params + (
+                self.rng.standard_normal(size=self.log_params.shape) @ proposal_chol.T
+            )
+
+            proposal_log_prior = self.log_prior(log_params=proposal)
+            proposal_log_likelihood = self.evaluate_log_likelihood(
+                log_params=proposal,
+                promptness=self.promptness,
+                counts=self.counts,
+            )
+            proposal_block_log_likelihood = self.evaluate_log_likelihood(
+                log_params=proposal,
+                promptness=block_promptness,
+                counts=block_counts,
+            )
+
+            log_ratio = (
+                proposal_log_prior
+                + proposal_log_likelihood
+                + temperature * proposal_block_log_likelihood
+            ) - (log_prior + self.log_likelihood + temperature * block_log_likelihood)
+
+            accept = np.log(self.rng.uniform(size=self.n_particles)) < log_ratio
+
+            self.log_params[accept] = proposal[accept]
+            self.log_likelihood[accept] = proposal_log_likelihood[accept]
+            block_log_likelihood[accept] = proposal_block_log_likelihood[accept]
+            log_prior[accept] = proposal_log_prior[accept]
+
+            self.n_acceptances += int(np.sum(accept))
+            self.n_proposals += self.n_particles
+
+        return block_log_likelihood
+
+    def log_prior(
+        self,
+        log_params: npt.NDArray[np.float64],
+    ) -> npt.NDArray[np.float64]:
+        """
+        Evaluate the log prior density of (log-transformed) particles.
+        """
+        log_prior: npt.NDArray[np.float64] = np.sum(
+            [
+                prior.log_density(log_value=log_params[:, i_param])
+                for (i_param, prior) in enumerate(self.priors)
+            ],
+            axis=0,
+        )
+        return log_prior
+
+    def evaluate_log_likelihood(
+        self,
+        log_params: npt.NDArray[np.float64],
+        promptness: npt.NDArray[np.float64],
+        counts: npt.NDArray[np.int64],
+    ) -> npt.NDArray[np.float64]:
+        """
+        Evaluate the log-likelihood of tie-compressed observations for each
+        (log-transformed) particle.
+        """
+        return compressed_log_likelihood(
+            log_params=log_params,
+            promptness=promptness,
+            counts=counts,
+            max_chunk_size=self.max_chunk_size,
+        )
+
+
+def compressed_log_likelihood(
+    log_params: npt.NDArray[np.float64],
+    promptness: npt.NDArray[np.float64],
+    counts: npt.NDArray[np.int64],
+    max_chunk_size: int = 2**22,
+) -> npt.NDArray[np.float64]:
+    """
+    Evaluate the LATER log-likelihood of tie-compressed observations.
+
+    Parameters
+    ----------
+    log_params
+        Logarithm of the `sigma`, `k`, and `sigma_e_mod` parameters, with the
+        parameters in the last dimension.
+    promptness
+        Unique observed promptness values.
+    counts
+        Number of observations of each unique promptness value.
+    max_chunk_size
+        Maximum number of parameter-by-observation evaluations to hold in memory
+        at once.
+
+    Returns
+    -------
+    npt.NDArray[np.float64]
+        The log-likelihood, with the shape of `log_params` without its last
+        dimension.
+    """
+
+    batch_shape = log_params.shape[:-1]
+
+    flat_params = np.exp(log_params.reshape(-1, log_params.shape[-1]))
+
+    sigma, k, sigma_e_mod = flat_params.T
+
+    log_likelihood = np.zeros(len(flat_params))
+
+    if len(promptness) == 0:
+        return log_likelihood.reshape(batch_shape)
+
+    chunk_size = max(1, max_chunk_size // len(promptness))
+
+    for i_start in range(0, len(flat_params), chunk_size):
+
+        chunk = slice(i_start, i_start + chunk_size)
+
+        log_likelihood[chunk] = (
+            pylater.dist.numpy_logp(
+                value=promptness[np.newaxis, :],
+                mu=(sigma[chunk] * k[chunk])[:, np.newaxis],
+                sigma=sigma[chunk, np.newaxis],
+                sigma_e=(sigma[chunk] * sigma_e_mod[chunk])[:, np.newaxis],
+            )
+            @ counts
+        )
+
+    return log_likelihood.reshape(batch_shape)
+
+
+def params_to_idata(
+    log_params: npt.NDArray[np.float64],
+    dataset_names: typing.Sequence[str],
+) -> az.data.inference_data.InferenceData:
+    """
+    Convert samples of the logarithm of the `sigma`, `k`, and `sigma_e_mod`
+    parameters into an inference data object matching the posterior of an
+    unshared model from `build_default_model`.
+
+    Parameters
+    ----------
+    log_params
+        Samples with shape (draws, datasets, parameters) or (chains, draws,
+        datasets, parameters).
+    dataset_names
+        Names of the datasets.
+
+    Returns
+    -------
+    az.data.inference_data.InferenceData
+        Inference data object containing the posterior samples.
+    """
+
+    if log_params.ndim == 3:
+        log_params = log_params[np.newaxis, ...]
+
+    sigma, k, sigma_e_mod = np.moveaxis(np.exp(log_params), -1, 0)
+
+    posterior = {
+        "sigma": sigma,
+        "k": k,
+        "sigma_e_mod": sigma_e_mod,
+        "mu": sigma * k,
+        "sigma_e": sigma * sigma_e_mod,
+    }
+
+    idata: az.data.inference_data.InferenceData = az.from_dict(
+        posterior=posterior,
+        coords={"dataset": list(dataset_names)},
+        dims={var_name: ["dataset"] for var_name in posterior},
+    )
+
+    return idata
+
+
+def normalise_log_weights(
+    log_weights: npt.NDArray[np.float64],
+) -> npt.NDArray[np.float64]:
+    weights = np.exp(log_weights - np.max(log_weights))
+    normalised: npt.NDArray[np.float64] = weights / np.sum(weights)
+    return normalised
+
+
+def systematic_resample(
+    weights: npt.NDArray[np.float64],
+    n_draws: int,
+    rng: np.random.Generator,
+) -> npt.NDArray[np.intp]:
+    positions = (rng.uniform() + np.arange(n_draws)) / n_draws
+    cumulative = np.cumsum(weights)
+    cumulative[-1] = 1.0
+    i_draws: npt.NDArray[np.intp] = np.searchsorted(cumulative, positions)
+    return i_draws
+
+
+def merge_compressed(
+    values_a: npt.NDArray[np.float64],
+    counts_a: npt.NDArray[np.int64],
+    values_b: npt.NDArray[np.float64],
+    counts_b: npt.NDArray[np.int64],
+) -> tuple[npt.NDArray[np.float64], npt.NDArray[np.int64]]:
+    values, i_inverse = np.unique(
+        np.concatenate((values_a, values_b)),
+        return_inverse=True,
+    )
+    counts = np.bincount(
+        i_inverse,
+        weights=np.concatenate((counts_a, counts_b)),
+        minlength=len(values),
+    ).astype(np.int64)
+    return (values, counts)
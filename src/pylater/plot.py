@@ -1,25 +1,40 @@
 from __future__ import annotations
 
 import enum
+import time
 import typing
 
 import numpy as np
+import numpy.typing as npt
 
-import scipy.stats
-
-import xarray as xr
+import scipy.special
 
 import arviz as az
 
 import matplotlib as mpl
 import matplotlib.axes
+import matplotlib.backend_bases
+import matplotlib.collections
 import matplotlib.figure
+import matplotlib.lines
 import matplotlib.pyplot as plt
 import matplotlib.scale
 import matplotlib.ticker
 import matplotlib.transforms
 
 import pylater.axes
+import pylater.bands
+import pylater.data
+import pylater.instrument
+import pylater.lines
+import pylater.store
+
+if typing.TYPE_CHECKING:
+    import pymc as pm
+
+
+# defined with the band calculations, and kept here for existing imports
+q_from_ci_range = pylater.bands.q_from_ci_range
 
 
 class DataPlotType(enum.Enum):
@@ -144,9 +159,10 @@ class ReciprobitPlot:
             ):
                 spine.set_position(("outward", self.axis_position_offset))
 
+    @pylater.instrument.instrumented("ReciprobitPlot.plot_data")
     def plot_data(
         self,
-        data: pylater.data.Dataset,
+        data: pylater.data.Dataset | pylater.data.BinnedDataset,
         plot_type: str = "step",
         n_points: int = 1000,
         **kwargs: str | float,
@@ -160,7 +176,8 @@ class ReciprobitPlot:
             Dataset containing the observations.
         plot_type
             Plots the data as a 'step' plot (`step`) or as individual
-            points (`scatter`).
+            points (`scatter`). For binned datasets, the points are at the upper
+            edge of each bin.
         n_points
             For 'step' plots, how many points to use when evaluating the ECDF.
         **kwargs
@@ -171,6 +188,13 @@ class ReciprobitPlot:
         -------
         ReciprobitPlot
             The `ReciprobitPlot` instance.
+
+        Notes
+        -----
+        * The ECDF of a censored dataset is over all of its trials, so it begins
+          at the proportion censored below the lower bound and ends at the
+          proportion not censored above the upper bound. It is not drawn
+          beyond a bound with censored trials, where it is unknown.
         """
 
         data_plot_type = DataPlotType(plot_type)
@@ -189,7 +213,21 @@ class ReciprobitPlot:
                 n_points,
             )
 
-            trial_ecdf_p = data.ecdf.cdf.evaluate(x_rt_s)
+            if isinstance(data, pylater.data.Dataset) and data.is_censored:
+                # so that the steps reach the censoring bounds
+                x_rt_s = np.union1d(
+                    x_rt_s,
+                    [
+                        bound_s
+                        for bound_s in (data.censor_lower_s, data.censor_upper_s)
+                        if bound_s is not None
+                        and self.min_rt_s <= bound_s <= self.max_rt_s
+                    ],
+                )
+
+            trial_ecdf_p = data.evaluate_ecdf(rt_s=x_rt_s)
+
+            pylater.instrument.annotate(n_points=n_points, n_trials=data.n_trials)
 
             with mpl.rc_context(rc=self.style):
                 self.ax.step(
@@ -214,6 +252,7 @@ class ReciprobitPlot:
 
         return self
 
+    @pylater.instrument.instrumented("ReciprobitPlot.plot_model")
     def plot_model(
         self,
         idata: az.data.inference_data.InferenceData,
@@ -222,6 +261,8 @@ class ReciprobitPlot:
         dataset_name: str | None = None,
         fill_kwargs: dict[str, typing.Any] | None = None,
         line_kwargs: dict[str, typing.Any] | None = None,
+        chunk_size: int = pylater.store.DEFAULT_CHUNK_SIZE,
+        use_cache: bool = True,
     ) -> ReciprobitPlot:
         """
         Plot a summary of model evaluations using parameters from a posterior
@@ -245,6 +286,11 @@ class ReciprobitPlot:
             credible interval.
         line_kwargs
             Keyword arguments passed directly to `plt.line`, for the median.
+        chunk_size
+            Number of draws (of each chain) to read and evaluate at a time.
+        use_cache
+            Whether to reuse the credible band from a previous plot of `idata`
+            with the same settings (see `pylater.bands`).
 
         Returns
         -------
@@ -257,37 +303,17 @@ class ReciprobitPlot:
         if line_kwargs is None:
             line_kwargs = {}
 
-        (lower_q, upper_q) = q_from_ci_range(ci_range=ci_range)
-
-        dataset: xr.Dataset = az.extract(
-            data=idata,
-            group="posterior",
-            combined=True,
+        band = pylater.bands.model_band(
+            idata=idata,
+            min_rt_s=self.min_rt_s,
+            max_rt_s=self.max_rt_s,
+            n_points=n_points,
+            ci_range=ci_range,
+            dataset_name=dataset_name,
+            chunk_size=chunk_size,
+            use_cache=use_cache,
         )
 
-        subset = (
-            dataset.sel(dataset=dataset_name)
-            if dataset_name is not None
-            else dataset.squeeze()
-        ).expand_dims(dim="x", axis=0)
-
-        x_rt_s = np.logspace(
-            np.log10(self.min_rt_s),
-            np.log10(self.max_rt_s),
-            n_points,
-        )
-
-        log_p = pylater.dist.logcdf(
-            value=1 / x_rt_s[:, np.newaxis],
-            mu=subset.mu.values,
-            sigma=subset.sigma.values,
-            sigma_e=subset.sigma_e.values,
-        ).eval()
-
-        p = 1 - np.exp(log_p)
-
-        quantiles = np.quantile(p, q=[0.5, lower_q, upper_q], axis=1)
-
         with mpl.rc_context(rc=self.style):
 
             if "alpha" not in fill_kwargs:
@@ -297,9 +323,9 @@ class ReciprobitPlot:
                 fill_kwargs["label"] = f"{ci_range:.0%} credible interval"
 
             self.ax.fill_between(
-                x_rt_s,
-                quantiles[1, :],
-                quantiles[2, :],
+                band.rt.values,
+                band.sel(statistic="lower").values,
+                band.sel(statistic="upper").values,
                 clip_on=False,
                 **fill_kwargs,
             )
@@ -308,8 +334,8 @@ class ReciprobitPlot:
                 line_kwargs["label"] = "Median"
 
             self.ax.plot(
-                x_rt_s,
-                quantiles[0, :],
+                band.rt.values,
+                band.sel(statistic="median").values,
                 clip_on=False,
                 **line_kwargs,
             )
@@ -319,6 +345,70 @@ class ReciprobitPlot:
 
         return self
 
+    def live_model(
+        self,
+        model: pm.Model,
+        dataset_name: str | None = None,
+        n_points: int = 200,
+        ci_range: float = 0.95,
+        window: int = 1000,
+        max_draws: int = 1000,
+        refresh_interval_s: float = 0.25,
+        include_tuning: bool = True,
+        fill_kwargs: dict[str, typing.Any] | None = None,
+        line_kwargs: dict[str, typing.Any] | None = None,
+    ) -> LiveModelPlot:
+        """
+        Plot a summary of model evaluations that is updated as a model is sampled,
+        using the most recent draws.
+
+        Parameters
+        ----------
+        model
+            The PyMC model being sampled, which has `mu`, `sigma`, and `sigma_e`
+            variables (as from `build_default_model`).
+        dataset_name
+            Name of the dataset to plot, as in `plot_model`.
+        n_points
+            How many points to use when evaluating the model.
+        ci_range
+            Width of the credible interval.
+        window
+            Number of the most recent draws (across chains) that are summarised.
+        max_draws
+            The draws in the window are thinned, evenly, to at most this number
+            when the summary is evaluated.
+        refresh_interval_s
+            Minimum time, in seconds, between redraws.
+        include_tuning
+            Whether to include tuning draws.
+        fill_kwargs
+            Keyword arguments passed directly to `plt.fill_between`, for the
+            credible interval.
+        line_kwargs
+            Keyword arguments passed directly to `plt.line`, for the median.
+
+        Returns
+        -------
+        LiveModelPlot
+            A callback to pass to `pm.sample` (as `callback`).
+        """
+
+        return LiveModelPlot(
+            plot=self,
+            model=model,
+            dataset_name=dataset_name,
+            n_points=n_points,
+            ci_range=ci_range,
+            window=window,
+            max_draws=max_draws,
+            refresh_interval_s=refresh_interval_s,
+            include_tuning=include_tuning,
+            fill_kwargs=fill_kwargs,
+            line_kwargs=line_kwargs,
+        )
+
+    @pylater.instrument.instrumented("ReciprobitPlot.plot_predictive")
     def plot_predictive(
         self,
         idata: az.data.inference_data.InferenceData,
@@ -328,6 +418,8 @@ class ReciprobitPlot:
         ci_range: float = 0.95,
         fill_kwargs: dict[str, typing.Any] | None = None,
         line_kwargs: dict[str, typing.Any] | None = None,
+        chunk_size: int = pylater.store.DEFAULT_CHUNK_SIZE,
+        use_cache: bool = True,
     ) -> ReciprobitPlot:
         """
         Plot a summary of draws from a prior or posterior predictive
@@ -351,6 +443,11 @@ class ReciprobitPlot:
             credible interval.
         line_kwargs
             Keyword arguments passed directly to `plt.line`, for the median.
+        chunk_size
+            Number of draws (of each chain) to read and evaluate at a time.
+        use_cache
+            Whether to reuse the credible band from a previous plot of `idata`
+            with the same settings (see `pylater.bands`).
 
         Returns
         -------
@@ -365,46 +462,16 @@ class ReciprobitPlot:
 
         pred_type = PredictiveDataType(predictive_type)
 
-        x_rt_s = np.logspace(
-            np.log10(self.min_rt_s),
-            np.log10(self.max_rt_s),
-            n_points,
-        )
-
-        group = pred_type.value + "_predictive"
-
-        dataset: xr.Dataset = az.extract(
-            data=idata,
-            group=group,
-            combined=True,
-            keep_dataset=True,
-        )
-
-        data = (
-            dataset.to_dataarray()
-            if observed_var_name is None
-            else dataset[observed_var_name]
-        )
-
-        def gen_ecdf(sample_data: xr.DataArray) -> xr.DataArray:
-            ecdf = scipy.stats.ecdf(sample=np.squeeze(sample_data.values))
-
-            ecdf_p = ecdf.cdf.evaluate(x=x_rt_s)
-
-            return xr.DataArray(
-                data=ecdf_p,
-                coords={"rt": x_rt_s},
-            )
-
-        da = data.groupby(
-            group="sample", squeeze=False
-        ).map(gen_ecdf)
-
-        (lower_q, upper_q) = q_from_ci_range(ci_range=ci_range)
-
-        quantiles = da.quantile(
-            dim="sample",
-            q=[0.5, lower_q, upper_q],
+        band = pylater.bands.predictive_band(
+            idata=idata,
+            predictive_type=pred_type.value,
+            min_rt_s=self.min_rt_s,
+            max_rt_s=self.max_rt_s,
+            observed_var_name=observed_var_name,
+            n_points=n_points,
+            ci_range=ci_range,
+            chunk_size=chunk_size,
+            use_cache=use_cache,
         )
 
         with mpl.rc_context(rc=self.style):
@@ -416,9 +483,9 @@ class ReciprobitPlot:
                 fill_kwargs["label"] = f"{ci_range:.0%} credible interval"
 
             self.ax.fill_between(
-                da.rt.values,
-                quantiles.sel(quantile=lower_q).values,
-                quantiles.sel(quantile=upper_q).values,
+                band.rt.values,
+                band.sel(statistic="lower").values,
+                band.sel(statistic="upper").values,
                 clip_on=False,
                 **fill_kwargs,
             )
@@ -427,8 +494,8 @@ class ReciprobitPlot:
                 line_kwargs["label"] = "Median"
 
             self.ax.plot(
-                da.rt.values,
-                quantiles.sel(quantile=0.5).values,
+                band.rt.values,
+                band.sel(statistic="median").values,
                 clip_on=False,
                 **line_kwargs,
             )
@@ -437,6 +504,91 @@ class ReciprobitPlot:
 
         return self
 
+    @pylater.instrument.instrumented("ReciprobitPlot.plot_lines")
+    def plot_lines(
+        self,
+        line_fit: pylater.lines.LineFit,
+        dataset_name: str | None = None,
+        n_points: int = 1000,
+        show_components: bool = True,
+        line_kwargs: dict[str, typing.Any] | None = None,
+        component_kwargs: dict[str, typing.Any] | None = None,
+    ) -> ReciprobitPlot:
+        """
+        Plot the distribution functions from reciprobit line fits.
+
+        Parameters
+        ----------
+        line_fit
+            The fitted parameters, from `pylater.lines.fit_lines`.
+        dataset_name
+            Name of the dataset to plot. If `None`, assumes that the fits are for a
+            single dataset.
+        n_points
+            How many points to use when evaluating the fitted functions.
+        show_components
+            Whether to also plot the straight lines of the main and early units.
+        line_kwargs
+            Keyword arguments passed directly to `plt.plot`, for the combined
+            distribution function.
+        component_kwargs
+            Keyword arguments passed directly to `plt.plot`, for the main and
+            early unit lines.
+
+        Returns
+        -------
+        ReciprobitPlot
+            The `ReciprobitPlot` instance.
+        """
+
+        if line_kwargs is None:
+            line_kwargs = {}
+        if component_kwargs is None:
+            component_kwargs = {}
+
+        if dataset_name is None:
+            if len(line_fit.dataset_names) != 1:
+                msg = "A dataset name is required when there are multiple fits"
+                raise ValueError(msg)
+            i_dataset = 0
+        else:
+            i_dataset = line_fit.dataset_names.index(dataset_name)
+
+        x_rt_s = np.logspace(
+            np.log10(self.min_rt_s),
+            np.log10(self.max_rt_s),
+            n_points,
+        )
+
+        components = ("combined", "main", "early") if show_components else ("combined",)
+
+        pylater.instrument.annotate(n_points=n_points, n_components=len(components))
+
+        with mpl.rc_context(rc=self.style):
+
+            for component in components:
+
+                p = line_fit.cdf(rt_s=x_rt_s, component=component)[i_dataset, :]
+
+                # the unit lines extend beyond the probability range of the axes
+                p = np.where((p >= self.min_p) & (p <= self.max_p), p, np.nan)
+
+                if component == "combined":
+                    kwargs = {"label": f"Fit ({line_fit.method.value})", **line_kwargs}
+                else:
+                    kwargs = {
+                        "label": f"{component.capitalize()} unit",
+                        "linestyle": "--",
+                        "linewidth": 0.75,
+                        **component_kwargs,
+                    }
+
+                self.ax.plot(x_rt_s, p, clip_on=False, **kwargs)
+
+            plt.legend()
+
+        return self
+
     @property
     def min_rt_s(self) -> float:
         return self._min_rt_s
@@ -478,5 +630,247 @@ class ReciprobitPlot:
         self.ax.set_ylim(ymax=value)
 
 
-def q_from_ci_range(ci_range: float) -> tuple[float, float]:
-    return ((1 - ci_range) / 2, 1 - (1 - ci_range) / 2)
+class LiveModelPlot:
+    def __init__(
+        self,
+        plot: ReciprobitPlot,
+        model: pm.Model,
+        dataset_name: str | None = None,
+        n_points: int = 200,
+        ci_range: float = 0.95,
+        window: int = 1000,
+        max_draws: int = 1000,
+        refresh_interval_s: float = 0.25,
+        include_tuning: bool = True,
+        fill_kwargs: dict[str, typing.Any] | None = None,
+        line_kwargs: dict[str, typing.Any] | None = None,
+    ) -> None:
+        """
+        A model summary in a reciprobit plot that is updated during sampling; see
+        `ReciprobitPlot.live_model`.
+
+        Notes
+        -----
+        * The credible interval and median artists are created once, and each
+          refresh updates their values and redraws only them over a saved copy of
+          the rest of the axes (blitting), where the canvas supports it.
+        * The parameters of each draw are kept in a ring buffer, and the
+          distribution function is evaluated directly (rather than through its
+          logarithm, as in `plot_model`). With the defaults, a refresh takes
+          around 20 ms, however many draws have been sampled.
+        * The artists are animated during sampling, and so are not included when
+          the figure is saved; call `finish` after sampling to redraw them
+          normally.
+        """
+
+        self.plot = plot
+        self.window = window
+        self.max_draws = max_draws
+        self.refresh_interval_s = refresh_interval_s
+        self.include_tuning = include_tuning
+
+        self.quantile_q = np.array([0.5, *q_from_ci_range(ci_range=ci_range)])
+
+        self.x_rt_s = np.logspace(
+            np.log10(plot.min_rt_s),
+            np.log10(plot.max_rt_s),
+            n_points,
+        )
+
+        dataset_names = list(model.coords.get("dataset", ()))
+
+        if dataset_name is None:
+            if len(dataset_names) > 1:
+                msg = "A `dataset_name` is needed for a model with multiple datasets"
+                raise ValueError(msg)
+            self.i_dataset = 0
+        else:
+            self.i_dataset = dataset_names.index(dataset_name)
+
+        # the parameters of each dataset, from the values of a draw
+        self.param_fn = model.compile_fn(
+            outs=model.replace_rvs_by_values(
+                [model["mu"], model["sigma"], model["sigma_e"]]
+            ),
+            inputs=model.value_vars,
+            on_unused_input="ignore",
+            point_fn=True,
+        )
+
+        # (draw, parameter); the oldest draw is overwritten once full
+        self.params = np.full((window, 3), np.nan)
+        self.n_recorded = 0
+        self.n_refreshes = 0
+        self.last_refresh_s = -np.inf
+
+        fill_kwargs = {
+            "alpha": 0.5,
+            "label": f"{ci_range:.0%} credible interval",
+            **(fill_kwargs or {}),
+        }
+        line_kwargs = {"label": "Median", **(line_kwargs or {})}
+
+        nans = np.full(n_points, np.nan)
+
+        with mpl.rc_context(rc=plot.style):
+
+            self.fill: matplotlib.collections.PolyCollection = plot.ax.fill_between(
+                self.x_rt_s,
+                nans,
+                nans,
+                clip_on=False,
+                animated=True,
+                **fill_kwargs,
+            )
+
+            (self.line,) = plot.ax.plot(
+                self.x_rt_s,
+                nans,
+                clip_on=False,
+                animated=True,
+                **line_kwargs,
+            )
+
+            plt.legend()
+
+        canvas = plot.fig.canvas
+
+        self.supports_blit = bool(getattr(canvas, "supports_blit", False))
+        self.background: typing.Any = None
+
+        # the background is saved whenever the whole figure is drawn (e.g., on
+        # resizing), as animated artists are not drawn then
+        self.draw_cid = canvas.mpl_connect("draw_event", self.on_draw)
+
+    def __repr__(self) -> str:
+        return (
+            f"Live model plot summarising {min(self.n_recorded, self.window)} "
+            + "recent draws"
+        )
+
+    def __call__(
+        self,
+        trace: typing.Any,  # noqa: ANN401, ARG002
+        draw: typing.Any,  # noqa: ANN401
+    ) -> None:
+        """
+        Record a draw, as a `pm.sample` callback, and refresh the plot if it is
+        due.
+        """
+
+        if draw.tuning and not self.include_tuning:
+            return
+
+        self.record(point=draw.point)
+
+        now_s = time.perf_counter()
+
+        if now_s - self.last_refresh_s >= self.refresh_interval_s:
+            self.refresh()
+            self.last_refresh_s = now_s
+
+    def record(self, point: dict[str, npt.NDArray[typing.Any]]) -> None:
+        """
+        Record the parameters of a draw.
+        """
+
+        (mu, sigma, sigma_e) = np.broadcast_arrays(*self.param_fn(point))
+
+        self.params[self.n_recorded % self.window] = (
+            np.ravel(mu)[self.i_dataset],
+            np.ravel(sigma)[self.i_dataset],
+            np.ravel(sigma_e)[self.i_dataset],
+        )
+
+        self.n_recorded += 1
+
+    def band(self) -> npt.NDArray[np.float64]:
+        """
+        Evaluate the median and credible interval of the distribution function
+        over the recorded draws.
+
+        Returns
+        -------
+        npt.NDArray[np.float64]
+            The median, lower, and upper values, with shape (3, points).
+        """
+
+        n_draws = min(self.n_recorded, self.window)
+
+        step = -(-n_draws // self.max_draws)
+
+        (mu, sigma, sigma_e) = self.params[:n_draws:step].T
+
+        promptness = 1 / self.x_rt_s[:, np.newaxis]
+
+        p = 1 - scipy.special.ndtr((promptness - mu) / sigma) * scipy.special.ndtr(
+            promptness / sigma_e
+        )
+
+        band: npt.NDArray[np.float64] = np.quantile(p, q=self.quantile_q, axis=1)
+
+        return band
+
+    @pylater.instrument.instrumented("LiveModelPlot.refresh")
+    def refresh(self) -> None:
+        """
+        Update the artists from the recorded draws and redraw them.
+        """
+
+        if self.n_recorded == 0:
+            return
+
+        (median, lower, upper) = self.band()
+
+        self.fill.set_verts(
+            [
+                np.column_stack(
+                    (
+                        np.concatenate((self.x_rt_s, self.x_rt_s[::-1])),
+                        np.concatenate((lower, upper[::-1])),
+                    )
+                )
+            ]
+        )
+        self.line.set_ydata(median)
+
+        canvas = self.plot.fig.canvas
+
+        if not (self.supports_blit and self.line.get_animated()):
+            canvas.draw_idle()
+
+        else:
+
+            if self.background is None:
+                # draws the figure, and so saves the background
+                canvas.draw()
+
+            canvas.restore_region(self.background)  # type: ignore[attr-defined]
+            self.plot.ax.draw_artist(self.fill)
+            self.plot.ax.draw_artist(self.line)
+            canvas.blit(self.plot.fig.bbox)
+
+        canvas.flush_events()
+
+        self.n_refreshes += 1
+
+    def finish(self) -> None:
+        """
+        Show the final summary as regular (non-animated) artists.
+        """
+
+        self.plot.fig.canvas.mpl_disconnect(self.draw_cid)
+        self.background = None
+
+        for artist in (self.fill, self.line):
+            artist.set_animated(False)
+
+        self.refresh()
+
+    def on_draw(self, event: matplotlib.backend_bases.Event | None) -> None:  # noqa: ARG002
+        canvas = self.plot.fig.canvas
+        self.background = canvas.copy_from_bbox(  # type: ignore[attr-defined]
+            self.plot.fig.bbox
+        )
+        self.plot.ax.draw_artist(self.fill)
+        self.plot.ax.draw_artist(self.line)
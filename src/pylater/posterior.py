@@ -0,0 +1,33 @@
+from __future__ import annotations
+
+import xarray as xr
+
+
+def dataset_posterior(posterior: xr.Dataset) -> xr.Dataset:
+    """
+    Express a posterior over the datasets of a fit, with any parameters that are
+    shared among the datasets repeated for each dataset.
+
+    Parameters
+    ----------
+    posterior
+        Posterior of a model from `build_default_model` (or with the same
+        parameter dimensions), with a `dataset` dimension.
+
+    Returns
+    -------
+    xr.Dataset
+        The posterior, with each variable over the `chain`, `draw`, and `dataset`
+        dimensions (in that order).
+    """
+
+    return xr.Dataset(
+        data_vars={
+            var_name: xr.broadcast(
+                var.squeeze(dim="shared", drop=True) if "shared" in var.dims else var,
+                posterior["dataset"],
+            )[0]
+            for var_name, var in posterior.data_vars.items()
+        },
+        attrs=posterior.attrs,
+    ).transpose("chain", "draw", "dataset", ...)
@@ -0,0 +1,608 @@
+from __future__ import annotations
+
+import re
+import typing
+
+import numpy as np
+import numpy.typing as npt
+
+import scipy.sparse
+
+import pymc as pm
+
+import pytensor.sparse
+
+import pylater.config
+import pylater.data
+import pylater.dist
+import pylater.instrument
+import pylater.model
+
+# the parameters of `build_default_model`, whose logarithms are modelled
+PARAM_NAMES = ("sigma", "k", "sigma_e_mod")
+
+# prior standard deviation of the coefficients that are not baselines (such as
+# differences between conditions, or slopes), on the logarithmic scale
+DEFAULT_EFFECT_SIGMA = 0.5
+
+CATEGORICAL_PATTERN = re.compile(r"^C\((?P<name>\w+)\)$")
+
+# the column of each row (or -1, if none), the value of each row, and the column names
+Coding = tuple[npt.NDArray[np.int64], npt.NDArray[np.float64], list[str]]
+
+
+class DesignMatrix:
+    __slots__ = ("column_names", "formula", "is_baseline", "matrix")
+
+    def __init__(
+        self,
+        formula: str,
+        matrix: scipy.sparse.csr_array,
+        column_names: list[str],
+        is_baseline: npt.NDArray[np.bool_],
+    ) -> None:
+        """
+        A sparse design matrix, as produced by `design_matrix`.
+
+        Parameters
+        ----------
+        formula
+            The formula from which the matrix was built.
+        matrix
+            The matrix, with a row per trial and a column per coefficient.
+        column_names
+            Name of each column.
+        is_baseline
+            Whether each column is a baseline (the intercept, or a level of a
+            categorical covariate that is coded without an intercept) rather
+            than an effect relative to a baseline.
+        """
+
+        self.formula = formula
+        self.matrix = matrix
+        self.column_names = column_names
+        self.is_baseline = is_baseline
+
+    def __repr__(self) -> str:
+        n_rows, n_columns = self.matrix.shape
+        return (
+            f"Design matrix for '{self.formula}' with {n_rows} rows and "
+            + f"{n_columns} columns"
+        )
+
+
+def design_matrix(
+    formula: str,
+    covariates: typing.Mapping[str, npt.ArrayLike],
+    n_trials: int | None = None,
+) -> DesignMatrix:
+    """
+    Build a sparse design matrix from a formula and the covariates of each trial.
+
+    Parameters
+    ----------
+    formula
+        Terms separated by `+`. A term is `1` (an intercept, which is included
+        unless the formula contains `0`), or covariate names separated by `:`
+        (an interaction). A covariate is categorical if written as `C(name)` or
+        if its values are not numeric, and is otherwise numeric.
+    covariates
+        Values of each covariate, one per trial.
+    n_trials
+        Number of trials; only needed if the formula has no covariates.
+
+    Returns
+    -------
+    DesignMatrix
+        The design matrix.
+
+    Notes
+    -----
+    * Categorical covariates use treatment coding, with an indicator column for
+      each level other than the first (in sorted order). If the formula has no
+      intercept, those of the first term with any categorical covariates instead
+      have a column for every level.
+    * Columns that are zero for every trial (e.g., interactions between levels
+      that never occur together) are removed.
+    """
+
+    has_intercept, terms = parse_formula(formula=formula)
+
+    covariate_values = {
+        name: np.asarray(values) for (name, values) in covariates.items()
+    }
+
+    if n_trials is None:
+        if not covariate_values:
+            msg = "The number of trials is needed if there are no covariates"
+            raise ValueError(msg)
+        n_trials = len(next(iter(covariate_values.values())))
+
+    # each term has at most one non-zero column in each row, and so is
+    # represented by the column (or -1, if none) and the value in each row
+    term_codings: list[Coding] = []
+    term_is_baseline: list[bool] = []
+
+    if has_intercept:
+        term_codings.append(
+            (np.zeros(n_trials, dtype=np.int64), np.ones(n_trials), ["Intercept"])
+        )
+        term_is_baseline.append(True)
+
+    full_coding_used = has_intercept
+
+    for term in terms:
+
+        is_categorical = [
+            is_categorical_factor(factor=factor, covariate_values=covariate_values)
+            for factor in term
+        ]
+
+        full_coding = not full_coding_used and any(is_categorical)
+        full_coding_used |= full_coding
+
+        coding = (
+            np.zeros(n_trials, dtype=np.int64),
+            np.ones(n_trials),
+            [""],
+        )
+
+        for factor, factor_is_categorical in zip(term, is_categorical, strict=True):
+            coding = interact(
+                coding=coding,
+                factor_coding=factor_codings(
+                    factor=factor,
+                    covariate_values=covariate_values,
+                    is_categorical=factor_is_categorical,
+                    full_coding=full_coding,
+                    n_trials=n_trials,
+                ),
+            )
+
+        term_codings.append(coding)
+        term_is_baseline.append(full_coding and all(is_categorical))
+
+    rows, cols, values = ([], [], [])
+    column_names: list[str] = []
+    is_baseline: list[bool] = []
+
+    for (term_cols, term_values, term_names), term_baseline in zip(
+        term_codings, term_is_baseline, strict=True
+    ):
+        has_value = term_cols >= 0
+        rows.append(np.flatnonzero(has_value))
+        cols.append(term_cols[has_value] + len(column_names))
+        values.append(term_values[has_value])
+        column_names.extend(term_names)
+        is_baseline.extend([term_baseline] * len(term_names))
+
+    matrix = scipy.sparse.csr_array(
+        (np.concatenate(values), (np.concatenate(rows), np.concatenate(cols))),
+        shape=(n_trials, len(column_names)),
+    )
+    matrix.eliminate_zeros()
+
+    # remove the columns that have no entries
+    is_used = np.bincount(matrix.indices, minlength=len(column_names)) > 0
+    i_used = np.flatnonzero(is_used)
+
+    return DesignMatrix(
+        formula=formula,
+        matrix=scipy.sparse.csr_array(matrix[:, i_used]),
+        column_names=[column_names[i_column] for i_column in i_used],
+        is_baseline=np.array(is_baseline, dtype=bool)[i_used],
+    )
+
+
+def parse_formula(formula: str) -> tuple[bool, list[list[str]]]:
+    """
+    Parse a formula into whether it has an intercept and the factors of each of
+    its other terms.
+    """
+
+    has_intercept = True
+    terms: list[list[str]] = []
+
+    for raw_term in formula.replace(" ", "").split("+"):
+
+        if raw_term == "1":
+            continue
+
+        if raw_term in ("0", "-1"):
+            has_intercept = False
+            continue
+
+        term = raw_term.split(":")
+
+        if not raw_term or not all(
+            re.fullmatch(r"\w+", factor) or CATEGORICAL_PATTERN.match(factor)
+            for factor in term
+        ):
+            msg = f"Invalid term '{raw_term}' in formula '{formula}'"
+            raise ValueError(msg)
+
+        if term not in terms:
+            terms.append(term)
+
+    return (has_intercept, terms)
+
+
+def formula_covariates(formula: str) -> set[str]:
+    """
+    The names of the covariates in a formula.
+    """
+
+    _, terms = parse_formula(formula=formula)
+
+    return {
+        match["name"] if (match := CATEGORICAL_PATTERN.match(factor)) else factor
+        for term in terms
+        for factor in term
+    }
+
+
+def is_categorical_factor(
+    factor: str,
+    covariate_values: dict[str, npt.NDArray[typing.Any]],
+) -> bool:
+
+    match = CATEGORICAL_PATTERN.match(factor)
+
+    name = match["name"] if match is not None else factor
+
+    if name not in covariate_values:
+        msg = f"Unknown covariate '{name}'"
+        raise ValueError(msg)
+
+    return match is not None or covariate_values[name].dtype.kind not in "biuf"
+
+
+def factor_codings(
+    factor: str,
+    covariate_values: dict[str, npt.NDArray[typing.Any]],
+    is_categorical: bool,
+    full_coding: bool,
+    n_trials: int,
+) -> Coding:
+    """
+    The column (or -1, if none) and value of a factor in each row, and the name
+    of each column.
+    """
+
+    match = CATEGORICAL_PATTERN.match(factor)
+
+    name = match["name"] if match is not None else factor
+
+    values = covariate_values[name]
+
+    if len(values) != n_trials:
+        msg = f"Covariate '{name}' has {len(values)} values rather than {n_trials}"
+        raise ValueError(msg)
+
+    if not is_categorical:
+        return (
+            np.zeros(n_trials, dtype=np.int64),
+            values.astype(np.float64),
+            [name],
+        )
+
+    levels, codes = np.unique(values, return_inverse=True)
+
+    if full_coding:
+        return (
+            codes.astype(np.int64),
+            np.ones(n_trials),
+            [f"C({name})[{level}]" for level in levels],
+        )
+
+    return (
+        codes.astype(np.int64) - 1,
+        np.ones(n_trials),
+        [f"C({name})[T.{level}]" for level in levels[1:]],
+    )
+
+
+def interact(
+    coding: Coding,
+    factor_coding: Coding,
+) -> Coding:
+    """
+    The row-wise product of the columns of two codings.
+    """
+
+    cols, values, names = coding
+    factor_cols, factor_values, factor_names = factor_coding
+
+    return (
+        np.where(
+            (cols >= 0) & (factor_cols >= 0),
+            cols * len(factor_names) + factor_cols,
+            -1,
+        ),
+        values * factor_values,
+        [
+            ":".join(filter(None, (name, factor_name)))
+            for name in names
+            for factor_name in factor_names
+        ],
+    )
+
+
+def unique_rows(
+    matrix: scipy.sparse.csr_array,
+) -> tuple[npt.NDArray[np.int64], npt.NDArray[np.int64]]:
+    """
+    Find the distinct rows of a sparse matrix.
+
+    Returns
+    -------
+    i_unique, inverse
+        The index of the first occurrence of each distinct row, and the index of
+        the distinct row that corresponds to each row.
+    """
+
+    matrix = scipy.sparse.csr_array(matrix)
+    matrix.sum_duplicates()
+
+    n_entries = np.diff(matrix.indptr)
+
+    # the entries of each row, padded to the same length
+    i_row = np.repeat(np.arange(matrix.shape[0]), n_entries)
+    i_entry = np.arange(matrix.nnz) - np.repeat(matrix.indptr[:-1], n_entries)
+
+    keys = np.full((matrix.shape[0], 2 * max(int(n_entries.max(initial=0)), 1)), -1.0)
+    keys[i_row, 2 * i_entry] = matrix.indices
+    keys[i_row, 2 * i_entry + 1] = matrix.data
+
+    _, i_unique, inverse = np.unique(
+        keys,
+        axis=0,
+        return_index=True,
+        return_inverse=True,
+    )
+
+    return (i_unique.astype(np.int64), inverse.reshape(-1).astype(np.int64))
+
+
+def share_type_formulas(
+    share_type: str | None,
+    dataset_covariate: str = "dataset",
+) -> dict[str, str]:
+    """
+    The formulas with which `build_regression_model` is equivalent to
+    `build_default_model`.
+
+    Parameters
+    ----------
+    share_type
+        Parameter sharing arrangement (`shift` or `swivel`), or `None` for
+        independent datasets.
+    dataset_covariate
+        Name of the covariate that identifies the dataset of each trial.
+
+    Returns
+    -------
+    dict[str, str]
+        The formula of each parameter.
+    """
+
+    per_dataset = f"0 + C({dataset_covariate})"
+
+    sharing = pylater.model.ShareType(share_type) if share_type is not None else None
+
+    return {
+        "sigma": "1" if sharing is pylater.model.ShareType.SHIFT else per_dataset,
+        "k": "1" if sharing is pylater.model.ShareType.SWIVEL else per_dataset,
+        "sigma_e_mod": per_dataset,
+    }
+
+
+def datasets_covariates(
+    datasets: typing.Sequence[pylater.data.Dataset],
+) -> tuple[npt.NDArray[np.floating[typing.Any]], dict[str, npt.NDArray[np.str_]]]:
+    """
+    Combine the trials of separate datasets, with a `dataset` covariate
+    containing the name of the dataset of each trial.
+
+    Returns
+    -------
+    rt_s, covariates
+        The reaction times and covariates of all of the trials.
+    """
+
+    rt_s = np.concatenate([dataset.rt_s for dataset in datasets])
+
+    dataset_names = np.repeat(
+        [dataset.name for dataset in datasets],
+        [dataset.n_trials for dataset in datasets],
+    )
+
+    return (rt_s, {"dataset": dataset_names})
+
+
+@pylater.instrument.instrumented("build_regression_model")
+def build_regression_model(
+    rt_s: npt.ArrayLike,
+    covariates: typing.Mapping[str, npt.ArrayLike],
+    formulas: typing.Mapping[str, str] | None = None,
+    priors: typing.Mapping[str, pylater.model.LogNormalPrior] | None = None,
+    effect_sigma: float = DEFAULT_EFFECT_SIGMA,
+    name: str = "obs",
+    cell_params: bool = True,
+) -> pm.Model:
+    """
+    Assemble a LATER model in which the parameters of each trial depend on its
+    covariates, through a linear model of their logarithms.
+
+    Parameters
+    ----------
+    rt_s
+        Reaction time of each trial, in seconds.
+    covariates
+        Values of each covariate, one per trial.
+    formulas
+        Formula (see `design_matrix`) for each of the parameters of
+        `build_default_model`: `sigma`, `k` (the ratio of `mu` to `sigma`), and
+        `sigma_e_mod` (the ratio of `sigma_e` to `sigma`). Parameters without a
+        formula are constant over trials (`1`).
+    priors
+        Priors to use in place of the defaults (`DEFAULT_PRIORS` of
+        `pylater.model`) for the baseline coefficients of each parameter; see
+        the notes.
+    effect_sigma
+        Prior standard deviation of the other coefficients, on the logarithmic
+        scale.
+    name
+        Name of the observed variable.
+    cell_params
+        Whether to include `mu`, `sigma`, and `sigma_e` of each cell as
+        deterministic variables, which are then stored with each posterior draw.
+        With continuous covariates, there can be as many cells as trials.
+
+    Returns
+    -------
+    pm.Model
+        The PyMC model. The coefficients of each parameter are `<param>_coef`
+        (on the logarithmic scale), over the columns of its design matrix
+        (`<param>_column`). The values of `mu`, `sigma`, and `sigma_e`
+        are computed for each distinct combination of the covariates (`cell`).
+
+    Notes
+    -----
+    * Baseline coefficients (the intercept, or each level of a categorical
+      covariate that is coded without an intercept) have a normal prior with
+      the mean and standard deviation of the log-normal prior of the parameter.
+      The other coefficients have a normal prior with a mean of zero and a
+      standard deviation of `effect_sigma`.
+    * With the formulas from `share_type_formulas`, this is equivalent to
+      `build_default_model` with the corresponding `share_type`.
+    * The parameters are evaluated for each cell, rather than for each trial,
+      through a sparse matrix product; the likelihood is then evaluated over all
+      of the trials in a single vectorised operation.
+    """
+
+    rt_s = np.asarray(rt_s, dtype=pylater.config.float_dtype())
+
+    formulas = {param_name: "1" for param_name in PARAM_NAMES} | dict(formulas or {})
+
+    unknown = set(formulas) - set(PARAM_NAMES)
+
+    if unknown:
+        msg = f"Unknown parameter names: {sorted(unknown)}"
+        raise ValueError(msg)
+
+    model_priors = pylater.model.get_priors(priors=priors)
+
+    designs = {
+        param_name: design_matrix(
+            formula=formulas[param_name],
+            covariates=covariates,
+            n_trials=len(rt_s),
+        )
+        for param_name in PARAM_NAMES
+    }
+
+    # the trials with the same parameter values
+    i_cells, cell_index = unique_rows(
+        matrix=scipy.sparse.hstack(
+            [designs[param_name].matrix for param_name in PARAM_NAMES],
+            format="csr",
+        )
+    )
+
+    pylater.instrument.annotate(
+        n_trials=len(rt_s),
+        n_cells=len(i_cells),
+        n_coefs=sum(design.matrix.shape[1] for design in designs.values()),
+    )
+
+    with pm.Model(
+        coords={
+            **{
+                f"{param_name}_column": design.column_names
+                for (param_name, design) in designs.items()
+            },
+            "cell": cell_labels(
+                covariates={
+                    covariate_name: covariates[covariate_name]
+                    for covariate_name in covariates
+                    if any(
+                        covariate_name in formula_covariates(formula=formula)
+                        for formula in formulas.values()
+                    )
+                },
+                i_cells=i_cells,
+            ),
+        },
+    ) as model:
+
+        log_params = {}
+
+        for param_name, design in designs.items():
+
+            param_prior = model_priors[param_name]
+
+            coef = pm.Normal(
+                f"{param_name}_coef",
+                mu=np.where(design.is_baseline, param_prior.mu, 0.0),
+                sigma=np.where(design.is_baseline, param_prior.sigma, effect_sigma),
+                dims=f"{param_name}_column",
+            )
+
+            cell_matrix = scipy.sparse.csr_matrix(
+                design.matrix[i_cells], dtype=pylater.config.float_dtype()
+            )
+
+            log_params[param_name] = pytensor.sparse.structured_dot(  # type: ignore[no-untyped-call]
+                pytensor.sparse.as_sparse_variable(cell_matrix),  # type: ignore[no-untyped-call]
+                coef[:, np.newaxis],
+            )[
+                :, 0
+            ]
+
+        cell_values = {
+            "mu": pm.math.exp(log_params["sigma"] + log_params["k"]),
+            "sigma": pm.math.exp(log_params["sigma"]),
+            "sigma_e": pm.math.exp(log_params["sigma"] + log_params["sigma_e_mod"]),
+        }
+
+        if cell_params:
+            cell_values = {
+                param_name: pm.Deterministic(param_name, values, dims="cell")
+                for (param_name, values) in cell_values.items()
+            }
+
+        mu, sigma, sigma_e = (
+            cell_values[param_name] for param_name in ("mu", "sigma", "sigma_e")
+        )
+
+        pylater.dist.LATER(
+            name=name,
+            mu=mu[cell_index],
+            sigma=sigma[cell_index],
+            sigma_e=sigma_e[cell_index],
+            observed_rt_s=rt_s,
+        )
+
+    return model
+
+
+def cell_labels(
+    covariates: typing.Mapping[str, npt.ArrayLike],
+    i_cells: npt.NDArray[np.int64],
+) -> list[str]:
+    """
+    A label for each cell, from the covariate values of its first trial.
+    """
+
+    covariate_values = {
+        name: np.asarray(values)[i_cells] for (name, values) in covariates.items()
+    }
+
+    return [
+        ", ".join(
+            f"{name}={values[i_cell]}" for (name, values) in covariate_values.items()
+        )
+        or "all"
+        for i_cell in range(len(i_cells))
+    ]
@@ -0,0 +1,705 @@
+from __future__ import annotations
+
+import concurrent.futures
+import enum
+import json
+import os
+import pathlib
+import typing
+import warnings
+
+import numpy as np
+import numpy.typing as npt
+
+import scipy.stats
+
+import xarray as xr
+
+import pymc as pm
+
+import pylater.data
+import pylater.dist
+import pylater.files
+import pylater.fit
+import pylater.grid
+import pylater.instrument
+import pylater.model
+
+
+class Engine(enum.Enum):
+    NUTS = "nuts"
+    MAP = "map"
+    APPROX = "approx"
+    GRID = "grid"
+
+
+# the free parameters of `build_default_model`
+PARAM_NAMES = ("sigma", "k", "sigma_e_mod")
+
+MANIFEST_FILENAME = "sbc.json"
+RESULTS_FILENAME = "results.jsonl"
+
+# settings that can differ when resuming a run
+RESUMABLE_SETTINGS = ("n_simulations", "n_workers")
+
+
+class SBCResults:
+    __slots__ = ("path", "records", "settings")
+
+    def __init__(self, path: str | os.PathLike[str]) -> None:
+        """
+        Results of a simulation-based calibration run, as produced by `run_sbc`.
+
+        Parameters
+        ----------
+        path
+            Directory containing the run.
+        """
+
+        self.path = pathlib.Path(path)
+
+        settings = read_settings(path=self.path)
+
+        if settings is None:
+            msg = f"No calibration run found in {self.path}"
+            raise ValueError(msg)
+
+        self.settings = settings
+
+        self.records = sorted(
+            read_records(path=self.path),
+            key=lambda record: int(record["simulation"]),
+        )
+
+    def __repr__(self) -> str:
+        return (
+            f"Calibration run with {self.n_completed} of "
+            + f"{self.settings['n_simulations']} simulations completed, using the "
+            + f"'{self.settings['engine']}' engine"
+        )
+
+    @property
+    def n_completed(self) -> int:
+        return len(self.records)
+
+    def table(self) -> xr.Dataset:
+        """
+        Tabulate the true and estimated parameter values from each simulation.
+
+        Returns
+        -------
+        xr.Dataset
+            Contains the `true` value, the posterior `mean` and `sd`, the
+            `lower` and `upper` bounds of the central posterior interval, and the
+            `rank` of the true value amongst the thinned posterior draws, for
+            each simulation and parameter. The `diagnostic` of each fit is the
+            number of divergences (`nuts`), the Pareto `k` (`approx`), or not
+            available. Values that are not available for the engine are `NaN`.
+        """
+
+        if not self.records:
+            raise ValueError("No simulations have been completed")
+
+        param_labels = list(self.records[0]["params"])
+
+        stat_names = ("true", "mean", "sd", "lower", "upper", "rank")
+
+        values = np.array(
+            [
+                [
+                    [
+                        (
+                            np.nan
+                            if record["params"][label][stat] is None
+                            else record["params"][label][stat]
+                        )
+                        for stat in stat_names
+                    ]
+                    for label in param_labels
+                ]
+                for record in self.records
+            ],
+            dtype=np.float64,
+        )
+
+        dims = ("simulation", "param")
+
+        return xr.Dataset(
+            data_vars={
+                **{
+                    stat: (dims, values[..., i_stat])
+                    for (i_stat, stat) in enumerate(stat_names)
+                },
+                "diagnostic": (
+                    "simulation",
+                    np.array(
+                        [
+                            (
+                                np.nan
+                                if record["diagnostic"] is None
+                                else record["diagnostic"]
+                            )
+                            for record in self.records
+                        ],
+                        dtype=np.float64,
+                    ),
+                ),
+            },
+            coords={
+                "simulation": [record["simulation"] for record in self.records],
+                "param": param_labels,
+            },
+        )
+
+    def recovery(self) -> xr.Dataset:
+        """
+        Summarise how well the parameters were recovered.
+
+        Returns
+        -------
+        xr.Dataset
+            For each parameter: the `bias` and root-mean-square error (`rmse`)
+            of the posterior mean, the correlation between the posterior mean
+            and the true value (`correlation`), the proportion of simulations in
+            which the true value was within the central posterior interval
+            (`coverage`), and the posterior contraction (`contraction`; one minus
+            the ratio of the mean posterior variance to the prior variance).
+        """
+
+        table = self.table()
+
+        error = table["mean"] - table["true"]
+
+        is_covered = (table["true"] >= table["lower"]) & (
+            table["true"] <= table["upper"]
+        )
+
+        prior_variance = xr.DataArray(
+            data=[
+                lognormal_variance(prior=self.priors()[str(label).split("[")[0]])
+                for label in table["param"].values
+            ],
+            dims="param",
+            coords={"param": table["param"]},
+        )
+
+        return xr.Dataset(
+            data_vars={
+                "bias": error.mean(dim="simulation"),
+                "rmse": np.sqrt((error**2).mean(dim="simulation")),
+                "correlation": xr.corr(table["mean"], table["true"], dim="simulation"),
+                "coverage": is_covered.where(table["lower"].notnull()).mean(
+                    dim="simulation"
+                ),
+                "contraction": 1
+                - (table["sd"] ** 2).mean(dim="simulation") / prior_variance,
+            },
+        )
+
+    def rank_uniformity(self, n_bins: int = 10) -> xr.Dataset:
+        """
+        Test whether the ranks of the true values are uniformly distributed, as
+        they should be if the inference is calibrated.
+
+        Parameters
+        ----------
+        n_bins
+            Number of bins for the rank histogram.
+
+        Returns
+        -------
+        xr.Dataset
+            The rank histogram (`counts`), and the chi-square statistic
+            (`chi_square`) and its p-value (`p_value`) for each parameter.
+        """
+
+        table = self.table()
+
+        n_ranks = self.settings["n_rank_draws"] + 1
+
+        ranks = table["rank"].values
+
+        if np.all(np.isnan(ranks)):
+            raise ValueError("Ranks are not available for this engine")
+
+        bins = (ranks.astype(np.int64) * n_bins) // n_ranks
+
+        counts = np.stack(
+            [np.bincount(param_bins, minlength=n_bins) for param_bins in bins.T]
+        )
+
+        test = scipy.stats.chisquare(f_obs=counts, axis=-1)
+
+        return xr.Dataset(
+            data_vars={
+                "counts": (("param", "bin"), counts),
+                "chi_square": ("param", test.statistic),
+                "p_value": ("param", test.pvalue),
+            },
+            coords={"param": table["param"]},
+        )
+
+    def priors(self) -> dict[str, pylater.model.LogNormalPrior]:
+        """
+        The priors used in the run.
+        """
+        return {
+            param_name: pylater.model.LogNormalPrior(mu=mu, sigma=sigma)
+            for (param_name, (mu, sigma)) in self.settings["priors"].items()
+        }
+
+
+@pylater.instrument.instrumented("run_sbc")
+def run_sbc(
+    path: str | os.PathLike[str],
+    n_simulations: int = 100,
+    n_datasets: int = 1,
+    n_trials: int = 100,
+    share_type: str | None = None,
+    priors: typing.Mapping[str, pylater.model.LogNormalPrior] | None = None,
+    engine: str = "approx",
+    n_draws: int = 1000,
+    n_tune: int = 1000,
+    n_chains: int = 2,
+    n_rank_draws: int = 99,
+    interval_prob: float = 0.9,
+    n_workers: int = 1,
+    random_seed: int | None = None,
+) -> SBCResults:
+    """
+    Run simulation-based calibration and parameter recovery for the default
+    LATER model.
+
+    Each simulation draws parameter values from the prior, simulates datasets
+    from those values, and fits `build_default_model` to the simulated data.
+
+    Parameters
+    ----------
+    path
+        Directory in which to store the results.
+    n_simulations
+        Number of simulations.
+    n_datasets
+        Number of datasets in each simulation.
+    n_trials
+        Number of trials in each dataset.
+    share_type
+        Parameter sharing arrangement, for multiple datasets.
+    priors
+        Priors to use in place of the defaults, as in `build_default_model`.
+        These are used both to generate the parameters and to fit the model.
+    engine
+        Method of fitting: `nuts` (`pylater.fit.sample`), `map` (maximum a
+        posteriori estimate only, so no ranks or intervals), `approx`
+        (`pylater.fit.approximate`), or `grid` (`pylater.grid.grid_posterior`;
+        only for unshared models).
+    n_draws
+        Number of posterior draws (per chain, for `nuts`).
+    n_tune
+        Number of tuning draws per chain, for `nuts`.
+    n_chains
+        Number of chains, for `nuts`.
+    n_rank_draws
+        Number of (evenly-spaced) posterior draws with which to rank the true
+        value; the ranks range from 0 to `n_rank_draws`.
+    interval_prob
+        Probability mass of the central posterior interval.
+    n_workers
+        Number of processes to use.
+    random_seed
+        Seed for the random number generator.
+
+    Returns
+    -------
+    SBCResults
+        The results of the completed simulations.
+
+    Notes
+    -----
+    * The results of each simulation are appended to a file as they complete,
+      so the summaries in `SBCResults` can be computed while a run is in
+      progress. If `path` already contains a run with the same settings, only
+      the simulations that have not been completed are run; this allows an
+      interrupted run to be resumed, or a completed run to be extended by
+      increasing `n_simulations`.
+    * The random state of each simulation depends only on `random_seed` and the
+      simulation index, so the results do not depend on `n_workers`.
+    """
+
+    path = pathlib.Path(path)
+
+    fit_engine = Engine(engine)
+
+    sharing = pylater.model.ShareType(share_type) if share_type is not None else None
+
+    if fit_engine is Engine.GRID and sharing not in (
+        None,
+        pylater.model.ShareType.INDEPENDENT,
+    ):
+        raise ValueError("The grid engine only supports unshared models")
+
+    model_priors = pylater.model.get_priors(priors=priors)
+
+    existing = read_settings(path=path)
+
+    if random_seed is None and existing is not None:
+        # continue an existing run
+        entropy = existing["entropy"]
+    else:
+        entropy = np.random.SeedSequence(random_seed).entropy
+
+    settings = {
+        "n_simulations": n_simulations,
+        "n_datasets": n_datasets,
+        "n_trials": n_trials,
+        "share_type": share_type,
+        "priors": {
+            param_name: [prior.mu, prior.sigma]
+            for (param_name, prior) in model_priors.items()
+        },
+        "engine": fit_engine.value,
+        "n_draws": n_draws,
+        "n_tune": n_tune,
+        "n_chains": n_chains,
+        "n_rank_draws": n_rank_draws,
+        "interval_prob": interval_prob,
+        "n_workers": n_workers,
+        "entropy": entropy,
+    }
+
+    if existing is not None and any(
+        existing[setting_name] != setting_value
+        for (setting_name, setting_value) in settings.items()
+        if setting_name not in RESUMABLE_SETTINGS
+    ):
+        msg = f"A calibration run with different settings already exists in {path}"
+        raise ValueError(msg)
+
+    path.mkdir(parents=True, exist_ok=True)
+
+    pylater.files.write_atomic(
+        path=path / MANIFEST_FILENAME,
+        write=lambda file: file.write(json.dumps(settings).encode()),
+    )
+
+    completed = {int(record["simulation"]) for record in read_records(path=path)}
+
+    tasks: list[dict[str, typing.Any]] = [
+        {
+            "i_simulation": i_simulation,
+            "seed": np.random.SeedSequence(entropy, spawn_key=(i_simulation,)),
+            "settings": settings,
+        }
+        for i_simulation in range(n_simulations)
+        if i_simulation not in completed
+    ]
+
+    pylater.instrument.annotate(n_simulations=len(tasks))
+
+    results_path = path / RESULTS_FILENAME
+
+    with results_path.open("a") as results_file:
+
+        # a previous run may have been interrupted part-way through a line
+        if results_file.tell() > 0 and not results_path.read_text().endswith("\n"):
+            results_file.write("\n")
+
+        def save(record: dict[str, typing.Any]) -> None:
+            results_file.write(json.dumps(record) + "\n")
+            results_file.flush()
+
+        if n_workers == 1:
+            for task in tasks:
+                save(run_simulation(**task))
+        else:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=n_workers) as pool:
+                futures = [pool.submit(run_simulation, **task) for task in tasks]
+                for future in concurrent.futures.as_completed(futures):
+                    save(future.result())
+
+    return SBCResults(path=path)
+
+
+def run_simulation(
+    i_simulation: int,
+    seed: np.random.SeedSequence,
+    settings: dict[str, typing.Any],
+) -> dict[str, typing.Any]:
+    """
+    Generate parameters and data from the prior, fit the model, and summarise the
+    posterior relative to the generating parameters.
+    """
+
+    rng = np.random.default_rng(seed)
+
+    priors = {
+        param_name: pylater.model.LogNormalPrior(mu=mu, sigma=sigma)
+        for (param_name, (mu, sigma)) in settings["priors"].items()
+    }
+
+    true_params = draw_prior_params(
+        n_datasets=settings["n_datasets"],
+        share_type=settings["share_type"],
+        priors=priors,
+        rng=rng,
+    )
+
+    datasets = simulate_datasets(
+        params=true_params,
+        n_trials=settings["n_trials"],
+        rng=rng,
+    )
+
+    draws, diagnostic = fit_datasets(
+        datasets=datasets,
+        settings=settings,
+        priors=priors,
+        rng=rng,
+    )
+
+    tail_prob = (1 - settings["interval_prob"]) / 2
+
+    params = {}
+
+    for param_name in PARAM_NAMES:
+
+        for i_value, true_value in enumerate(true_params[param_name]):
+
+            param_draws = draws[param_name][:, i_value]
+
+            has_samples = len(param_draws) > 1
+
+            if has_samples:
+                i_rank_draws = np.round(
+                    np.linspace(0, len(param_draws) - 1, settings["n_rank_draws"])
+                ).astype(np.int64)
+                lower, upper = np.quantile(param_draws, [tail_prob, 1 - tail_prob])
+
+            params[f"{param_name}[{i_value}]"] = {
+                "true": float(true_value),
+                "mean": float(np.mean(param_draws)),
+                "sd": float(np.std(param_draws)) if has_samples else None,
+                "lower": float(lower) if has_samples else None,
+                "upper": float(upper) if has_samples else None,
+                "rank": (
+                    int(np.sum(param_draws[i_rank_draws] < true_value))
+                    if has_samples
+                    else None
+                ),
+            }
+
+    return {
+        "simulation": i_simulation,
+        "diagnostic": diagnostic,
+        "params": params,
+    }
+
+
+def draw_prior_params(
+    n_datasets: int,
+    share_type: str | None,
+    priors: typing.Mapping[str, pylater.model.LogNormalPrior],
+    rng: np.random.Generator,
+) -> dict[str, npt.NDArray[np.float64]]:
+    """
+    Draw values of the free parameters of `build_default_model` from their priors.
+
+    Parameters
+    ----------
+    n_datasets
+        Number of datasets.
+    share_type
+        Parameter sharing arrangement, for multiple datasets.
+    priors
+        Prior of each parameter.
+    rng
+        Random number generator.
+
+    Returns
+    -------
+    dict[str, npt.NDArray[np.float64]]
+        Values of `sigma`, `k`, and `sigma_e_mod`, with the shape of the
+        corresponding model variable.
+    """
+
+    sharing = pylater.model.ShareType(share_type) if share_type is not None else None
+
+    sizes = {
+        "sigma": 1 if sharing is pylater.model.ShareType.SHIFT else n_datasets,
+        "k": 1 if sharing is pylater.model.ShareType.SWIVEL else n_datasets,
+        "sigma_e_mod": n_datasets,
+    }
+
+    return {
+        param_name: priors[param_name].random(rng=rng, size=sizes[param_name])
+        for param_name in PARAM_NAMES
+    }
+
+
+def simulate_datasets(
+    params: typing.Mapping[str, npt.NDArray[np.float64]],
+    n_trials: int,
+    rng: np.random.Generator,
+) -> list[pylater.data.Dataset]:
+    """
+    Simulate datasets from values of the free parameters of `build_default_model`.
+
+    Parameters
+    ----------
+    params
+        Values of `sigma`, `k`, and `sigma_e_mod`, as from `draw_prior_params`.
+    n_trials
+        Number of trials in each dataset.
+    rng
+        Random number generator.
+
+    Returns
+    -------
+    list[pylater.data.Dataset]
+        The simulated datasets.
+    """
+
+    n_datasets = len(params["sigma_e_mod"])
+
+    sigma = np.broadcast_to(params["sigma"], (n_datasets,))
+    k = np.broadcast_to(params["k"], (n_datasets,))
+
+    rt_s = pylater.dist.random(
+        mu=(sigma * k)[:, np.newaxis],
+        sigma=sigma[:, np.newaxis],
+        sigma_e=(sigma * params["sigma_e_mod"])[:, np.newaxis],
+        rng=rng,
+        size=(n_datasets, n_trials),
+    )
+
+    return [
+        pylater.data.Dataset(name=f"dataset_{i_dataset}", rt_s=dataset_rt_s)
+        for (i_dataset, dataset_rt_s) in enumerate(np.atleast_2d(rt_s))
+    ]
+
+
+def fit_datasets(
+    datasets: list[pylater.data.Dataset],
+    settings: dict[str, typing.Any],
+    priors: dict[str, pylater.model.LogNormalPrior],
+    rng: np.random.Generator,
+) -> tuple[dict[str, npt.NDArray[np.float64]], float | None]:
+    """
+    Fit the default model using the configured engine.
+
+    Returns
+    -------
+    tuple[dict[str, npt.NDArray[np.float64]], float | None]
+        The posterior draws of each free parameter, with shape (draws, values),
+        and the diagnostic of the fit.
+    """
+
+    fit_engine = Engine(settings["engine"])
+
+    random_seed = int(rng.integers(2**31))
+
+    if fit_engine is Engine.GRID:
+        idata = pylater.grid.grid_posterior(
+            datasets=datasets,
+            priors=priors,
+        ).to_inference_data(n_draws=settings["n_draws"], rng=rng)
+        return (posterior_draws(idata=idata), None)
+
+    with warnings.catch_warnings():
+        warnings.filterwarnings(action="ignore", message="Note that this uses priors")
+        model = pylater.model.build_default_model(
+            datasets=datasets,
+            share_type=settings["share_type"],
+            priors=priors,
+        )
+
+    if fit_engine is Engine.MAP:
+        map_point = pm.find_MAP(model=model, progressbar=False, seed=random_seed)
+        return (
+            {
+                param_name: np.atleast_1d(map_point[param_name])[np.newaxis, :]
+                for param_name in PARAM_NAMES
+            },
+            None,
+        )
+
+    if fit_engine is Engine.APPROX:
+        idata = pylater.fit.approximate(
+            model=model,
+            n_draws=settings["n_draws"],
+            log_likelihood=False,
+            random_seed=random_seed,
+        )
+        assert hasattr(idata, "sample_stats")
+        return (posterior_draws(idata=idata), idata.sample_stats.attrs["pareto_k"])
+
+    idata = pylater.fit.sample(
+        model=model,
+        draws=settings["n_draws"],
+        tune=settings["n_tune"],
+        chains=settings["n_chains"],
+        cores=1,
+        progressbar=False,
+        compute_convergence_checks=False,
+        random_seed=random_seed,
+    )
+
+    assert hasattr(idata, "sample_stats")
+
+    return (posterior_draws(idata=idata), int(idata.sample_stats["diverging"].sum()))
+
+
+def posterior_draws(
+    idata: typing.Any,  # noqa: ANN401
+) -> dict[str, npt.NDArray[np.float64]]:
+    """
+    Extract the posterior draws of the free parameters, with shape (draws, values).
+    """
+    return {
+        param_name: np.reshape(
+            idata.posterior[param_name].values,
+            (-1, int(np.prod(idata.posterior[param_name].shape[2:]))),
+        )
+        for param_name in PARAM_NAMES
+    }
+
+
+def lognormal_variance(prior: pylater.model.LogNormalPrior) -> float:
+    return float((np.exp(prior.sigma**2) - 1) * np.exp(2 * prior.mu + prior.sigma**2))
+
+
+def read_settings(path: pathlib.Path) -> dict[str, typing.Any] | None:
+    settings_path = path / MANIFEST_FILENAME
+
+    if not settings_path.exists():
+        return None
+
+    settings: dict[str, typing.Any] = json.loads(settings_path.read_text())
+
+    return settings
+
+
+def read_records(path: pathlib.Path) -> list[dict[str, typing.Any]]:
+    """
+    Read the results of the completed simulations, skipping any line that was
+    only partially written.
+    """
+
+    results_path = path / RESULTS_FILENAME
+
+    if not results_path.exists():
+        return []
+
+    return [
+        record
+        for record in map(parse_record, results_path.read_text().splitlines())
+        if record is not None
+    ]
+
+
+def parse_record(line: str) -> dict[str, typing.Any] | None:
+    try:
+        record: dict[str, typing.Any] = json.loads(line)
+    except json.JSONDecodeError:
+        return None
+    return record
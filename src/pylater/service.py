@@ -0,0 +1,790 @@
+from __future__ import annotations
+
+import asyncio
+import concurrent.futures
+import enum
+import heapq
+import inspect
+import multiprocessing
+import multiprocessing.managers
+import os
+import time
+import typing
+import uuid
+import warnings
+
+import arviz as az
+
+import pymc as pm
+
+import pylater.data
+import pylater.fit
+import pylater.model
+
+# default limit on the number of jobs that are waiting to be run
+DEFAULT_MAX_QUEUED = 64
+
+# default minimum interval between progress updates from a running fit
+DEFAULT_PROGRESS_INTERVAL_S = 0.5
+
+
+class JobStatus(enum.Enum):
+    QUEUED = "queued"
+    BUILDING = "building"
+    SAMPLING = "sampling"
+    COMPLETED = "completed"
+    CANCELLED = "cancelled"
+    FAILED = "failed"
+
+    @property
+    def is_finished(self) -> bool:
+        return self in (JobStatus.COMPLETED, JobStatus.CANCELLED, JobStatus.FAILED)
+
+
+class Progress:
+    __slots__ = ("job_id", "n_draws", "n_total_draws", "status")
+
+    def __init__(
+        self,
+        job_id: str,
+        status: JobStatus,
+        n_draws: int = 0,
+        n_total_draws: int = 0,
+    ) -> None:
+        """
+        The state of a fitting job at a point in time.
+
+        Parameters
+        ----------
+        job_id
+            Identifier of the job.
+        status
+            Stage of the job.
+        n_draws
+            Number of draws (including tuning draws, over all chains) that have
+            been sampled.
+        n_total_draws
+            Number of draws (including tuning draws, over all chains) that the fit
+            will sample.
+        """
+
+        self.job_id = job_id
+        self.status = status
+        self.n_draws = n_draws
+        self.n_total_draws = n_total_draws
+
+    def __repr__(self) -> str:
+        return (
+            f"Job {self.job_id} {self.status.value} ({self.n_draws} of "
+            + f"{self.n_total_draws} draws)"
+        )
+
+    @property
+    def fraction(self) -> float:
+        """The fraction of the draws that have been sampled."""
+        return self.n_draws / self.n_total_draws if self.n_total_draws else 0.0
+
+
+class FitJob:
+    __slots__ = (
+        "cancel_event",
+        "future",
+        "job_id",
+        "owner",
+        "priority",
+        "progress",
+        "subscribers",
+        "task",
+    )
+
+    def __init__(
+        self,
+        job_id: str,
+        priority: int,
+        owner: str | None,
+        task: dict[str, typing.Any],
+        cancel_event: typing.Any,  # noqa: ANN401
+    ) -> None:
+        """
+        A fit that has been submitted to a `FitService`.
+
+        Parameters
+        ----------
+        job_id
+            Identifier of the job.
+        priority
+            Jobs with a higher priority are run first.
+        owner
+            Who submitted the job, if given.
+        task
+            Arguments to the function that runs the fit.
+        cancel_event
+            Event, shared with the worker processes, that is set to request that
+            the fit stops.
+        """
+
+        self.job_id = job_id
+        self.priority = priority
+        self.owner = owner
+        self.task = task
+        self.cancel_event = cancel_event
+
+        self.progress = Progress(job_id=job_id, status=JobStatus.QUEUED)
+
+        self.future: asyncio.Future[az.data.inference_data.InferenceData] = (
+            asyncio.get_running_loop().create_future()
+        )
+
+        self.subscribers: list[asyncio.Queue[Progress]] = []
+
+    def __repr__(self) -> str:
+        return f"Fitting job {self.job_id} ({self.status.value})"
+
+    @property
+    def status(self) -> JobStatus:
+        return self.progress.status
+
+    async def result(self) -> az.data.inference_data.InferenceData:
+        """
+        Wait for the fit to finish.
+
+        Returns
+        -------
+        az.data.inference_data.InferenceData
+            Inference data object containing the posterior samples.
+
+        Notes
+        -----
+        * Raises `asyncio.CancelledError` if the job was cancelled, or the error
+          that stopped the fit if it failed. Cancelling the task that awaits the
+          result does not cancel the job.
+        """
+
+        return await asyncio.shield(self.future)
+
+    async def updates(self) -> typing.AsyncIterator[Progress]:
+        """
+        Iterate over the progress of the job, starting from its current state and
+        finishing once the job has finished.
+
+        Yields
+        ------
+        Progress
+            The state of the job, whenever it changes (and, while sampling, at
+            most once per progress interval of the service).
+        """
+
+        queue: asyncio.Queue[Progress] = asyncio.Queue()
+
+        self.subscribers.append(queue)
+
+        try:
+            progress = self.progress
+
+            while True:
+                yield progress
+                if progress.status.is_finished:
+                    return
+                progress = await queue.get()
+
+        finally:
+            self.subscribers.remove(queue)
+
+    def cancel(self) -> bool:
+        """
+        Request that the job stops.
+
+        Returns
+        -------
+        bool
+            Whether the request was made; `False` if the job had already
+            finished.
+
+        Notes
+        -----
+        * A queued job is removed from the queue immediately. A running fit is
+          stopped cooperatively, at its next progress update, and so can take up
+          to the progress interval (plus the time to sample a draw) to stop; a
+          fit that is still building its model stops once sampling starts.
+        """
+
+        if self.status.is_finished:
+            return False
+
+        self.cancel_event.set()
+
+        if self.status is JobStatus.QUEUED:
+            self.finish(status=JobStatus.CANCELLED)
+
+        return True
+
+    def update(self, progress: Progress) -> None:
+        """
+        Record, and notify subscribers of, a change in the state of the job.
+        """
+
+        # updates from the worker can arrive after the job has finished
+        if self.status.is_finished:
+            return
+
+        self.progress = progress
+
+        for queue in self.subscribers:
+            queue.put_nowait(progress)
+
+    def finish(
+        self,
+        status: JobStatus,
+        idata: az.data.inference_data.InferenceData | None = None,
+        error: BaseException | None = None,
+    ) -> None:
+        """
+        Record the outcome of the job.
+        """
+
+        # the progress updates from the worker are at intervals, and so may not
+        # include the final draws
+        n_draws = (
+            self.progress.n_total_draws
+            if status is JobStatus.COMPLETED
+            else self.progress.n_draws
+        )
+
+        self.update(
+            progress=Progress(
+                job_id=self.job_id,
+                status=status,
+                n_draws=n_draws,
+                n_total_draws=self.progress.n_total_draws,
+            )
+        )
+
+        if self.future.done():
+            return
+
+        if status is JobStatus.COMPLETED:
+            assert idata is not None
+            self.future.set_result(idata)
+        elif status is JobStatus.FAILED:
+            assert error is not None
+            self.future.set_exception(error)
+        else:
+            self.future.cancel()
+
+        # the outcome is retrieved here so that it is not reported as unretrieved
+        # if nobody awaits the result
+        if not self.future.cancelled():
+            self.future.exception()
+
+
+class FitService:
+    __slots__ = (
+        "cores_per_fit",
+        "current_round",
+        "is_closing",
+        "jobs",
+        "manager",
+        "max_queued",
+        "n_submitted",
+        "n_workers",
+        "owner_rounds",
+        "pending",
+        "pool",
+        "progress_interval_s",
+        "running",
+        "tasks",
+        "updates",
+        "wakeup",
+    )
+
+    def __init__(
+        self,
+        n_workers: int | None = None,
+        cores_per_fit: int = 1,
+        max_queued: int = DEFAULT_MAX_QUEUED,
+        progress_interval_s: float = DEFAULT_PROGRESS_INTERVAL_S,
+    ) -> None:
+        """
+        Fit models from `build_default_model` in a pool of worker processes,
+        without blocking the event loop.
+
+        Parameters
+        ----------
+        n_workers
+            Number of fits to run at a time. Defaults to the number of cores on
+            the system divided by `cores_per_fit`, so that the fits do not
+            compete for cores.
+        cores_per_fit
+            Number of cores used by each fit, to sample its chains in parallel.
+        max_queued
+            Limit on the number of jobs that are waiting to be run.
+        progress_interval_s
+            Minimum interval between progress updates (and checks for
+            cancellation) from a running fit.
+
+        Notes
+        -----
+        * The service is used as an asynchronous context manager, which starts
+          the worker processes on entry and, on exit, cancels any unfinished jobs
+          and stops the workers:
+
+          .. code-block:: python
+
+              async with pylater.service.FitService() as service:
+                  job = await service.submit(datasets=[dataset], draws=500)
+                  async for progress in job.updates():
+                      ...
+                  idata = await job.result()
+
+        * Queued jobs are run in order of priority. Within a priority, the jobs
+          of different owners are interleaved, so that an owner who submits many
+          jobs does not hold up the jobs of others; jobs without an owner are
+          run in the order in which they were submitted.
+        * The service only keeps the jobs that have not finished; the result of
+          a finished job is available from the `FitJob` returned by `submit`.
+        * The workers are started with the `spawn` method, since the event loop
+          process typically has other threads running.
+        """
+
+        if n_workers is None:
+            n_workers = max(1, (os.cpu_count() or 1) // cores_per_fit)
+
+        if n_workers < 1 or cores_per_fit < 1:
+            msg = "The number of workers and of cores per fit must be at least one"
+            raise ValueError(msg)
+
+        self.n_workers = n_workers
+        self.cores_per_fit = cores_per_fit
+        self.max_queued = max_queued
+        self.progress_interval_s = progress_interval_s
+
+        # only the jobs that have not finished are kept, so that a long-running
+        # service does not accumulate the results of its past jobs
+        self.jobs: dict[str, FitJob] = {}
+
+        # entries are (-priority, round, submission number, job)
+        self.pending: list[tuple[int, int, int, FitJob]] = []
+
+        # identifiers of the jobs that are in the pool
+        self.running: set[str] = set()
+
+        self.n_submitted = 0
+        self.current_round = 0
+        self.owner_rounds: dict[str, int] = {}
+
+        self.wakeup: asyncio.Event | None = None
+        self.is_closing = False
+
+        self.manager: multiprocessing.managers.SyncManager | None = None
+        self.updates: typing.Any = None
+        self.pool: concurrent.futures.ProcessPoolExecutor | None = None
+        self.tasks: list[asyncio.Task[None]] = []
+
+    def __repr__(self) -> str:
+        return (
+            f"Fitting service with {self.n_workers} worker(s), {self.n_queued} "
+            + f"queued and {self.n_running} running job(s)"
+        )
+
+    async def __aenter__(self) -> FitService:
+        await self.start()
+        return self
+
+    async def __aexit__(self, *args: object) -> None:
+        await self.close()
+
+    @property
+    def n_queued(self) -> int:
+        # jobs that are cancelled while queued stay in the queue until taken
+        return sum(job.status is JobStatus.QUEUED for (*_, job) in self.pending)
+
+    @property
+    def n_running(self) -> int:
+        return len(self.running)
+
+    async def start(self) -> None:
+        """
+        Start the worker processes.
+        """
+
+        if self.pool is not None:
+            msg = "The service has already been started"
+            raise ValueError(msg)
+
+        context = multiprocessing.get_context("spawn")
+
+        # the manager shares the progress queue and cancellation events with the
+        # workers
+        self.manager = context.Manager()
+        self.updates = self.manager.Queue()
+
+        self.pool = concurrent.futures.ProcessPoolExecutor(
+            max_workers=self.n_workers,
+            mp_context=context,
+        )
+
+        self.wakeup = asyncio.Event()
+
+        # one dispatcher per worker, so that the pool never holds waiting fits
+        # and the order in which they run is decided here
+        self.tasks = [
+            asyncio.create_task(self.dispatch()) for _ in range(self.n_workers)
+        ]
+        self.tasks.append(asyncio.create_task(self.listen()))
+
+    async def close(self) -> None:
+        """
+        Cancel any unfinished jobs, and stop the worker processes.
+        """
+
+        if self.pool is None or self.is_closing:
+            return
+
+        self.is_closing = True
+
+        for job in list(self.jobs.values()):
+            job.cancel()
+
+        assert self.wakeup is not None
+        self.wakeup.set()
+
+        *dispatchers, listener = self.tasks
+
+        await asyncio.gather(*dispatchers)
+
+        # stops the listener
+        self.updates.put(None)
+        await listener
+
+        await asyncio.to_thread(self.pool.shutdown)
+
+        assert self.manager is not None
+        self.manager.shutdown()
+
+    async def submit(
+        self,
+        datasets: typing.Sequence[pylater.data.Dataset | pylater.data.BinnedDataset],
+        share_type: str | None = None,
+        priors: typing.Mapping[str, pylater.model.LogNormalPrior] | None = None,
+        priority: int = 0,
+        owner: str | None = None,
+        **kwargs: object,
+    ) -> FitJob:
+        """
+        Add a fit to the queue.
+
+        Parameters
+        ----------
+        datasets, share_type, priors
+            As for `build_default_model`.
+        priority
+            Jobs with a higher priority are run first.
+        owner
+            Who is submitting the job (e.g., a user or session identifier), so
+            that the jobs of different owners can be interleaved.
+        **kwargs
+            Additional arguments are passed directly to `pm.sample`. The service
+            provides its own `callback`, and `cores` is always `cores_per_fit`.
+
+        Returns
+        -------
+        FitJob
+            The job, which can be awaited, monitored, and cancelled.
+
+        Notes
+        -----
+        * Raises `asyncio.QueueFull` if `max_queued` jobs are already waiting.
+        * Raises `ValueError` if a `callback` is given, and warns if `cores` is
+          given.
+        """
+
+        if self.pool is None or self.is_closing:
+            msg = "The service is not running"
+            raise ValueError(msg)
+
+        if "callback" in kwargs:
+            msg = "The service uses its own sampling callback to report progress"
+            raise ValueError(msg)
+
+        if "cores" in kwargs:
+            warnings.warn(
+                message=f"Ignoring `cores`, each fit uses {self.cores_per_fit} cores",
+                stacklevel=2,
+            )
+
+        if len(self.pending) >= self.max_queued:
+            self.discard_cancelled()
+
+        if self.n_queued >= self.max_queued:
+            msg = f"There are already {self.max_queued} jobs waiting to be run"
+            raise asyncio.QueueFull(msg)
+
+        assert self.manager is not None
+
+        job = FitJob(
+            job_id=uuid.uuid4().hex,
+            priority=priority,
+            owner=owner,
+            task={
+                "datasets": datasets,
+                "share_type": share_type,
+                "priors": priors,
+                "sample_kwargs": {
+                    "progressbar": False,
+                    **kwargs,
+                    "cores": self.cores_per_fit,
+                },
+            },
+            cancel_event=await asyncio.to_thread(self.manager.Event),
+        )
+
+        # an owner's jobs are spread over successive rounds
+        job_round = self.current_round
+
+        if owner is not None:
+            job_round = max(job_round, self.owner_rounds.get(owner, job_round))
+            self.owner_rounds[owner] = job_round + 1
+
+        heapq.heappush(self.pending, (-priority, job_round, self.n_submitted, job))
+
+        self.n_submitted += 1
+        self.jobs[job.job_id] = job
+
+        assert self.wakeup is not None
+        self.wakeup.set()
+
+        return job
+
+    async def fit(
+        self,
+        datasets: typing.Sequence[pylater.data.Dataset | pylater.data.BinnedDataset],
+        share_type: str | None = None,
+        priors: typing.Mapping[str, pylater.model.LogNormalPrior] | None = None,
+        priority: int = 0,
+        owner: str | None = None,
+        **kwargs: object,
+    ) -> az.data.inference_data.InferenceData:
+        """
+        Submit a fit and wait for its result; the arguments are as for `submit`.
+        """
+
+        job = await self.submit(
+            datasets=datasets,
+            share_type=share_type,
+            priors=priors,
+            priority=priority,
+            owner=owner,
+            **kwargs,
+        )
+
+        return await job.result()
+
+    async def dispatch(self) -> None:
+        """
+        Repeatedly take the next job from the queue and run it in the pool.
+        """
+
+        assert self.wakeup is not None
+
+        loop = asyncio.get_running_loop()
+
+        while not self.is_closing:
+
+            if not self.pending:
+                self.wakeup.clear()
+                await self.wakeup.wait()
+                continue
+
+            _, job_round, _, job = heapq.heappop(self.pending)
+
+            # cancelled while queued
+            if job.status is not JobStatus.QUEUED:
+                self.jobs.pop(job.job_id, None)
+                continue
+
+            self.current_round = max(self.current_round, job_round)
+
+            job.update(progress=Progress(job_id=job.job_id, status=JobStatus.BUILDING))
+
+            self.running.add(job.job_id)
+
+            try:
+                idata = await loop.run_in_executor(
+                    self.pool,
+                    run_job_task,
+                    {
+                        **job.task,
+                        "job_id": job.job_id,
+                        "updates": self.updates,
+                        "cancel_event": job.cancel_event,
+                        "progress_interval_s": self.progress_interval_s,
+                    },
+                )
+            except Exception as err:
+                job.finish(status=JobStatus.FAILED, error=err)
+            else:
+                if idata is None:
+                    job.finish(status=JobStatus.CANCELLED)
+                else:
+                    job.finish(status=JobStatus.COMPLETED, idata=idata)
+            finally:
+                self.running.discard(job.job_id)
+                self.jobs.pop(job.job_id, None)
+
+    def discard_cancelled(self) -> None:
+        """
+        Remove the jobs that were cancelled while queued from the queue, rather
+        than waiting for them to be taken.
+        """
+
+        for (*_, job) in self.pending:
+            if job.status is not JobStatus.QUEUED:
+                self.jobs.pop(job.job_id, None)
+
+        self.pending = [
+            entry for entry in self.pending if entry[-1].status is JobStatus.QUEUED
+        ]
+
+        heapq.heapify(self.pending)
+
+    async def listen(self) -> None:
+        """
+        Pass progress updates from the workers to their jobs.
+        """
+
+        while True:
+
+            message = await asyncio.to_thread(self.updates.get)
+
+            if message is None:
+                return
+
+            job_id, status, n_draws, n_total_draws = message
+
+            job = self.jobs.get(job_id)
+
+            if job is not None:
+                job.update(
+                    progress=Progress(
+                        job_id=job_id,
+                        status=JobStatus(status),
+                        n_draws=n_draws,
+                        n_total_draws=n_total_draws,
+                    )
+                )
+
+
+class ProgressCallback:
+    __slots__ = (
+        "cancel_event",
+        "job_id",
+        "last_update_s",
+        "n_draws",
+        "n_total_draws",
+        "progress_interval_s",
+        "updates",
+    )
+
+    def __init__(
+        self,
+        job_id: str,
+        updates: typing.Any,  # noqa: ANN401
+        cancel_event: typing.Any,  # noqa: ANN401
+        progress_interval_s: float,
+        n_total_draws: int,
+    ) -> None:
+        """
+        Report the progress of a fit, as a `pm.sample` callback, and stop the fit
+        if it has been cancelled.
+        """
+
+        self.job_id = job_id
+        self.updates = updates
+        self.cancel_event = cancel_event
+        self.progress_interval_s = progress_interval_s
+        self.n_draws = 0
+        self.n_total_draws = n_total_draws
+        self.last_update_s = time.perf_counter()
+
+    def __call__(
+        self,
+        trace: typing.Any,  # noqa: ANN401, ARG002
+        draw: typing.Any,  # noqa: ANN401, ARG002
+    ) -> None:
+
+        self.n_draws += 1
+
+        now_s = time.perf_counter()
+
+        # the queue and event are in the manager process, so they are only
+        # accessed at intervals
+        if now_s - self.last_update_s < self.progress_interval_s:
+            return
+
+        self.last_update_s = now_s
+
+        if self.cancel_event.is_set():
+            raise concurrent.futures.CancelledError
+
+        self.report(status=JobStatus.SAMPLING)
+
+    def report(self, status: JobStatus) -> None:
+        self.updates.put((self.job_id, status.value, self.n_draws, self.n_total_draws))
+
+
+def run_job(
+    job_id: str,
+    datasets: typing.Sequence[pylater.data.Dataset | pylater.data.BinnedDataset],
+    share_type: str | None,
+    priors: typing.Mapping[str, pylater.model.LogNormalPrior] | None,
+    sample_kwargs: dict[str, typing.Any],
+    updates: typing.Any,  # noqa: ANN401
+    cancel_event: typing.Any,  # noqa: ANN401
+    progress_interval_s: float,
+) -> az.data.inference_data.InferenceData | None:
+    """
+    Build and sample the model of a job, in a worker process; returns `None` if
+    the job was cancelled.
+    """
+
+    parameters = inspect.signature(pm.sample).parameters
+
+    n_draws, n_tune = (
+        sample_kwargs.get(name, parameters[name].default) for name in ("draws", "tune")
+    )
+
+    n_chains = sample_kwargs.get("chains") or max(2, sample_kwargs["cores"])
+
+    callback = ProgressCallback(
+        job_id=job_id,
+        updates=updates,
+        cancel_event=cancel_event,
+        progress_interval_s=progress_interval_s,
+        n_total_draws=n_chains * (n_draws + n_tune),
+    )
+
+    with warnings.catch_warnings():
+        warnings.filterwarnings(action="ignore", message="Note that this uses priors")
+        model = pylater.model.build_default_model(
+            datasets=datasets,
+            share_type=share_type,
+            priors=priors,
+        )
+
+    if cancel_event.is_set():
+        return None
+
+    callback.report(status=JobStatus.SAMPLING)
+
+    try:
+        idata = pylater.fit.sample(model=model, callback=callback, **sample_kwargs)
+    except concurrent.futures.CancelledError:
+        return None
+
+    return idata
+
+
+def run_job_task(
+    task: dict[str, typing.Any],
+) -> az.data.inference_data.InferenceData | None:
+    return run_job(**task)
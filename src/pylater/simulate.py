@@ -0,0 +1,611 @@
+from __future__ import annotations
+
+import concurrent.futures
+import enum
+import json
+import os
+import pathlib
+import typing
+
+import numpy as np
+import numpy.typing as npt
+
+import pylater.config
+import pylater.data
+import pylater.files
+import pylater.instrument
+
+# parameters of the LATER distribution, as in `pylater.dist.LATER`
+PARAM_NAMES = ("mu", "sigma", "sigma_e")
+
+MANIFEST_FILENAME = "simulation.json"
+
+# bumped when the layout of the stored files changes
+FORMAT_VERSION = 1
+
+# the columns with a value for each dataset in a chunk
+DATASET_COLUMNS = (
+    "condition",
+    "replicate",
+    "n_trials",
+    "n_censored_lower",
+    "n_censored_upper",
+)
+
+
+class ChunkFormat(enum.Enum):
+    NPZ = "npz"
+    PARQUET = "parquet"
+
+
+def parameter_grid(
+    mu: npt.ArrayLike,
+    sigma: npt.ArrayLike,
+    sigma_e: npt.ArrayLike,
+) -> dict[str, npt.NDArray[np.float64]]:
+    """
+    Form all combinations of a set of parameter values.
+
+    Parameters
+    ----------
+    mu, sigma, sigma_e
+        Values of each parameter of the LATER distribution.
+
+    Returns
+    -------
+    dict[str, npt.NDArray[np.float64]]
+        The value of each parameter in each combination (condition), with the
+        `sigma_e` values varying fastest.
+    """
+
+    grids = np.meshgrid(
+        np.atleast_1d(mu),
+        np.atleast_1d(sigma),
+        np.atleast_1d(sigma_e),
+        indexing="ij",
+    )
+
+    return {
+        param_name: np.ravel(grid).astype(np.float64)
+        for (param_name, grid) in zip(PARAM_NAMES, grids, strict=True)
+    }
+
+
+class Simulation:
+    __slots__ = (
+        "chunk_format",
+        "chunk_size",
+        "max_rt_s",
+        "min_rt_s",
+        "n_chunks",
+        "n_replicates",
+        "n_trials",
+        "parameters",
+        "path",
+        "rt_dtype",
+    )
+
+    def __init__(self, path: str | os.PathLike[str]) -> None:
+        """
+        Simulated reaction times that are stored on disk, as produced by
+        `simulate`.
+
+        Parameters
+        ----------
+        path
+            Directory containing the simulation.
+
+        Notes
+        -----
+        * Each chunk of simulated datasets is stored in its own file with a
+          columnar layout. The per-dataset columns are `condition`, `replicate`,
+          `n_trials`, `n_censored_lower`, and `n_censored_upper`.
+        * In a NumPy `.npz` file, the reaction times of all datasets in the chunk
+          are concatenated in `rt_s`, with those of dataset `i` in
+          `rt_s[offsets[i]:offsets[i + 1]]`. In a Parquet file, `rt_s` is a list
+          column with a row for each dataset. `load_chunk` returns the
+          concatenated form for either.
+        * Censored trials are not stored, but their numbers are.
+        """
+
+        self.path = pathlib.Path(path)
+
+        manifest = read_manifest(path=self.path)
+
+        if manifest is None:
+            msg = f"No simulation found in {self.path}"
+            raise ValueError(msg)
+
+        self.parameters = {
+            param_name: np.array(manifest["parameters"][param_name])
+            for param_name in PARAM_NAMES
+        }
+        self.n_trials = np.array(manifest["n_trials"], dtype=np.int64)
+        self.n_replicates = int(manifest["n_replicates"])
+        self.min_rt_s = manifest["min_rt_s"]
+        self.max_rt_s = manifest["max_rt_s"]
+        self.chunk_size = int(manifest["chunk_size"])
+        self.n_chunks = int(manifest["n_chunks"])
+        self.rt_dtype = np.dtype(manifest["rt_dtype"])
+        self.chunk_format = ChunkFormat(manifest["chunk_format"])
+
+    def __repr__(self) -> str:
+        return (
+            f"Simulation of {self.n_conditions} condition(s) with "
+            + f"{self.n_replicates} replicate(s) in {self.path}"
+        )
+
+    @property
+    def n_conditions(self) -> int:
+        return len(self.n_trials)
+
+    @property
+    def n_datasets(self) -> int:
+        return self.n_conditions * self.n_replicates
+
+    @property
+    def is_complete(self) -> bool:
+        """Whether all of the chunks have been written."""
+        return all(
+            chunk_path(
+                path=self.path, i_chunk=i_chunk, chunk_format=self.chunk_format
+            ).exists()
+            for i_chunk in range(self.n_chunks)
+        )
+
+    def load_chunk(self, i_chunk: int) -> dict[str, npt.NDArray[typing.Any]]:
+        """
+        Load the columns of a chunk of simulated datasets.
+
+        Parameters
+        ----------
+        i_chunk
+            Index of the chunk.
+
+        Returns
+        -------
+        dict[str, npt.NDArray]
+            The per-dataset columns, the reaction times of all the datasets
+            concatenated in `rt_s`, and the `offsets` of each dataset within them.
+        """
+
+        return read_chunk(
+            path=chunk_path(
+                path=self.path, i_chunk=i_chunk, chunk_format=self.chunk_format
+            ),
+            chunk_format=self.chunk_format,
+        )
+
+    def iter_datasets(
+        self,
+        conditions: typing.Iterable[int] | None = None,
+    ) -> typing.Iterator[tuple[int, int, pylater.data.Dataset]]:
+        """
+        Load the simulated datasets, one chunk at a time.
+
+        Parameters
+        ----------
+        conditions
+            Indices of the conditions to load; loads all conditions if `None`.
+
+        Yields
+        ------
+        tuple[int, int, pylater.data.Dataset]
+            The condition index, the replicate index, and the dataset, with its
+            censored trials.
+        """
+
+        if conditions is None:
+            i_chunks: typing.Iterable[int] = range(self.n_chunks)
+            selected = None
+        else:
+            selected = set(conditions)
+            i_chunks = sorted(
+                {
+                    i_dataset // self.chunk_size
+                    for i_condition in selected
+                    for i_dataset in range(
+                        i_condition * self.n_replicates,
+                        (i_condition + 1) * self.n_replicates,
+                    )
+                }
+            )
+
+        for i_chunk in i_chunks:
+
+            chunk = self.load_chunk(i_chunk=i_chunk)
+
+            offsets = chunk["offsets"]
+
+            for i_row, (i_condition, i_replicate) in enumerate(
+                zip(chunk["condition"], chunk["replicate"], strict=True)
+            ):
+
+                if selected is not None and i_condition not in selected:
+                    continue
+
+                n_censored_upper = int(chunk["n_censored_upper"][i_row])
+
+                # trials without a response are censored above an infinite
+                # reaction time, when there is no upper bound
+                censor_upper_s = (
+                    np.inf
+                    if self.max_rt_s is None and n_censored_upper > 0
+                    else self.max_rt_s
+                )
+
+                yield (
+                    int(i_condition),
+                    int(i_replicate),
+                    pylater.data.Dataset(
+                        name=f"condition_{i_condition}_replicate_{i_replicate}",
+                        rt_s=chunk["rt_s"][offsets[i_row] : offsets[i_row + 1]],
+                        dtype=self.rt_dtype,
+                        censor_lower_s=self.min_rt_s,
+                        censor_upper_s=censor_upper_s,
+                        n_censored_lower=int(chunk["n_censored_lower"][i_row]),
+                        n_censored_upper=n_censored_upper,
+                    ),
+                )
+
+    def datasets(self, condition: int) -> list[pylater.data.Dataset]:
+        """
+        Load the simulated datasets of a condition.
+
+        Parameters
+        ----------
+        condition
+            Index of the condition.
+
+        Returns
+        -------
+        list[pylater.data.Dataset]
+            The dataset from each replicate.
+        """
+        return [
+            dataset for (_, _, dataset) in self.iter_datasets(conditions=[condition])
+        ]
+
+
+@pylater.instrument.instrumented("simulate")
+def simulate(
+    path: str | os.PathLike[str],
+    parameters: typing.Mapping[str, npt.ArrayLike],
+    n_trials: int | npt.ArrayLike = 100,
+    n_replicates: int = 1,
+    min_rt_s: float | None = None,
+    max_rt_s: float | None = None,
+    chunk_size: int = 1000,
+    n_workers: int = 1,
+    random_seed: int | None = None,
+    chunk_format: str = "npz",
+) -> Simulation:
+    """
+    Simulate reaction times for many conditions and replicates, storing the
+    results on disk.
+
+    Parameters
+    ----------
+    path
+        Directory in which to store the simulation.
+    parameters
+        Values of the `mu`, `sigma`, and `sigma_e` parameters in each condition;
+        see `parameter_grid` to form all combinations of parameter values.
+    n_trials
+        Number of trials in each dataset, either for all conditions or for each
+        condition.
+    n_replicates
+        Number of datasets to simulate in each condition.
+    min_rt_s, max_rt_s
+        Reaction times outside these bounds are censored. Trials with negative
+        promptness (no response) are always censored.
+    chunk_size
+        Number of datasets in each chunk; each chunk is simulated in a single
+        process and written to its own file.
+    n_workers
+        Number of processes to use.
+    random_seed
+        Seed for the random number generator.
+    chunk_format
+        Either `npz` (NumPy) or `parquet` (Apache Parquet, which needs `pyarrow`
+        to be installed; e.g., through the `parquet` optional dependency).
+
+    Returns
+    -------
+    Simulation
+        The stored simulation.
+
+    Notes
+    -----
+    * The random state of each chunk is derived from `random_seed`, so the
+      results do not depend on `n_workers`.
+    * If `path` already contains a simulation with the same settings, only the
+      chunks that are missing are simulated. This allows an interrupted
+      simulation to be resumed.
+    * The reaction times are stored using the current precision (see
+      `pylater.config`).
+    """
+
+    path = pathlib.Path(path)
+
+    chunk_format_type = ChunkFormat(chunk_format)
+
+    if chunk_format_type is ChunkFormat.PARQUET:
+        # fail before simulating anything if it is not available
+        import_pyarrow()
+
+    condition_params = {
+        param_name: np.atleast_1d(np.asarray(parameters[param_name], dtype=np.float64))
+        for param_name in PARAM_NAMES
+    }
+
+    n_conditions = len(condition_params["mu"])
+
+    if any(len(values) != n_conditions for values in condition_params.values()):
+        raise ValueError("All parameters need the same number of conditions")
+
+    condition_n_trials = np.broadcast_to(
+        np.asarray(n_trials, dtype=np.int64),
+        (n_conditions,),
+    )
+
+    if np.any(condition_n_trials < 0) or n_replicates < 1 or chunk_size < 1:
+        raise ValueError("Invalid number of trials, replicates, or chunk size")
+
+    n_datasets = n_conditions * n_replicates
+    n_chunks = -(-n_datasets // chunk_size)
+
+    pylater.instrument.annotate(
+        n_datasets=n_datasets,
+        n_trials=int(np.sum(condition_n_trials)) * n_replicates,
+    )
+
+    existing = read_manifest(path=path)
+
+    if random_seed is None and existing is not None:
+        # continue an existing simulation
+        entropy = existing["entropy"]
+    else:
+        entropy = np.random.SeedSequence(random_seed).entropy
+
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "parameters": {
+            param_name: values.tolist()
+            for (param_name, values) in condition_params.items()
+        },
+        "n_trials": condition_n_trials.tolist(),
+        "n_replicates": n_replicates,
+        "min_rt_s": min_rt_s,
+        "max_rt_s": max_rt_s,
+        "chunk_size": chunk_size,
+        "n_chunks": n_chunks,
+        "rt_dtype": np.dtype(pylater.config.float_dtype()).name,
+        "chunk_format": chunk_format_type.value,
+        "entropy": entropy,
+    }
+
+    if existing is not None and existing != manifest:
+        msg = f"A simulation with different settings already exists in {path}"
+        raise ValueError(msg)
+
+    if existing is None:
+        path.mkdir(parents=True, exist_ok=True)
+        pylater.files.write_atomic(
+            path=path / MANIFEST_FILENAME,
+            write=lambda file: file.write(json.dumps(manifest).encode()),
+        )
+
+    chunk_seeds = np.random.SeedSequence(entropy).spawn(n_chunks)
+
+    tasks = []
+
+    for i_chunk in range(n_chunks):
+
+        if chunk_path(
+            path=path, i_chunk=i_chunk, chunk_format=chunk_format_type
+        ).exists():
+            continue
+
+        i_datasets = np.arange(
+            i_chunk * chunk_size,
+            min((i_chunk + 1) * chunk_size, n_datasets),
+        )
+
+        i_conditions = i_datasets // n_replicates
+
+        tasks.append(
+            {
+                "path": path,
+                "i_chunk": i_chunk,
+                "seed": chunk_seeds[i_chunk],
+                "condition": i_conditions,
+                "replicate": i_datasets % n_replicates,
+                "n_trials": condition_n_trials[i_conditions],
+                "params": {
+                    param_name: values[i_conditions]
+                    for (param_name, values) in condition_params.items()
+                },
+                "min_rt_s": min_rt_s,
+                "max_rt_s": max_rt_s,
+                "rt_dtype": manifest["rt_dtype"],
+                "chunk_format": chunk_format_type,
+            }
+        )
+
+    if n_workers == 1:
+        for task in tasks:
+            simulate_chunk(**task)
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=n_workers) as pool:
+            futures = [pool.submit(simulate_chunk, **task) for task in tasks]
+            for future in concurrent.futures.as_completed(futures):
+                # raises any exception from the worker
+                future.result()
+
+    return Simulation(path=path)
+
+
+def simulate_chunk(
+    path: pathlib.Path,
+    i_chunk: int,
+    seed: np.random.SeedSequence,
+    condition: npt.NDArray[np.int64],
+    replicate: npt.NDArray[np.int64],
+    n_trials: npt.NDArray[np.int64],
+    params: dict[str, npt.NDArray[np.float64]],
+    min_rt_s: float | None,
+    max_rt_s: float | None,
+    rt_dtype: str,
+    chunk_format: ChunkFormat,
+) -> None:
+    """
+    Simulate a chunk of datasets and write it to disk.
+    """
+
+    import pylater.dist
+
+    rng = np.random.default_rng(seed)
+
+    # one row per trial, across all of the datasets in the chunk
+    i_rows = np.repeat(np.arange(len(n_trials)), n_trials)
+
+    rt_s = np.asarray(
+        pylater.dist.random(
+            mu=params["mu"][i_rows],
+            sigma=params["sigma"][i_rows],
+            sigma_e=params["sigma_e"][i_rows],
+            rng=rng,
+        ),
+        dtype=np.float64,
+    )
+
+    # negative reaction times correspond to trials without a response
+    is_upper = rt_s < 0
+
+    if max_rt_s is not None:
+        is_upper |= rt_s > max_rt_s
+
+    is_lower = np.zeros_like(is_upper)
+
+    if min_rt_s is not None:
+        is_lower |= (rt_s >= 0) & (rt_s < min_rt_s)
+
+    is_kept = ~(is_lower | is_upper)
+
+    n_rows = len(n_trials)
+
+    n_kept = np.bincount(i_rows[is_kept], minlength=n_rows)
+
+    columns: dict[str, npt.NDArray[typing.Any]] = {
+        "condition": condition,
+        "replicate": replicate,
+        "n_trials": n_trials,
+        "n_censored_lower": np.bincount(i_rows[is_lower], minlength=n_rows),
+        "n_censored_upper": np.bincount(i_rows[is_upper], minlength=n_rows),
+        "offsets": np.concatenate(([0], np.cumsum(n_kept))),
+        "rt_s": rt_s[is_kept].astype(rt_dtype),
+    }
+
+    write_chunk(
+        path=chunk_path(path=path, i_chunk=i_chunk, chunk_format=chunk_format),
+        columns=columns,
+        chunk_format=chunk_format,
+    )
+
+
+def chunk_path(
+    path: pathlib.Path,
+    i_chunk: int,
+    chunk_format: ChunkFormat,
+) -> pathlib.Path:
+    return path / f"chunk_{i_chunk:06d}.{chunk_format.value}"
+
+
+def write_chunk(
+    path: pathlib.Path,
+    columns: dict[str, npt.NDArray[typing.Any]],
+    chunk_format: ChunkFormat,
+) -> None:
+    """
+    Write the columns of a chunk of simulated datasets to a file.
+    """
+
+    if chunk_format is ChunkFormat.NPZ:
+        pylater.files.write_atomic(
+            path=path, write=lambda file: np.savez(file, **columns)
+        )
+        return
+
+    pa, pyarrow_parquet = import_pyarrow()
+
+    table = pa.table(
+        {
+            **{column_name: columns[column_name] for column_name in DATASET_COLUMNS},
+            "rt_s": pa.ListArray.from_arrays(
+                offsets=pa.array(columns["offsets"], type=pa.int64()).cast(pa.int32()),
+                values=pa.array(columns["rt_s"]),
+            ),
+        }
+    )
+
+    pylater.files.write_atomic(
+        path=path,
+        write=lambda file: pyarrow_parquet.write_table(table, where=file),
+    )
+
+
+def read_chunk(
+    path: pathlib.Path,
+    chunk_format: ChunkFormat,
+) -> dict[str, npt.NDArray[typing.Any]]:
+    """
+    Read the columns of a chunk of simulated datasets from a file.
+    """
+
+    if chunk_format is ChunkFormat.NPZ:
+        with np.load(path) as chunk:
+            return dict(chunk)
+
+    _, pyarrow_parquet = import_pyarrow()
+
+    table = pyarrow_parquet.read_table(os.fspath(path))
+
+    rt_s = table.column("rt_s").combine_chunks()
+
+    offsets = np.asarray(rt_s.offsets, dtype=np.int64)
+
+    return {
+        **{
+            column_name: table.column(column_name).to_numpy()
+            for column_name in DATASET_COLUMNS
+        },
+        "offsets": offsets - offsets[0],
+        "rt_s": np.asarray(rt_s.flatten()),
+    }
+
+
+def import_pyarrow() -> tuple[typing.Any, typing.Any]:
+    """
+    Import the `pyarrow` modules that are needed to read and write Parquet files.
+    """
+
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet
+    except ImportError as err:
+        msg = "Parquet chunks need `pyarrow` to be installed"
+        raise ImportError(msg) from err
+
+    return (pa, pyarrow.parquet)
+
+
+def read_manifest(path: pathlib.Path) -> dict[str, typing.Any] | None:
+    manifest_path = path / MANIFEST_FILENAME
+
+    if not manifest_path.exists():
+        return None
+
+    manifest: dict[str, typing.Any] = json.loads(manifest_path.read_text())
+
+    return manifest
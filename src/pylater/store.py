@@ -0,0 +1,787 @@
+from __future__ import annotations
+
+import collections.abc
+import logging
+import os
+import pathlib
+import typing
+
+import numpy as np
+import numpy.typing as npt
+
+import xarray as xr
+
+import arviz as az
+
+import h5netcdf
+
+import pymc as pm
+
+import pylater.fit
+import pylater.instrument
+
+# the netCDF engine used to read and write stores
+ENGINE: typing.Final = "h5netcdf"
+
+# default number of draws (per chain) that are written, read, and evaluated at a
+# time
+DEFAULT_CHUNK_SIZE = 100
+
+# the key in the encoding of each group opened by `open_store`, which marks the
+# group as one that can be written back to
+STORE_ENCODING_KEY: typing.Final = "pylater_store"
+
+X = typing.TypeVar("X", xr.Dataset, xr.DataArray)
+
+
+class StoreTrace(pm.backends.base.BaseTrace):  # type: ignore[misc]
+    def __init__(
+        self,
+        path: str | os.PathLike[str],
+        model: pm.Model,
+        n_draws: int,
+        n_tune: int,
+        n_chains: int,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+    ) -> None:
+        """
+        A PyMC trace backend that writes the posterior draws, and the sampler
+        statistics, of each chain to a store as sampling proceeds.
+
+        Parameters
+        ----------
+        path
+            Path to the store file.
+        model
+            The PyMC model.
+        n_draws, n_tune, n_chains
+            The number of draws, tuning draws, and chains; as passed to
+            `pm.sample`.
+        chunk_size
+            Number of draws of each chain to hold in memory before writing.
+
+        Notes
+        -----
+        * Tuning draws are not stored.
+        * The draws are not held in memory; those accessed through the trace
+          returned by `pm.sample` are read from the store, as are those from
+          `open_store`.
+        """
+
+        trace_vars = model.replace_rvs_by_values(model.unobserved_RVs)
+
+        super().__init__(name=os.fspath(path), model=model, vars=trace_vars)
+
+        self.path = pathlib.Path(path)
+        self.n_draws = n_draws
+        self.n_tune = n_tune
+        self.n_chains = n_chains
+        self.chunk_size = chunk_size
+
+        self.stat_dtypes: dict[str, np.dtype[typing.Any]] = {}
+        self.buffer: dict[str, list[npt.NDArray[typing.Any]]] = {}
+        self.n_recorded = 0
+        self.n_written = 0
+
+    def setup(
+        self,
+        draws: int,
+        chain: int,
+        sampler_vars: list[dict[str, typing.Any]] | None = None,
+    ) -> None:
+        super().setup(draws, chain, sampler_vars)
+
+        self.chain = chain
+
+        # the first statistic of each name, excluding non-numeric statistics
+        # (such as sampler warnings)
+        self.stat_dtypes = {}
+        for stats in sampler_vars or []:
+            for stat_name, dtype in stats.items():
+                if np.dtype(dtype).kind in "biuf":
+                    self.stat_dtypes.setdefault(stat_name, np.dtype(dtype))
+
+        # new containers, since each chain's trace is a shallow copy
+        self.buffer = {name: [] for name in (*self.varnames, *self.stat_dtypes)}
+        self.n_recorded = 0
+        self.n_written = 0
+
+        # the chains are set up in turn, before sampling starts
+        if not has_group(path=self.path, group="sample_stats"):
+            create_group(
+                path=self.path,
+                group="sample_stats",
+                variables={
+                    stat_name: ((), dtype)
+                    for (stat_name, dtype) in self.stat_dtypes.items()
+                },
+                coords=chain_draw_coords(n_chains=self.n_chains, n_draws=self.n_draws),
+                chunk_size=self.chunk_size,
+            )
+
+    def record(
+        self,
+        point: dict[str, npt.NDArray[typing.Any]],
+        sampler_stats: list[dict[str, typing.Any]] | None = None,
+    ) -> None:
+        is_tune = self.n_recorded < self.n_tune
+
+        self.n_recorded += 1
+
+        if is_tune:
+            return
+
+        for var_name, value in zip(self.varnames, self.fn(point), strict=True):
+            self.buffer[var_name].append(value)
+
+        for stat_name in self.stat_dtypes:
+            value = next(
+                stats[stat_name] for stats in sampler_stats or [] if stat_name in stats
+            )
+            self.buffer[stat_name].append(np.asarray(value))
+
+        if len(self.buffer[self.varnames[0]]) >= self.chunk_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Write the buffered draws to the store.
+        """
+
+        n_buffered = len(self.buffer[self.varnames[0]])
+
+        if n_buffered == 0:
+            return
+
+        for group, names in (
+            ("posterior", self.varnames),
+            ("sample_stats", list(self.stat_dtypes)),
+        ):
+            write_values(
+                path=self.path,
+                group=group,
+                values={
+                    name: np.stack(self.buffer[name])[np.newaxis, ...] for name in names
+                },
+                chains=slice(self.chain, self.chain + 1),
+                draws=slice(self.n_written, self.n_written + n_buffered),
+            )
+
+        for values in self.buffer.values():
+            values.clear()
+
+        self.n_written += n_buffered
+
+    def close(self) -> None:
+        self.flush()
+
+    def __len__(self) -> int:
+        return self.n_recorded
+
+    def _slice(self, idx: slice) -> StoreTrace:  # noqa: ARG002
+        # tuning draws are already excluded from the store
+        return self
+
+    def _get_sampler_stats(
+        self,
+        stat_name: str,
+        sampler_idx: int,  # noqa: ARG002
+        burn: int,
+        thin: int,
+    ) -> npt.NDArray[typing.Any]:
+        # the tuning flag is needed by PyMC to discard the tuning draws
+        if stat_name == "tune":
+            return (np.arange(self.n_recorded) < self.n_tune)[burn::thin]
+
+        if stat_name not in self.stat_dtypes:
+            msg = f"Sampler statistic {stat_name} is not stored"
+            raise KeyError(msg)
+
+        return self.read(group="sample_stats", name=stat_name)[burn::thin]
+
+    def get_values(
+        self,
+        varname: str,
+        burn: int = 0,
+        thin: int = 1,
+    ) -> npt.NDArray[typing.Any]:
+        return self.read(group="posterior", name=varname)[burn::thin]
+
+    def point(self, idx: int) -> dict[str, npt.NDArray[typing.Any]]:
+        return {
+            var_name: self.read(group="posterior", name=var_name, draws=idx)
+            for var_name in self.varnames
+        }
+
+    def read(
+        self,
+        group: str,
+        name: str,
+        draws: int | slice = slice(None),
+    ) -> npt.NDArray[typing.Any]:
+        """
+        Read the stored draws of a variable of this chain, after writing any that
+        are buffered.
+        """
+
+        self.flush()
+
+        return read_values(
+            path=self.path,
+            group=group,
+            name=name,
+            chain=self.chain,
+            draws=range(self.n_written)[draws],
+        )
+
+
+@pylater.instrument.instrumented("sample_to_store")
+def sample_to_store(
+    model: pm.Model,
+    path: str | os.PathLike[str],
+    draws: int = 1000,
+    tune: int = 1000,
+    chains: int = 4,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    log_likelihood: bool = True,
+    posterior_predictive: bool = False,
+    random_seed: int | None = None,
+    overwrite: bool = False,
+    **kwargs: object,
+) -> az.data.inference_data.InferenceData:
+    """
+    Draw samples from the posterior distribution of a model, streaming them to a
+    chunked store on disk rather than holding them in memory.
+
+    Parameters
+    ----------
+    model
+        The PyMC model.
+    path
+        Path to the store, a netCDF file that can also be read with
+        `az.from_netcdf`.
+    draws, tune, chains
+        Number of draws, tuning draws, and chains, as for `pm.sample`.
+    chunk_size
+        Number of draws of each chain that are held in memory at a time, both
+        while sampling and when computing the log-likelihood and posterior
+        predictive draws.
+    log_likelihood
+        Whether to also compute and store the pointwise log-likelihood.
+    posterior_predictive
+        Whether to also draw and store samples from the posterior predictive
+        distribution.
+    random_seed
+        Seed for the random number generator.
+    overwrite
+        Whether to replace an existing store.
+    **kwargs
+        Additional arguments are passed directly to `pm.sample`.
+
+    Returns
+    -------
+    az.data.inference_data.InferenceData
+        Inference data object that reads from the store, as from `open_store`.
+
+    Notes
+    -----
+    * The log-likelihood and posterior predictive draws are computed after
+      sampling, one chunk of draws at a time.
+    * Convergence checks are not run by `pm.sample`, since they would need all
+      of the draws to be in memory; they can be computed from the returned
+      inference data (e.g., with `az.summary`).
+    """
+
+    path = pathlib.Path(path)
+
+    if path.exists():
+        if not overwrite:
+            msg = f"Store {path} already exists; either remove or set `overwrite=True`"
+            raise ValueError(msg)
+        path.unlink()
+
+    trace = StoreTrace(
+        path=path,
+        model=model,
+        n_draws=draws,
+        n_tune=tune,
+        n_chains=chains,
+        chunk_size=chunk_size,
+    )
+
+    create_group(
+        path=path,
+        group="posterior",
+        variables={
+            var_name: (trace.var_shapes[var_name], trace.var_dtypes[var_name])
+            for var_name in trace.varnames
+        },
+        coords=chain_draw_coords(n_chains=chains, n_draws=draws),
+        chunk_size=chunk_size,
+        model=model,
+    )
+
+    pylater.instrument.annotate(n_chains=chains, n_draws=draws, chunk_size=chunk_size)
+
+    with pylater.instrument.phase("sample", n_free=len(model.free_RVs)):
+        pm.sample(
+            model=model,
+            draws=draws,
+            tune=tune,
+            chains=chains,
+            trace=trace,
+            return_inferencedata=False,
+            compute_convergence_checks=False,
+            random_seed=random_seed,
+            **kwargs,
+        )
+
+    if log_likelihood:
+        add_log_likelihood(path=path, model=model, chunk_size=chunk_size)
+
+    if posterior_predictive:
+        add_posterior_predictive(
+            path=path,
+            model=model,
+            chunk_size=chunk_size,
+            random_seed=random_seed,
+        )
+
+    return open_store(path=path)
+
+
+def open_store(
+    path: str | os.PathLike[str],
+) -> az.data.inference_data.InferenceData:
+    """
+    Open a store for lazy reading.
+
+    Parameters
+    ----------
+    path
+        Path to the store.
+
+    Returns
+    -------
+    az.data.inference_data.InferenceData
+        Inference data object whose values are read from the store only when
+        they are accessed.
+    """
+
+    with h5netcdf.File(path, "r") as store:
+        groups = list(store.groups)
+
+    # rather than `az.from_netcdf`, so that each group can later be closed (see
+    # `close_store`)
+    group_datasets: dict[str, typing.Any] = {
+        group: open_group(path=path, group=group) for group in groups
+    }
+
+    return az.InferenceData(**group_datasets)
+
+
+def open_group(path: str | os.PathLike[str], group: str) -> xr.Dataset:
+    """
+    Open a group of a store for lazy reading, marked as read from the store.
+    """
+
+    dataset = xr.open_dataset(path, group=group, engine=ENGINE)
+
+    dataset.encoding[STORE_ENCODING_KEY] = True
+
+    return dataset
+
+
+def add_log_likelihood(
+    path: str | os.PathLike[str],
+    model: pm.Model,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> None:
+    """
+    Compute the pointwise log-likelihood of each stored posterior draw, a chunk
+    of draws at a time, and add it to the store.
+    """
+
+    # as for `pm.compute_log_likelihood`, but compiled once rather than for each
+    # chunk; the stored values are untransformed
+    untransformed_model = pm.model.transform.conditioning.remove_value_transforms(model)
+
+    log_likelihood_func = untransformed_model.compile_fn(
+        inputs=untransformed_model.value_vars,
+        outs=untransformed_model.logp(vars=untransformed_model.observed_RVs, sum=False),
+        on_unused_input="ignore",
+    )
+
+    coords, dims = pm.backends.arviz.coords_and_dims_for_inferencedata(
+        untransformed_model
+    )
+
+    def compute(posterior: xr.Dataset) -> xr.Dataset:
+        ll_dataset: xr.Dataset = pm.backends.arviz.apply_function_over_dataset(
+            log_likelihood_func,
+            posterior[[rv.name for rv in untransformed_model.free_RVs]],
+            output_var_names=[rv.name for rv in untransformed_model.observed_RVs],
+            dims=dims,
+            coords=coords,
+            progressbar=False,
+        )
+        return ll_dataset
+
+    add_group(path=path, group="log_likelihood", compute=compute, chunk_size=chunk_size)
+
+
+def add_posterior_predictive(
+    path: str | os.PathLike[str],
+    model: pm.Model,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    random_seed: int | None = None,
+) -> None:
+    """
+    Draw a posterior predictive sample for each stored posterior draw, a chunk of
+    draws at a time, and add them to the store.
+    """
+
+    seed_seq = np.random.SeedSequence(entropy=random_seed)
+
+    def compute(posterior: xr.Dataset) -> xr.Dataset:
+        # each chunk has its own random number generator
+        (chunk_seed_seq,) = seed_seq.spawn(n_children=1)
+
+        # the variables that are sampled are otherwise logged for each chunk
+        logger = logging.getLogger("pymc")
+        log_level = logger.level
+        logger.setLevel(logging.WARNING)
+
+        try:
+            pp_idata = pylater.fit.sample_posterior_predictive(
+                idata=az.InferenceData(posterior=posterior),
+                model=model,
+                random_seed=np.random.default_rng(seed=chunk_seed_seq),
+                progressbar=False,
+            )
+        finally:
+            logger.setLevel(log_level)
+
+        assert hasattr(pp_idata, "posterior_predictive")
+
+        pp_dataset: xr.Dataset = pp_idata.posterior_predictive
+        return pp_dataset
+
+    add_group(
+        path=path,
+        group="posterior_predictive",
+        compute=compute,
+        chunk_size=chunk_size,
+    )
+
+
+def add_group(
+    path: str | os.PathLike[str],
+    group: str,
+    compute: typing.Callable[[xr.Dataset], xr.Dataset],
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    source_group: str = "posterior",
+) -> None:
+    """
+    Add a group to a store by computing it from another group (or itself), a
+    chunk of draws at a time. If the group already exists, the computed
+    variables are added to it.
+    """
+
+    with xr.open_dataset(path, group=source_group, engine=ENGINE) as source:
+        n_draws = source.sizes["draw"]
+
+    for draw_start in range(0, n_draws, chunk_size):
+
+        draws = slice(draw_start, min(draw_start + chunk_size, n_draws))
+
+        # the file is closed before it is written to
+        with xr.open_dataset(path, group=source_group, engine=ENGINE) as source:
+            source_chunk = source.isel(draw=draws).load()
+
+        chunk = compute(source_chunk)
+
+        if draw_start == 0:
+            create_group(
+                path=path,
+                group=group,
+                variables={
+                    str(var_name): (var.shape[2:], var.dtype)
+                    for (var_name, var) in chunk.data_vars.items()
+                },
+                coords={
+                    **chain_draw_coords(n_chains=chunk.sizes["chain"], n_draws=n_draws),
+                    **{
+                        str(dim): chunk[dim].values
+                        for dim in chunk.dims
+                        if dim not in ("chain", "draw")
+                    },
+                },
+                dims={
+                    str(var_name): var.dims[2:]
+                    for (var_name, var) in chunk.data_vars.items()
+                },
+                chunk_size=chunk_size,
+            )
+
+        write_values(
+            path=path,
+            group=group,
+            values={
+                str(var_name): var.transpose("chain", "draw", ...).values
+                for (var_name, var) in chunk.data_vars.items()
+            },
+            chains=slice(None),
+            draws=draws,
+        )
+
+
+def iter_draw_chunks(
+    data: X,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> collections.abc.Iterator[X]:
+    """
+    Iterate over chunks of draws, with the `chain` and `draw` dimensions
+    combined into a `sample` dimension.
+
+    Parameters
+    ----------
+    data
+        Draws with `chain` and `draw` dimensions; if read from a store, only each
+        chunk is read into memory.
+    chunk_size
+        Number of draws (of each chain) in each chunk.
+
+    Yields
+    ------
+    xr.Dataset | xr.DataArray
+        The draws in each chunk.
+    """
+
+    for draw_start in range(0, data.sizes["draw"], chunk_size):
+        chunk = data.isel(draw=slice(draw_start, draw_start + chunk_size)).load()
+        yield chunk.stack(sample=("chain", "draw"))
+
+
+def store_path(
+    idata: az.data.inference_data.InferenceData,
+    group: str,
+) -> pathlib.Path | None:
+    """
+    The path to the store from which a group is read, or `None` if the group is
+    not read from a store.
+
+    Notes
+    -----
+    * Only groups opened by `open_store` (or returned by `sample_to_store`) are
+      considered to be read from a store; a group read from a file with
+      `az.from_netcdf`, for example, is not, so that the file is not changed.
+    """
+
+    encoding = getattr(idata, group).encoding
+
+    if not encoding.get(STORE_ENCODING_KEY, False):
+        return None
+
+    return pathlib.Path(encoding["source"])
+
+
+def close_store(
+    idata: az.data.inference_data.InferenceData,
+    path: str | os.PathLike[str],
+) -> list[str]:
+    """
+    Close the groups of an inference data object that read from a store, so that
+    the store can be written to. Returns the names of the closed groups.
+    """
+
+    closed = []
+
+    for group in idata.groups():
+        if store_path(idata=idata, group=group) == pathlib.Path(path):
+            getattr(idata, group).close()
+            closed.append(group)
+
+    return closed
+
+
+def reopen_store(
+    idata: az.data.inference_data.InferenceData,
+    path: str | os.PathLike[str],
+    groups: list[str],
+) -> None:
+    """
+    Replace groups of an inference data object with those read lazily from a
+    store.
+    """
+    for group in groups:
+        setattr(idata, group, open_group(path=path, group=group))
+
+
+def has_group(path: str | os.PathLike[str], group: str) -> bool:
+    """
+    Whether a store contains a group.
+    """
+
+    if not pathlib.Path(path).exists():
+        return False
+
+    with h5netcdf.File(path, "r") as store:
+        return group in store.groups
+
+
+def chain_draw_coords(n_chains: int, n_draws: int) -> dict[str, npt.NDArray[np.int_]]:
+    """
+    Coordinates of the chain and draw dimensions.
+    """
+    return {"chain": np.arange(n_chains), "draw": np.arange(n_draws)}
+
+
+def create_group(
+    path: str | os.PathLike[str],
+    group: str,
+    variables: dict[str, tuple[tuple[int, ...], np.dtype[typing.Any]]],
+    coords: collections.abc.Mapping[str, npt.NDArray[typing.Any]],
+    chunk_size: int,
+    dims: dict[str, tuple[collections.abc.Hashable, ...]] | None = None,
+    model: pm.Model | None = None,
+) -> None:
+    """
+    Create a group in a store, or add to an existing group, with variables over
+    `chain` and `draw` (and any other) dimensions whose values are written later.
+
+    Parameters
+    ----------
+    path
+        Path to the store; created if it does not exist.
+    group
+        Name of the group.
+    variables
+        The shape of each draw of each variable, and its data type. Variables
+        that already exist in the group are left as they are.
+    coords
+        Coordinates of the dimensions, including `chain` and `draw`; those of
+        dimensions that already exist in the group are not written.
+    chunk_size
+        Number of draws in each chunk on disk.
+    dims
+        Names of the dimensions of each variable (after `chain` and `draw`).
+    model
+        A PyMC model from which the dimensions and coordinates of the variables
+        are taken, if not in `dims` and `coords`.
+    """
+
+    dims = dict(dims or {})
+    coords = {str(dim): dim_coords for (dim, dim_coords) in coords.items()}
+
+    for var_name, (shape, _) in variables.items():
+
+        if var_name not in dims:
+            model_dims = (
+                model.named_vars_to_dims.get(var_name) if model is not None else None
+            )
+            dims[var_name] = tuple(
+                model_dims
+                if model_dims is not None
+                else (f"{var_name}_dim_{i_dim}" for i_dim in range(len(shape)))
+            )
+
+        for dim, size in zip(dims[var_name], shape, strict=True):
+            if str(dim) not in coords:
+                model_coords = model.coords.get(dim) if model is not None else None
+                coords[str(dim)] = (
+                    np.array(model_coords)
+                    if model_coords is not None
+                    else np.arange(size)
+                )
+
+    existing_dims: set[str] = set()
+    existing_vars: set[str] = set()
+
+    if has_group(path=path, group=group):
+        with h5netcdf.File(path, "r") as store:
+            existing_dims = set(store[group].dimensions)
+            existing_vars = set(store[group].variables)
+
+    new_coords = {
+        dim: dim_coords
+        for (dim, dim_coords) in coords.items()
+        if dim not in existing_dims
+    }
+
+    mode: typing.Literal["a", "w"] = "a" if pathlib.Path(path).exists() else "w"
+
+    # the coordinates (with their string encoding) are written by xarray, and the
+    # variables are then created empty
+    if new_coords or not existing_dims:
+        xr.Dataset(coords=new_coords).to_netcdf(
+            path,
+            group=group,
+            mode=mode,
+            engine=ENGINE,
+        )
+
+    with h5netcdf.File(path, "a") as store:
+
+        store_group = store[group]
+
+        for var_name, (shape, dtype) in variables.items():
+
+            if var_name in existing_vars:
+                continue
+
+            is_bool = np.dtype(dtype).kind == "b"
+
+            store_var = store_group.create_variable(
+                name=str(var_name),
+                dimensions=("chain", "draw", *(str(dim) for dim in dims[var_name])),
+                # booleans are not supported by netCDF, and are stored as bytes
+                # with an attribute that xarray uses to decode them
+                dtype=np.int8 if is_bool else dtype,
+                chunks=(1, min(chunk_size, len(coords["draw"])), *shape),
+                fillvalue=np.nan if np.dtype(dtype).kind == "f" else None,
+            )
+
+            if is_bool:
+                store_var.attrs["dtype"] = "bool"
+
+
+def read_values(
+    path: str | os.PathLike[str],
+    group: str,
+    name: str,
+    chain: int,
+    draws: int | range,
+) -> npt.NDArray[typing.Any]:
+    """
+    Read the values of a variable, for a chain and a range of draws (or a single
+    draw), from a group of a store.
+    """
+
+    index = draws if isinstance(draws, int) else slice(draws.start, draws.stop)
+
+    with h5netcdf.File(path, "r") as store:
+        store_var = store[group][name]
+        values = np.asarray(store_var[chain, index, ...])
+        if store_var.attrs.get("dtype") == "bool":
+            values = values.astype(bool)
+
+    return values
+
+
+def write_values(
+    path: str | os.PathLike[str],
+    group: str,
+    values: dict[str, npt.NDArray[typing.Any]],
+    chains: slice,
+    draws: slice,
+) -> None:
+    """
+    Write the values of variables, over (chain, draw, ...) dimensions, to a
+    group of a store.
+    """
+
+    with h5netcdf.File(path, "a") as store:
+        for var_name, var_values in values.items():
+            store_var = store[group][var_name]
+            store_var[chains, draws, ...] = var_values.astype(store_var.dtype)
@@ -0,0 +1,588 @@
+from __future__ import annotations
+
+import functools
+import typing
+import warnings
+
+import numpy as np
+import numpy.typing as npt
+
+import xarray as xr
+
+import arviz as az
+
+import pymc as pm
+
+import pytensor
+import pytensor.gradient
+import pytensor.tensor as pt
+
+import pylater.config
+import pylater.data
+import pylater.dist
+import pylater.instrument
+import pylater.model
+import pylater.online
+import pylater.posterior
+
+# the parameters around which the log-likelihood is expanded, as logarithms
+PARAM_NAMES = pylater.online.PARAM_NAMES
+
+# default number of trials in the subsample of each dataset
+DEFAULT_N_SUBSAMPLE = 1000
+
+# default number of trials whose derivatives are evaluated at a time
+DEFAULT_CHUNK_SIZE = 2**16
+
+# importance sampling is unreliable when the Pareto k estimate exceeds this
+PARETO_K_THRESHOLD = 0.7
+
+
+class SubsampledLikelihood:
+    __slots__ = (
+        "coefs",
+        "counts",
+        "n_trials",
+        "name",
+        "promptness",
+        "ref_log_params",
+        "unique_promptness",
+    )
+
+    def __init__(
+        self,
+        dataset: pylater.data.Dataset,
+        ref_log_params: npt.ArrayLike,
+        n_subsample: int = DEFAULT_N_SUBSAMPLE,
+        rng: np.random.Generator | int | None = None,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+    ) -> None:
+        """
+        An estimate of the log-likelihood of a dataset from a subsample of its
+        trials, with control variates from an expansion around reference
+        parameters.
+
+        Parameters
+        ----------
+        dataset
+            Observed data.
+        ref_log_params
+            Logarithm of the `sigma`, `k`, and `sigma_e_mod` parameters around
+            which the log-likelihood of each trial is expanded; ideally, near the
+            posterior mode.
+        n_subsample
+            Number of trials in the subsample.
+        rng
+            Random number generator, or a seed for one, for selecting the
+            subsample.
+        chunk_size
+            Number of trials whose derivatives are evaluated at a time.
+
+        Notes
+        -----
+        * The estimate is the difference estimator of Quiroz et al. (2019): the
+          log-likelihood of each trial is approximated by its second-order
+          Taylor expansion around the reference parameters, whose total over all
+          of the trials is a quadratic in the parameters, and the subsample
+          estimates the total remainder. The totals of the expansion are
+          calculated once, so evaluating the estimate (and its gradient) only
+          involves the trials in the subsample.
+        * The subsample is fixed, so the estimate is a deterministic function of
+          the parameters that can be sampled with NUTS; see
+          `importance_weights` for correcting the resulting draws.
+        """
+
+        rng = np.random.default_rng(seed=rng)
+
+        self.name = dataset.name
+        self.n_trials = dataset.n_trials
+
+        promptness = np.asarray(dataset.promptness, dtype=np.float64)
+
+        self.promptness = promptness[
+            np.sort(
+                rng.choice(
+                    self.n_trials,
+                    size=min(n_subsample, self.n_trials),
+                    replace=False,
+                )
+            )
+        ]
+
+        self.ref_log_params = np.asarray(ref_log_params, dtype=np.float64)
+
+        # the log-likelihood is evaluated over the unique values
+        self.unique_promptness, self.counts = pylater.data.compress_ties(
+            values=promptness
+        )
+
+        # the quadratic is the total of the expansions over all of the trials,
+        # less that over the subsample (scaled)
+        total, gradient, hessian = expansion_totals(
+            log_params=self.ref_log_params,
+            promptness=self.unique_promptness,
+            weights=self.counts,
+            chunk_size=chunk_size,
+        )
+        subsample_total, subsample_gradient, subsample_hessian = expansion_totals(
+            log_params=self.ref_log_params,
+            promptness=self.promptness,
+            weights=np.ones(len(self.promptness)),
+            chunk_size=chunk_size,
+        )
+
+        self.coefs = (
+            total - self.scale * subsample_total,
+            gradient - self.scale * subsample_gradient,
+            hessian - self.scale * subsample_hessian,
+        )
+
+    def __repr__(self) -> str:
+        return (
+            f"Subsampled likelihood for '{self.name}' with {len(self.promptness)} "
+            + f"of {self.n_trials} trials"
+        )
+
+    @property
+    def scale(self) -> float:
+        return self.n_trials / len(self.promptness)
+
+    def tensor_estimate(
+        self,
+        log_params: pt.TensorVariable,  # type: ignore[name-defined]
+    ) -> pt.TensorVariable:  # type: ignore[name-defined]
+        """
+        Estimate the log-likelihood within a PyTensor graph.
+
+        Parameters
+        ----------
+        log_params
+            Logarithm of the `sigma`, `k`, and `sigma_e_mod` parameters, as a
+            vector.
+
+        Returns
+        -------
+        pt.TensorVariable
+            The estimated log-likelihood.
+        """
+
+        constant, linear, quadratic = self.coefs
+
+        delta = log_params - self.ref_log_params
+
+        sigma, k, sigma_e_mod = (pt.exp(log_params[i_param]) for i_param in range(3))
+
+        subsample_logp = pt.sum(  # type: ignore[no-untyped-call]
+            pylater.dist.logp(
+                value=self.promptness.astype(pylater.config.float_dtype()),
+                mu=sigma * k,
+                sigma=sigma,
+                sigma_e=sigma * sigma_e_mod,
+            )
+        )
+
+        return (
+            constant
+            + pt.dot(linear, delta)  # type: ignore[no-untyped-call]
+            + 0.5 * pt.dot(delta, pt.dot(quadratic, delta))  # type: ignore[no-untyped-call]
+            + self.scale * subsample_logp
+        )
+
+    def numpy_estimate(self, log_params: npt.ArrayLike) -> npt.NDArray[np.float64]:
+        """
+        Estimate the log-likelihood, outside of a PyTensor graph.
+
+        Parameters
+        ----------
+        log_params
+            Logarithm of the `sigma`, `k`, and `sigma_e_mod` parameters, with the
+            parameters in the last dimension.
+
+        Returns
+        -------
+        npt.NDArray[np.float64]
+            The estimated log-likelihood, with the shape of `log_params` without
+            its last dimension.
+        """
+
+        log_params = np.asarray(log_params, dtype=np.float64)
+
+        constant, linear, quadratic = self.coefs
+
+        delta = log_params - self.ref_log_params
+
+        subsample_logp = pylater.online.compressed_log_likelihood(
+            log_params=log_params,
+            promptness=self.promptness,
+            counts=np.ones(len(self.promptness), dtype=np.int64),
+        )
+
+        estimate: npt.NDArray[np.float64] = (
+            constant
+            + delta @ linear
+            + 0.5 * np.einsum("...i,ij,...j->...", delta, quadratic, delta)
+            + self.scale * subsample_logp
+        )
+
+        return estimate
+
+    def numpy_exact(self, log_params: npt.ArrayLike) -> npt.NDArray[np.float64]:
+        """
+        Evaluate the log-likelihood over all of the trials.
+
+        Parameters
+        ----------
+        log_params
+            Logarithm of the `sigma`, `k`, and `sigma_e_mod` parameters, with the
+            parameters in the last dimension.
+
+        Returns
+        -------
+        npt.NDArray[np.float64]
+            The log-likelihood, with the shape of `log_params` without its last
+            dimension.
+        """
+
+        return pylater.online.compressed_log_likelihood(
+            log_params=np.asarray(log_params, dtype=np.float64),
+            promptness=self.unique_promptness,
+            counts=self.counts,
+        )
+
+
+class SubsampledModel:
+    __slots__ = ("likelihoods", "model")
+
+    def __init__(
+        self,
+        model: pm.Model,
+        likelihoods: dict[str, SubsampledLikelihood],
+    ) -> None:
+        """
+        A LATER model whose log-likelihood is estimated from subsamples.
+
+        Parameters
+        ----------
+        model
+            The PyMC model.
+        likelihoods
+            The subsampled likelihood of each dataset.
+        """
+
+        self.model = model
+        self.likelihoods = likelihoods
+
+    def __repr__(self) -> str:
+        return f"SubsampledModel with {len(self.likelihoods)} dataset(s)"
+
+    @pylater.instrument.instrumented("SubsampledModel.importance_weights")
+    def importance_weights(
+        self,
+        idata: az.data.inference_data.InferenceData,
+        max_draws: int | None = 1000,
+    ) -> xr.Dataset:
+        """
+        Calculate importance weights that correct posterior draws of the
+        subsampled model to the posterior with the exact likelihood.
+
+        Parameters
+        ----------
+        idata
+            Inference data object containing posterior samples of the model.
+        max_draws
+            The draws are thinned, evenly, to at most this number, since the
+            exact log-likelihood of each involves all of the trials. If `None`,
+            all of the draws are used.
+
+        Returns
+        -------
+        xr.Dataset
+            The Pareto-smoothed, normalised log weight of each (thinned) draw
+            (`log_weight`), over `chain` and `draw`; the difference between the
+            exact and estimated log-likelihood (`log_ratio`); and the Pareto k
+            estimate of the tail of the weights (`pareto_k`).
+
+        Notes
+        -----
+        * A Pareto k estimate below 0.7 indicates that the weighted draws give
+          reliable estimates of posterior expectations under the exact
+          likelihood (Vehtari et al., 2024). Larger values indicate that the
+          subsampled posterior is too far from the exact posterior, and that the
+          subsample should be larger.
+        """
+
+        assert hasattr(idata, "posterior")
+
+        posterior = pylater.posterior.dataset_posterior(
+            posterior=idata.posterior[["mu", *PARAM_NAMES]]
+        )
+
+        if max_draws is not None:
+            n_chain_draws = max(1, max_draws // posterior.sizes["chain"])
+            step = -(-posterior.sizes["draw"] // n_chain_draws)
+            posterior = posterior.isel(draw=slice(None, None, step))
+
+        log_ratio = xr.zeros_like(posterior["sigma"].isel(dataset=0, drop=True))
+
+        for dataset_name, likelihood in self.likelihoods.items():
+
+            log_params = np.log(
+                np.stack(
+                    [
+                        posterior[param_name].sel(dataset=dataset_name).values
+                        for param_name in PARAM_NAMES
+                    ],
+                    axis=-1,
+                )
+            )
+
+            log_ratio = log_ratio + (
+                likelihood.numpy_exact(log_params=log_params)
+                - likelihood.numpy_estimate(log_params=log_params)
+            )
+
+        pylater.instrument.annotate(n_draws=int(log_ratio.size))
+
+        # the psis functions warn about the tail of the weights, which is reported
+        # as `pareto_k` instead
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            log_weight, pareto_k = az.psislw(log_ratio.values.ravel())
+
+        return xr.Dataset(
+            data_vars={
+                "log_weight": log_ratio.copy(data=log_weight.reshape(log_ratio.shape)),
+                "log_ratio": log_ratio,
+                "pareto_k": float(pareto_k),
+            },
+        )
+
+
+@pylater.instrument.instrumented("build_subsampled_model")
+def build_subsampled_model(
+    datasets: typing.Sequence[pylater.data.Dataset],
+    share_type: str | None = None,
+    priors: typing.Mapping[str, pylater.model.LogNormalPrior] | None = None,
+    n_subsample: int = DEFAULT_N_SUBSAMPLE,
+    ref_point: typing.Mapping[str, npt.ArrayLike] | None = None,
+    rng: np.random.Generator | int | None = None,
+) -> SubsampledModel:
+    """
+    Assemble a LATER model like `build_default_model`, but with the
+    log-likelihood of each dataset estimated from a subsample of its trials.
+
+    Parameters
+    ----------
+    datasets
+        Observed data to model.
+    share_type
+        Parameter sharing arrangement, as for `build_default_model`.
+    priors
+        Priors to use in place of the defaults, as for `build_default_model`.
+    n_subsample
+        Number of trials in the subsample of each dataset.
+    ref_point
+        Values of `sigma`, `k`, and `sigma_e_mod` (as in the posterior of
+        `build_default_model`) around which the log-likelihood of each trial is
+        expanded. If `None`, the maximum a posteriori estimate of the model with
+        all of the trials is used.
+    rng
+        Random number generator, or a seed for one, for selecting the
+        subsamples.
+
+    Returns
+    -------
+    SubsampledModel
+        The model (`model`) and the subsampled likelihood of each dataset
+        (`likelihoods`). The log-likelihood estimate of each dataset is a
+        potential named `obs_<name>_subsampled`.
+
+    Notes
+    -----
+    * The cost of each evaluation of the model log-probability and its gradient
+      depends on `n_subsample` rather than on the number of trials. Finding the
+      reference point (if not given) and setting up the control variates
+      involve all of the trials, but only once.
+    * The posterior of this model approximates that of `build_default_model`;
+      use `SubsampledModel.importance_weights` to correct (and check) the
+      approximation.
+    * The accuracy of the estimate depends on how well the expansion describes
+      each trial over the posterior, which improves as the posterior narrows;
+      this is suited to datasets with very many trials.
+    """
+
+    rng = np.random.default_rng(seed=rng)
+
+    for dataset in datasets:
+        # binned datasets are not typed as acceptable, but may be given
+        if (
+            not isinstance(dataset, pylater.data.Dataset)  # type: ignore[redundant-expr]
+            or dataset.is_censored
+        ):
+            msg = (
+                f"Dataset {dataset.name} is binned or censored, which is not "
+                + "supported with subsampling"
+            )
+            raise ValueError(msg)
+
+    sharing = pylater.model.ShareType(share_type) if share_type is not None else None
+
+    n_datasets = len(datasets)
+
+    if n_datasets > 1 and sharing is None:
+        raise ValueError("With multiple datasets, must provide a `share_type` argument")
+
+    model_priors = pylater.model.get_priors(priors=priors)
+
+    pylater.instrument.annotate(
+        n_datasets=n_datasets,
+        n_trials=sum(dataset.n_trials for dataset in datasets),
+        n_subsample=n_subsample,
+    )
+
+    if ref_point is None:
+        with warnings.catch_warnings():
+            # the same priors are used here, which the caller is warned about
+            # below
+            warnings.simplefilter("ignore")
+            exact_model = pylater.model.build_default_model(
+                datasets=datasets,
+                share_type=share_type,
+                priors=priors,
+            )
+        with pylater.instrument.phase("find_map"):
+            ref_point = pm.find_MAP(model=exact_model, progressbar=False)
+
+    ref_log_params = np.stack(
+        [
+            np.broadcast_to(np.log(np.asarray(ref_point[param_name])), n_datasets)
+            for param_name in PARAM_NAMES
+        ],
+        axis=-1,
+    )
+
+    likelihoods = {
+        dataset.name: SubsampledLikelihood(
+            dataset=dataset,
+            ref_log_params=dataset_ref_log_params,
+            n_subsample=n_subsample,
+            rng=rng,
+        )
+        for (dataset, dataset_ref_log_params) in zip(
+            datasets, ref_log_params, strict=True
+        )
+    }
+
+    warnings.warn(
+        message=(
+            "Note that this uses priors that may not be appropriate for your "
+            + "use case"
+        ),
+        stacklevel=3,
+    )
+
+    with pm.Model(
+        coords={
+            "dataset": [dataset.name for dataset in datasets],
+            "shared": ("shared",),
+        },
+    ) as model:
+
+        params = pylater.model.add_default_parameters(
+            n_datasets=n_datasets,
+            sharing=sharing,
+            model_priors=model_priors,
+        )
+
+        for i_dataset, (dataset_name, likelihood) in enumerate(likelihoods.items()):
+            pm.Potential(
+                f"obs_{dataset_name}_subsampled",
+                likelihood.tensor_estimate(
+                    log_params=pt.log(
+                        pt.stack(
+                            [
+                                params[param_name][i_dataset]
+                                for param_name in PARAM_NAMES
+                            ]
+                        )
+                    )
+                ),
+            )
+
+    return SubsampledModel(model=model, likelihoods=likelihoods)
+
+
+def expansion_totals(
+    log_params: npt.NDArray[np.float64],
+    promptness: npt.NDArray[np.float64],
+    weights: npt.NDArray[np.floating[typing.Any]] | npt.NDArray[np.int64],
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> tuple[float, npt.NDArray[np.float64], npt.NDArray[np.float64]]:
+    """
+    The weighted total over trials of the log-likelihood, and of its gradient
+    and Hessian with respect to the logarithm of the parameters.
+    """
+
+    derivatives = derivatives_function()
+
+    total = 0.0
+    gradient = np.zeros(3)
+    hessian = np.zeros((3, 3))
+
+    for i_start in range(0, len(promptness), chunk_size):
+        chunk = slice(i_start, i_start + chunk_size)
+
+        chunk_total, chunk_gradient, chunk_hessian = derivatives(
+            log_params,
+            promptness[chunk],
+            np.asarray(weights[chunk], dtype=np.float64),
+        )
+
+        total += float(chunk_total)
+        gradient += chunk_gradient
+        hessian += chunk_hessian
+
+    return (total, gradient, hessian)
+
+
+@functools.lru_cache
+def derivatives_function() -> typing.Callable[..., list[npt.NDArray[np.float64]]]:
+    """
+    Compile a function that evaluates the weighted total of the log-likelihood
+    over trials, and its gradient and Hessian with respect to the logarithm of
+    the parameters.
+    """
+
+    log_params = pt.dvector("log_params")
+    promptness = pt.dvector("promptness")
+    weights = pt.dvector("weights")
+
+    sigma, k, sigma_e_mod = (
+        pt.exp(log_params[i_param]) for i_param in range(3)  # type: ignore[index]
+    )
+
+    total = pt.sum(  # type: ignore[no-untyped-call]
+        weights
+        * pylater.dist.logp(
+            value=promptness,
+            mu=sigma * k,
+            sigma=sigma,
+            sigma_e=sigma * sigma_e_mod,
+        )
+    )
+
+    function: typing.Callable[..., list[npt.NDArray[np.float64]]] = (
+        pytensor.function(  # type: ignore[attr-defined]
+            inputs=[log_params, promptness, weights],
+            outputs=[
+                total,
+                pytensor.gradient.grad(total, wrt=log_params),  # type: ignore[list-item]
+                pytensor.gradient.hessian(  # type: ignore[no-untyped-call]
+                    total,
+                    wrt=log_params,
+                ),
+            ],
+        )
+    )
+
+    return function
@@ -0,0 +1,454 @@
+from __future__ import annotations
+
+import csv
+import os
+import pathlib
+import typing
+
+import numpy as np
+import numpy.typing as npt
+
+import scipy.fft
+import scipy.special
+import scipy.stats
+
+import xarray as xr
+
+import arviz as az
+
+import pylater.instrument
+import pylater.posterior
+
+# the variables that are summarised by default
+DEFAULT_VAR_NAMES = ("mu", "sigma", "sigma_e", "k")
+
+DEFAULT_QUANTILES = (0.025, 0.5, 0.975)
+
+# default number of datasets that are summarised at a time
+DEFAULT_CHUNK_SIZE = 500
+
+# the quantiles whose indicator variables give the tail effective sample size
+TAIL_QUANTILES = (0.05, 0.95)
+
+# the minimum number of draws per chain for the convergence diagnostics
+MIN_DRAWS = 4
+
+# R-hat values above this indicate that the chains have not converged
+R_HAT_THRESHOLD = 1.01
+
+
+@pylater.instrument.instrumented("summarise")
+def summarise(
+    idata: az.data.inference_data.InferenceData | xr.Dataset,
+    var_names: typing.Sequence[str] = DEFAULT_VAR_NAMES,
+    quantiles: typing.Sequence[float] = DEFAULT_QUANTILES,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> xr.Dataset:
+    """
+    Summarise the posterior of each dataset, with convergence diagnostics.
+
+    Parameters
+    ----------
+    idata
+        Inference data object containing posterior samples, or the posterior
+        itself, with the parameters over a `dataset` dimension (for example,
+        from `build_default_model` or `pylater.batch.BatchFit.merge`).
+    var_names
+        Variables to summarise.
+    quantiles
+        Quantiles of each variable to calculate.
+    chunk_size
+        Number of datasets to read and summarise at a time.
+
+    Returns
+    -------
+    xr.Dataset
+        The summary statistics (`mean`, `sd`, `q<quantile>`, `r_hat`,
+        `ess_bulk`, and `ess_tail`) over `dataset` and `variable`. Any other
+        coordinates along `dataset` (such as `fit`) are retained.
+
+    Notes
+    -----
+    * The diagnostics are the rank-normalised split R-hat and the bulk and tail
+      effective sample sizes of Vehtari et al. (2021), and match those of
+      `az.summary`. They are calculated for all of the datasets in a chunk at
+      once, rather than one value at a time.
+    * The rank normalisation needs all of the draws of a value together, so the
+      posterior is read a chunk of datasets (with all of their draws) at a time;
+      this bounds the memory that is needed when the posterior is in a store
+      (see `pylater.store`).
+    * Parameters that are shared among datasets (in a 'shift' or 'swivel'
+      arrangement) are summarised for each dataset.
+    * R-hat needs more than one chain; with a single chain, it is missing.
+    """
+
+    if isinstance(idata, xr.Dataset):
+        posterior = idata
+    else:
+        assert hasattr(idata, "posterior")
+        posterior = idata.posterior
+
+    # the coordinates are kept, so that the `dataset` dimension remains even if
+    # none of the variables are over it
+    posterior = pylater.posterior.dataset_posterior(
+        posterior=posterior[list(var_names)].assign_coords(posterior.coords)
+    )
+
+    n_chains, n_draws, n_datasets = (
+        posterior.sizes[dim] for dim in ("chain", "draw", "dataset")
+    )
+
+    pylater.instrument.annotate(
+        n_datasets=n_datasets,
+        n_vars=len(var_names),
+        n_draws=n_chains * n_draws,
+    )
+
+    stat_names = [
+        "mean",
+        "sd",
+        *(quantile_name(quantile=quantile) for quantile in quantiles),
+        "r_hat",
+        "ess_bulk",
+        "ess_tail",
+    ]
+
+    # (statistic, variable, dataset)
+    stats = np.full((len(stat_names), len(var_names), n_datasets), np.nan)
+
+    for i_start in range(0, n_datasets, chunk_size):
+
+        chunk = slice(i_start, i_start + chunk_size)
+
+        chunk_posterior = posterior.isel(dataset=chunk).load()
+
+        for i_var, var_name in enumerate(var_names):
+
+            values = (
+                chunk_posterior[var_name].transpose("chain", "draw", "dataset").values
+            )
+
+            stats[:, i_var, chunk] = summarise_values(
+                values=values,
+                quantiles=quantiles,
+            )
+
+    dataset_coords = {
+        coord_name: coord
+        for (coord_name, coord) in posterior.coords.items()
+        if coord.dims == ("dataset",)
+    }
+
+    return xr.Dataset(
+        data_vars={
+            stat_name: (("dataset", "variable"), stats[i_stat].T)
+            for (i_stat, stat_name) in enumerate(stat_names)
+        },
+        coords={**dataset_coords, "variable": list(var_names)},
+    )
+
+
+def summarise_values(
+    values: npt.NDArray[np.floating[typing.Any]],
+    quantiles: typing.Sequence[float] = DEFAULT_QUANTILES,
+) -> npt.NDArray[np.float64]:
+    """
+    Calculate the summary statistics of a set of values.
+
+    Parameters
+    ----------
+    values
+        Draws of each value, with shape (chains, draws, values).
+    quantiles
+        Quantiles to calculate.
+
+    Returns
+    -------
+    npt.NDArray[np.float64]
+        The mean, standard deviation, quantiles, R-hat, bulk effective sample
+        size, and tail effective sample size of each value, with shape
+        (statistics, values).
+    """
+
+    values = np.asarray(values, dtype=np.float64)
+
+    n_chains, n_draws, n_values = values.shape
+
+    flat = values.reshape(n_chains * n_draws, n_values)
+
+    stats = [
+        np.mean(flat, axis=0),
+        np.std(flat, axis=0, ddof=1),
+        *np.quantile(flat, q=quantiles, axis=0),
+    ]
+
+    if n_draws < MIN_DRAWS:
+        return np.vstack((*stats, np.full((3, n_values), np.nan)))
+
+    split = split_chains(values=values)
+
+    r_hat = (
+        np.maximum(
+            rhat(values=z_scale(values=split)),
+            rhat(
+                values=z_scale(
+                    values=split_chains(values=np.abs(values - np.median(flat, axis=0)))
+                )
+            ),
+        )
+        if n_chains > 1
+        else np.full(n_values, np.nan)
+    )
+
+    ess_bulk = ess(values=z_scale(values=split))
+
+    ess_tail = np.minimum(
+        *(
+            ess(values=split_chains(values=(values <= quantile).astype(np.float64)))
+            for quantile in np.quantile(flat, q=TAIL_QUANTILES, axis=0)
+        )
+    )
+
+    return np.vstack((*stats, r_hat, ess_bulk, ess_tail))
+
+
+def split_chains(
+    values: npt.NDArray[np.float64],
+) -> npt.NDArray[np.float64]:
+    """
+    Split each chain into two halves (dropping the middle draw if the number of
+    draws is odd).
+    """
+
+    half = values.shape[1] // 2
+
+    return np.concatenate((values[:, :half], values[:, -half:]), axis=0)
+
+
+def z_scale(values: npt.NDArray[np.float64]) -> npt.NDArray[np.float64]:
+    """
+    Replace values by the normal quantiles of their ranks, over chains and
+    draws.
+    """
+
+    n_chains, n_draws, n_values = values.shape
+
+    n_total = n_chains * n_draws
+
+    ranks = scipy.stats.rankdata(
+        values.reshape(n_total, n_values),
+        method="average",
+        axis=0,
+    )
+
+    z: npt.NDArray[np.float64] = scipy.special.ndtri(
+        (ranks - 3 / 8) / (n_total + 1 / 4)
+    ).reshape(values.shape)
+
+    return z
+
+
+def rhat(values: npt.NDArray[np.float64]) -> npt.NDArray[np.float64]:
+    """
+    Calculate the potential scale reduction of each value, from draws with shape
+    (chains, draws, values).
+    """
+
+    n_draws = values.shape[1]
+
+    between_chain_variance = n_draws * np.var(np.mean(values, axis=1), axis=0, ddof=1)
+    within_chain_variance = np.mean(np.var(values, axis=1, ddof=1), axis=0)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        r_hat: npt.NDArray[np.float64] = np.sqrt(
+            (between_chain_variance / within_chain_variance + n_draws - 1) / n_draws
+        )
+
+    return r_hat
+
+
+def ess(values: npt.NDArray[np.float64]) -> npt.NDArray[np.float64]:
+    """
+    Calculate the effective sample size of each value, from draws with shape
+    (chains, draws, values).
+
+    Notes
+    -----
+    * The autocorrelations are truncated by Geyer's initial positive sequence
+      and made monotone by Geyer's initial monotone sequence; the sequential
+      search for the truncation point of each value is replaced by operations
+      over the pairs of lags of all of the values.
+    * Values that are constant over the draws have an effective sample size
+      equal to the number of draws.
+    """
+
+    n_chains, n_draws = values.shape[:2]
+
+    n_total = n_chains * n_draws
+
+    acov = autocov(values=values)
+
+    mean_var = np.mean(acov[:, 0], axis=0) * n_draws / (n_draws - 1)
+
+    var_plus = mean_var * (n_draws - 1) / n_draws
+
+    if n_chains > 1:
+        var_plus = var_plus + np.var(np.mean(values, axis=1), axis=0, ddof=1)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+
+        # (lag, value)
+        rho = 1 - (mean_var - np.mean(acov, axis=0)) / var_plus
+        rho[0] = 1
+
+        # the autocorrelations are considered in pairs of (even, odd) lags
+        n_pairs = max((n_draws - 3) // 2 + 1, 1)
+
+        rho_even = rho[0 : 2 * n_pairs : 2]
+        pair_sums = rho_even + rho[1 : 2 * n_pairs : 2]
+
+        # the index of the first pair whose sum is not positive
+        is_not_positive = ~(pair_sums > 0)
+        i_last = np.where(
+            np.any(is_not_positive, axis=0),
+            np.argmax(is_not_positive, axis=0),
+            n_pairs - 1,
+        )
+
+        is_included = np.arange(n_pairs)[:, np.newaxis] < i_last
+
+        pairs_total = np.sum(
+            np.where(is_included, np.minimum.accumulate(pair_sums, axis=0), 0.0),
+            axis=0,
+        )
+
+        # the even lag of the last pair
+        last_even, last_sum = (
+            np.take_along_axis(arr, i_last[np.newaxis], axis=0)[0]
+            for arr in (rho_even, pair_sums)
+        )
+
+        tail = np.where(
+            (last_even > 0) | ((i_last > 0) & (last_sum >= 0)),
+            last_even,
+            0.0,
+        )
+
+        tau = np.maximum(-1 + 2 * pairs_total + tail, 1 / np.log10(n_total))
+
+        effective_size: npt.NDArray[np.float64] = n_total / tau
+
+    # values that are constant have no autocorrelation to estimate
+    is_constant = np.ptp(values, axis=(0, 1)) < np.finfo(np.float64).resolution
+    effective_size[is_constant] = n_total
+
+    return effective_size
+
+
+def autocov(values: npt.NDArray[np.float64]) -> npt.NDArray[np.float64]:
+    """
+    Calculate the autocovariance of each chain over the draws (the second axis).
+    """
+
+    n_draws = values.shape[1]
+
+    n_fft = scipy.fft.next_fast_len(2 * n_draws)
+
+    transformed = np.fft.rfft(
+        values - np.mean(values, axis=1, keepdims=True),
+        n=n_fft,
+        axis=1,
+    )
+
+    cov: npt.NDArray[np.float64] = (
+        np.fft.irfft(transformed * np.conjugate(transformed), n=n_fft, axis=1)[
+            :, :n_draws
+        ]
+        / n_draws
+    )
+
+    return cov
+
+
+def quantile_name(quantile: float) -> str:
+    return f"q{quantile:g}"
+
+
+def write_parquet(
+    summary: xr.Dataset,
+    path: str | os.PathLike[str],
+) -> None:
+    """
+    Write a summary to a Parquet file, with a row for each dataset and variable.
+
+    Parameters
+    ----------
+    summary
+        The output of `summarise`.
+    path
+        Path to the Parquet file.
+
+    Notes
+    -----
+    * This needs `pyarrow` to be installed (e.g., through the `parquet`
+      optional dependency).
+    """
+
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet
+    except ImportError as err:
+        msg = "Writing Parquet files needs `pyarrow` to be installed"
+        raise ImportError(msg) from err
+
+    table = pa.table(summary_columns(summary=summary))
+
+    pyarrow.parquet.write_table(table, where=os.fspath(pathlib.Path(path)))
+
+
+def write_csv(
+    summary: xr.Dataset,
+    path: str | os.PathLike[str],
+) -> None:
+    """
+    Write a summary to a CSV file, with a row for each dataset and variable.
+
+    Parameters
+    ----------
+    summary
+        The output of `summarise`.
+    path
+        Path to the CSV file.
+    """
+
+    columns = summary_columns(summary=summary)
+
+    with pathlib.Path(path).open("w", newline="") as handle:
+        writer = csv.writer(handle)
+        writer.writerow(columns)
+        writer.writerows(
+            zip(*(column.tolist() for column in columns.values()), strict=True)
+        )
+
+
+def summary_columns(summary: xr.Dataset) -> dict[str, npt.NDArray[typing.Any]]:
+    """
+    Express a summary as columns, with a row for each dataset and variable.
+    """
+
+    summary = summary.transpose("dataset", "variable")
+
+    n_vars = summary.sizes["variable"]
+
+    columns = {
+        str(coord_name): np.repeat(coord.values, n_vars)
+        for (coord_name, coord) in summary.coords.items()
+        if coord.dims == ("dataset",)
+    }
+
+    columns["variable"] = np.tile(summary.variable.values, summary.sizes["dataset"])
+
+    for stat_name, stat in summary.data_vars.items():
+        columns[str(stat_name)] = stat.values.ravel()
+
+    return columns
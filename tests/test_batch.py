@@ -0,0 +1,116 @@
+import csv
+import pathlib
+
+import numpy as np
+
+import pytest
+
+import pylater
+import pylater.batch
+
+
+def test_fit_batch(tmp_path: pathlib.Path) -> None:
+    data_path = tmp_path / "data.csv"
+
+    dataset_names = {"a": ["a_p50", "a_p25"], "b": ["b_p50", "b_p25"]}
+
+    with data_path.open("w", newline="") as handle:
+        writer = csv.writer(handle)
+        writer.writerow(["fit", "dataset", "rt_s"])
+        for fit_name, names in dataset_names.items():
+            for name in names:
+                for rt_s in pylater.data.cw1995[name].rt_s[::10]:
+                    writer.writerow([fit_name, name, rt_s])
+
+    fits = pylater.batch.read_fits_csv(path=data_path)
+
+    assert {
+        fit_name: [dataset.name for dataset in datasets]
+        for (fit_name, datasets) in fits.items()
+    } == dataset_names
+
+    def run(
+        shard: tuple[int, int],
+        share_type: str = "shift",
+    ) -> pylater.batch.BatchFit:
+        return pylater.batch.fit_batch(
+            fits=fits,
+            path=tmp_path / "batch",
+            share_type=share_type,
+            # a tuple, which is a list once read back from the settings file
+            sample_kwargs={
+                "draws": 20,
+                "tune": 20,
+                "chains": 1,
+                "var_names": ("sigma", "k", "sigma_e_mod", "mu", "sigma_e"),
+            },
+            random_seed=3,
+            shard=shard,
+        )
+
+    batch = run(shard=(0, 2))
+
+    assert batch.completed == ["a"]
+    assert not (tmp_path / "batch" / pylater.batch.MERGED_FILENAME).exists()
+
+    with pytest.raises(ValueError, match="different settings"):
+        run(shard=(1, 2), share_type="swivel")
+
+    batch = run(shard=(1, 2))
+
+    assert batch.is_complete
+
+    # resuming a complete batch with the same settings does nothing
+    assert run(shard=(0, 1)).is_complete
+
+    merged = batch.merge()
+
+    assert hasattr(merged, "posterior")
+    assert hasattr(merged, "sample_stats")
+    assert hasattr(merged, "log_likelihood")
+
+    assert list(merged.posterior.dataset.values) == ["a_p50", "a_p25", "b_p50", "b_p25"]
+    assert list(merged.posterior.fit.values) == ["a", "a", "b", "b"]
+    assert merged.sample_stats.diverging.sizes["fit"] == 2
+    assert "obs_b_p25" in merged.log_likelihood
+
+    b_idata = batch.load("b")
+
+    assert hasattr(b_idata, "posterior")
+
+    # the shared parameter is repeated for each dataset of a fit
+    sigma = merged.posterior.sigma.values
+    assert np.array_equal(sigma[..., 0], sigma[..., 1])
+    assert np.array_equal(
+        sigma[..., 2],
+        b_idata.posterior.sigma.squeeze(dim="shared").values,
+    )
+
+    # the names of the fits are used as the names of their files
+    for fit_name in ("../a", ".a", ""):
+        with pytest.raises(ValueError, match="Invalid fit name"):
+            pylater.batch.fit_batch(fits={fit_name: fits["a"]}, path=tmp_path / "bad")
+
+
+def test_fit_batch_censored(tmp_path: pathlib.Path) -> None:
+    dataset = pylater.Dataset.from_censored_rt_s(
+        name="a_p50",
+        rt_s=np.concatenate((pylater.data.cw1995["a_p50"].rt_s[::10], [np.nan] * 5)),
+        censor_upper_s=0.3,
+    )
+
+    batch = pylater.batch.fit_batch(
+        fits={"a": [dataset]},
+        path=tmp_path / "batch",
+        sample_kwargs={"draws": 20, "tune": 20, "chains": 1},
+        random_seed=3,
+    )
+
+    idata = batch.load("a")
+
+    # the censored trials are part of the fit
+    assert hasattr(idata, "log_likelihood")
+    assert (
+        idata.log_likelihood["obs_a_p50_censored"].sizes["obs_a_p50_censored_dim_0"]
+        == 2
+    )
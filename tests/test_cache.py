@@ -0,0 +1,124 @@
+import os
+import pathlib
+import typing
+import warnings
+
+import numpy as np
+
+import pytest
+
+import arviz as az
+
+import pylater
+import pylater.cache
+import pylater.fit
+import pylater.model
+
+
+def test_fit_cache(tmp_path: pathlib.Path) -> None:
+    cache = pylater.cache.FitCache(path=tmp_path)
+
+    datasets = [pylater.data.cw1995["a_p50"]]
+
+    key = cache.key(datasets=datasets, draws=100, random_seed=1)
+
+    # equivalent settings give the same key
+    assert key == cache.key(
+        datasets=[pylater.Dataset(name="a_p50", rt_s=datasets[0].rt_s.copy())],
+        priors=pylater.model.DEFAULT_PRIORS,
+        random_seed=np.int64(1),
+        draws=100,
+    )
+
+    # including those that only affect how the sampling is run
+    assert key == cache.key(
+        datasets=datasets,
+        draws=100,
+        random_seed=1,
+        progressbar=False,
+        cores=1,
+        compute_convergence_checks=False,
+    )
+
+    # and different data or settings do not
+    assert key != cache.key(datasets=datasets, draws=100, random_seed=2)
+    assert key != cache.key(
+        datasets=[pylater.Dataset(name="a_p50", rt_s=datasets[0].rt_s[1:])],
+        draws=100,
+        random_seed=1,
+    )
+    assert key != cache.key(
+        datasets=datasets,
+        priors={"k": pylater.model.LogNormalPrior(mu=1.0, sigma=0.5)},
+        draws=100,
+        random_seed=1,
+    )
+
+    assert cache.load(key=key) is None
+
+    rng = np.random.default_rng(seed=0)
+
+    idatas = {
+        f"{i_fit:064x}": az.from_dict(posterior={"mu": rng.normal(size=(2, 100))})
+        for i_fit in range(3)
+    }
+
+    for i_fit, (fit_key, idata) in enumerate(idatas.items()):
+        cache.save(key=fit_key, idata=idata, settings={"fit": i_fit})
+        # so that the order of use is unambiguous
+        os.utime(cache.entry_path(key=fit_key), (i_fit, i_fit))
+
+    loaded = cache.load(key=f"{0:064x}")
+
+    assert loaded is not None
+    assert hasattr(loaded, "posterior")
+    assert np.array_equal(loaded.posterior.mu, idatas[f"{0:064x}"].posterior.mu)
+
+    # the least recently used fit is now the second
+    evicted = cache.evict(max_bytes=cache.n_bytes - 1, dry_run=True)
+
+    assert [entry.key for entry in evicted] == [f"{1:064x}"]
+    assert len(cache.entries()) == 3
+
+    cache.evict(max_bytes=cache.n_bytes - 1)
+
+    assert {entry.key for entry in cache.entries()} == {f"{0:064x}", f"{2:064x}"}
+
+    assert len(cache.invalidate(keys=[f"{0:064x}"], dry_run=True)) == 1
+    assert len(cache.invalidate()) == 2
+    assert cache.entries() == []
+
+
+def test_fit_cache_hit(tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    cache = pylater.cache.FitCache(path=tmp_path)
+
+    datasets = [pylater.data.cw1995["a_p50"]]
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        idata = cache.fit(
+            datasets=datasets,
+            draws=50,
+            tune=50,
+            chains=1,
+            cores=1,
+            progressbar=False,
+            random_seed=1,
+        )
+
+    def sample(*_args: object, **_kwargs: object) -> typing.NoReturn:
+        raise AssertionError("Sampled rather than loading the cached fit")
+
+    monkeypatch.setattr(pylater.fit, "sample", sample)
+
+    cached_idata = cache.fit(
+        datasets=datasets,
+        draws=50,
+        tune=50,
+        chains=1,
+        random_seed=1,
+    )
+
+    assert hasattr(idata, "posterior")
+    assert hasattr(cached_idata, "posterior")
+    assert np.array_equal(cached_idata.posterior.mu, idata.posterior.mu)
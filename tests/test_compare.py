@@ -0,0 +1,134 @@
+import warnings
+
+import numpy as np
+import xarray as xr
+
+import pymc as pm
+
+import pylater
+import pylater.compare
+import pylater.dist
+
+
+def test_compare_arrangements() -> None:
+    datasets = [
+        pylater.Dataset(name=name, rt_s=pylater.data.cw1995[name].rt_s[::5])
+        for name in ("a_p50", "a_p10")
+    ]
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        result = pylater.compare.compare_arrangements(
+            datasets=datasets,
+            sample_kwargs={"draws": 50, "tune": 50, "chains": 1},
+            n_cores=2,
+            random_seed=1,
+        )
+
+    assert set(result.comparison.index) == {"shift", "swivel", "independent"}
+    assert list(result.dataset_elpd.dataset.values) == ["a_p50", "a_p10"]
+
+    # the dataset contributions add up to the total
+    assert np.allclose(
+        result.dataset_elpd.elpd_loo.sum(dim="dataset").sel(
+            arrangement=list(result.comparison.index)
+        ),
+        result.comparison.elpd_loo,
+    )
+
+    # the pointwise log-likelihood matches that from the model
+    idata = result.idatas["shift"]
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        model = pylater.build_default_model(datasets=datasets, share_type="shift")
+
+    model_log_likelihood = pm.compute_log_likelihood(
+        idata=idata.copy(),
+        model=model,
+        extend_inferencedata=False,
+        progressbar=False,
+    )
+
+    assert hasattr(idata, "log_likelihood")
+
+    for dataset in datasets:
+        var_name = f"obs_{dataset.name}"
+        assert np.allclose(
+            idata.log_likelihood[var_name],
+            model_log_likelihood[var_name],
+        )
+
+
+def test_binned_log_likelihood() -> None:
+    # the second bin is far in the tail of the early unit, where its probability
+    # is lost to cancellation if the distribution function is not in log space
+    dataset = pylater.data.BinnedDataset(
+        name="tail",
+        edges_s=np.array([0.0, 0.02, 0.025, 0.2, 0.3, np.inf]),
+        counts=np.array([0, 2, 50, 30, 17]),
+    )
+
+    mu, sigma, sigma_e = (np.array([5.0]), np.array([1.0]), np.array([4.0]))
+
+    lower_promptness, upper_promptness = pylater.dist.edges_to_promptness(
+        edges_s=dataset.edges_s
+    )
+
+    expected = pylater.dist.binned_logp(
+        value=dataset.counts,
+        mu=mu,
+        sigma=sigma,
+        sigma_e=sigma_e,
+        lower_promptness=lower_promptness,
+        upper_promptness=upper_promptness,
+        n_trials=np.sum(dataset.counts),
+    ).eval()
+
+    log_likelihood = pylater.compare.binned_log_likelihood(
+        dataset=dataset, mu=mu, sigma=sigma, sigma_e=sigma_e
+    )
+
+    assert np.all(np.isfinite(log_likelihood))
+    assert np.allclose(log_likelihood, expected)
+
+
+def test_censored_log_likelihood() -> None:
+    rt_s = np.concatenate((pylater.data.cw1995["a_p50"].rt_s, [np.nan] * 3))
+
+    # only an upper bound, so that the missing lower bound has no probability
+    # beyond it
+    dataset = pylater.Dataset.from_censored_rt_s(
+        name="censored", rt_s=rt_s, censor_upper_s=0.3
+    )
+
+    posterior = xr.Dataset(
+        data_vars={
+            param_name: (("chain", "draw", "dataset"), [[[value], [value * 1.1]]])
+            for (param_name, value) in (("mu", 5.0), ("sigma", 1.0), ("sigma_e", 4.0))
+        },
+        coords={"chain": [0], "draw": [0, 1], "dataset": [dataset.name]},
+    )
+
+    log_likelihood = pylater.compare.pointwise_log_likelihood(
+        posterior=posterior, datasets=[dataset]
+    )
+
+    expected = pylater.dist.censored_logp(
+        value=np.array([dataset.n_censored_lower, dataset.n_censored_upper]),
+        mu=posterior.mu.values,
+        sigma=posterior.sigma.values,
+        sigma_e=posterior.sigma_e.values,
+        bound_promptness=pylater.dist.censor_bounds_to_promptness(
+            censor_lower_s=dataset.censor_lower_s,
+            censor_upper_s=dataset.censor_upper_s,
+        ),
+        is_above=pylater.dist.IS_ABOVE_BOUND,
+        n_trials=rt_s.size,
+    ).eval()
+
+    values = log_likelihood["obs_censored_censored"].values
+
+    assert values.shape == (1, 2, 2)
+    assert np.all(np.isfinite(values))
+    assert np.allclose(values, expected)
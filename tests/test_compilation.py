@@ -0,0 +1,67 @@
+import os
+import pathlib
+import subprocess
+import sys
+
+import pytest
+
+import pylater.cli
+import pylater.compilation
+import pylater.config
+
+
+def test_warmup_then_hit() -> None:
+    reports = pylater.compilation.warmup(n_datasets=[1], log_likelihood=False)
+
+    assert list(reports) == [(1, None, "float64")]
+
+    # a different number of trials uses the same compiled modules
+    model = pylater.compilation.build_standard_model(n_datasets=1, n_trials=37)
+
+    report = pylater.compilation.check_cache(model=model)
+
+    assert report.hit
+    assert report.n_compiled == 0
+    assert report.n_memory_hits + report.n_disk_hits > 0
+
+
+def test_set_compiledir(
+    tmp_path: pathlib.Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    # `set_compiledir` sets the environment variable, so it is restored after
+    # the test (including if the check below fails)
+    monkeypatch.setenv("PYTENSOR_FLAGS", os.environ.get("PYTENSOR_FLAGS", ""))
+
+    # pytensor has already been imported in this process, whatever the test order
+    import pytensor  # noqa: F401
+
+    with pytest.raises(ValueError, match="after PyTensor has been imported"):
+        pylater.config.set_compiledir(compiledir=tmp_path)
+
+    code = (
+        "import sys, pylater.config; "
+        + f"pylater.config.set_compiledir({str(tmp_path)!r}); "
+        + "import pytensor; print(pytensor.config.base_compiledir)"
+    )
+
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        capture_output=True,
+        check=True,
+        text=True,
+    )
+
+    assert result.stdout.strip() == str(tmp_path)
+
+
+def test_cli_arguments() -> None:
+    parser = pylater.cli.build_parser()
+
+    args = parser.parse_args(
+        ["check-cache", "--n-datasets", "1", "3", "--precisions", "float32"]
+    )
+
+    assert args.n_datasets == [1, 3]
+    assert args.precisions == ["float32"]
+    assert args.log_likelihood
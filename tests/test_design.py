@@ -0,0 +1,94 @@
+import time
+
+import numpy as np
+
+import pylater.design
+import pylater.dist
+
+
+def test_expected_information_gain() -> None:
+    rng = np.random.default_rng(seed=2112)
+
+    n_particles = 500
+
+    # the particles only differ in the second condition, so a block in the first
+    # condition carries no information about them
+    log_params = np.zeros((2, n_particles, 3))
+    log_params[..., 1] = np.log(5.0)
+    log_params[1, :, 1] += rng.normal(scale=0.3, size=n_particles)
+
+    eig = pylater.design.expected_information_gain(
+        log_params=log_params,
+        weights=np.full(n_particles, 1 / n_particles),
+        n_trials=20,
+        rng=rng,
+    )
+
+    assert np.isclose(eig[0], 0)
+    assert eig[1] > 0.5
+
+
+def test_adaptive_design() -> None:
+    rng = np.random.default_rng(seed=5813)
+
+    log_priors = np.log([0.1, 0.5, 0.9])
+
+    design = pylater.design.AdaptiveDesign(
+        conditions={"log_prior": log_priors},
+        formulas={"k": "1 + log_prior"},
+        n_particles=1000,
+        rng=rng,
+    )
+
+    assert design.condition_log_params().shape == (3, 1000, 3)
+
+    sigma, sigma_e, k_intercept, k_slope = (1.0, 3.0, np.log(5.0), 0.4)
+
+    for _ in range(15):
+        i_condition, eig = design.next_condition()
+
+        assert eig.shape == (3,)
+
+        rt_s = pylater.dist.random(
+            mu=sigma * np.exp(k_intercept + k_slope * log_priors[i_condition]),
+            sigma=sigma,
+            sigma_e=sigma_e,
+            rng=rng,
+            size=design.n_trials,
+        )
+
+        design.update(condition=i_condition, new_rt_s=rt_s)
+
+    assert design.n_trials_observed == 15 * design.n_trials
+
+    idata = design.posterior()
+
+    assert hasattr(idata, "posterior")
+
+    k_coef = idata.posterior.k_coef.mean(dim=("chain", "draw"))
+
+    assert list(k_coef.k_column.values) == ["Intercept", "log_prior"]
+    assert np.abs(float(k_coef.sel(k_column="Intercept")) - k_intercept) < 0.2
+    assert np.abs(float(k_coef.sel(k_column="log_prior")) - k_slope) < 0.2
+
+
+def test_decision_time() -> None:
+    # the default settings, with five candidate conditions
+    design = pylater.design.AdaptiveDesign(
+        conditions={"log_prior": np.log([0.1, 0.25, 0.5, 0.75, 0.9])},
+        formulas={"k": "1 + log_prior"},
+        rng=np.random.default_rng(seed=8120),
+    )
+
+    # the first decision is not timed, in case of any one-off costs
+    design.next_condition()
+
+    decision_times_s = []
+
+    for _ in range(3):
+        start_s = time.perf_counter()
+        design.next_condition()
+        decision_times_s.append(time.perf_counter() - start_s)
+
+    # the fastest of a few decisions, so as to be robust to other load
+    assert min(decision_times_s) < 0.2
@@ -1,5 +1,15 @@
+import warnings
+
 import numpy as np
 
+import pytest
+
+import scipy.stats
+
+import pymc as pm
+
+import pytensor.tensor as pt
+
 import pylater.dist
 
 
@@ -49,6 +59,12 @@ def test_random() -> None:
     # and that it is different to before
     assert samples != seeded_samples[0]
 
+    # the draws are those of the main and early units, in that order, so that
+    # seeded draws do not depend on the version
+    rng = np.random.default_rng(seed=124121)
+    later, early = (rng.normal(mu, sigma), rng.normal(0.0, sigma_e))
+    assert np.isclose(seeded_samples[0], 1 / max(later, early))
+
     # check that the size parameter works
     sized_shape = (10, 1, 4)
     sized_samples = pylater.dist.random(
@@ -56,3 +72,251 @@ def test_random() -> None:
     )
     assert isinstance(sized_samples, np.ndarray)
     assert sized_samples.shape == sized_shape
+
+    # and with an integer size
+    int_sized_samples = pylater.dist.random(
+        mu=mu, sigma=sigma, sigma_e=sigma_e, size=10
+    )
+    assert isinstance(int_sized_samples, np.ndarray)
+    assert int_sized_samples.shape == (10,)
+
+
+def test_numpy_equivalents() -> None:
+    value = np.array([-1.0, 0.5, 2.0, 5.0, 12.0])
+    mu = 5.0
+    sigma = 1.0
+    sigma_e = 4.0
+
+    for pt_func, np_func in (
+        (pylater.dist.logp, pylater.dist.numpy_logp),
+        (pylater.dist.logcdf, pylater.dist.numpy_logcdf),
+    ):
+        expected = pt_func(value=value, mu=mu, sigma=sigma, sigma_e=sigma_e).eval()
+        actual = np_func(value=value, mu=mu, sigma=sigma, sigma_e=sigma_e)
+
+        assert np.allclose(actual, expected)
+
+
+def test_binned() -> None:
+    mu = 5.0
+    sigma = 1.0
+    sigma_e = 4.0
+
+    edges_s = np.array([0.0, 0.1, 0.2, 0.3, np.inf])
+    counts = np.array([3, 50, 30, 17])
+
+    lower, upper = pylater.dist.edges_to_promptness(edges_s=edges_s)
+
+    logp = pylater.dist.binned_logp(
+        value=counts,
+        mu=mu,
+        sigma=sigma,
+        sigma_e=sigma_e,
+        lower_promptness=lower,
+        upper_promptness=upper,
+        n_trials=np.sum(counts),
+    ).eval()
+
+    cdf = np.exp(
+        pylater.dist.numpy_logcdf(
+            value=np.concatenate(([np.inf], upper[1:], [0.0])),
+            mu=mu,
+            sigma=sigma,
+            sigma_e=sigma_e,
+        )
+    )
+
+    assert np.allclose(logp, counts * np.log(-np.diff(cdf)))
+
+    samples = pylater.dist.binned_random(
+        mu=mu,
+        sigma=sigma,
+        sigma_e=sigma_e,
+        lower_promptness=lower,
+        upper_promptness=upper,
+        n_trials=100,
+        rng=np.random.default_rng(seed=2113),
+        size=(6, len(counts)),
+    )
+
+    assert samples.shape == (6, len(counts))
+    assert np.all(samples.sum(axis=-1) <= 100)
+
+    # a dataset without any reaction times within the bins has no ECDF
+    with pytest.raises(ValueError, match="at least one reaction time"):
+        pylater.data.BinnedDataset(name="empty", edges_s=edges_s, counts=[0] * 4)
+
+    # with a different number of trials for each element of a batch
+    batch_n_trials = np.array([10, 100, 1000])
+
+    batch_samples = pylater.dist.binned_random(
+        mu=np.full((3, 1), mu),
+        sigma=sigma,
+        sigma_e=sigma_e,
+        lower_promptness=lower,
+        upper_promptness=upper,
+        n_trials=batch_n_trials,
+        rng=np.random.default_rng(seed=2114),
+    )
+
+    assert batch_samples.shape == (3, len(counts))
+    assert np.all(batch_samples.sum(axis=-1) <= batch_n_trials)
+    assert np.all(batch_samples.sum(axis=-1) > batch_n_trials / 2)
+
+    # an empty bin with no probability (here, a narrow bin at very short reaction
+    # times) does not affect the likelihood or its gradient
+    tail_edges_s = np.array([0.0, 0.001, 0.0011, 0.2, 0.3, np.inf])
+    tail_counts = np.array([0, 0, 50, 30, 17])
+
+    tail_lower, tail_upper = pylater.dist.edges_to_promptness(edges_s=tail_edges_s)
+
+    mu_var = pt.scalar("mu")
+
+    tail_logp = pm.math.sum(
+        pylater.dist.binned_logp(
+            value=tail_counts,
+            mu=mu_var,
+            sigma=sigma,
+            sigma_e=sigma_e,
+            lower_promptness=tail_lower,
+            upper_promptness=tail_upper,
+            n_trials=np.sum(tail_counts),
+        )
+    )
+
+    tail_logp_value, tail_dlogp_value = pm.pytensorf.compile_pymc(
+        inputs=[mu_var],
+        outputs=[tail_logp, pm.pytensorf.gradient(tail_logp, [mu_var])],
+    )(mu)
+
+    assert np.isfinite(tail_logp_value)
+    assert np.isfinite(tail_dlogp_value)
+
+
+def test_censored() -> None:
+    mu = 5.0
+    sigma = 1.0
+    sigma_e = 4.0
+
+    rt_s = np.array([0.05, 0.15, 0.2, 0.25, 0.5, np.nan])
+
+    dataset = pylater.Dataset.from_censored_rt_s(
+        name="a",
+        rt_s=rt_s,
+        censor_lower_s=0.1,
+        censor_upper_s=0.3,
+    )
+
+    assert dataset.n_trials == 3
+    assert (dataset.n_censored_lower, dataset.n_censored_upper) == (1, 2)
+
+    # the ECDF is over all of the trials, and unknown beyond the bounds
+    assert np.allclose(
+        dataset.evaluate_ecdf(rt_s=[0.05, 0.1, 0.2, 0.3, 0.4]),
+        [np.nan, 1 / 6, 3 / 6, 4 / 6, np.nan],
+        equal_nan=True,
+    )
+
+    bound_promptness = pylater.dist.censor_bounds_to_promptness(
+        censor_lower_s=dataset.censor_lower_s,
+        censor_upper_s=dataset.censor_upper_s,
+    )
+
+    logp = pylater.dist.censored_logp(
+        value=np.array([1, 2]),
+        mu=mu,
+        sigma=sigma,
+        sigma_e=sigma_e,
+        bound_promptness=bound_promptness,
+        is_above=pylater.dist.IS_ABOVE_BOUND,
+        n_trials=dataset.n_total,
+    ).eval()
+
+    cdf = np.exp(
+        pylater.dist.numpy_logcdf(
+            value=[10.0, 1 / 0.3],
+            mu=mu,
+            sigma=sigma,
+            sigma_e=sigma_e,
+        )
+    )
+
+    assert np.allclose(logp, [np.log(1 - cdf[0]), 2 * np.log(cdf[1])])
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        model = pylater.build_default_model(datasets=[dataset])
+
+    assert {rv.name for rv in model.observed_RVs} == {
+        "obs_a",
+        "obs_a_censored",
+    }
+
+    # with a different number of trials for each element of a batch
+    batch_n_trials = np.array([10, 1000])
+
+    batch_samples = pylater.dist.censored_random(
+        mu=np.full((2, 1), mu),
+        sigma=sigma,
+        sigma_e=sigma_e,
+        bound_promptness=bound_promptness,
+        is_above=pylater.dist.IS_ABOVE_BOUND,
+        n_trials=batch_n_trials,
+        rng=np.random.default_rng(seed=2115),
+    )
+
+    assert batch_samples.shape == (2, 2)
+    assert np.all(batch_samples.sum(axis=-1) <= batch_n_trials)
+    assert batch_samples[1].sum() > 10
+
+
+def test_race() -> None:
+    value = np.array([-1.0, 0.5, 2.0, 5.0, 12.0])
+
+    mu, sigma, sigma_e = (5.0, 1.0, 4.0)
+
+    # a race between a main and early unit is the LATER distribution, whose
+    # density is that of each unit multiplied by the distribution function of
+    # the other
+    expected_logp = np.logaddexp(
+        scipy.stats.norm.logpdf(value, loc=mu, scale=sigma)
+        + scipy.stats.norm.logcdf(value, loc=0.0, scale=sigma_e),
+        scipy.stats.norm.logpdf(value, loc=0.0, scale=sigma_e)
+        + scipy.stats.norm.logcdf(value, loc=mu, scale=sigma),
+    )
+    expected_logcdf = scipy.stats.norm.logcdf(
+        value, loc=mu, scale=sigma
+    ) + scipy.stats.norm.logcdf(value, loc=0.0, scale=sigma_e)
+
+    for race_func, expected in (
+        (pylater.dist.numpy_race_logp, expected_logp),
+        (pylater.dist.numpy_race_logcdf, expected_logcdf),
+    ):
+        assert np.allclose(
+            race_func(value, mu=[mu, 0.0], sigma=[sigma, sigma_e]), expected
+        )
+
+    assert np.allclose(
+        pylater.dist.logp(value=value, mu=mu, sigma=sigma, sigma_e=sigma_e).eval(),
+        expected_logp,
+    )
+
+    unit_mu = np.array([5.0, 3.0, 0.0])
+    unit_sigma = np.array([1.0, 2.0, 4.0])
+
+    with pm.Model():
+        race = pylater.dist.LATERRace("race", mu=unit_mu, sigma=unit_sigma)
+
+    assert np.allclose(
+        pm.logp(rv=race, value=value).eval(),
+        pylater.dist.numpy_race_logp(value, mu=unit_mu, sigma=unit_sigma),
+    )
+
+    samples = pm.draw(vars=race, draws=20_000, random_seed=2113)
+
+    assert samples.shape == (20_000,)
+    assert np.isclose(
+        np.mean(1 / samples <= 4.0),
+        np.exp(pylater.dist.numpy_race_logcdf(4.0, mu=unit_mu, sigma=unit_sigma)),
+        atol=0.01,
+    )
@@ -0,0 +1,69 @@
+import warnings
+
+import numpy as np
+
+import pylater
+import pylater.fit
+
+
+def test_approximate() -> None:
+    data = pylater.data.cw1995["a_p50"]
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        model = pylater.build_default_model(datasets=[data])
+
+    idata = pylater.fit.approximate(model=model, n_draws=500, random_seed=4125)
+
+    assert hasattr(idata, "posterior")
+    assert hasattr(idata, "log_likelihood")
+    assert hasattr(idata, "sample_stats")
+
+    assert idata.posterior.mu.shape == (1, 500, 1)
+    assert "obs_a_p50" in idata.log_likelihood
+
+    # the Laplace approximation is adequate for this dataset
+    assert not pylater.fit.needs_full_fit(idata=idata)
+    assert np.isfinite(idata.sample_stats.attrs["pareto_k"])
+
+    # the resampled draws are equally weighted
+    assert np.allclose(idata.sample_stats.log_weight, -np.log(500))
+
+
+def test_approximate_variational() -> None:
+    data = pylater.data.cw1995["a_p50"]
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        model = pylater.build_default_model(datasets=[data])
+
+    for method, n_iterations in (("advi", 10_000), ("fullrank_advi", 2_000)):
+        idata = pylater.fit.approximate(
+            model=model,
+            method=method,
+            n_draws=200,
+            n_iterations=n_iterations,
+            importance_resample=False,
+            log_likelihood=False,
+            random_seed=4126,
+        )
+
+        assert hasattr(idata, "posterior")
+        assert hasattr(idata, "sample_stats")
+
+        assert idata.posterior.mu.shape == (1, 200, 1)
+        assert idata.sample_stats.attrs["method"] == method
+
+        # without resampling, the weights are the importance weights
+        log_weight = idata.sample_stats.log_weight.values
+        assert np.isclose(np.sum(np.exp(log_weight)), 1.0)
+        assert np.ptp(log_weight) > 0
+
+        assert pylater.fit.needs_full_fit(idata=idata) == (
+            idata.sample_stats.attrs["pareto_k"] > pylater.fit.PARETO_K_THRESHOLD
+        )
+
+        # the full-rank approximation needs more iterations than are run here
+        if method == "advi":
+            assert not pylater.fit.needs_full_fit(idata=idata)
+            assert 4 < float(idata.posterior.mu.mean()) < 6
@@ -0,0 +1,99 @@
+import numpy as np
+
+import pytest
+
+import scipy.stats
+
+import arviz as az
+
+import pylater.data
+import pylater.dist
+import pylater.gof
+
+
+def test_evaluate_ecdfs() -> None:
+    rng = np.random.default_rng(seed=0)
+
+    samples = rng.normal(size=(4, 50))
+    samples[1, 40:] = np.nan
+
+    x = rng.normal(size=(4, 10))
+
+    ecdf_p = pylater.gof.evaluate_ecdfs(samples=samples, x=x)
+
+    for row_samples, row_x, row_ecdf_p in zip(samples, x, ecdf_p, strict=True):
+        ecdf = scipy.stats.ecdf(sample=row_samples[~np.isnan(row_samples)])
+        assert np.allclose(row_ecdf_p, ecdf.cdf.evaluate(row_x))
+
+
+def test_goodness_of_fit() -> None:
+    rng = np.random.default_rng(seed=0)
+
+    n_datasets, n_draws = (4, 200)
+
+    mu = np.array([4.0, 5.0, 6.0, 5.0])
+    sigma, sigma_e = (0.8, 3.0)
+
+    datasets = [
+        pylater.data.Dataset(
+            name=f"dataset_{i_dataset}",
+            rt_s=rt_s[rt_s > 0],
+        )
+        for (i_dataset, rt_s) in enumerate(
+            np.asarray(
+                pylater.dist.random(
+                    mu=mu[:, np.newaxis],
+                    sigma=sigma,
+                    sigma_e=sigma_e,
+                    rng=rng,
+                    size=(n_datasets, 200),
+                )
+            )
+        )
+    ]
+
+    # the posterior describes all but the last dataset
+    posterior_mu = np.array([4.0, 5.0, 6.0, 7.0]) * np.ones((1, n_draws, 1))
+
+    idata = az.from_dict(
+        posterior={
+            "mu": posterior_mu,
+            "sigma": np.full((1, n_draws, n_datasets), sigma),
+            "sigma_e": np.full((1, n_draws, n_datasets), sigma_e),
+        },
+        posterior_predictive={
+            f"obs_{dataset.name}": pylater.dist.random(
+                mu=posterior_mu[..., i_dataset, np.newaxis],
+                sigma=sigma,
+                sigma_e=sigma_e,
+                rng=rng,
+                size=(1, n_draws, 200),
+            )
+            for (i_dataset, dataset) in enumerate(datasets)
+        },
+        dims={param_name: ["dataset"] for param_name in ("mu", "sigma", "sigma_e")},
+        coords={"dataset": [dataset.name for dataset in datasets]},
+    )
+
+    for source in ("logcdf", "predictive"):
+        gof = pylater.gof.goodness_of_fit(
+            idata=idata,
+            datasets=datasets,
+            source=source,
+            chunk_size=30,
+        )
+
+        for stat_name in ("ks_statistic", "anderson_darling"):
+            assert np.argmax(gof[stat_name].values) == n_datasets - 1
+
+    # without uncertainty in the parameters, only the predictive draws have a band
+    assert np.argmin(gof.band_coverage.values) == n_datasets - 1
+    assert gof.band_coverage[:-1].min() > 0.8
+
+    # the censored trials are not part of the statistics
+    censored = pylater.data.Dataset.from_censored_rt_s(
+        name=datasets[0].name, rt_s=datasets[0].rt_s, censor_upper_s=0.3
+    )
+
+    with pytest.raises(ValueError, match="censored"):
+        pylater.gof.goodness_of_fit(idata=idata, datasets=[censored])
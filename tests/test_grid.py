@@ -0,0 +1,50 @@
+import numpy as np
+
+import pylater.data
+import pylater.dist
+import pylater.grid
+
+
+def test_grid_posterior() -> None:
+    rng = np.random.default_rng(seed=9182)
+
+    true_params = {"a": (5.0, 1.0, 3.0), "b": (3.0, 0.5, 2.0)}
+
+    datasets = [
+        pylater.data.Dataset(
+            name=name,
+            rt_s=np.round(
+                pylater.dist.random(
+                    mu=mu, sigma=sigma, sigma_e=sigma_e, rng=rng, size=(1000,)
+                ),
+                3,
+            ),
+        )
+        for (name, (mu, sigma, sigma_e)) in true_params.items()
+    ]
+
+    posterior = pylater.grid.grid_posterior(datasets=datasets, n_points=16)
+
+    joint = posterior.joint
+    grid_dims = [dim for dim in joint.dims if dim != "dataset"]
+    assert np.allclose(joint.sum(dim=grid_dims), 1)
+
+    # the datasets are evaluated together, but are independent
+    single_posterior = pylater.grid.grid_posterior(datasets=datasets[1:], n_points=16)
+    assert np.allclose(single_posterior.log_axes[0], posterior.log_axes[1])
+    assert np.allclose(
+        single_posterior.log_probability[0], posterior.log_probability[1]
+    )
+
+    marginal = posterior.marginal(param_name="k")
+    assert np.allclose(marginal.probability.sum(dim="point"), 1)
+
+    idata = posterior.to_inference_data(n_draws=500, rng=rng)
+
+    assert hasattr(idata, "posterior")
+    assert idata.posterior.mu.shape == (1, 500, 2)
+
+    for name, (mu, sigma, _) in true_params.items():
+        subset = idata.posterior.sel(dataset=name)
+        assert np.abs(float(subset.mu.mean()) - mu) < 0.1 * mu
+        assert np.abs(float(subset.sigma.mean()) - sigma) < 0.1 * sigma
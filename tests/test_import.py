@@ -0,0 +1,42 @@
+import subprocess
+import sys
+import textwrap
+
+
+def run_python(code: str) -> str:
+    result = subprocess.run(
+        [sys.executable, "-c", textwrap.dedent(code)],
+        capture_output=True,
+        check=True,
+        text=True,
+    )
+    return result.stdout.strip()
+
+
+def test_lazy_import() -> None:
+    output = run_python("""
+        import sys
+        import pylater
+        data = pylater.data.cw1995
+        heavy = ("pymc", "pytensor", "matplotlib", "arviz", "xarray")
+        print(",".join(name for name in heavy if name in sys.modules))
+        """)
+
+    assert output == ""
+
+
+def test_lazy_attributes() -> None:
+    output = run_python("""
+        import sys
+        import pylater
+        assert "matplotlib.pyplot" not in sys.modules
+        import matplotlib.scale
+        assert "reciprobit_time" not in matplotlib.scale.get_scale_names()
+        pylater.ReciprobitPlot
+        assert "reciprobit_time" in matplotlib.scale.get_scale_names()
+        assert pylater.LATER is sys.modules["pylater.dist"].LATER
+        assert "LATER" in dir(pylater)
+        print("ok")
+        """)
+
+    assert output == "ok"
@@ -0,0 +1,59 @@
+import numpy as np
+
+import pylater.instrument
+
+
+def test_phases() -> None:
+    records: list[pylater.instrument.PhaseRecord] = []
+
+    with pylater.instrument.Profiler(
+        callback=records.append,
+        track_memory=True,
+    ) as profiler:
+
+        with pylater.instrument.phase("outer", n_outer=1):
+
+            with pylater.instrument.phase("inner"):
+                data = np.ones(1_000_000)
+                pylater.instrument.annotate(n_inner=data.size)
+                del data
+
+    assert [record.name for record in records] == ["inner", "outer"]
+
+    inner, outer = records
+
+    assert inner.sizes == {"n_inner": 1_000_000}
+    assert outer.sizes == {"n_outer": 1}
+
+    # the peak memory of the inner phase must also count for the outer phase
+    assert inner.peak_bytes is not None and inner.peak_bytes >= 8_000_000
+    assert outer.peak_bytes is not None and outer.peak_bytes >= inner.peak_bytes
+
+    assert outer.wall_s >= inner.wall_s
+
+    summary = profiler.summary()
+
+    assert summary["inner"]["n_calls"] == 1
+
+    table = profiler.summary_table()
+
+    assert table.splitlines()[2].startswith("outer")
+
+
+def test_inactive() -> None:
+    @pylater.instrument.instrumented("func")
+    def func() -> int:
+        pylater.instrument.annotate(n=1)
+        return 1
+
+    # without an active profiler, nothing is recorded and nothing fails
+    assert func() == 1
+
+    with pylater.instrument.Profiler() as profiler:
+        assert func() == 1
+
+    assert func() == 1
+
+    assert len(profiler.records) == 1
+    assert profiler.records[0].peak_bytes is None
+    assert profiler.records[0].sizes == {"n": 1}
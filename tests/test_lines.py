@@ -0,0 +1,45 @@
+import numpy as np
+
+import pylater.data
+import pylater.dist
+import pylater.lines
+
+
+def test_fit_lines() -> None:
+    rng = np.random.default_rng(seed=0)
+
+    n_datasets = 50
+
+    mu = rng.uniform(low=3, high=6, size=n_datasets)
+    sigma = rng.uniform(low=0.5, high=1.0, size=n_datasets)
+    sigma_e = 4 * sigma
+
+    rt_s = np.asarray(
+        pylater.dist.random(
+            mu[:, np.newaxis],
+            sigma[:, np.newaxis],
+            sigma_e[:, np.newaxis],
+            rng=rng,
+            size=(n_datasets, 500),
+        )
+    )
+
+    datasets = [
+        pylater.data.Dataset(
+            name=f"dataset_{i_dataset}",
+            rt_s=dataset_rt_s[dataset_rt_s > 0],
+        )
+        for (i_dataset, dataset_rt_s) in enumerate(rt_s)
+    ]
+
+    wls_fit = pylater.lines.fit_lines(datasets=datasets, method="wls")
+    ks_fit = pylater.lines.fit_lines(datasets=datasets, method="ks")
+
+    assert np.median(np.abs(wls_fit.mu / mu - 1)) < 0.02
+    assert np.median(np.abs(wls_fit.sigma / sigma - 1)) < 0.1
+
+    # the KS fit starts from the WLS fit and only accepts improvements
+    assert np.all(ks_fit.ks_statistic <= wls_fit.ks_statistic)
+
+    assert wls_fit.cdf(rt_s=[0.1, 0.2, 0.5]).shape == (n_datasets, 3)
+    assert list(wls_fit.to_dataset().dataset.values) == wls_fit.dataset_names
@@ -0,0 +1,51 @@
+import numpy as np
+
+import pylater.dist
+import pylater.online
+
+
+def test_update() -> None:
+    rng = np.random.default_rng(seed=3351)
+
+    mu, sigma, sigma_e = (5.0, 1.0, 3.0)
+
+    online = pylater.online.OnlineLATER(name="test", n_particles=1000, rng=rng)
+
+    for _ in range(10):
+        rt_s = pylater.dist.random(
+            mu=mu,
+            sigma=sigma,
+            sigma_e=sigma_e,
+            rng=rng,
+            size=(100,),
+        )
+        idata = online.update(new_rt_s=np.round(rt_s, 3))
+
+    assert online.n_trials == 1000
+    assert online.acceptance_rate > 0
+
+    assert hasattr(idata, "posterior")
+    posterior = idata.posterior
+
+    assert list(posterior.dataset.values) == ["test"]
+    assert posterior.mu.shape == (1, 1000, 1)
+
+    for param, true_value in (("mu", mu), ("sigma", sigma)):
+        assert np.abs(float(posterior[param].mean()) - true_value) < 0.2 * true_value
+
+
+def test_next_temperature() -> None:
+    online = pylater.online.OnlineLATER(name="test", n_particles=100, rng=1)
+
+    # a block that the particles disagree on strongly, so that the full block
+    # cannot be taken at once
+    block_log_likelihood = np.linspace(0.0, 1e4, online.n_particles)
+
+    # near the end of the block, the step does not go past it
+    assert (
+        online.next_temperature(
+            temperature=0.9995,
+            block_log_likelihood=block_log_likelihood,
+        )
+        == 1.0
+    )
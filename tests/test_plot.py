@@ -0,0 +1,261 @@
+import warnings
+
+import numpy as np
+
+import pytest
+
+import xarray as xr
+
+import arviz as az
+
+import matplotlib as mpl
+
+import pylater
+import pylater.bands
+import pylater.fit
+import pylater.lines
+import pylater.plot
+
+
+def test_live_model() -> None:
+    mpl.use("Agg")
+
+    datasets = [pylater.data.cw1995[name] for name in ("a_p50", "a_p25")]
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        model = pylater.build_default_model(datasets=datasets, share_type="shift")
+
+    plot = pylater.ReciprobitPlot()
+
+    live = plot.live_model(
+        model=model,
+        dataset_name="a_p25",
+        window=40,
+        refresh_interval_s=0,
+        include_tuning=False,
+    )
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        idata = pylater.fit.sample(
+            model=model,
+            draws=60,
+            tune=20,
+            chains=1,
+            cores=1,
+            progressbar=False,
+            random_seed=1,
+            callback=live,
+        )
+
+    assert live.n_recorded == 60
+    assert live.n_refreshes == 60
+
+    # the artists are updated rather than added
+    assert len(plot.ax.collections) == 1
+    assert len(plot.ax.lines) == 1
+
+    assert hasattr(idata, "posterior")
+
+    # the window holds the most recent draws
+    posterior = idata.posterior.sel(dataset="a_p25").isel(
+        chain=0,
+        draw=slice(-40, None),
+    )
+    assert np.allclose(np.sort(live.params[:, 0]), np.sort(posterior.mu.values))
+
+    live.finish()
+
+    assert not plot.ax.lines[0].get_animated()
+    assert np.all(np.isfinite(plot.ax.lines[0].get_ydata()))
+
+
+def test_cached_bands() -> None:
+    mpl.use("Agg")
+
+    rng = np.random.default_rng(seed=4491)
+
+    posterior = xr.Dataset(
+        data_vars={
+            param_name: (
+                ("chain", "draw", "dataset"),
+                rng.normal(loc=loc, scale=0.1, size=(2, 50, 1)),
+            )
+            for (param_name, loc) in (("mu", 5.0), ("sigma", 1.0), ("sigma_e", 3.0))
+        },
+        coords={"dataset": ["a"]},
+    )
+
+    idata = az.InferenceData(posterior=posterior)
+
+    plot = pylater.ReciprobitPlot()
+
+    plot.plot_model(idata=idata, n_points=50)
+
+    assert hasattr(idata, "credible_bands")
+    assert len(idata.credible_bands.data_vars) == 1
+
+    # a band with the same settings is reused, rather than added
+    plot.plot_model(idata=idata, n_points=50)
+
+    assert len(idata.credible_bands.data_vars) == 1
+
+    # however the draws are read
+    plot.plot_model(idata=idata, n_points=50, chunk_size=7)
+
+    assert len(idata.credible_bands.data_vars) == 1
+
+    band = pylater.bands.model_band(
+        idata=idata,
+        min_rt_s=plot.min_rt_s,
+        max_rt_s=plot.max_rt_s,
+        n_points=50,
+        use_cache=False,
+    )
+
+    assert np.allclose(plot.ax.lines[-1].get_ydata(), band.sel(statistic="median"))
+
+    # a band with different settings is added
+    plot.plot_model(idata=idata, n_points=50, ci_range=0.5)
+
+    assert len(idata.credible_bands.data_vars) == 2
+
+    # a band whose samples have changed is replaced
+    assert hasattr(idata, "posterior")
+    idata.posterior["mu"] = idata.posterior.mu + 1.0
+
+    updated_band = pylater.bands.model_band(
+        idata=idata,
+        min_rt_s=plot.min_rt_s,
+        max_rt_s=plot.max_rt_s,
+        n_points=50,
+    )
+
+    assert len(idata.credible_bands.data_vars) == 2
+    assert not np.allclose(updated_band, band)
+
+    # including if only draws other than the first and last of each chain change
+    idata.posterior["mu"][:, 1:-1] += 2.0
+
+    middle_band = pylater.bands.model_band(
+        idata=idata,
+        min_rt_s=plot.min_rt_s,
+        max_rt_s=plot.max_rt_s,
+        n_points=50,
+    )
+
+    assert not np.allclose(middle_band, updated_band)
+    assert np.allclose(
+        middle_band,
+        pylater.bands.model_band(
+            idata=idata,
+            min_rt_s=plot.min_rt_s,
+            max_rt_s=plot.max_rt_s,
+            n_points=50,
+            use_cache=False,
+        ),
+    )
+
+    # the function is still available from its original module
+    assert pylater.plot.q_from_ci_range(ci_range=0.5) == (0.25, 0.75)
+
+
+def test_plot_binned_data() -> None:
+    mpl.use("Agg")
+
+    dataset = pylater.data.BinnedDataset(
+        name="binned",
+        edges_s=[0.0, 0.15, 0.2, 0.3, 1.0],
+        counts=[10, 40, 30, 20],
+    )
+
+    plot = pylater.ReciprobitPlot()
+
+    plot.plot_data(data=dataset, n_points=200)
+
+    x_rt_s, ecdf_p = (np.asarray(values) for values in plot.ax.lines[-1].get_data())
+
+    # the ECDF steps up at the upper edge of each bin
+    assert np.allclose(ecdf_p, dataset.evaluate_ecdf(rt_s=x_rt_s))
+    assert np.allclose(
+        [ecdf_p[x_rt_s < 0.15][-1], ecdf_p[x_rt_s >= 0.3][0], ecdf_p[-1]],
+        [0.0, 0.8, 1.0],
+    )
+
+    plot.plot_data(data=dataset, plot_type="scatter")
+
+    assert np.allclose(
+        plot.ax.collections[-1].get_offsets(),
+        np.column_stack(([0.15, 0.2, 0.3, 1.0], [0.1, 0.5, 0.8, 1.0])),
+    )
+
+
+def test_plot_censored_data() -> None:
+    mpl.use("Agg")
+
+    rt_s = pylater.data.cw1995["a_p50"].rt_s
+
+    dataset = pylater.Dataset.from_censored_rt_s(
+        name="censored",
+        rt_s=rt_s,
+        censor_lower_s=0.15,
+        censor_upper_s=0.3,
+    )
+
+    plot = pylater.ReciprobitPlot()
+
+    plot.plot_data(data=dataset, n_points=200)
+
+    x_rt_s, ecdf_p = (np.asarray(values) for values in plot.ax.lines[-1].get_data())
+
+    # the ECDF is over all of the trials, reaches the bounds, and is not drawn
+    # beyond them
+    assert np.all(np.isnan(ecdf_p[(x_rt_s < 0.15) | (x_rt_s > 0.3)]))
+    assert np.allclose(
+        ecdf_p[np.isin(x_rt_s, [0.15, 0.3])],
+        [np.mean(rt_s <= 0.15), np.mean(rt_s <= 0.3)],
+    )
+
+
+def test_plot_lines() -> None:
+    mpl.use("Agg")
+
+    datasets = [pylater.data.cw1995[name] for name in ("a_p50", "a_p25")]
+
+    line_fit = pylater.lines.fit_lines(datasets=datasets)
+
+    plot = pylater.ReciprobitPlot()
+
+    with pytest.raises(ValueError, match="dataset name is required"):
+        plot.plot_lines(line_fit=line_fit)
+
+    plot.plot_lines(line_fit=line_fit, dataset_name="a_p25", n_points=100)
+
+    combined, main, early = plot.ax.lines[-3:]
+
+    assert [line.get_label() for line in (combined, main, early)] == [
+        f"Fit ({line_fit.method.value})",
+        "Main unit",
+        "Early unit",
+    ]
+
+    for line, component in zip(
+        (combined, main, early), ("combined", "main", "early"), strict=True
+    ):
+        x_rt_s, p = (np.asarray(values) for values in line.get_data())
+
+        assert (x_rt_s[0], x_rt_s[-1]) == pytest.approx((plot.min_rt_s, plot.max_rt_s))
+
+        # within the probability range of the axes, at the ends of the line
+        expected = line_fit.cdf(rt_s=x_rt_s[[0, -1]], component=component)[1]
+        expected = np.where(
+            (expected >= plot.min_p) & (expected <= plot.max_p), expected, np.nan
+        )
+
+        assert np.allclose(p[[0, -1]], expected, equal_nan=True)
+
+    # the combined function spans the probability range of the data
+    x_rt_s, p = (np.asarray(values) for values in combined.get_data())
+    assert np.nanmin(p) < 0.01
+    assert np.nanmax(p) > 0.99
@@ -0,0 +1,121 @@
+import warnings
+
+import numpy as np
+
+import pymc as pm
+
+import pytensor.tensor as pt
+
+import pylater
+import pylater.config
+import pylater.dist
+
+
+def test_tail_numerics() -> None:
+    # includes extremely early responses and negative promptness
+    values = np.array([-5.0, -0.5, 0.5, 5.0, 20.0, 50.0, 200.0])
+
+    mu, sigma, sigma_e = (4.0, 0.5, 2.0)
+
+    for func in (pylater.dist.logp, pylater.dist.logcdf):
+
+        results = {}
+
+        for dtype in ("float64", "float32"):
+
+            with pylater.config.precision(precision=dtype):
+
+                value = pt.vector(dtype=dtype)
+                params = [pt.scalar(dtype=dtype) for _ in range(3)]
+
+                out = func(value, *params)
+
+                grads = pm.pytensorf.gradient(pm.math.sum(out), params)
+
+                eval_func = pm.pytensorf.compile_pymc(
+                    inputs=[value, *params],
+                    outputs=[out, *grads],
+                )
+
+            results[dtype] = eval_func(
+                values.astype(dtype), *np.array([mu, sigma, sigma_e], dtype=dtype)
+            )
+
+            assert results[dtype][0].dtype == dtype
+
+            for result in results[dtype]:
+                assert np.all(np.isfinite(result))
+
+        for result_64, result_32 in zip(
+            results["float64"], results["float32"], strict=True
+        ):
+            assert np.allclose(result_32, result_64, rtol=1e-4, atol=1e-4)
+
+
+def test_posterior_precision() -> None:
+    data_name = "a_p50"
+
+    posteriors = {}
+
+    for precision in ("float64", "float32"):
+
+        with pylater.config.precision(precision=precision):
+
+            dataset = pylater.data.Dataset(
+                name=data_name,
+                rt_s=pylater.data.cw1995[data_name].rt_s,
+            )
+
+            assert dataset.rt_s.dtype == precision
+
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")
+                model = pylater.build_default_model(datasets=[dataset])
+
+                idata = pm.sample(
+                    model=model,
+                    draws=500,
+                    tune=500,
+                    chains=2,
+                    cores=1,
+                    random_seed=3561,
+                    progressbar=False,
+                    compute_convergence_checks=False,
+                )
+
+            assert hasattr(idata, "posterior")
+
+            posteriors[precision] = idata.posterior
+
+            assert posteriors[precision]["mu"].dtype == precision
+
+            rt_s = pylater.dist.random(mu=5.0, sigma=1.0, sigma_e=3.0, size=(10,))
+
+            assert isinstance(rt_s, np.ndarray)
+            assert rt_s.dtype == precision
+
+    # the posterior summaries agree to within the Monte Carlo error
+    for param_name in ("mu", "sigma", "sigma_e"):
+
+        posterior_64, posterior_32 = (
+            posteriors[precision][param_name].astype(np.float64)
+            for precision in ("float64", "float32")
+        )
+
+        sd_64 = posterior_64.std(dim=("chain", "draw"))
+
+        assert np.all(
+            np.abs(
+                posterior_32.mean(dim=("chain", "draw"))
+                - posterior_64.mean(dim=("chain", "draw"))
+            )
+            < 0.25 * sd_64
+        )
+
+        assert np.allclose(posterior_32.std(dim=("chain", "draw")), sd_64, rtol=0.15)
+
+        assert np.allclose(
+            posterior_32.quantile(q=[0.05, 0.95], dim=("chain", "draw")),
+            posterior_64.quantile(q=[0.05, 0.95], dim=("chain", "draw")),
+            rtol=0.05,
+        )
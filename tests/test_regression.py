@@ -0,0 +1,104 @@
+import warnings
+
+import numpy as np
+
+import pylater
+import pylater.regression
+
+
+def test_design_matrix() -> None:
+    covariates = {
+        "condition": np.array(["b", "a", "c", "a"]),
+        "session": np.array([1, 2, 1, 2]),
+        "urgency": np.array([0.5, 1.0, 1.5, 2.0]),
+    }
+
+    design = pylater.regression.design_matrix(
+        formula="condition + urgency + C(session):urgency",
+        covariates=covariates,
+    )
+
+    assert design.column_names == [
+        "Intercept",
+        "C(condition)[T.b]",
+        "C(condition)[T.c]",
+        "urgency",
+        "C(session)[T.2]:urgency",
+    ]
+    assert list(design.is_baseline) == [True, False, False, False, False]
+    assert np.array_equal(
+        design.matrix.toarray(),
+        [
+            [1, 1, 0, 0.5, 0],
+            [1, 0, 0, 1.0, 1.0],
+            [1, 0, 1, 1.5, 0],
+            [1, 0, 0, 2.0, 2.0],
+        ],
+    )
+
+    # without an intercept, each condition has a baseline and the interaction
+    # columns that never occur (condition "c" in session 2) are removed
+    design = pylater.regression.design_matrix(
+        formula="0 + C(condition) + C(condition):C(session)",
+        covariates={
+            "condition": np.array(["b", "a", "c", "a", "b"]),
+            "session": np.array([1, 2, 1, 2, 2]),
+        },
+    )
+
+    assert design.column_names == [
+        "C(condition)[a]",
+        "C(condition)[b]",
+        "C(condition)[c]",
+        "C(condition)[T.b]:C(session)[T.2]",
+    ]
+    assert list(design.is_baseline) == [True, True, True, False]
+    assert np.array_equal(design.matrix[[4], :].toarray(), [[0, 1, 0, 1]])
+
+
+def test_share_type_equivalence() -> None:
+    datasets = [pylater.data.cw1995[name] for name in ("a_p50", "a_p25", "a_p10")]
+
+    # the levels of the dataset covariate are in sorted order
+    i_sorted = np.argsort([dataset.name for dataset in datasets])
+
+    rt_s, covariates = pylater.regression.datasets_covariates(datasets=datasets)
+
+    rng = np.random.default_rng(seed=0)
+
+    for share_type in ("shift", "swivel"):
+
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            default_model = pylater.build_default_model(
+                datasets=datasets,
+                share_type=share_type,
+            )
+
+        regression_model = pylater.regression.build_regression_model(
+            rt_s=rt_s,
+            covariates=covariates,
+            formulas=pylater.regression.share_type_formulas(share_type=share_type),
+        )
+
+        point = {
+            value_name: np.log(
+                pylater.model.DEFAULT_PRIORS[value_name[:-6]].random(
+                    rng=rng,
+                    size=np.shape(value),
+                )
+            )
+            for (value_name, value) in default_model.initial_point().items()
+        }
+
+        regression_point = {
+            f"{value_name[:-6]}_coef": (
+                value[i_sorted] if len(value) == len(datasets) else value
+            )
+            for (value_name, value) in point.items()
+        }
+
+        assert np.isclose(
+            default_model.compile_logp()(point),
+            regression_model.compile_logp()(regression_point),
+        )
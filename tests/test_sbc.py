@@ -0,0 +1,95 @@
+import json
+import pathlib
+
+import numpy as np
+
+import pytest
+
+import pylater.sbc
+
+
+def run_sbc(
+    path: pathlib.Path,
+    n_simulations: int,
+    n_trials: int = 50,
+    share_type: str | None = None,
+    n_workers: int = 1,
+) -> pylater.sbc.SBCResults:
+    return pylater.sbc.run_sbc(
+        path=path,
+        n_simulations=n_simulations,
+        n_datasets=2,
+        n_trials=n_trials,
+        share_type=share_type,
+        engine="grid",
+        n_draws=200,
+        n_rank_draws=19,
+        n_workers=n_workers,
+        random_seed=1,
+    )
+
+
+def test_sbc(tmp_path: pathlib.Path) -> None:
+    results = run_sbc(path=tmp_path / "serial", n_simulations=4)
+
+    assert results.n_completed == 4
+
+    # extending the run only performs the additional simulations
+    results = run_sbc(path=tmp_path / "serial", n_simulations=6)
+
+    assert results.n_completed == 6
+    assert len((tmp_path / "serial" / "results.jsonl").read_text().splitlines()) == 6
+
+    parallel_results = run_sbc(path=tmp_path / "parallel", n_simulations=6, n_workers=2)
+
+    table = results.table()
+
+    assert table["rank"].shape == (6, 6)
+    assert np.all((table["rank"] >= 0) & (table["rank"] <= 19))
+    assert table.equals(parallel_results.table())
+
+    recovery = results.recovery()
+
+    assert set(recovery.data_vars) == {
+        "bias",
+        "rmse",
+        "correlation",
+        "coverage",
+        "contraction",
+    }
+    assert np.all(recovery["contraction"] > 0)
+
+    uniformity = results.rank_uniformity(n_bins=4)
+
+    assert np.all(uniformity["counts"].sum(dim="bin") == 6)
+
+    with pytest.raises(ValueError, match="different settings"):
+        run_sbc(path=tmp_path / "serial", n_simulations=6, n_trials=60)
+
+    with pytest.raises(ValueError, match="only supports unshared"):
+        run_sbc(path=tmp_path / "shared", n_simulations=6, share_type="shift")
+
+
+def test_sbc_partial_line(tmp_path: pathlib.Path) -> None:
+    def run() -> pylater.sbc.SBCResults:
+        return pylater.sbc.run_sbc(
+            path=tmp_path,
+            n_simulations=2,
+            n_trials=50,
+            engine="grid",
+            n_draws=100,
+            random_seed=2,
+        )
+
+    run()
+
+    results_path = tmp_path / "results.jsonl"
+
+    # simulate an interruption part-way through writing a result
+    first_line, second_line = results_path.read_text().splitlines()
+    results_path.write_text(first_line + "\n" + second_line[:20])
+
+    results = run()
+
+    assert results.n_completed == 2
+    assert json.loads(results_path.read_text().splitlines()[-1])["simulation"] == 1
@@ -0,0 +1,160 @@
+import asyncio
+
+import pytest
+
+import pylater
+import pylater.service
+
+
+def test_service() -> None:
+    asyncio.run(run_service())
+
+
+async def run_service() -> None:
+    datasets = [pylater.data.cw1995["a_p50"]]
+
+    async with pylater.service.FitService(
+        n_workers=1,
+        max_queued=2,
+        progress_interval_s=0.1,
+    ) as service:
+
+        running = await service.submit(
+            datasets=datasets,
+            draws=100_000,
+            chains=1,
+            random_seed=1,
+        )
+
+        queued = await service.submit(datasets=datasets, draws=50, tune=50, chains=1)
+
+        job = await service.submit(
+            datasets=datasets,
+            draws=50,
+            tune=50,
+            chains=1,
+            random_seed=2,
+            priority=1,
+        )
+
+        with pytest.raises(asyncio.QueueFull):
+            await service.submit(datasets=datasets)
+
+        with pytest.raises(ValueError, match="own sampling callback"):
+            await service.submit(datasets=datasets, callback=print)
+
+        with (
+            pytest.warns(UserWarning, match="Ignoring `cores`"),
+            pytest.raises(asyncio.QueueFull),
+        ):
+            await service.submit(datasets=datasets, cores=4)
+
+        # a queued job is removed immediately
+        assert queued.cancel()
+        assert queued.status is pylater.service.JobStatus.CANCELLED
+        assert service.n_queued == 1
+
+        # a running job stops at its next progress update
+        async for progress in running.updates():
+            if (
+                progress.status is pylater.service.JobStatus.SAMPLING
+                and progress.n_draws > 0
+            ):
+                assert running.cancel()
+
+        assert progress.status is pylater.service.JobStatus.CANCELLED
+        assert 0 < progress.n_draws < progress.n_total_draws
+
+        with pytest.raises(asyncio.CancelledError):
+            await running.result()
+
+        statuses = [progress.status async for progress in job.updates()]
+
+        assert statuses[-1] is pylater.service.JobStatus.COMPLETED
+        assert job.progress.fraction == 1.0
+
+        idata = await job.result()
+
+        assert hasattr(idata, "posterior")
+        assert idata.posterior.sizes["draw"] == 50
+
+        assert not job.cancel()
+
+    assert service.n_running == 0
+
+    # finished jobs are not kept
+    assert not service.jobs
+
+
+def test_service_order() -> None:
+    asyncio.run(run_service_order())
+
+
+async def run_service_order() -> None:
+    datasets = [pylater.data.cw1995[name] for name in ("a_p50", "a_p25")]
+
+    async with pylater.service.FitService(
+        n_workers=1,
+        progress_interval_s=0.1,
+    ) as service:
+
+        blocking = await service.submit(
+            datasets=datasets[:1],
+            draws=100_000,
+            chains=1,
+        )
+
+        async for progress in blocking.updates():
+            if progress.status is not pylater.service.JobStatus.QUEUED:
+                break
+
+        # jobs that fail as soon as they start, in building their model
+        jobs: list[pylater.service.FitJob] = []
+        labels: dict[str, str] = {}
+
+        for label, priority, owner in (
+            ("a_0", 0, "a"),
+            ("a_1", 0, "a"),
+            ("a_2", 0, "a"),
+            ("b_0", 0, "b"),
+            ("b_1", 0, "b"),
+            ("high", 1, None),
+        ):
+            job = await service.submit(
+                datasets=datasets,
+                share_type="invalid",
+                priority=priority,
+                owner=owner,
+            )
+            jobs.append(job)
+            labels[job.job_id] = label
+
+        assert service.n_queued == 6
+
+        started: list[str] = []
+
+        async def record_start(job: pylater.service.FitJob) -> None:
+            async for progress in job.updates():
+                if progress.status is pylater.service.JobStatus.BUILDING:
+                    started.append(labels[job.job_id])
+                    return
+
+        recorders = [asyncio.create_task(record_start(job=job)) for job in jobs]
+
+        # let the recorders subscribe before the queued jobs can start
+        await asyncio.sleep(0)
+
+        assert blocking.cancel()
+
+        results = await asyncio.gather(
+            *(job.result() for job in jobs), return_exceptions=True
+        )
+        await asyncio.gather(*recorders)
+
+        assert all(isinstance(result, ValueError) for result in results)
+
+        # by priority, then with the jobs of each owner interleaved
+        assert started == ["high", "a_0", "b_0", "a_1", "b_1", "a_2"]
+
+        assert service.n_queued == 0
+        assert not service.jobs
@@ -0,0 +1,97 @@
+import pathlib
+
+import numpy as np
+
+import pytest
+
+import pylater.simulate
+
+
+def run_simulation(
+    path: pathlib.Path,
+    n_workers: int = 1,
+    n_replicates: int = 5,
+    chunk_format: str = "npz",
+) -> pylater.simulate.Simulation:
+    grid = pylater.simulate.parameter_grid(mu=[3, 5], sigma=[0.5, 1.0], sigma_e=3.0)
+
+    return pylater.simulate.simulate(
+        path=path,
+        parameters=grid,
+        n_trials=[50, 100, 150, 200],
+        n_replicates=n_replicates,
+        min_rt_s=0.1,
+        max_rt_s=1.0,
+        chunk_size=3,
+        n_workers=n_workers,
+        random_seed=42,
+        chunk_format=chunk_format,
+    )
+
+
+def test_simulate(tmp_path: pathlib.Path) -> None:
+    sim = run_simulation(path=tmp_path / "serial")
+    parallel_sim = run_simulation(path=tmp_path / "parallel", n_workers=2)
+
+    assert sim.n_datasets == 20
+    assert sim.n_chunks == 7
+    assert sim.is_complete
+
+    # independent of the number of processes
+    for i_chunk in range(sim.n_chunks):
+        chunk = sim.load_chunk(i_chunk=i_chunk)
+        parallel_chunk = parallel_sim.load_chunk(i_chunk=i_chunk)
+        for column_name, column in chunk.items():
+            assert np.array_equal(column, parallel_chunk[column_name])
+
+    for i_condition, _, dataset in sim.iter_datasets():
+        assert np.all((dataset.rt_s >= 0.1) & (dataset.rt_s <= 1.0))
+        # the censored trials are counted in the dataset
+        assert dataset.n_total == sim.n_trials[i_condition]
+        assert dataset.censor_lower_s == 0.1
+        assert dataset.censor_upper_s == 1.0
+
+    chunk = sim.load_chunk(i_chunk=0)
+    assert np.array_equal(
+        chunk["n_trials"],
+        np.diff(chunk["offsets"])
+        + chunk["n_censored_lower"]
+        + chunk["n_censored_upper"],
+    )
+
+    datasets = sim.datasets(condition=2)
+    assert len(datasets) == 5
+    assert datasets[0].name == "condition_2_replicate_0"
+
+    # resuming only simulates the missing chunks, with the same results
+    rt_s = sim.load_chunk(i_chunk=4)["rt_s"]
+    (tmp_path / "serial" / "chunk_000004.npz").unlink()
+    assert not pylater.simulate.Simulation(path=tmp_path / "serial").is_complete
+    run_simulation(path=tmp_path / "serial")
+    assert np.array_equal(sim.load_chunk(i_chunk=4)["rt_s"], rt_s)
+
+    with pytest.raises(ValueError, match="different settings"):
+        run_simulation(path=tmp_path / "serial", n_replicates=6)
+
+
+def test_simulate_parquet(tmp_path: pathlib.Path) -> None:
+    pytest.importorskip("pyarrow", exc_type=ImportError)
+
+    sim = run_simulation(path=tmp_path / "npz")
+    parquet_sim = run_simulation(path=tmp_path / "parquet", chunk_format="parquet")
+
+    assert parquet_sim.is_complete
+    assert (tmp_path / "parquet" / "chunk_000000.parquet").exists()
+
+    # the same datasets, whichever the format
+    for i_chunk in range(sim.n_chunks):
+        chunk = sim.load_chunk(i_chunk=i_chunk)
+        parquet_chunk = parquet_sim.load_chunk(i_chunk=i_chunk)
+        assert chunk.keys() == parquet_chunk.keys()
+        for column_name, column in chunk.items():
+            assert np.array_equal(column, parquet_chunk[column_name])
+            assert column.dtype == parquet_chunk[column_name].dtype
+
+    # and the format is part of the settings
+    with pytest.raises(ValueError, match="different settings"):
+        run_simulation(path=tmp_path / "npz", chunk_format="parquet")
@@ -0,0 +1,160 @@
+import pathlib
+import typing
+import warnings
+
+import numpy as np
+
+import matplotlib as mpl
+
+import xarray as xr
+
+import arviz as az
+
+import h5netcdf
+
+import pymc as pm
+
+import pylater
+import pylater.store
+
+
+def test_sample_to_store(tmp_path: pathlib.Path) -> None:
+    mpl.use("Agg")
+
+    datasets = [pylater.data.cw1995["a_p50"], pylater.data.cw1995["a_p25"]]
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        model = pylater.build_default_model(datasets=datasets, share_type="shift")
+
+    path = tmp_path / "store.nc"
+
+    idata = pylater.store.sample_to_store(
+        model=model,
+        path=path,
+        draws=30,
+        tune=30,
+        chains=2,
+        cores=1,
+        chunk_size=20,
+        posterior_predictive=True,
+        random_seed=5312,
+        progressbar=False,
+    )
+
+    assert hasattr(idata, "posterior")
+    assert hasattr(idata, "log_likelihood")
+    assert hasattr(idata, "sample_stats")
+
+    assert set(idata.groups()) == {
+        "posterior",
+        "sample_stats",
+        "log_likelihood",
+        "posterior_predictive",
+    }
+
+    # the draws are read lazily, and all of them were written
+    assert idata.posterior.mu.shape == (2, 30, 2)
+    assert not np.any(np.isnan(idata.posterior.mu.values))
+    assert not np.any(np.isnan(idata.log_likelihood.obs_a_p50.values))
+    assert idata.sample_stats.diverging.dtype == bool
+
+    plot = pylater.ReciprobitPlot()
+    plot.plot_model(idata=idata, dataset_name="a_p50", chunk_size=7)
+    plot.plot_predictive(
+        idata=idata,
+        predictive_type="posterior",
+        observed_var_name="obs_a_p50",
+        chunk_size=7,
+    )
+
+    # a file that was not opened as a store (here, read into memory) is not written
+    # to
+    plain_groups: dict[str, typing.Any] = {
+        group: xr.load_dataset(path, group=group, engine="h5netcdf")
+        for group in ("posterior", "log_likelihood")
+    }
+    plain_idata = az.InferenceData(**plain_groups)
+    pylater.combine_multiple_likelihoods(idata=plain_idata)
+
+    assert hasattr(plain_idata, "log_likelihood")
+    assert "obs" in plain_idata.log_likelihood
+
+    with h5netcdf.File(path, "r") as store:
+        assert "obs" not in store["log_likelihood"].variables
+
+    # the combined log-likelihood is written to the store
+    pylater.combine_multiple_likelihoods(idata=idata, chunk_size=7)
+
+    reopened = pylater.store.open_store(path=path)
+
+    assert hasattr(reopened, "log_likelihood")
+
+    assert np.allclose(
+        reopened.log_likelihood.obs.values,
+        np.concatenate(
+            [
+                idata.log_likelihood[f"obs_{dataset.name}"].values
+                for dataset in datasets
+            ],
+            axis=-1,
+        ),
+    )
+
+
+def test_store_trace(tmp_path: pathlib.Path) -> None:
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        model = pylater.build_default_model(datasets=[pylater.data.cw1995["a_p50"]])
+
+    path = tmp_path / "store.nc"
+
+    trace = pylater.store.StoreTrace(
+        path=path,
+        model=model,
+        n_draws=25,
+        n_tune=20,
+        n_chains=1,
+        chunk_size=10,
+    )
+
+    pylater.store.create_group(
+        path=path,
+        group="posterior",
+        variables={
+            var_name: (trace.var_shapes[var_name], trace.var_dtypes[var_name])
+            for var_name in trace.varnames
+        },
+        coords=pylater.store.chain_draw_coords(n_chains=1, n_draws=25),
+        chunk_size=10,
+        model=model,
+    )
+
+    # the draws of the returned trace are read from the store
+    multi_trace = pm.sample(
+        model=model,
+        draws=25,
+        tune=20,
+        chains=1,
+        cores=1,
+        trace=trace,
+        return_inferencedata=False,
+        compute_convergence_checks=False,
+        random_seed=2211,
+        progressbar=False,
+    )
+
+    idata = pylater.store.open_store(path=path)
+
+    assert hasattr(idata, "posterior")
+    assert hasattr(idata, "sample_stats")
+
+    mu = multi_trace.get_values("mu")
+
+    assert mu.shape == (25, 1)
+    assert np.array_equal(mu, idata.posterior.mu.values[0])
+    assert np.array_equal(multi_trace.point(-1)["mu"], mu[-1])
+    assert np.array_equal(
+        multi_trace.get_sampler_stats("diverging"),
+        idata.sample_stats.diverging.values[0],
+    )
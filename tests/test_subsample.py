@@ -0,0 +1,105 @@
+import warnings
+
+import numpy as np
+
+import xarray as xr
+
+import arviz as az
+
+import pylater
+import pylater.dist
+import pylater.subsample
+
+
+def test_subsample() -> None:
+    rng = np.random.default_rng(seed=2718)
+
+    rt_s = pylater.dist.random(mu=5.0, sigma=1.0, sigma_e=4.0, rng=rng, size=20_000)
+
+    dataset = pylater.Dataset(name="a", rt_s=rt_s)
+
+    ref_point = {"sigma": 1.0, "k": 5.0, "sigma_e_mod": 4.0}
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        subsampled = pylater.subsample.build_subsampled_model(
+            datasets=[dataset],
+            n_subsample=500,
+            ref_point=ref_point,
+            rng=1,
+        )
+
+    likelihood = subsampled.likelihoods["a"]
+
+    assert len(likelihood.promptness) == 500
+
+    # the estimate is exact at the reference point, and close near it
+    ref_log_params = np.log([ref_point[name] for name in pylater.subsample.PARAM_NAMES])
+
+    assert np.isclose(
+        likelihood.numpy_estimate(log_params=ref_log_params),
+        likelihood.numpy_exact(log_params=ref_log_params),
+    )
+
+    # on the scale of the posterior
+    log_params = ref_log_params + rng.normal(scale=0.005, size=(2, 400, 3))
+
+    assert (
+        np.std(
+            likelihood.numpy_estimate(log_params=log_params)
+            - likelihood.numpy_exact(log_params=log_params)
+        )
+        < 0.5
+    )
+
+    # the estimate in the model matches that outside of it
+    point = subsampled.model.initial_point()
+    point_log_params = np.array(
+        [
+            point["sigma_log__"][0],
+            point["k_log__"][0],
+            point["sigma_e_mod_log__"][0],
+        ]
+    )
+
+    potential = subsampled.model.compile_logp(
+        vars=[subsampled.model["obs_a_subsampled"]],
+    )(point)
+
+    assert np.isclose(
+        potential,
+        likelihood.numpy_estimate(log_params=point_log_params),
+        rtol=1e-6,
+    )
+
+    params = np.exp(log_params)
+
+    posterior = xr.Dataset(
+        data_vars={
+            name: (("chain", "draw", "dataset"), params[..., [i_param]])
+            for (i_param, name) in enumerate(pylater.subsample.PARAM_NAMES)
+        }
+        | {
+            "mu": (
+                ("chain", "draw", "dataset"),
+                params[..., [0]] * params[..., [1]],
+            ),
+        },
+        coords={"dataset": ["a"]},
+    )
+
+    weights = subsampled.importance_weights(
+        idata=az.InferenceData(posterior=posterior),
+        max_draws=200,
+    )
+
+    assert weights.log_weight.sizes == {"chain": 2, "draw": 100}
+    assert np.isclose(np.exp(weights.log_weight).sum(), 1.0)
+    assert np.isfinite(weights.pareto_k)
+
+    # the draws are thinned evenly
+    assert np.isclose(
+        weights.log_ratio.isel(chain=1, draw=1),
+        likelihood.numpy_exact(log_params=log_params[1, 4])
+        - likelihood.numpy_estimate(log_params=log_params[1, 4]),
+    )
@@ -0,0 +1,89 @@
+import csv
+import pathlib
+
+import numpy as np
+
+import xarray as xr
+
+import arviz as az
+
+import pylater.summary
+
+
+def test_summarise(tmp_path: pathlib.Path) -> None:
+    rng = np.random.default_rng(seed=3141)
+
+    n_chains, n_draws, n_datasets = (4, 300, 20)
+
+    # autocorrelated draws, with some chains that have not mixed
+    values = np.zeros((n_chains, n_draws, n_datasets))
+    for i_draw in range(1, n_draws):
+        values[:, i_draw] = 0.8 * values[:, i_draw - 1] + rng.normal(
+            size=(n_chains, n_datasets)
+        )
+    values[0, :, :5] += 3.0
+
+    posterior = xr.Dataset(
+        data_vars={
+            "mu": (("chain", "draw", "dataset"), np.exp(values)),
+            "sigma": (
+                ("chain", "draw"),
+                rng.gamma(shape=2.0, size=(n_chains, n_draws)),
+            ),
+        },
+        coords={"dataset": [f"d{i_dataset}" for i_dataset in range(n_datasets)]},
+    )
+
+    summary = pylater.summary.summarise(
+        idata=posterior,
+        var_names=["mu", "sigma"],
+        chunk_size=7,
+    )
+
+    assert summary.sizes == {"dataset": n_datasets, "variable": 2}
+
+    expected = az.summary(
+        posterior.mu,
+        stat_focus="mean",
+        round_to="none",
+    )
+
+    for stat_name in ("mean", "sd", "r_hat", "ess_bulk", "ess_tail"):
+        assert np.allclose(
+            summary[stat_name].sel(variable="mu"),
+            expected[stat_name],
+        )
+
+    assert np.allclose(
+        summary["q0.5"].sel(variable="mu"),
+        posterior.mu.median(dim=("chain", "draw")),
+    )
+
+    # the shared parameter is summarised for each dataset
+    assert np.allclose(
+        summary.r_hat.sel(variable="sigma"),
+        summary.r_hat.sel(variable="sigma").isel(dataset=0),
+    )
+
+    # without `mu`, and so with only a shared parameter
+    sigma_summary = pylater.summary.summarise(idata=posterior, var_names=["sigma"])
+
+    assert sigma_summary.sizes == {"dataset": n_datasets, "variable": 1}
+    assert np.allclose(
+        sigma_summary.r_hat.sel(variable="sigma"),
+        summary.r_hat.sel(variable="sigma"),
+    )
+
+    path = tmp_path / "summary.csv"
+
+    pylater.summary.write_csv(summary=summary, path=path)
+
+    with path.open(newline="") as handle:
+        rows = list(csv.DictReader(handle))
+
+    assert len(rows) == n_datasets * 2
+    assert (rows[1]["dataset"], rows[1]["variable"]) == ("d0", "sigma")
+    assert np.isclose(
+        float(rows[1]["ess_bulk"]),
+        summary.ess_bulk.sel(dataset="d0", variable="sigma"),
+    )